@@ -9,8 +9,7 @@ from pathlib import Path
 from typing import TYPE_CHECKING
 
 import uvicorn
-from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import FastAPI, File, Request, UploadFile
+from fastapi import BackgroundTasks, FastAPI, File, Request, UploadFile
 from fastapi.openapi.docs import (
     get_redoc_html,
     get_swagger_ui_html,
@@ -31,7 +30,18 @@ from custom.haleon import haleon_api
 from framework.api_model import QueryResponse
 from framework.business_code import ERROR_10207
 from framework.business_except import BusinessException
+from framework.mysql.mysql_pool import MysqlPool, run_in_db_executor
+from framework.scheduler.job_scheduler import DistributedScheduler
+from framework.util.async_util import iterate_in_thread, run_blocking
+from framework.util.body_limit import BodySizeLimitMiddleware
+from framework.util.stream_encoder import encode_stream
+from framework.util.stream_guard import DisconnectGuard, get_stream_metrics
+from models.embeddings.cached_embeddings import get_embeddings_cache_stats
+from models.llms.llm_client_registry import get_pool_metrics, close_clients
+from models.llms.llm_key_scheduler import get_key_metrics
+from models.llms.llm_router import get_breaker_metrics
 from models.vectordatabase.v_client import get_instance_client
+from service.bot_profile_cache import publish_bot_profile_changed
 from service.bot_service import BotInitDomain
 from service.chat_private_service import ChatPrivateDomain
 from service.chat_public_service import ChatPublicDomain
@@ -39,20 +49,27 @@ from service.domain.ai_chat_bot import AiChatBotDomain
 from service.domain.ai_chat_history import AiChatHistoryDomain
 from service.domain.ai_namespace import AiNamespaceDomain
 from service.domain.ai_namespace_file import AiNamespaceFileDomain
-from service.local_repo_service import LocalRepositoryDomain
+from service.ingest_queue import IngestQueue, IngestWorkerPool
 from service.namespacefile.namespace_file_request import (
     DelChunkParam,
     DelFileParam,
 )
+from service.prohibited_filter import filter_answer_stream
+from service.schedule.namespace_file_schedule import reload_namespace_file
 from service.schedule.spider_network_schedule import rewrite_spider_network
+from service.upload_service import save_upload_file
 
 app = FastAPI(title="BespinGLM模型层-主应用工程")
+# 上传接口(含定制模块路由中接收UploadFile的接口)在Starlette落盘表单之前按请求体大小拒绝超限请求
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES + UPLOAD_BODY_OVERHEAD_BYTES)
 app.include_router(haleon_api.router)
 app.include_router(amway_api.router)
 app.include_router(bespin_api.router)
 BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "framework" / "static" / "swagger-ui"), name="static")
-scheduler = BackgroundScheduler()
+scheduler = DistributedScheduler()
+# 进程内嵌的向量化消费者(生产环境建议以ingest_worker.py独立部署)
+ingest_pool = IngestWorkerPool(concurrency=INGEST_EMBEDDED_CONSUMERS)
 
 
 # @app.get("/docs", include_in_schema=False)
@@ -103,20 +120,33 @@ async def redoc_html():
 async def start_scheduler():
     """
     1.日志框架初始化配置\n
-    2.定时任务初始化配置\n
+    2.向量库连接池及表结构初始化\n
+    3.定时任务初始化配置\n
+    4.向量化消费者启动\n
     :return:\n
     """
     init_log_config()
+    try:
+        get_instance_client().init_database()
+    except Exception as e:
+        logger.error("Application 向量库初始化失败, Message={}", e)
     #   init_prohibited_data()
     #   init_disclaimer_data()
     #   if SCHEDULES_PROHIBITED:
-    #       scheduler.add_job(init_prohibited_data, 'interval', seconds=SCHEDULES_PROHIBITED_SECONDS)
+    #       scheduler.add_job(init_prohibited_data, job_id="prohibited_data", seconds=SCHEDULES_PROHIBITED_SECONDS)
     #   if SCHEDULES_DISCLAIMER:
-    #       scheduler.add_job(init_disclaimer_data, 'interval', seconds=SCHEDULES_DISCLAIMER_SECONDS)
+    #       scheduler.add_job(init_disclaimer_data, job_id="disclaimer_data", seconds=SCHEDULES_DISCLAIMER_SECONDS)
+    # 定时任务在集群内按执行周期与分片加锁, 多个worker进程不会重复执行
     if SCHEDULES_SPIDER:
-        scheduler.add_job(rewrite_spider_network, "interval", seconds=SCHEDULES_SPIDER_SECONDS)
+        scheduler.add_job(rewrite_spider_network, job_id="spider_network", seconds=SCHEDULES_SPIDER_SECONDS,
+                          shards=SCHEDULES_SPIDER_SHARDS)
+    if SCHEDULES_FILE_RELOAD:
+        scheduler.add_job(reload_namespace_file, job_id="namespace_file_reload", seconds=SCHEDULES_RATE_SECOND,
+                          shards=SCHEDULES_FILE_RELOAD_SHARDS)
     if SCHEDULES_ENABLED:
         scheduler.start()
+    if INGEST_EMBEDDED_CONSUMERS > 0:
+        ingest_pool.start()
     logger.info("Application 启动成功! 执行时间: ", end=" ")
     logger.info(f"{datetime.now():%Y-%m-%d %H:%M:%S}")
 
@@ -129,6 +159,9 @@ async def stop_scheduler():
     """
     if SCHEDULES_ENABLED:
         scheduler.shutdown()
+    ingest_pool.stop(timeout=INGEST_BLOCK_MS / 1000 + 1)
+    await close_clients()
+    get_instance_client().close_database()
 
 
 @app.get(path="/", include_in_schema=False)
@@ -177,41 +210,38 @@ async def api_upload_file(user_file: UploadFile = File(...), namespace_id: str |
         # 上传文件保存至临时目录
         if user_file.filename is None:
             raise BusinessException(400, "文件名为空")
-        filepath = f"{CONTENT_PATH}{user_file.filename}"
-        content = await user_file.read()
-        print(user_file.filename)
-        with open(filepath, "wb") as f:
-            f.write(content)
-        print(f)
-        # 向量标识
-        ids = None
-        if namespace_id:
-            # 根据标识查询知识库信息
-            namespaceModel = AiNamespaceDomain().find_by_id(namespace_id)
-            if not namespaceModel:
-                logger.error(f"[10001]未查询到所属知识库[{namespace_id}]信息")
-                raise BusinessException(10001, "未查询到所属知识库信息")
-            # 向本地知识库推送元数据
-            localRepositoryDomain = LocalRepositoryDomain()
-            ids = localRepositoryDomain.push(
-                glob=user_file.filename,
-                namespaceModel=namespaceModel,
-            )
-        else:
-            # namespace_id 为空时无法确定所属知识库，push 需要 namespaceModel
+        if not namespace_id:
+            # namespace_id 为空时无法确定所属知识库
             raise BusinessException(400, "namespace_id 不能为空")
-        # 保存源文件信息
-        namespaceFileDomain = AiNamespaceFileDomain()
-        namespaceFileDomain.create(
+        # 根据标识查询知识库信息
+        namespaceModel = await run_in_db_executor(AiNamespaceDomain(request_id=request_id).find_by_id, namespace_id)
+        if not namespaceModel:
+            logger.error(f"[10001]未查询到所属知识库[{namespace_id}]信息")
+            raise BusinessException(10001, "未查询到所属知识库信息")
+        # 分块流式写入, 同时计算内容摘要; 按内容分目录保存, 排队中的任务文件不会被同名上传覆盖
+        uploadResult = await save_upload_file(user_file, request_id=request_id, content_addressed=True)
+        # 保存源文件信息(待向量化), 向量化由后台消费者异步处理
+        namespaceFileDomain = AiNamespaceFileDomain(request_id=request_id)
+        file_id = await run_in_db_executor(
+            namespaceFileDomain.create,
             namespace_id=namespace_id,
-            name=user_file.filename,
-            display_name=user_file.filename,
-            path=CONTENT_PATH,
+            name=uploadResult.file_name,
+            display_name=uploadResult.file_name,
+            path=uploadResult.file_dir,
             type=user_file.content_type or "",
-            size=str(user_file.size),
+            size=str(uploadResult.size),
             remark="python",
-            vector_ids=ids,
+            vector_ids=[],
+            vector_status="Wait",
         )
+        if not file_id:
+            raise BusinessException(-1, "保存知识库文件信息失败")
+        await run_in_db_executor(namespaceFileDomain.update_md5, file_id, uploadResult.md5)
+        job = await run_blocking(IngestQueue(request_id=request_id).enqueue, file_id=str(file_id),
+                                 namespace_id=namespace_id, content_hash=uploadResult.md5,
+                                 file_path=uploadResult.file_path)
+        response.data = {"file_id": file_id, "job_id": job.get("job_id"), "status": job.get("status"),
+                         "size": uploadResult.size, "sha256": uploadResult.sha256}
     except BusinessException as business_err:
         logger.error("###API###api_upload_file error, requestId={}, err={}.", request_id, business_err)
         response.message = business_err.message
@@ -223,6 +253,49 @@ async def api_upload_file(user_file: UploadFile = File(...), namespace_id: str |
     return response
 
 
+@app.get(
+    path="/knowledge-base/upload/status",
+    tags=["KnowledgeBase:知识库模块"],
+    summary="查询知识库文件向量化进度",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_upload_status(job_id: str | None = None, file_id: str | None = None) -> QueryResponse:
+    """
+    查询知识库文件向量化进度\n
+    :param job_id: 任务标识(上传接口返回)\n
+    :param file_id: 知识文件标识\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        if not job_id and not file_id:
+            raise BusinessException(400, "job_id 与 file_id 不能同时为空")
+        queue = IngestQueue(request_id=request_id)
+        job = queue.get_job(job_id=job_id, file_id=file_id)
+        file_id = file_id or job.get("file_id") or (job_id.split(":")[0] if job_id else None)
+        namespaceFileModel = AiNamespaceFileDomain(request_id=request_id).find_by_id(file_id=file_id)
+        if not namespaceFileModel and not job:
+            raise BusinessException(404, "未查询到向量化任务信息")
+        response.data = {
+            "job": job,
+            "file_id": file_id,
+            "vector_status": namespaceFileModel.vector_status if namespaceFileModel else None,
+            "vector_count": namespaceFileModel.vector_count if namespaceFileModel else None,
+            "queue": queue.stats(),
+        }
+    except BusinessException as business_err:
+        logger.error("###API###api_upload_status error, requestId={}, err={}.", request_id, business_err)
+        response.message = business_err.message
+        response.status = business_err.code
+    except Exception as err:
+        logger.error("###API###api_upload_status error, requestId={}, err={}.", request_id, err)
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
 @app.post(
     path="/chat/ask",
     tags=["Chat:聊天模块"],
@@ -284,6 +357,7 @@ def api_chat_ask(
     response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
 )
 async def api_chat_ask_stream(
+    request: Request,
     ques: str,
     bot_id: str,
     enable_search: bool,
@@ -309,7 +383,8 @@ async def api_chat_ask_stream(
     try:
 
         async def event_generator():
-            for chatResponse in ChatPrivateDomain(request_id).ask_stream(
+            # 同步流式问答在独立线程中执行, 客户端断开时取消
+            source = iterate_in_thread(ChatPrivateDomain(request_id).ask_stream(
                 ques=ques,
                 bot_id=bot_id,
                 user_id=user_id or "",
@@ -317,8 +392,12 @@ async def api_chat_ask_stream(
                 enable_search=enable_search,
                 enable_thinking=enable_thinking,
                 thinking_budget=thinking_budget,
-            ):
-                yield chatResponse.json()
+            ), name=f"chat-stream-{request_id[:8]}")
+            if PROHIBITED_STREAM_ENABLED:
+                # 流式逐片过滤敏感词
+                source = filter_answer_stream(source)
+            async for frame in encode_stream(DisconnectGuard(request, request_id).stream(source)):
+                yield frame
 
         return EventSourceResponse(event_generator())
     except BusinessException as business_err:
@@ -451,7 +530,7 @@ async def api_chat_public_ask_stream(
     try:
 
         async def event_generator() -> AsyncGenerator[str, None]:
-            async for chatResponse in ChatPublicDomain(request_id).ask_chat_stream(
+            source = ChatPublicDomain(request_id).ask_chat_stream(
                 ques=ques,
                 bot_id=bot_id,
                 user_id=user_id or "",
@@ -463,8 +542,12 @@ async def api_chat_public_ask_stream(
                 thinking_budget=thinking_budget,
                 files=files,
                 voice=voice,
-            ):
-                yield chatResponse.json()
+            )
+            if PROHIBITED_STREAM_ENABLED:
+                # 流式逐片过滤敏感词
+                source = filter_answer_stream(source)
+            async for frame in encode_stream(DisconnectGuard(request, request_id).stream(source)):
+                yield frame
 
         return EventSourceResponse(event_generator())
     except BusinessException as business_err:
@@ -598,6 +681,35 @@ def api_get_bot_info(
     return response
 
 
+@app.post(
+    path="/bot/profile/invalidate",
+    tags=["Bot:机器人模块"],
+    summary="机器人配置缓存失效通知",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_bot_profile_invalidate(bot_id: str, version: int | None = None) -> QueryResponse:
+    """
+    管理端修改机器人配置(version递增)后调用, 通知全部服务进程失效该机器人的配置缓存\n
+    :param bot_id: 机器人标识(*为全部)\n
+    :param version: 新版本号\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        response.data = {"receivers": publish_bot_profile_changed(bot_id=bot_id, version=version)}
+    except BusinessException as business_err:
+        logger.error("###API###api_bot_profile_invalidate error, requestId={}, err={}.", request_id, business_err)
+        response.message = business_err.message
+        response.status = business_err.code
+    except Exception as err:
+        logger.error("###API###api_bot_profile_invalidate error, requestId={}, err={}.", request_id, err)
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
 @app.get(
     path="/namespace",
     tags=["Namespace:知识库模块"],
@@ -918,6 +1030,163 @@ def api_del_vector_namespace_file(
     return response
 
 
+@app.get(
+    path="/vector/index/health",
+    tags=["Vector:向量模块"],
+    summary="查询向量索引健康状况",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_vector_index_health() -> QueryResponse:
+    """
+    查询向量索引健康状况(索引是否缺失/失效、大小、扫描次数、表行数)\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        response.data = get_instance_client().get_index_health()
+    except BusinessException as business_err:
+        logger.error("###API###api_vector_index_health error, requestId={}, err={}.", request_id, business_err)
+        traceback.print_exc()
+        response.message = business_err.message
+        response.status = business_err.code
+    except Exception as err:
+        logger.error("###API###api_vector_index_health error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
+def _vector_index_rebuild_task(request_id: str, index_type: str = None, rebuild: bool = False):
+    try:
+        result = get_instance_client().create_index(index_type=index_type, rebuild=rebuild)
+        logger.info("###API###api_vector_index_rebuild INFO, requestId={}, 索引构建结束, executed={}.", request_id,
+                    result)
+    except Exception as err:
+        logger.error("###API###api_vector_index_rebuild error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+
+
+@app.post(
+    path="/vector/index/rebuild",
+    tags=["Vector:向量模块"],
+    summary="创建或重建向量索引",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_vector_index_rebuild(
+        background_tasks: BackgroundTasks,
+        index_type: str = None,
+        rebuild: bool = False,
+) -> QueryResponse:
+    """
+    创建或重建向量索引(后台执行, 进度通过/vector/index/health查询)\n
+    :param index_type: 索引类型 hnsw/ivfflat, 为空取默认配置\n
+    :param rebuild: 是否重建已有向量索引(新索引构建完成后替换旧索引)\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        logger.info("###API###api_vector_index_rebuild INFO, requestId={}, index_type={}, rebuild={}", request_id,
+                    index_type, rebuild)
+        background_tasks.add_task(_vector_index_rebuild_task, request_id, index_type, rebuild)
+        response.data = {"submitted": True, "request_id": request_id}
+    except BusinessException as business_err:
+        logger.error("###API###api_vector_index_rebuild error, requestId={}, err={}.", request_id, business_err)
+        traceback.print_exc()
+        response.message = business_err.message
+        response.status = business_err.code
+    except Exception as err:
+        logger.error("###API###api_vector_index_rebuild error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
+@app.get(
+    path="/schedule/job/status",
+    tags=["Schedule:定时任务"],
+    summary="查询定时任务执行进度与运行历史",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_schedule_job_status(job_id: str, limit: int = 20) -> QueryResponse:
+    """
+    查询定时任务执行进度与运行历史\n
+    :param job_id: 任务标识(spider_network、namespace_file_reload)\n
+    :param limit: 历史条数\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        response.data = scheduler.get_job_status(job_id=job_id, limit=limit)
+    except BusinessException as business_err:
+        logger.error("###API###api_schedule_job_status error, requestId={}, err={}.", request_id, business_err)
+        traceback.print_exc()
+        response.message = business_err.message
+        response.status = business_err.code
+    except Exception as err:
+        logger.error("###API###api_schedule_job_status error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
+@app.get(
+    path="/llm/client/metrics",
+    tags=["Monitor:运行监控"],
+    summary="查询大模型客户端连接池占用",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_llm_client_metrics() -> QueryResponse:
+    """
+    查询当前进程内大模型客户端连接池占用(连接数、活跃/空闲连接数、排队请求数)、千帆AccessToken剩余有效期、API密钥调度、服务商熔断状态、流式响应统计及向量缓存命中统计\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        response.data = {**get_pool_metrics(), "keys": get_key_metrics(), "breakers": get_breaker_metrics(),
+                         "streams": get_stream_metrics(), "embeddings_cache": get_embeddings_cache_stats()}
+    except Exception as err:
+        logger.error("###API###api_llm_client_metrics error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
+@app.get(
+    path="/db/pool/metrics",
+    tags=["Monitor:运行监控"],
+    summary="查询数据库连接池占用",
+    response_model=QueryResponse,
+    response_description="返回体对象[status:结果状态(0成功), message:错误信息, data:业务数据]",
+)
+def api_db_pool_metrics() -> QueryResponse:
+    """
+    查询当前进程内各MySQL连接池统计(借出、超时、新建、丢弃次数, 等待与查询耗时, 慢查询数, 空闲连接数与连接上限)\n
+    :return: QueryResponse\n
+    """
+    response = QueryResponse()
+    request_id = str(uuid.uuid4())
+    try:
+        response.data = MysqlPool.get_all_stats()
+    except Exception as err:
+        logger.error("###API###api_db_pool_metrics error, requestId={}, err={}.", request_id, err)
+        traceback.print_exc()
+        response.message = str(err)
+        response.status = -1
+    return response
+
+
 @app.post(
     path="/llm/ragas/upload",
     tags=["Ragas:结果评估"],
@@ -961,13 +1230,8 @@ async def api_ragas_upload_file(user_file: UploadFile = File(...)) -> QueryRespo
         # 上传文件保存至临时目录
         if user_file.filename is None:
             raise BusinessException(400, "文件名为空")
-        filepath = f"{CONTENT_PATH}{user_file.filename}"
-        content = await user_file.read()
-        print(user_file.filename)
-        with open(filepath, "wb") as f:
-            f.write(content)
-
-        print(filepath)
+        uploadResult = await save_upload_file(user_file, request_id=request_id)
+        filepath = uploadResult.file_path
         # 读取Excel文件
         df = pd.read_excel(filepath, header=None)
 
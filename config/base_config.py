@@ -30,6 +30,11 @@ OPENAI_MODEL_NAME = BASE_OPENAI_MODEL_NAME or os.environ.get("OPENAI_MODEL_NAME"
 VECTOR_DATABASE_TYPE = BASE_VECTOR_DATABASE_TYPE or os.environ.get("VECTOR_DATABASE_TYPE")
 VECTOR_EMBEDDINGS_MODEL = BASE_VECTOR_EMBEDDINGS_MODEL or os.environ.get("VECTOR_EMBEDDINGS_MODEL")
 VECTOR_EMBEDDINGS_MODEL_TYPE = BASE_VECTOR_EMBEDDINGS_MODEL_TYPE or os.environ.get("VECTOR_EMBEDDINGS_MODEL_TYPE")
+# 向量缓存配置(进程内LRU + Redis共享缓存)
+EMBEDDINGS_CACHE_ENABLED = os.environ.get("EMBEDDINGS_CACHE_ENABLED") != 'False'
+EMBEDDINGS_CACHE_MEMORY_SIZE = int(os.environ.get("EMBEDDINGS_CACHE_MEMORY_SIZE") or 20000)
+EMBEDDINGS_CACHE_REDIS_ENABLED = os.environ.get("EMBEDDINGS_CACHE_REDIS_ENABLED") != 'False'
+EMBEDDINGS_CACHE_REDIS_SECONDS = int(os.environ.get("EMBEDDINGS_CACHE_REDIS_SECONDS") or 7 * 86400)
 
 # 向量库配置
 PGVECTOR_DRIVER = TEST_PGVECTOR_DRIVER if APPLICATION_ENV_IS_TEST else PROD_PGVECTOR_DRIVER
@@ -39,6 +44,31 @@ PGVECTOR_DATABASE = TEST_PGVECTOR_DATABASE if APPLICATION_ENV_IS_TEST else PROD_
 PGVECTOR_USER = TEST_PGVECTOR_USER if APPLICATION_ENV_IS_TEST else PROD_PGVECTOR_USER
 PGVECTOR_PASSWORD = TEST_PGVECTOR_PASSWORD if APPLICATION_ENV_IS_TEST else PROD_PGVECTOR_PASSWORD
 PGVECTOR_DIMENSIONS = TEST_PGVECTOR_DIMENSIONS if APPLICATION_ENV_IS_TEST else PROD_PGVECTOR_DIMENSIONS
+# 向量库连接池配置(每个进程独立持有, 注意与uvicorn workers数量相乘后的总连接数)
+PGVECTOR_POOL_SIZE = int(os.environ.get("PGVECTOR_POOL_SIZE") or 5)
+PGVECTOR_POOL_MAX_OVERFLOW = int(os.environ.get("PGVECTOR_POOL_MAX_OVERFLOW") or 10)
+PGVECTOR_POOL_TIMEOUT = int(os.environ.get("PGVECTOR_POOL_TIMEOUT") or 30)
+PGVECTOR_POOL_RECYCLE = int(os.environ.get("PGVECTOR_POOL_RECYCLE") or 1800)
+PGVECTOR_POOL_PRE_PING = os.environ.get("PGVECTOR_POOL_PRE_PING") != 'False'
+# 知识库名称与collection_id映射的进程内缓存有效期(秒), 其他进程删除或重建知识库后最迟在该时间后生效
+PGVECTOR_COLLECTION_CACHE_SECONDS = int(os.environ.get("PGVECTOR_COLLECTION_CACHE_SECONDS") or 300)
+# 向量批量写入模式: copy(COPY FROM STDIN) / executemany / orm, 以及每批次写入条数
+PGVECTOR_BULK_INSERT_MODE = os.environ.get("PGVECTOR_BULK_INSERT_MODE") or "copy"
+PGVECTOR_BULK_INSERT_BATCH_SIZE = int(os.environ.get("PGVECTOR_BULK_INSERT_BATCH_SIZE") or 500)
+# 向量索引配置: 启动时自动创建索引, 索引类型hnsw/ivfflat及构建、检索参数(ivfflat_lists为0时按数据量自动计算)
+PGVECTOR_INDEX_AUTO_CREATE = os.environ.get("PGVECTOR_INDEX_AUTO_CREATE") != 'False'
+PGVECTOR_INDEX_TYPE = os.environ.get("PGVECTOR_INDEX_TYPE") or "hnsw"
+PGVECTOR_HNSW_M = 16
+PGVECTOR_HNSW_EF_CONSTRUCTION = 64
+PGVECTOR_HNSW_EF_SEARCH = int(os.environ.get("PGVECTOR_HNSW_EF_SEARCH") or 100)
+PGVECTOR_IVFFLAT_LISTS = 0
+PGVECTOR_IVFFLAT_PROBES = int(os.environ.get("PGVECTOR_IVFFLAT_PROBES") or 10)
+# 向量索引迭代扫描模式(pgvector>=0.8支持, strict_order/relaxed_order, 为空不开启)
+PGVECTOR_ITERATIVE_SCAN = os.environ.get("PGVECTOR_ITERATIVE_SCAN") or ""
+# 向量索引召回数量不足k条时是否回退精确检索(按集合过滤后计算距离)
+PGVECTOR_EXACT_FALLBACK = os.environ.get("PGVECTOR_EXACT_FALLBACK") != 'False'
+# 精确检索回退判断使用的集合分片数缓存时间(秒)
+PGVECTOR_ROW_COUNT_CACHE_SECONDS = int(os.environ.get("PGVECTOR_ROW_COUNT_CACHE_SECONDS") or 60)
 # 业务库配置
 MYSQL_HOST = TEST_MYSQL_HOST if APPLICATION_ENV_IS_TEST else PROD_MYSQL_HOST
 MYSQL_PORT = TEST_MYSQL_PORT if APPLICATION_ENV_IS_TEST else PROD_MYSQL_PORT
@@ -46,6 +76,13 @@ MYSQL_CHARSET = TEST_MYSQL_CHARSET if APPLICATION_ENV_IS_TEST else PROD_MYSQL_CH
 MYSQL_DATABASE = TEST_MYSQL_DATABASE if APPLICATION_ENV_IS_TEST else PROD_MYSQL_DATABASE
 MYSQL_USER = TEST_MYSQL_USER if APPLICATION_ENV_IS_TEST else PROD_MYSQL_USER
 MYSQL_PASSWD = TEST_MYSQL_PASSWD if APPLICATION_ENV_IS_TEST else PROD_MYSQL_PASSWD
+# 业务库连接池配置: 最小/最大连接数, 获取连接超时(秒), 空闲多久后取用前检测(秒), 连接最长存活(秒), 慢查询阈值(毫秒)
+MYSQL_POOL_MIN = int(os.environ.get("MYSQL_POOL_MIN") or 2)
+MYSQL_POOL_MAX = int(os.environ.get("MYSQL_POOL_MAX") or 20)
+MYSQL_POOL_TIMEOUT = int(os.environ.get("MYSQL_POOL_TIMEOUT") or 10)
+MYSQL_POOL_PING_INTERVAL = int(os.environ.get("MYSQL_POOL_PING_INTERVAL") or 30)
+MYSQL_POOL_MAX_LIFETIME = int(os.environ.get("MYSQL_POOL_MAX_LIFETIME") or 3600)
+MYSQL_SLOW_QUERY_MS = int(os.environ.get("MYSQL_SLOW_QUERY_MS") or 500)
 # 缓存库配置
 REDIS_HOST = TEST_REDIS_HOST if APPLICATION_ENV_IS_TEST else PROD_REDIS_HOST
 REDIS_PORT = TEST_REDIS_PORT if APPLICATION_ENV_IS_TEST else PROD_REDIS_PORT
@@ -88,6 +125,71 @@ SCHEDULES_DISCLAIMER_SECONDS = 86400
 # 网站信息抓取更新定时任务，单位秒
 SCHEDULES_SPIDER = True
 SCHEDULES_SPIDER_SECONDS = 3600
+# 网页爬虫任务分片数(各分片可由不同进程并行执行)
+SCHEDULES_SPIDER_SHARDS = int(os.environ.get("SCHEDULES_SPIDER_SHARDS") or 4)
+# 文件重新向量化定时任务(间隔取SCHEDULES_RATE_SECOND)及分片数
+SCHEDULES_FILE_RELOAD = os.environ.get("SCHEDULES_FILE_RELOAD") == 'True'
+SCHEDULES_FILE_RELOAD_SHARDS = int(os.environ.get("SCHEDULES_FILE_RELOAD_SHARDS") or 4)
+# 分布式定时任务: 是否通过Redis锁协调多进程(关闭时每个进程独立执行)、调度检查间隔(秒)
+SCHEDULES_DISTRIBUTED = os.environ.get("SCHEDULES_DISTRIBUTED") != 'False'
+SCHEDULES_TICK_SECONDS = int(os.environ.get("SCHEDULES_TICK_SECONDS") or 30)
+# 分布式定时任务: 任务锁过期时间(秒, 执行期间自动续期)、运行历史保留条数
+SCHEDULES_LOCK_TTL_SECONDS = int(os.environ.get("SCHEDULES_LOCK_TTL_SECONDS") or 60)
+SCHEDULES_HISTORY_SIZE = int(os.environ.get("SCHEDULES_HISTORY_SIZE") or 100)
+# 文件向量化队列(Redis Stream): API进程内嵌消费线程数, 默认0(由独立部署的ingest_worker.py消费);
+# 仅单进程开发环境未启动ingest_worker.py时按需开启
+INGEST_EMBEDDED_CONSUMERS = int(os.environ.get("INGEST_EMBEDDED_CONSUMERS") or 0)
+# 文件向量化队列: 独立worker进程数及每个进程的消费线程数
+INGEST_WORKER_PROCESSES = int(os.environ.get("INGEST_WORKER_PROCESSES") or 2)
+INGEST_WORKER_CONCURRENCY = int(os.environ.get("INGEST_WORKER_CONCURRENCY") or 4)
+# 文件向量化队列: 最大尝试次数、未确认消息被其他消费者接管的空闲时间(毫秒)、阻塞读取时间(毫秒)
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS") or 3)
+INGEST_CLAIM_IDLE_MS = int(os.environ.get("INGEST_CLAIM_IDLE_MS") or 10 * 60 * 1000)
+INGEST_BLOCK_MS = int(os.environ.get("INGEST_BLOCK_MS") or 5000)
+# 文件向量化队列: 任务记录保留时间(秒)、消息流近似最大长度
+INGEST_JOB_SECONDS = int(os.environ.get("INGEST_JOB_SECONDS") or 7 * 86400)
+INGEST_STREAM_MAXLEN = int(os.environ.get("INGEST_STREAM_MAXLEN") or 100000)
+# 文档加载: PDF文本解析后端 pypdf / pymupdf(需安装PyMuPDF, 未安装时退化为pypdf), HTML解析后端 unstructured / lxml
+DOCUMENT_PDF_BACKEND = os.environ.get("DOCUMENT_PDF_BACKEND") or "pypdf"
+DOCUMENT_HTML_BACKEND = os.environ.get("DOCUMENT_HTML_BACKEND") or "unstructured"
+# 文档加载: PDF页数达到阈值时按页段交由进程池并行解析, 每个页段的页数, 进程池大小
+DOCUMENT_PDF_PARALLEL_PAGES = int(os.environ.get("DOCUMENT_PDF_PARALLEL_PAGES") or 64)
+DOCUMENT_PDF_BATCH_PAGES = int(os.environ.get("DOCUMENT_PDF_BATCH_PAGES") or 16)
+DOCUMENT_LOADER_PROCESSES = int(os.environ.get("DOCUMENT_LOADER_PROCESSES") or 4)
+# OCR: 是否识别扫描页(正文过少且含图片的页面, 默认关闭), 进程数(0为CPU核数), 单张图片超时时间(秒)
+OCR_ENABLED = os.environ.get("OCR_ENABLED") == 'True'
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES") or 0)
+OCR_TIMEOUT_SECONDS = int(os.environ.get("OCR_TIMEOUT_SECONDS") or 30)
+# OCR: 正文少于该字符数的页面视为扫描页, 每批并行识别的页数, PDF页面渲染分辨率(需安装PyMuPDF)
+OCR_MIN_TEXT_CHARS = int(os.environ.get("OCR_MIN_TEXT_CHARS") or 20)
+OCR_PAGE_WINDOW = int(os.environ.get("OCR_PAGE_WINDOW") or 16)
+OCR_PDF_DPI = int(os.environ.get("OCR_PDF_DPI") or 200)
+# OCR: 无图片标识的PDF页面, 图片覆盖页面面积比例不低于该值时才渲染识别(避免空白页、标题页等正文少的页面触发OCR)
+OCR_MIN_IMAGE_COVERAGE = float(os.environ.get("OCR_MIN_IMAGE_COVERAGE") or 0.5)
+# OCR: 未安装PyMuPDF(无法计算覆盖率)时, 只识别像素数(宽*高)不低于该值的PDF内嵌图片(跳过图标、logo等小图)
+OCR_MIN_IMAGE_PIXELS = int(os.environ.get("OCR_MIN_IMAGE_PIXELS") or 500 * 500)
+# OCR: 识别语言与tesseract参数, 识别结果缓存时间(秒, 按图片内容摘要缓存)
+OCR_LANG = os.environ.get("OCR_LANG") or "chi_sim+en"
+OCR_TESSERACT_CONFIG = os.environ.get("OCR_TESSERACT_CONFIG") or "--oem 3 --psm 6"
+OCR_CACHE_SECONDS = int(os.environ.get("OCR_CACHE_SECONDS") or 30 * 86400)
+# 文件上传: 单个文件大小上限(字节)、流式写入分块大小(字节)
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES") or 500 * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE") or 1024 * 1024)
+# 文件上传: 请求体(multipart表单)在文件大小上限之外允许的额外字节数, 超过时在解析表单前拒绝
+UPLOAD_BODY_OVERHEAD_BYTES = int(os.environ.get("UPLOAD_BODY_OVERHEAD_BYTES") or 1024 * 1024)
+# 增量向量化: 以分片内容摘要比对, 仅对新增分片计算向量(网页刷新、文件重新向量化)
+VECTOR_INCREMENTAL_ENABLED = os.environ.get("VECTOR_INCREMENTAL_ENABLED") != 'False'
+# 文件去重: 内容MD5与分片参数相同的已向量化文件, 在向量库内直接复制分片(不重新计算向量)
+VECTOR_DEDUP_ENABLED = os.environ.get("VECTOR_DEDUP_ENABLED") != 'False'
+# 网页爬虫: 全局并发数、单站点并发数与同站点请求最小间隔(毫秒)
+SPIDER_MAX_CONCURRENCY = int(os.environ.get("SPIDER_MAX_CONCURRENCY") or 64)
+SPIDER_PER_HOST_CONCURRENCY = int(os.environ.get("SPIDER_PER_HOST_CONCURRENCY") or 2)
+SPIDER_PER_HOST_INTERVAL_MS = int(os.environ.get("SPIDER_PER_HOST_INTERVAL_MS") or 200)
+# 网页爬虫: 请求超时(秒)、单页面最大字节数、到期网站分页读取条数、同时向量化的网页数
+SPIDER_TIMEOUT_SECONDS = int(os.environ.get("SPIDER_TIMEOUT_SECONDS") or 15)
+SPIDER_MAX_BYTES = int(os.environ.get("SPIDER_MAX_BYTES") or 10 * 1024 * 1024)
+SPIDER_PAGE_SIZE = int(os.environ.get("SPIDER_PAGE_SIZE") or 500)
+SPIDER_VECTOR_CONCURRENCY = int(os.environ.get("SPIDER_VECTOR_CONCURRENCY") or 4)
 # 爬虫文件保存路径
 SPIDER_FILE_PATH = "/data/knowledge-chatommi/namespace/{namespace_id}/{today_date}/{file_name}"
 # 分片的图标识别前后缀
@@ -127,9 +229,65 @@ QUES_OPTIMIZER_MODEL_NAME = TEST_QUES_OPTIMIZER_MODEL_NAME if APPLICATION_ENV_IS
 # 文件summary模型
 FILES_SUMMARY_MODEL = TEST_FILES_SUMMARY_MODEL if APPLICATION_ENV_IS_TEST else PROD_FILES_SUMMARY_MODEL
 FILES_SUMMARY_MODEL_NAME = TEST_FILES_SUMMARY_MODEL_NAME if APPLICATION_ENV_IS_TEST else PROD_FILES_SUMMARY_MODEL_NAME
+# 文件summary模式: map_reduce(分块并发摘要 + 树形归约) / refine(逐块串行累积)
+FILES_SUMMARY_MODE = os.environ.get("FILES_SUMMARY_MODE") or "map_reduce"
+# 文件summary分块摘要最大并发数、每秒请求数上限(0为不限流)、归约阶段单次输入的token预算
+FILES_SUMMARY_MAX_CONCURRENCY = int(os.environ.get("FILES_SUMMARY_MAX_CONCURRENCY") or 8)
+FILES_SUMMARY_RATE_LIMIT = float(os.environ.get("FILES_SUMMARY_RATE_LIMIT") or 5)
+FILES_SUMMARY_REDUCE_TOKEN_BUDGET = int(os.environ.get("FILES_SUMMARY_REDUCE_TOKEN_BUDGET") or 24000)
+# 文件summary结果缓存(Redis, 按文件哈希+问题+模型), 过期时间单位秒
+FILES_SUMMARY_CACHE_ENABLED = int(os.environ.get("FILES_SUMMARY_CACHE_ENABLED") or 1)
+FILES_SUMMARY_CACHE_SECONDS = int(os.environ.get("FILES_SUMMARY_CACHE_SECONDS") or 7 * 86400)
 # 深度思考模型
 THINKING_MODEL = TEST_THINKING_MODEL if APPLICATION_ENV_IS_TEST else PROD_THINKING_MODEL
 THINKING_MODEL_NAME = TEST_THINKING_MODEL_NAME if APPLICATION_ENV_IS_TEST else PROD_THINKING_MODEL_NAME
+# 聊天流水线投机生成: 意图识别未完成时提前发起主模型请求, 识别为非医学问题时取消(1开启/0关闭)
+CHAT_SPECULATIVE_GENERATION = int(os.environ.get("CHAT_SPECULATIVE_GENERATION") or 1)
+# 大模型HTTP客户端连接池(按服务地址+密钥进程内共享): 最大连接数、最大长连接数、空闲长连接保持时间(秒)
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS") or 200)
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE") or 50)
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY") or 60)
+# 大模型HTTP客户端连接超时、读取超时(秒)
+LLM_HTTP_CONNECT_TIMEOUT = float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT") or 5)
+LLM_HTTP_READ_TIMEOUT = float(os.environ.get("LLM_HTTP_READ_TIMEOUT") or 600)
+# 大模型HTTP客户端启用HTTP/2(需安装h2, 1开启/0关闭)
+LLM_HTTP2_ENABLED = int(os.environ.get("LLM_HTTP2_ENABLED") or 0)
+# 千帆AccessToken提前刷新时间(秒), 缓存至过期前该时间
+BAIDUBCE_TOKEN_REFRESH_MARGIN = int(os.environ.get("BAIDUBCE_TOKEN_REFRESH_MARGIN") or 3600)
+# 大模型API密钥调度: 限流(429)冷却基准时间与上限(秒, 按连续限流次数指数退避), 连续失败(5xx、超时)达到该次数后冷却
+LLM_KEY_COOLDOWN_SECONDS = float(os.environ.get("LLM_KEY_COOLDOWN_SECONDS") or 2)
+LLM_KEY_COOLDOWN_MAX_SECONDS = float(os.environ.get("LLM_KEY_COOLDOWN_MAX_SECONDS") or 60)
+LLM_KEY_FAILURE_THRESHOLD = int(os.environ.get("LLM_KEY_FAILURE_THRESHOLD") or 3)
+# 大模型API密钥每分钟token额度(按权重折算, 0为不限制), 达到额度的密钥优先让出流量
+LLM_KEY_TPM_LIMIT = int(os.environ.get("LLM_KEY_TPM_LIMIT") or 0)
+# 大模型API密钥调度集群同步(Redis, 1开启/0关闭)及同步间隔(毫秒)
+LLM_KEY_SYNC_ENABLED = int(os.environ.get("LLM_KEY_SYNC_ENABLED") or 1)
+LLM_KEY_SYNC_INTERVAL_MS = int(os.environ.get("LLM_KEY_SYNC_INTERVAL_MS") or 500)
+# 大模型服务商熔断: 连续失败达到该次数后熔断, 熔断持续时间(秒, 到期后放行一次探测请求)
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("LLM_BREAKER_FAILURE_THRESHOLD") or 5)
+LLM_BREAKER_OPEN_SECONDS = float(os.environ.get("LLM_BREAKER_OPEN_SECONDS") or 30)
+# 大模型对冲请求: 流式请求超过该时间(毫秒)未收到首个分片时, 向下一个备用服务商发起相同请求并采用先输出者(0为关闭, 可按机器人配置覆盖)
+LLM_ROUTE_HEDGE_MS = int(os.environ.get("LLM_ROUTE_HEDGE_MS") or 0)
+# 流式问答客户端断开检测轮询间隔(毫秒), 断开后取消上游模型请求
+SSE_DISCONNECT_POLL_MS = int(os.environ.get("SSE_DISCONNECT_POLL_MS") or 500)
+# 客户端中途断开时是否保存已生成的部分回答到聊天记录(1保存/0不保存)
+CHAT_SAVE_PARTIAL_ANSWER = int(os.environ.get("CHAT_SAVE_PARTIAL_ANSWER") or 0)
+# 流式响应分片合并间隔(毫秒), 该时间内的逐字分片合并为一帧输出(0为不合并)
+STREAM_COALESCE_MS = int(os.environ.get("STREAM_COALESCE_MS") or 0)
+# 流式响应分片合并字数, 合并的字数达到该值时立即输出
+STREAM_COALESCE_CHARS = int(os.environ.get("STREAM_COALESCE_CHARS") or 64)
+# 机器人配置缓存有效期(秒, 0为不缓存), 管理端修改配置(version递增)后通过Redis频道通知各进程失效
+BOT_PROFILE_CACHE_SECONDS = int(os.environ.get("BOT_PROFILE_CACHE_SECONDS") or 300)
+# 机器人配置失效通知频道, 消息格式: {"bot_id": "...", "version": 2}, bot_id为*时全部失效
+BOT_PROFILE_CHANNEL = os.environ.get("BOT_PROFILE_CHANNEL") or "bot:profile:invalidate"
+# 单个机器人配置缓存的提示词模板数量上限
+BOT_PROFILE_TEMPLATE_LIMIT = int(os.environ.get("BOT_PROFILE_TEMPLATE_LIMIT") or 32)
+# 敏感词规则版本检查间隔(秒), 规则重新加载(版本变化)后各进程在该间隔内切换到新规则
+PROHIBITED_VERSION_CHECK_SECONDS = int(os.environ.get("PROHIBITED_VERSION_CHECK_SECONDS") or 10)
+# 流式问答是否逐片过滤敏感词(1开启/0关闭)
+PROHIBITED_STREAM_ENABLED = int(os.environ.get("PROHIBITED_STREAM_ENABLED") or 0)
+# 流式过滤时为正则规则保留的跨分片回看字数(字面规则按最长敏感词自动保留)
+PROHIBITED_STREAM_LOOKBEHIND = int(os.environ.get("PROHIBITED_STREAM_LOOKBEHIND") or 16)
 
 # AES密钥和偏移量
 AES_IV = "aGFsZW9uMjAyNDA0MDAwMA=="  # 偏移量
@@ -1,9 +1,8 @@
 import uuid
 from typing import List, Dict
 from loguru import logger
-import requests
 import json
-from framework.business_code import ERROR_10901, ERROR_10902
+from framework.business_code import ERROR_10902
 from framework.business_except import BusinessException
 from custom.amway.amway_config import (
     BAIDUBCE_ACCESS_TOKEN_URL,
@@ -15,6 +14,7 @@ from custom.amway.amway_config import (
     BAIDUBCE_INIT_AIGC_URL,
     BAIDUBCE_GET_AIGC_URL,
 )
+from models.llms.llm_client_registry import get_baidubce_access_token, get_http_session
 from service.domain.ai_chat_history import ChatHistoryModel
 
 
@@ -47,23 +47,11 @@ class BaidubceClient:
 
     def get_access_token(self) -> str:
         """
-        获取AccessToken信息
+        获取AccessToken信息(进程内缓存至过期前, 不再每次构造客户端时请求)
         :return: AccessToken
         """
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
-            payload = ""
-            logger.info("###BaidubceClient get_access_token request INFO, request_id={}, url={}, body={}.", self.request_id, self.access_token_url, payload)
-            response = requests.post(url=self.access_token_url, data=payload, headers=headers)
-            logger.info("###BaidubceClient get_access_token request INFO, request_id={}, response={}.", self.request_id, response.text)
-            if "error" in response.text:
-                logger.error("###BaidubceClient get_access_token request ERROR, request_id={}, code={}, message={}.", self.request_id, ERROR_10901, response.text)
-                raise BusinessException(ERROR_10901.code, ERROR_10901.message)
-            data = eval(response.text)
-            return str(data["access_token"])
+            return get_baidubce_access_token(access_token_url=self.access_token_url, request_id=self.request_id)
         except Exception as e:
             logger.error("###BaidubceClient get_access_token request ERROR, request_id={}, err={}.", self.request_id, e)
 
@@ -92,7 +80,7 @@ class BaidubceClient:
                 "penalty_score": self.penalty_score,
             }
             logger.info("###BaidubceClient chat request INFO, request_id={}, url={}, ques={}, body={}.", self.request_id, self.chat_url, ques, body)
-            response = requests.post(url=self.chat_url, data=json.dumps(body), headers=headers)
+            response = get_http_session().post(url=self.chat_url, data=json.dumps(body), headers=headers)
             response_json = response.json()
             logger.info("###BaidubceClient chat request INFO, request_id={}, response={}.", self.request_id, response_json)
             # 千帆业务异常
@@ -129,7 +117,7 @@ class BaidubceClient:
                 "num": num,
             }
             logger.info("###BaidubceClient init_aigc request INFO, request_id={}, url={}, body={}.", self.request_id, self.init_aigc_url, body)
-            response = requests.post(url=self.init_aigc_url, data=json.dumps(body), headers=headers)
+            response = get_http_session().post(url=self.init_aigc_url, data=json.dumps(body), headers=headers)
             response_json = response.json()
             logger.info("###BaidubceClient init_aigc request INFO, request_id={}, response={}.", self.request_id, response_json)
             # 千帆业务异常
@@ -155,7 +143,7 @@ class BaidubceClient:
                 "taskId": taskId,
             }
             logger.info("###BaidubceClient get_aigc request INFO, request_id={}, url={}, body={}.", self.request_id, self.get_aigc_url, body)
-            response = requests.post(url=self.get_aigc_url, data=json.dumps(body), headers=headers)
+            response = get_http_session().post(url=self.get_aigc_url, data=json.dumps(body), headers=headers)
             response_json = response.json()
             logger.info("###BaidubceClient get_aigc request INFO, request_id={}, response={}.", self.request_id, response_json)
             # 千帆业务异常
@@ -18,6 +18,7 @@ from framework.business_except import BusinessException
 from custom.amway.prepare.service.prepare_services import NamespacePrepare, NamespacePrepareService
 from config.base_config import *
 from framework.api_model import QueryResponse
+from service.upload_service import save_upload_file
 
 
 router = APIRouter()
@@ -45,18 +46,15 @@ async def api_prepare_upload(
     response = QueryResponse()
     request_id = str(uuid.uuid4())
     try:
-        # 上传文件保存至临时目录
-        file_path = CONTENT_PATH + user_file.filename
-        content = await user_file.read()
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        # 上传文件分块流式保存至临时目录
+        uploadResult = await save_upload_file(user_file, request_id=request_id)
         # 开始获取
         namespacePrepare = NamespacePrepare(
             path=CONTENT_PATH,
             file_type=user_file.content_type,
-            file_path=file_path,
-            file_name=user_file.filename,
-            file_size=user_file.size,
+            file_path=uploadResult.file_path,
+            file_name=uploadResult.file_name,
+            file_size=uploadResult.size,
             namespace_id=namespace_id,
             encoding=encoding,
             request_id=request_id,
@@ -11,6 +11,7 @@ from custom.bespin.graphs.neo4j_request import ChatParam, ChatParamExamples
 from custom.bespin.graphs.neo4j_response import ChatResponse, ChatResponseExamples
 from framework.api_model import QueryResponse
 from framework.business_except import BusinessException
+from service.upload_service import save_upload_file
 
 
 router = APIRouter()
@@ -74,14 +75,11 @@ async def api_bsp_document_loader(
     response = QueryResponse()
     request_id = str(uuid.uuid4())
     try:
-        # 文档保存临时目录
-        filepath = CONTENT_PATH + base_file.filename
-        content = await base_file.read()
-        with open(filepath, 'wb') as f:
-            f.write(content)
+        # 文档分块流式保存临时目录
+        uploadResult = await save_upload_file(base_file, request_id=request_id)
         # 临时目录解析文档
         response.data = CusDocumentLoader(request_id=request_id).loader(
-            document_glob=base_file.filename,
+            document_glob=uploadResult.file_name,
             document_path=CONTENT_PATH
         )
     except BusinessException as business_err:
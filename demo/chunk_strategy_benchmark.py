@@ -0,0 +1,121 @@
+"""
+分片策略基准测试: 对比原有"字典字面量预先执行三种切割"的方式与按需分派/逐页流式切割的吞吐与内存峰值
+
+用法(项目根目录执行):
+    python -m demo.chunk_strategy_benchmark --pages 2000 --page-chars 3000 --rounds 3
+    python -m demo.chunk_strategy_benchmark --pdf /path/to/large.pdf
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config.base_config import (
+    CHUNK_STRATEGY_SMART,
+    CHUNK_STRATEGY_TEXT_LENGTH,
+    CHUNK_STRATEGY_TEXT_SENTENCE,
+    SEPARATORS_SENTENCE)
+from service.domain.ai_namespace_file_chunk_strategy import AiChunkStrategyDomain, ChunkStrategyModel
+
+SAMPLE_SENTENCES = [
+    "高血压是以体循环动脉压升高为主要临床表现的心血管综合征。",
+    "糖尿病患者应定期监测空腹血糖、餐后两小时血糖及糖化血红蛋白。",
+    "Aspirin inhibits cyclooxygenase and reduces thromboxane A2 synthesis.",
+    "慢性阻塞性肺疾病的主要危险因素包括吸烟、职业粉尘和空气污染。",
+    "急性心肌梗死患者应尽早行再灌注治疗，以挽救濒死心肌。",
+    "What is the recommended first-line therapy for community-acquired pneumonia?",
+]
+
+
+def build_corpus(pages: int, page_chars: int, seed: int = 7) -> list[Document]:
+    """
+    构造样例语料(按页组织, 模拟PDF加载结果)
+    """
+    rnd = random.Random(seed)
+    docs = []
+    for page in range(pages):
+        parts, length = [], 0
+        while length < page_chars:
+            sentence = rnd.choice(SAMPLE_SENTENCES)
+            parts.append(sentence)
+            length += len(sentence)
+            if rnd.random() < 0.1:
+                parts.append("\n\n")
+        docs.append(Document(page_content="".join(parts), metadata={"source": "benchmark", "page": page}))
+    return docs
+
+
+def load_pdf(path: str) -> list[Document]:
+    from langchain_community.document_loaders.pdf import PyPDFLoader
+    return PyPDFLoader(file_path=path).load()
+
+
+def legacy_case_chunk_strategy(chunk_strategy, docs, chunkStrategyModel):
+    """
+    原有实现: 字典字面量中的三次切割全部执行后再取值
+    """
+    def _split(separators=None):
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunkStrategyModel.chunk_size,
+            chunk_overlap=chunkStrategyModel.chunk_overlap,
+            separators=separators,
+            is_separator_regex=True
+        ).split_documents(docs)
+
+    switch_dict = {
+        CHUNK_STRATEGY_SMART: _split(),
+        CHUNK_STRATEGY_TEXT_LENGTH: _split(),
+        CHUNK_STRATEGY_TEXT_SENTENCE: _split(separators=SEPARATORS_SENTENCE),
+    }
+    return switch_dict.get(chunk_strategy)
+
+
+def measure(name: str, func, rounds: int, total_chars: int):
+    costs, peaks, chunks = [], [], 0
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = time.perf_counter()
+        chunks = func()
+        costs.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    best = min(costs)
+    print(f"{name:<28} chunks={chunks:<8} best={best:.3f}s  "
+          f"throughput={total_chars / best / 1024 / 1024:.2f}MB/s  peak_mem={max(peaks) / 1024 / 1024:.1f}MB")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chunk strategy benchmark")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--pdf", type=str, default=None)
+    parser.add_argument("--strategy", type=str, default=CHUNK_STRATEGY_TEXT_LENGTH)
+    args = parser.parse_args()
+
+    docs = load_pdf(args.pdf) if args.pdf else build_corpus(args.pages, args.page_chars)
+    total_chars = sum(len(d.page_content) for d in docs)
+    print(f"corpus: pages={len(docs)}, chars={total_chars}, strategy={args.strategy}")
+
+    # (id, deleted, creator, create_time, updator, update_time, version, file_id, chunk_strategy, chunk_size,
+    #  chunk_overlap, chunk_delimiter, chunk_delimiter_custom, sentence_type, window_size)
+    model = ChunkStrategyModel((0, 0, "benchmark", None, "benchmark", None, 0, "0", args.strategy, 800, 100,
+                                None, None, "0", 0))
+    domain = AiChunkStrategyDomain(request_id="benchmark")
+
+    legacy = measure("legacy (eager x3)",
+                     lambda: len(legacy_case_chunk_strategy(args.strategy, docs, model)), args.rounds, total_chars)
+    lazy = measure("registry (lazy)",
+                   lambda: len(domain.case_chunk_strategy(args.strategy, docs, model)), args.rounds, total_chars)
+    streamed = measure("registry (stream, count)",
+                       lambda: sum(1 for _ in domain.case_chunk_strategy(args.strategy, docs, model, stream=True)),
+                       args.rounds, total_chars)
+    print(f"speedup: lazy={legacy / lazy:.2f}x, stream={legacy / streamed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
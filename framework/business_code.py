@@ -70,12 +70,22 @@ ERROR_10210 = BusinessCode(10210, "未查询到知识库文件信息")
 ERROR_10211 = BusinessCode(10211, "解析Excel文件失败")
 ERROR_10212 = BusinessCode(10212, "未查询到当前分片信息")
 ERROR_10213 = BusinessCode(10213, "知识库文件的向量化状态异常，不可执行向量化操作")
+ERROR_10214 = BusinessCode(10214, "上传文件为空或文件名非法")
+ERROR_10215 = BusinessCode(10215, "上传文件大小超过限制")
 '''
 演讲稿模块
 '''
 ERROR_10300 = BusinessCode(10300, "未查询到指定业务背景知识库信息")
 ERROR_10301 = BusinessCode(10301, "未查询到指定风格背景知识库信息")
 '''
+数据库模块
+'''
+ERROR_10400 = BusinessCode(10400, "业务库连接池繁忙，获取连接超时")
+'''
+定时任务模块
+'''
+ERROR_10500 = BusinessCode(10500, "定时任务锁已失效，当前进程不再持有执行权")
+'''
 定制化模型
 '''
 ERROR_10900 = BusinessCode(10900, "请求大模型API超时")
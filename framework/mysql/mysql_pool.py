@@ -0,0 +1,438 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import pymysql
+from loguru import logger
+
+from config.base_config import (
+    MYSQL_HOST,
+    MYSQL_PORT,
+    MYSQL_DATABASE,
+    MYSQL_CHARSET,
+    MYSQL_USER,
+    MYSQL_PASSWD,
+    MYSQL_POOL_MIN,
+    MYSQL_POOL_MAX,
+    MYSQL_POOL_TIMEOUT,
+    MYSQL_POOL_PING_INTERVAL,
+    MYSQL_POOL_MAX_LIFETIME,
+    MYSQL_SLOW_QUERY_MS)
+from framework.business_code import ERROR_10400
+from framework.business_except import BusinessException
+from framework.util.async_util import run_blocking
+
+# 默认连接池名称
+POOL_DEFAULT = "default"
+# 北京时间(UTC+8)会话连接池名称
+POOL_BEIJING_TIME = "beijing_time"
+
+T = TypeVar("T")
+
+# 异步调用数据库操作的专用线程池, 线程数与连接池上限一致, 避免线程空等连接
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_lock = threading.Lock()
+
+
+class MysqlPoolStats:
+    """
+    连接池监控指标: 获取连接等待耗时、SQL执行耗时
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.queries = 0
+        self.slow_queries = 0
+        self.query_ms_total = 0.0
+        self.query_ms_max = 0.0
+
+    def record_wait(self, wait_ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def record_query(self, query_ms: float, slow: bool):
+        with self._lock:
+            self.queries += 1
+            self.query_ms_total += query_ms
+            self.query_ms_max = max(self.query_ms_max, query_ms)
+            if slow:
+                self.slow_queries += 1
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "created": self.created,
+            "discarded": self.discarded,
+            "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+            "queries": self.queries,
+            "slow_queries": self.slow_queries,
+            "query_ms_avg": round(self.query_ms_total / self.queries, 3) if self.queries else 0,
+            "query_ms_max": round(self.query_ms_max, 3),
+        }
+
+
+class TimedCursor:
+    """
+    统计执行耗时的游标代理
+    """
+
+    def __init__(self, cursor, stats: MysqlPoolStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _timed(self, func, sql, args):
+        start = time.perf_counter()
+        try:
+            return func(sql, args)
+        finally:
+            cost = (time.perf_counter() - start) * 1000
+            slow = cost >= MYSQL_SLOW_QUERY_MS
+            self._stats.record_query(cost, slow)
+            if slow:
+                logger.warning("###MysqlPool WARN, 慢查询, cost={}ms, sql={}", round(cost, 3),
+                               sql[:500] if isinstance(sql, str) else sql)
+
+    def execute(self, query, args=None):
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(self._cursor.executemany, query, args)
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+
+class PooledConnection:
+    """
+    池化连接代理
+    调用close()时归还连接池(回滚未提交事务), 而非真正关闭连接, 兼容原有的
+    "conn = get_db_conn() ... finally: conn.close()"写法。
+    """
+
+    def __init__(self, pool: "MysqlPool", raw: pymysql.connections.Connection):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    @property
+    def raw(self) -> pymysql.connections.Connection:
+        return self._raw
+
+    def cursor(self, *args, **kwargs) -> TimedCursor:
+        return TimedCursor(self._raw.cursor(*args, **kwargs), self._pool.stats)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def __getattr__(self, item):
+        return getattr(self._raw, item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MysqlPool:
+    """
+    业务库(MySQL)连接池
+    - 最小/最大连接数可配置, 超过最大值时等待归还, 超时抛出业务异常;
+    - 空闲超过检测间隔的连接取用前ping检测, 超过最长存活时间的连接重建;
+    - 支持连接初始化SQL(如设置会话时区);
+    - 统计获取连接等待耗时与SQL执行耗时。
+    """
+    _pools: Dict[str, "MysqlPool"] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(
+            self,
+            name: str = POOL_DEFAULT,
+            init_sql: Sequence[str] = (),
+            min_size: int = MYSQL_POOL_MIN,
+            max_size: int = MYSQL_POOL_MAX,
+            timeout: int = MYSQL_POOL_TIMEOUT,
+    ):
+        """
+        构造函数
+        :param name: 连接池名称
+        :param init_sql: 新建连接后执行的会话初始化SQL
+        :param min_size: 最小连接数
+        :param max_size: 最大连接数
+        :param timeout: 获取连接超时时间，单位秒
+        """
+        self.name = name
+        self.init_sql = tuple(init_sql)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.stats = MysqlPoolStats()
+        # 空闲连接: (连接, 最后归还时间), 后进先出以保持热连接
+        self._idle: "queue.LifoQueue[Tuple[pymysql.connections.Connection, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._born: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._prefilled = False
+
+    @classmethod
+    def get_pool(
+            cls,
+            name: str = POOL_DEFAULT,
+            init_sql: Sequence[str] = ()
+    ) -> "MysqlPool":
+        """
+        获取(或创建)指定名称的进程级连接池
+        :param name: 连接池名称
+        :param init_sql: 会话初始化SQL
+        :return: 连接池
+        """
+        pool = cls._pools.get(name)
+        if pool is None:
+            with cls._pools_lock:
+                pool = cls._pools.get(name)
+                if pool is None:
+                    pool = cls(name=name, init_sql=init_sql)
+                    cls._pools[name] = pool
+        return pool
+
+    @classmethod
+    def get_all_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有连接池的监控指标
+        :return: {连接池名称: 指标}
+        """
+        return {name: dict(pool.stats.snapshot(), idle=pool._idle.qsize(), max_size=pool.max_size)
+                for name, pool in cls._pools.items()}
+
+    def _create(self) -> pymysql.connections.Connection:
+        raw = pymysql.connect(
+            host=MYSQL_HOST,
+            port=int(MYSQL_PORT),
+            database=MYSQL_DATABASE,
+            charset=MYSQL_CHARSET,
+            user=MYSQL_USER,
+            passwd=MYSQL_PASSWD
+        )
+        if self.init_sql:
+            with raw.cursor() as cursor:
+                for sql in self.init_sql:
+                    cursor.execute(sql)
+        with self._lock:
+            self._born[id(raw)] = time.time()
+        self.stats.incr("created")
+        return raw
+
+    def _discard(self, raw: pymysql.connections.Connection):
+        with self._lock:
+            self._born.pop(id(raw), None)
+        self.stats.incr("discarded")
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _prefill(self):
+        with self._lock:
+            if self._prefilled:
+                return
+            self._prefilled = True
+        for _ in range(self.min_size):
+            try:
+                raw = self._create()
+                self._idle.put((raw, time.time()))
+            except Exception as err:
+                logger.error("###MysqlPool ERROR, 预建连接失败, pool={}, err={}", self.name, err)
+                break
+
+    def _is_usable(self, raw: pymysql.connections.Connection, idle_since: float) -> bool:
+        born = self._born.get(id(raw), 0)
+        if time.time() - born > MYSQL_POOL_MAX_LIFETIME:
+            return False
+        if time.time() - idle_since > MYSQL_POOL_PING_INTERVAL:
+            try:
+                # 不自动重连, 避免丢失会话初始化设置; 失效连接直接重建
+                raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def acquire(self) -> PooledConnection:
+        """
+        从连接池获取连接
+        :return: 池化连接
+        """
+        if not self._prefilled:
+            self._prefill()
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.incr("timeouts")
+            logger.error("###MysqlPool ERROR, 获取连接超时, pool={}, timeout={}s, stats={}", self.name, self.timeout,
+                         self.stats.snapshot())
+            raise BusinessException(ERROR_10400.code, ERROR_10400.message)
+        try:
+            raw = None
+            while raw is None:
+                try:
+                    candidate, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    raw = self._create()
+                    break
+                if self._is_usable(candidate, idle_since):
+                    raw = candidate
+                else:
+                    self._discard(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats.record_wait((time.perf_counter() - start) * 1000)
+        return PooledConnection(self, raw)
+
+    def release(self, raw: pymysql.connections.Connection):
+        """
+        归还连接: 回滚未提交事务(同时结束只读快照), 失败则丢弃
+        :param raw: 原始连接
+        """
+        try:
+            raw.rollback()
+            self._idle.put((raw, time.time()))
+        except Exception as err:
+            logger.warning("###MysqlPool WARN, 归还连接失败, 丢弃该连接, pool={}, err={}", self.name, err)
+            self._discard(raw)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """
+        上下文方式获取连接, 退出时自动归还
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def query_all(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[tuple]:
+        """
+        参数化查询-多条
+        :param sql: SQL语句(使用%s占位符)
+        :param params: 参数
+        :return: 结果集
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return list(cursor.fetchall())
+
+    def query_one(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[tuple]:
+        """
+        参数化查询-单条
+        :param sql: SQL语句(使用%s占位符)
+        :param params: 参数
+        :return: 单条结果
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchone()
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> Tuple[int, int]:
+        """
+        参数化执行(增删改)并提交
+        :param sql: SQL语句(使用%s占位符)
+        :param params: 参数
+        :return: (影响行数, 自增长序号)
+        """
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    rowcount = cursor.execute(sql, params)
+                    lastrowid = cursor.lastrowid
+                conn.commit()
+                return rowcount, lastrowid
+            except Exception:
+                conn.rollback()
+                raise
+
+
+def get_db_conn(
+        pool_name: str = POOL_DEFAULT,
+        init_sql: Sequence[str] = ()
+) -> PooledConnection:
+    """
+    从连接池获取数据库连接对象, 使用完毕调用close()归还
+    :param pool_name: 连接池名称
+    :param init_sql: 会话初始化SQL
+    :return: conn数据库连接对象
+    """
+    return MysqlPool.get_pool(name=pool_name, init_sql=init_sql).acquire()
+
+
+def text_params(*values: Any) -> Tuple[str, ...]:
+    """
+    按文本绑定SQL参数(与原有字符串拼接写入的数据保持一致, 空值保存为'None')
+    :param values: 参数
+    :return: 参数元组
+    """
+    return tuple(str(value) for value in values)
+
+def get_pool(
+        pool_name: str = POOL_DEFAULT,
+        init_sql: Sequence[str] = ()
+) -> MysqlPool:
+    """
+    获取连接池
+    :param pool_name: 连接池名称
+    :param init_sql: 会话初始化SQL
+    :return: 连接池
+    """
+    return MysqlPool.get_pool(name=pool_name, init_sql=init_sql)
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    获取数据库操作专用线程池
+    :return: 线程池
+    """
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(max_workers=MYSQL_POOL_MAX, thread_name_prefix="mysql-pool")
+    return _db_executor
+
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在数据库专用线程池中执行同步的数据库操作(异步接口使用, 不阻塞事件循环)
+    :param func: 数据库操作函数
+    :param args: 位置参数
+    :param kwargs: 关键字参数
+    :return: 函数返回值
+    """
+    return await run_blocking(func, *args, executor=get_db_executor(), **kwargs)
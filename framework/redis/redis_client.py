@@ -71,6 +71,11 @@ class RedisClient:
                         decode_responses=decode_responses,
                         max_connections=max_connections,
                     )
+                # 二进制数据(如向量)专用连接池, 返回结果不做字符串解码
+                self.binary_pool = redis.ConnectionPool(
+                    **dict(self.pool.connection_kwargs, decode_responses=False),
+                    max_connections=int(max_connections),
+                )
                 logger.info("###Redis_Client INFO, 连接池初始化成功, Pool={}.", self.pool)
             except Exception as err:
                 logger.error("###Redis_Client __init__ error, 初始化获取Redis连接池失败, err={}", err)
@@ -90,6 +95,13 @@ class RedisClient:
             logger.error("###Redis_Client _get_conn error, 获取Redis实例失败, err={}", err)
             raise err
 
+    def _get_binary_conn(self) -> redis.Redis:
+        """
+        从二进制连接池中获取一个实例
+        :return: redis实例
+        """
+        return redis.StrictRedis(connection_pool=self.binary_pool)
+
     def del_key(self, key: str):
         """
         删除指定键的数据
@@ -198,6 +210,208 @@ class RedisClient:
     def expire(self, key: str, time: int):
         return self._get_conn().expire(key, time)
 
+    def get_bytes_list(self, keys: list[str]) -> list:
+        """
+        批量读取-二进制
+        :param keys: 键列表
+        :return: 值列表(与键一一对应, 不存在为None)
+        """
+        if not keys:
+            return []
+        return self._get_binary_conn().mget(keys)
+
+    def set_bytes_list_time(self, mapping: dict, time: int):
+        """
+        批量添加-二进制并设置过期时间
+        :param mapping: 键值字典
+        :param time: 过期时间，单位秒
+        :return: None
+        """
+        if not mapping:
+            return
+        pipe = self._get_binary_conn().pipeline(transaction=False)
+        for key, val in mapping.items():
+            pipe.set(name=key, value=val, ex=time)
+        pipe.execute()
+
+    def eval_script(self, script: str, keys: list[str] = None, args: list = None):
+        """
+        执行Lua脚本(原子操作)
+        :param script: 脚本内容
+        :param keys: 键列表
+        :param args: 参数列表
+        :return: 脚本返回值
+        """
+        keys = keys or []
+        return self._get_conn().eval(script, len(keys), *keys, *(args or []))
+
+    def push_list_l_limit(self, key: str, value: Any, limit: int):
+        """
+        列表 - 从左侧进并只保留最新的limit个元素
+        :param key: 键
+        :param value: 值
+        :param limit: 保留个数
+        :return: None
+        """
+        pipe = self._get_conn().pipeline(transaction=False)
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, limit - 1)
+        pipe.execute()
+
+    def get_list_range(self, key: str, start: int, end: int):
+        """
+        列表 - 获取指定区间的值
+        :param key: 键
+        :param start: 开始下标
+        :param end: 结束下标(包含)
+        :return: 值
+        """
+        return self._get_conn().lrange(key, start, end)
+
+    def set_hash_nx(self, pkey: str, key: str, v: Any) -> bool:
+        """
+        哈希表 - 字段不存在时写入
+        :param pkey: 哈希表键
+        :param key: 字段
+        :param v: 值
+        :return: 是否写入
+        """
+        return bool(self._get_conn().hsetnx(pkey, key, v))
+
+    def set_hash_time(self, pkey: str, mapping: dict, time: int):
+        """
+        哈希表 - 批量写入字段并设置过期时间
+        :param pkey: 哈希表键
+        :param mapping: 字段与值
+        :param time: 过期时间，单位秒
+        :return: None
+        """
+        pipe = self._get_conn().pipeline(transaction=False)
+        pipe.hmset(pkey, {k: "" if v is None else v for k, v in mapping.items()})
+        pipe.expire(pkey, time)
+        pipe.execute()
+
+    @staticmethod
+    def _parse_stream_entries(entries) -> list[tuple[str, dict]]:
+        result = []
+        for entry in entries or []:
+            # XCLAIM对已删除的消息返回空值
+            if not entry or entry[1] is None:
+                continue
+            fields = entry[1]
+            result.append((entry[0], dict(zip(fields[::2], fields[1::2]))))
+        return result
+
+    def stream_add(self, key: str, fields: dict, maxlen: int = None) -> str:
+        """
+        消息流 - 追加消息(当前客户端版本无原生Stream接口, 以原始命令实现, 需Redis 5.0+)
+        :param key: 消息流键
+        :param fields: 消息内容
+        :param maxlen: 近似最大长度
+        :return: 消息ID
+        """
+        args = ["XADD", key]
+        if maxlen:
+            args.extend(["MAXLEN", "~", maxlen])
+        args.append("*")
+        for field, value in fields.items():
+            args.extend([field, "" if value is None else value])
+        return self._get_conn().execute_command(*args)
+
+    def stream_create_group(self, key: str, group: str, start_id: str = "0"):
+        """
+        消息流 - 创建消费组(已存在时忽略)
+        :param key: 消息流键
+        :param group: 消费组
+        :param start_id: 起始消息ID
+        :return: None
+        """
+        try:
+            self._get_conn().execute_command("XGROUP", "CREATE", key, group, start_id, "MKSTREAM")
+        except redis.ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise err
+
+    def stream_read_group(self, key: str, group: str, consumer: str, count: int = 1,
+                          block_ms: int = 5000) -> list[tuple[str, dict]]:
+        """
+        消息流 - 以消费组读取新消息
+        :param key: 消息流键
+        :param group: 消费组
+        :param consumer: 消费者
+        :param count: 最大条数
+        :param block_ms: 无消息时阻塞等待时间(毫秒)
+        :return: [(消息ID, 消息内容)]
+        """
+        reply = self._get_conn().execute_command("XREADGROUP", "GROUP", group, consumer, "COUNT", count,
+                                                 "BLOCK", block_ms, "STREAMS", key, ">")
+        return self._parse_stream_entries(reply[0][1]) if reply else []
+
+    def stream_ack(self, key: str, group: str, *ids: str) -> int:
+        """
+        消息流 - 确认消息
+        :param key: 消息流键
+        :param group: 消费组
+        :param ids: 消息ID
+        :return: 确认条数
+        """
+        return self._get_conn().execute_command("XACK", key, group, *ids) if ids else 0
+
+    def stream_pending(self, key: str, group: str, count: int = 100) -> list[tuple[str, str, int, int]]:
+        """
+        消息流 - 查询已投递未确认的消息
+        :param key: 消息流键
+        :param group: 消费组
+        :param count: 最大条数
+        :return: [(消息ID, 消费者, 空闲毫秒数, 投递次数)]
+        """
+        reply = self._get_conn().execute_command("XPENDING", key, group, "-", "+", count)
+        return [(item[0], item[1], int(item[2]), int(item[3])) for item in reply or []]
+
+    def stream_claim(self, key: str, group: str, consumer: str, min_idle_ms: int,
+                     ids: list[str]) -> list[tuple[str, dict]]:
+        """
+        消息流 - 接管空闲超时的未确认消息
+        :param key: 消息流键
+        :param group: 消费组
+        :param consumer: 消费者
+        :param min_idle_ms: 最小空闲毫秒数
+        :param ids: 消息ID
+        :return: [(消息ID, 消息内容)]
+        """
+        if not ids:
+            return []
+        reply = self._get_conn().execute_command("XCLAIM", key, group, consumer, min_idle_ms, *ids)
+        return self._parse_stream_entries(reply)
+
+    def stream_len(self, key: str) -> int:
+        """
+        消息流 - 长度
+        :param key: 消息流键
+        :return: 消息条数
+        """
+        return int(self._get_conn().execute_command("XLEN", key) or 0)
+
+    def publish(self, channel: str, message: str) -> int:
+        """
+        发布订阅 - 发布消息
+        :param channel: 频道
+        :param message: 消息
+        :return: 收到消息的订阅者数量
+        """
+        return int(self._get_conn().publish(channel, message) or 0)
+
+    def subscribe(self, *channels: str):
+        """
+        发布订阅 - 订阅频道(占用一个独立连接, 由调用方在专用线程中读取)
+        :param channels: 频道
+        :return: 订阅对象, 通过listen()/get_message()读取消息, 用完后close()
+        """
+        pubsub = self._get_conn().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(*channels)
+        return pubsub
+
+
 # if __name__ == "__main__":
 #     _client = RedisClient(
 #         host=REDIS_HOST,
@@ -0,0 +1,162 @@
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, Optional
+
+from loguru import logger
+
+from framework.redis.redis_client import RedisClient
+
+# 加锁成功时递增并返回栅栏令牌(fencing token), 失败返回0
+_ACQUIRE_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return redis.call('incr', KEYS[2])
+end
+return 0
+"""
+# 仍为锁持有者时续期
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# 仍为锁持有者时释放
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+# 令牌仍为最新时写入哈希表, 过期的持有者(如长时间停顿后)写入会被拒绝
+_FENCED_HSET_SCRIPT = """
+if tonumber(redis.call('get', KEYS[1]) or '0') ~= tonumber(ARGV[1]) then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('hset', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+
+def default_owner() -> str:
+    """
+    当前进程的锁持有者标识
+    :return: 主机名:进程号:随机串
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class RedisLock:
+    """
+    Redis分布式锁
+    加锁成功时分配单调递增的栅栏令牌, 持有期间由后台线程自动续期;
+    续期失败(锁已过期或被他人持有)时标记为失效, 调用方据此停止后续写操作。
+    """
+
+    def __init__(
+            self,
+            name: str,
+            ttl_seconds: int,
+            owner: str = None,
+    ):
+        """
+        构造函数
+        :param name: 锁名称
+        :param ttl_seconds: 锁过期时间(秒)
+        :param owner: 持有者标识(为空时按进程生成)
+        """
+        self.key = f"lock:{name}"
+        self.fence_key = f"lock:{name}:fence"
+        self.ttl_ms = max(1, int(ttl_seconds)) * 1000
+        self.owner = owner or default_owner()
+        self.token = 0
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+
+    def acquire(self) -> bool:
+        """
+        尝试加锁(不阻塞)
+        :return: 是否加锁成功
+        """
+        self.token = int(RedisClient().eval_script(_ACQUIRE_SCRIPT, keys=[self.key, self.fence_key],
+                                                   args=[self.owner, self.ttl_ms]) or 0)
+        if self.token:
+            self.lost.clear()
+        return bool(self.token)
+
+    def renew(self) -> bool:
+        """
+        续期
+        :return: 是否仍持有锁
+        """
+        return bool(RedisClient().eval_script(_RENEW_SCRIPT, keys=[self.key], args=[self.owner, self.ttl_ms]))
+
+    def release(self):
+        """
+        停止续期并释放锁
+        """
+        self._stop.set()
+        if self._renewer is not None:
+            self._renewer.join(timeout=1)
+        if not self.token:
+            return
+        try:
+            RedisClient().eval_script(_RELEASE_SCRIPT, keys=[self.key], args=[self.owner])
+        except Exception as err:
+            logger.error("###RedisLock ERROR, 释放锁失败, key={}, owner={}, err={}.", self.key, self.owner, err)
+
+    def is_valid(self) -> bool:
+        """
+        当前是否仍持有锁
+        :return: 识别结果
+        """
+        return bool(self.token) and not self.lost.is_set()
+
+    def start_renewal(self):
+        """
+        启动后台续期线程(每1/3过期时间续期一次)
+        """
+        if self._renewer is not None:
+            return
+        self._stop.clear()
+        self._renewer = threading.Thread(target=self._renew_loop, name=f"lock-renew-{self.key}", daemon=True)
+        self._renewer.start()
+
+    def _renew_loop(self):
+        interval = self.ttl_ms / 3000
+        while not self._stop.wait(interval):
+            try:
+                if not self.renew():
+                    self.lost.set()
+                    logger.error("###RedisLock ERROR, 锁续期失败(已过期或被其他进程持有), key={}, owner={}, "
+                                 "token={}.", self.key, self.owner, self.token)
+                    return
+            except Exception as err:
+                # 网络抖动时继续尝试, 直到锁真正过期
+                logger.warning("###RedisLock WARN, 锁续期异常, key={}, err={}.", self.key, err)
+
+    def fenced_set_hash(
+            self,
+            key: str,
+            mapping: Dict[str, str],
+    ) -> bool:
+        """
+        以栅栏令牌校验后写入哈希表
+        :param key: 哈希表键
+        :param mapping: 字段与值
+        :return: 是否写入(令牌已过期时拒绝)
+        """
+        args = [self.token]
+        for field, value in mapping.items():
+            args.extend([field, "" if value is None else str(value)])
+        return bool(RedisClient().eval_script(_FENCED_HSET_SCRIPT, keys=[self.fence_key, key], args=args))
+
+    def __enter__(self) -> "RedisLock":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,321 @@
+import inspect
+import json
+import random
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from loguru import logger
+
+from config.base_config import (
+    SCHEDULES_DISTRIBUTED,
+    SCHEDULES_TICK_SECONDS,
+    SCHEDULES_LOCK_TTL_SECONDS,
+    SCHEDULES_HISTORY_SIZE)
+from framework.business_code import ERROR_10500
+from framework.business_except import BusinessException
+from framework.redis.redis_client import RedisClient
+from framework.redis.redis_lock import RedisLock, default_owner
+
+# 错过执行周期的处理策略: 合并为一次执行 / 逐个补执行(有上限) / 超过宽限时间则跳过本周期
+MISFIRE_COALESCE = "coalesce"
+MISFIRE_CATCH_UP = "catch_up"
+MISFIRE_SKIP = "skip"
+# 运行状态
+JOB_STATUS_SUCCESS = "success"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_SKIPPED = "skipped"
+JOB_STATUS_LOST = "lost"
+
+
+class JobContext:
+    """
+    任务执行上下文: 执行周期、分片信息与栅栏令牌
+    长任务应在每个工作单元前调用check()/is_valid(), 锁失效后立即停止写操作。
+    """
+
+    def __init__(
+            self,
+            job_id: str,
+            slot: int,
+            shard_index: int = 0,
+            shard_count: int = 1,
+            lock: RedisLock = None,
+    ):
+        """
+        构造函数
+        :param job_id: 任务标识
+        :param slot: 执行周期序号(时间戳整除执行间隔)
+        :param shard_index: 分片序号
+        :param shard_count: 分片总数
+        :param lock: 任务锁(单进程模式为空)
+        """
+        self.job_id = job_id
+        self.slot = slot
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.lock = lock
+
+    @property
+    def token(self) -> int:
+        return self.lock.token if self.lock else 0
+
+    def is_valid(self) -> bool:
+        """
+        当前进程是否仍持有执行权
+        :return: 识别结果
+        """
+        return self.lock is None or self.lock.is_valid()
+
+    def check(self):
+        """
+        校验执行权, 已失效时抛出异常
+        """
+        if not self.is_valid():
+            logger.error("###JobScheduler ERROR, [{}]任务锁已失效, job_id={}, shard={}, token={}.", ERROR_10500,
+                         self.job_id, self.shard_index, self.token)
+            raise BusinessException(ERROR_10500.code, ERROR_10500.message)
+
+
+class ScheduledJob:
+    """
+    定时任务定义
+    """
+
+    def __init__(
+            self,
+            func: Callable[..., Any],
+            job_id: str,
+            seconds: int,
+            shards: int = 1,
+            misfire_policy: str = MISFIRE_COALESCE,
+            grace_seconds: int = None,
+            max_catch_up: int = 3,
+            lock_ttl_seconds: int = SCHEDULES_LOCK_TTL_SECONDS,
+    ):
+        """
+        构造函数
+        :param func: 任务函数, 声明context参数时传入JobContext
+        :param job_id: 任务标识(集群内唯一)
+        :param seconds: 执行间隔(秒)
+        :param shards: 分片数
+        :param misfire_policy: 错过执行周期的处理策略
+        :param grace_seconds: 跳过策略的宽限时间(秒), 为空时取调度检查间隔的2倍
+        :param max_catch_up: 补执行策略的最大补执行周期数
+        :param lock_ttl_seconds: 任务锁过期时间(秒)
+        """
+        self.func = func
+        self.job_id = job_id
+        self.seconds = max(1, int(seconds))
+        self.shards = max(1, int(shards))
+        self.misfire_policy = misfire_policy
+        self.grace_seconds = grace_seconds
+        self.max_catch_up = max(1, max_catch_up)
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.accept_context = "context" in inspect.signature(func).parameters
+
+
+class DistributedScheduler:
+    """
+    分布式定时调度
+    每个进程仍以APScheduler定期检查, 但任务按"执行周期(时间戳整除执行间隔)+分片"在Redis中加锁并记录执行进度,
+    同一周期的同一分片在整个集群内只执行一次; 分片由各进程抢占执行, 执行能力随集群规模扩展而非重复执行。
+    """
+
+    def __init__(
+            self,
+            namespace: str = "schedule",
+            tick_seconds: int = SCHEDULES_TICK_SECONDS,
+            distributed: bool = SCHEDULES_DISTRIBUTED,
+            history_size: int = SCHEDULES_HISTORY_SIZE,
+    ):
+        """
+        构造函数
+        :param namespace: Redis键前缀
+        :param tick_seconds: 调度检查间隔(秒)
+        :param distributed: 是否通过Redis协调(关闭时退化为单进程定时任务)
+        :param history_size: 每个任务保留的运行历史条数
+        """
+        self.namespace = namespace
+        self.tick_seconds = max(1, tick_seconds)
+        self.distributed = distributed
+        self.history_size = history_size
+        self.owner = default_owner()
+        self.scheduler = BackgroundScheduler()
+        self.jobs: Dict[str, ScheduledJob] = {}
+
+    def add_job(
+            self,
+            func: Callable[..., Any],
+            job_id: str,
+            seconds: int,
+            **kwargs: Any,
+    ) -> ScheduledJob:
+        """
+        注册定时任务
+        :param func: 任务函数
+        :param job_id: 任务标识
+        :param seconds: 执行间隔(秒)
+        :param kwargs: ScheduledJob其他参数(shards、misfire_policy等)
+        :return: 任务定义
+        """
+        job = ScheduledJob(func=func, job_id=job_id, seconds=seconds, **kwargs)
+        self.jobs[job_id] = job
+        # 分布式模式下检查间隔小于执行间隔, 由执行周期控制实际执行次数
+        interval = min(job.seconds, self.tick_seconds) if self.distributed else job.seconds
+        self.scheduler.add_job(self._tick, "interval", seconds=interval, args=[job], id=job_id,
+                               max_instances=1, coalesce=True)
+        logger.info("###JobScheduler INFO, 注册定时任务, job_id={}, seconds={}, shards={}, policy={}, "
+                    "distributed={}.", job_id, job.seconds, job.shards, job.misfire_policy, self.distributed)
+        return job
+
+    def start(self):
+        self.scheduler.start()
+
+    def shutdown(self, wait: bool = True):
+        self.scheduler.shutdown(wait=wait)
+
+    def _state_key(self, job_id: str, shard_index: int) -> str:
+        return f"{self.namespace}:{job_id}:{shard_index}:state"
+
+    def _history_key(self, job_id: str) -> str:
+        return f"{self.namespace}:{job_id}:history"
+
+    def _tick(self, job: ScheduledJob):
+        current_slot = int(time.time() // job.seconds)
+        if not self.distributed:
+            for shard_index in range(job.shards):
+                self._execute(job, JobContext(job.job_id, current_slot, shard_index, job.shards))
+            return
+        # 各进程从随机分片开始抢占, 减少锁竞争; 执行完一个分片后继续检查剩余分片(工作窃取)
+        offset = random.randrange(job.shards)
+        for i in range(job.shards):
+            try:
+                self._run_shard(job, (offset + i) % job.shards, current_slot)
+            except Exception as err:
+                logger.error("###JobScheduler ERROR, 任务调度异常, job_id={}, err={}.", job.job_id, err)
+
+    def _last_slot(self, job: ScheduledJob, shard_index: int) -> int:
+        state = RedisClient().get_hash(self._state_key(job.job_id, shard_index)) or {}
+        return int(state.get("slot") or -1)
+
+    def _plan_slots(self, job: ScheduledJob, last_slot: int, current_slot: int) -> List[int]:
+        """
+        按错过执行周期的处理策略计算本次需要执行的周期
+        """
+        if job.misfire_policy == MISFIRE_SKIP:
+            grace = job.grace_seconds if job.grace_seconds is not None else self.tick_seconds * 2
+            if time.time() - current_slot * job.seconds > grace:
+                return []
+        if job.misfire_policy == MISFIRE_CATCH_UP and last_slot >= 0:
+            return list(range(max(last_slot + 1, current_slot - job.max_catch_up + 1), current_slot + 1))
+        return [current_slot]
+
+    def _run_shard(self, job: ScheduledJob, shard_index: int, current_slot: int):
+        if self._last_slot(job, shard_index) >= current_slot:
+            return
+        lock = RedisLock(name=f"{self.namespace}:{job.job_id}:{shard_index}", ttl_seconds=job.lock_ttl_seconds,
+                         owner=self.owner)
+        if not lock.acquire():
+            return
+        try:
+            # 加锁后再次确认, 避免其他进程刚执行完同一周期
+            last_slot = self._last_slot(job, shard_index)
+            if last_slot >= current_slot:
+                return
+            missed = current_slot - last_slot - 1 if last_slot >= 0 else 0
+            slots = self._plan_slots(job, last_slot, current_slot)
+            if not slots:
+                self._record(job, lock, shard_index, current_slot, JOB_STATUS_SKIPPED, time.time(), missed=missed)
+                return
+            lock.start_renewal()
+            for slot in slots:
+                context = JobContext(job.job_id, slot, shard_index, job.shards, lock)
+                start = time.time()
+                status, error = self._execute(job, context)
+                if not lock.is_valid():
+                    status = JOB_STATUS_LOST
+                self._record(job, lock, shard_index, slot, status, start, missed=missed, error=error)
+                if status == JOB_STATUS_LOST:
+                    return
+        finally:
+            lock.release()
+
+    def _execute(self, job: ScheduledJob, context: JobContext) -> tuple[str, Optional[str]]:
+        try:
+            if job.accept_context:
+                job.func(context=context)
+            else:
+                job.func()
+            return JOB_STATUS_SUCCESS, None
+        except Exception as err:
+            logger.error("###JobScheduler ERROR, 任务执行失败, job_id={}, shard={}, slot={}, err={}.", job.job_id,
+                         context.shard_index, context.slot, err)
+            traceback.print_exc()
+            return JOB_STATUS_FAILED, repr(err)
+
+    def _record(
+            self,
+            job: ScheduledJob,
+            lock: RedisLock,
+            shard_index: int,
+            slot: int,
+            status: str,
+            start: float,
+            missed: int = 0,
+            error: str = None,
+    ):
+        """
+        记录执行进度(栅栏令牌校验)与运行历史
+        """
+        end = time.time()
+        record = {
+            "job_id": job.job_id,
+            "shard": shard_index,
+            "shards": job.shards,
+            "slot": slot,
+            "status": status,
+            "owner": lock.owner,
+            "token": lock.token,
+            "start_time": f"{datetime.fromtimestamp(start):%Y-%m-%d %H:%M:%S}",
+            "cost": round(end - start, 3),
+            "missed": missed,
+            "error": error,
+        }
+        try:
+            # 失去执行权的进程不能覆盖新持有者的执行进度
+            if status != JOB_STATUS_LOST and not lock.fenced_set_hash(self._state_key(job.job_id, shard_index), {
+                "slot": slot, "status": status, "owner": lock.owner, "token": lock.token,
+                "start_time": record["start_time"], "cost": record["cost"],
+            }):
+                record["status"] = JOB_STATUS_LOST
+            RedisClient().push_list_l_limit(self._history_key(job.job_id), json.dumps(record, ensure_ascii=False),
+                                            self.history_size)
+        except Exception as err:
+            logger.error("###JobScheduler ERROR, 记录运行历史失败, job_id={}, err={}.", job.job_id, err)
+        logger.info("###JobScheduler INFO, 任务执行结束, record={}.", record)
+
+    def get_job_status(
+            self,
+            job_id: str,
+            limit: int = 20,
+    ) -> Dict[str, Any]:
+        """
+        查询任务各分片执行进度与最近运行历史
+        :param job_id: 任务标识
+        :param limit: 历史条数
+        :return: 任务状态
+        """
+        job = self.jobs.get(job_id)
+        shards = job.shards if job else 1
+        redis_client = RedisClient()
+        return {
+            "job_id": job_id,
+            "seconds": job.seconds if job else None,
+            "misfire_policy": job.misfire_policy if job else None,
+            "shards": [redis_client.get_hash(self._state_key(job_id, i)) or {} for i in range(shards)],
+            "history": [json.loads(item) for item in redis_client.get_list_range(self._history_key(job_id), 0,
+                                                                                  max(0, limit - 1))],
+        }
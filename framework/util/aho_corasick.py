@@ -0,0 +1,91 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    多模式字符串匹配自动机(Aho-Corasick)
+    构建后一次扫描文本即可找出全部模式串, 耗时与模式串数量无关
+    """
+
+    def __init__(
+            self,
+            words: Iterable[str],
+    ):
+        """
+        构造函数
+        :param words: 模式串列表
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 节点 -> 以该节点结尾的全部模式串长度(含失配链上的输出)
+        self._lengths: List[Tuple[int, ...]] = [()]
+        self.max_length = 0
+        self.size = 0
+        for word in words:
+            self._add(word)
+        self._build()
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def _add(self, word: str):
+        if not word:
+            return
+        node = 0
+        for ch in word:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._lengths.append(())
+            node = child
+        if len(word) not in self._lengths[node]:
+            self._lengths[node] = self._lengths[node] + (len(word),)
+            self.size += 1
+        self.max_length = max(self.max_length, len(word))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._lengths[child] = self._lengths[child] + self._lengths[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        查找全部匹配(可重叠)
+        :param text: 文本
+        :return: (开始下标, 结束下标)
+        """
+        goto, fail, lengths = self._goto, self._fail, self._lengths
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length in lengths[node]:
+                yield i + 1 - length, i + 1
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """
+        查找不重叠的匹配(最左最长优先)
+        :param text: 文本
+        :return: 按位置排序的(开始下标, 结束下标)列表
+        """
+        if not self.size or not text:
+            return []
+        result = []
+        end = 0
+        for start, stop in sorted(self.iter_matches(text), key=lambda m: (m[0], -m[1])):
+            if start >= end:
+                result.append((start, stop))
+                end = stop
+        return result
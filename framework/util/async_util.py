@@ -0,0 +1,81 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+async def run_blocking(
+        func: Callable[..., T],
+        *args: Any,
+        executor: Optional[Executor] = None,
+        **kwargs: Any
+) -> T:
+    """
+    在线程池中执行同步阻塞调用, 避免阻塞事件循环
+    仅作为没有原生异步实现时的兜底方式。
+    :param func: 同步函数
+    :param args: 位置参数
+    :param executor: 线程池, 为空时使用事件循环默认线程池
+    :param kwargs: 关键字参数
+    :return: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+# 线程迭代结束标记
+_ITER_END = object()
+
+
+async def iterate_in_thread(
+        iterator: Iterator[T],
+        name: str = "iterate-in-thread",
+) -> AsyncIterator[T]:
+    """
+    在独立线程中消费同步迭代器(如同步流式问答), 逐项转为异步迭代, 避免阻塞事件循环
+    调用方提前结束或被取消时, 线程在产出下一项后关闭同步迭代器(生成器收到GeneratorExit, 上游流式请求随之关闭)。
+    :param iterator: 同步迭代器
+    :param name: 线程名称
+    :return: 异步迭代器
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item, err=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, err))
+        except RuntimeError:
+            # 事件循环已关闭
+            stop.set()
+
+    def pump():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                put(item)
+        except BaseException as err:
+            put(_ITER_END, err)
+        finally:
+            try:
+                close = getattr(iterator, "close", None)
+                if close:
+                    close()
+            finally:
+                put(_ITER_END)
+
+    threading.Thread(target=pump, name=name, daemon=True).start()
+    try:
+        while True:
+            item, err = await queue.get()
+            if item is _ITER_END:
+                if err is not None:
+                    raise err
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,109 @@
+import inspect
+import json
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.params import File
+from fastapi.routing import APIRoute
+from loguru import logger
+
+from framework.business_code import ERROR_10215
+
+
+def upload_route_paths(routes: Iterable) -> frozenset:
+    """
+    查询接收上传文件的接口路径(参数类型为UploadFile或默认值为File(...))
+    :param routes: 应用路由列表
+    :return: 请求路径集合
+    """
+    paths = set()
+    for route in routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for param in inspect.signature(route.endpoint).parameters.values():
+            if param.annotation is UploadFile or isinstance(param.default, File):
+                paths.add(route.path)
+                break
+    return frozenset(paths)
+
+
+class BodySizeLimitMiddleware:
+    """
+    请求体大小限制中间件(ASGI)
+    在框架解析表单、落盘临时文件之前生效: Content-Length超过上限时直接返回413, 不读取请求体;
+    未声明长度(分块传输)时边接收边累计, 超过上限立即中止接收;
+    未指定生效路径时, 首次请求按应用路由中接收上传文件的接口生成
+    """
+
+    def __init__(
+            self,
+            app,
+            max_bytes: int,
+            paths: Optional[Iterable[str]] = None,
+    ):
+        """
+        构造函数
+        :param app: ASGI应用
+        :param max_bytes: 请求体大小上限(字节)
+        :param paths: 生效的请求路径(为空时取接收上传文件的接口)
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(paths) if paths is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if self.paths is None and "app" in scope:
+            self.paths = upload_route_paths(scope["app"].routes)
+            logger.info("###BodySizeLimit INFO, 上传接口路径={}.", sorted(self.paths))
+        if scope["type"] != "http" or scope["path"] not in (self.paths or ()):
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope.get("headers") or []).get(b"content-length")
+        try:
+            declared = int(content_length) if content_length is not None else None
+        except ValueError:
+            declared = None
+        if declared is not None and declared > self.max_bytes:
+            logger.error("###BodySizeLimit ERROR, [{}]请求体大小超过限制, path={}, content_length={}, max_bytes={}.",
+                         ERROR_10215, scope["path"], declared, self.max_bytes)
+            await self._reject(send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    logger.error("###BodySizeLimit ERROR, [{}]请求体大小超过限制, path={}, max_bytes={}.",
+                                 ERROR_10215, scope["path"], self.max_bytes)
+                    raise HTTPException(status_code=413, detail=ERROR_10215.message)
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as err:
+            if started or err.status_code != 413:
+                raise
+            await self._reject(send)
+
+    @staticmethod
+    async def _reject(send):
+        body = json.dumps({"status": ERROR_10215.code, "message": ERROR_10215.message, "data": None},
+                          ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,35 @@
+import hashlib
+
+# 文件分块读取大小
+_FILE_BLOCK_SIZE = 1024 * 1024
+
+
+def text_sha256(text: str) -> str:
+    """
+    计算文本SHA-256
+    :param text: 文本内容
+    :return: 十六进制摘要
+    """
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def bytes_sha256(data: bytes) -> str:
+    """
+    计算二进制内容SHA-256
+    :param data: 二进制内容
+    :return: 十六进制摘要
+    """
+    return hashlib.sha256(data or b"").hexdigest()
+
+
+def file_md5(file_path: str) -> str:
+    """
+    分块计算文件内容MD5(与知识库文件表md5字段口径一致)
+    :param file_path: 文件路径
+    :return: 十六进制摘要
+    """
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_FILE_BLOCK_SIZE), b""):
+            md5.update(block)
+    return md5.hexdigest()
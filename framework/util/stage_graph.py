@@ -0,0 +1,212 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence
+
+from loguru import logger
+
+# 预取队列结束标记
+_STREAM_END = object()
+
+
+class Stage:
+    """
+    流水线阶段: 名称、依赖阶段与执行函数
+    """
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[..., Awaitable[Any]],
+            deps: Sequence[str] = (),
+    ):
+        """
+        构造函数
+        :param name: 阶段名称
+        :param func: 异步执行函数, 以依赖阶段名称为关键字参数接收依赖结果
+        :param deps: 依赖的阶段名称
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.task: Optional[asyncio.Task] = None
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+
+
+class StageGraph:
+    """
+    依赖图执行器
+    各阶段在其依赖全部完成后立即并发执行, 整体耗时由最长依赖链决定, 而非各阶段耗时之和;
+    记录每个阶段的开始时间与耗时, 便于定位首字延迟的瓶颈。
+    """
+
+    def __init__(
+            self,
+            name: str = "pipeline",
+            request_id: str = None,
+    ):
+        """
+        构造函数
+        :param name: 流水线名称(日志使用)
+        :param request_id: 请求唯一标识(日志使用)
+        """
+        self.name = name
+        self.request_id = request_id
+        self._stages: Dict[str, Stage] = {}
+        self._origin = time.perf_counter()
+
+    def add(
+            self,
+            name: str,
+            func: Callable[..., Awaitable[Any]],
+            deps: Sequence[str] = (),
+    ) -> "StageGraph":
+        """
+        注册阶段, 依赖阶段必须先注册(保证无环)
+        :param name: 阶段名称
+        :param func: 异步执行函数
+        :param deps: 依赖的阶段名称
+        :return: 当前执行器
+        """
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        unknown = [dep for dep in deps if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {unknown}")
+        self._stages[name] = Stage(name=name, func=func, deps=deps)
+        return self
+
+    async def _run_stage(self, stage: Stage) -> Any:
+        kwargs = {}
+        for dep in stage.deps:
+            kwargs[dep] = await self._stages[dep].task
+        stage.start_time = time.perf_counter()
+        try:
+            return await stage.func(**kwargs)
+        finally:
+            stage.end_time = time.perf_counter()
+
+    def start(self) -> "StageGraph":
+        """
+        启动所有阶段(按依赖关系自动等待)
+        :return: 当前执行器
+        """
+        for stage in self._stages.values():
+            if stage.task is None:
+                stage.task = asyncio.ensure_future(self._run_stage(stage))
+        return self
+
+    async def get(self, name: str) -> Any:
+        """
+        等待并获取阶段结果, 阶段异常会在此抛出
+        :param name: 阶段名称
+        :return: 阶段结果
+        """
+        if self._stages[name].task is None:
+            self.start()
+        return await self._stages[name].task
+
+    def task(self, name: str) -> asyncio.Future:
+        """
+        获取阶段任务(用于与其他任务一起等待, 如asyncio.wait)
+        :param name: 阶段名称
+        :return: 阶段任务
+        """
+        if self._stages[name].task is None:
+            self.start()
+        return self._stages[name].task
+
+    def done(self, name: str) -> bool:
+        """
+        阶段是否已执行完成
+        :param name: 阶段名称
+        :return: 是否完成
+        """
+        task = self._stages[name].task
+        return task is not None and task.done()
+
+    def cancel(self):
+        """
+        取消所有未完成的阶段
+        """
+        for stage in self._stages.values():
+            if stage.task is None:
+                continue
+            if not stage.task.done():
+                stage.task.cancel()
+            elif not stage.task.cancelled():
+                # 已完成阶段的异常标记为已读取, 避免"Task exception was never retrieved"告警
+                stage.task.exception()
+
+    def timings(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        获取各阶段耗时
+        :return: {阶段名称: {start: 相对流水线开始的毫秒数, cost: 耗时毫秒数}}
+        """
+        result = {}
+        for name, stage in self._stages.items():
+            start = round((stage.start_time - self._origin) * 1000, 1) if stage.start_time else None
+            cost = round((stage.end_time - stage.start_time) * 1000, 1) if stage.start_time and stage.end_time else None
+            result[name] = {"start": start, "cost": cost}
+        return result
+
+    def log_timings(self, **extra: Any):
+        logger.info("###StageGraph INFO, name={}, request_id={}, total={}ms, stages={}, extra={}.", self.name,
+                    self.request_id, round((time.perf_counter() - self._origin) * 1000, 1), self.timings(), extra)
+
+
+class PrefetchStream:
+    """
+    预取异步流
+    立即在后台消费上游异步迭代器并缓存到队列(投机执行), 调用方确认需要后再按序读取;
+    不再需要时调用cancel()终止上游请求。
+    """
+
+    def __init__(
+            self,
+            source: AsyncIterator[Any],
+    ):
+        """
+        构造函数
+        :param source: 上游异步迭代器
+        """
+        self._source = source
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.first_item_time: Optional[float] = None
+
+    def start(self) -> "PrefetchStream":
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._pump())
+        return self
+
+    async def _pump(self):
+        try:
+            async for item in self._source:
+                if self.first_item_time is None:
+                    self.first_item_time = time.perf_counter()
+                await self._queue.put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            await self._queue.put(err)
+        finally:
+            self._queue.put_nowait(_STREAM_END)
+
+    def cancel(self):
+        """
+        取消预取并关闭上游
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        self.start()
+        while True:
+            item = await self._queue.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from config.base_config import STREAM_COALESCE_CHARS, STREAM_COALESCE_MS
+
+try:
+    import orjson  # 可选, 更快的JSON编码
+except ImportError:
+    orjson = None
+
+"""
+文本分片编码模板: 返回结构体类型 -> 默认值model_dump()
+文本分片中除answer/thinking/search外的字段均为默认值, 按模板直接编码, 不经过pydantic序列化, 输出与frame.json()相同
+"""
+_DELTA_TEMPLATES: Dict[type, Dict[str, Any]] = {}
+
+
+def dumps(obj: Any) -> str:
+    """
+    JSON编码(紧凑格式, 不转义中文), 安装orjson时使用orjson
+    :param obj: 待编码对象
+    :return: JSON字符串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _delta_template(frame: BaseModel) -> Dict[str, Any]:
+    template = _DELTA_TEMPLATES.get(type(frame))
+    if template is None:
+        template = type(frame)(data=type(frame.data)()).model_dump()
+        _DELTA_TEMPLATES[type(frame)] = template
+    return template
+
+
+def _is_delta(frame: Any) -> bool:
+    """
+    是否为逐字输出的文本分片(只有answer/thinking/search, 其余字段为默认值)
+    """
+    data = getattr(frame, "data", None)
+    if getattr(frame, "status", None) != 0 or frame.message is not None or data is None:
+        return False
+    return (not getattr(data, "history_id", 0) and getattr(data, "scene", None) is None
+            and not getattr(data, "metadata", None) and not getattr(data, "slave_result", None)
+            and not getattr(data, "answer_list", None) and not getattr(data, "label_list", None)
+            and getattr(data, "progress", None) is None and data.answer != "[DONE]")
+
+
+def encode_delta(template: Dict[str, Any], answer: str = "", thinking: str = "", search: List[dict] = None) -> str:
+    """
+    编码文本分片
+    :param template: 编码模板
+    :param answer: 回答内容
+    :param thinking: 思考过程
+    :param search: 搜索结果
+    :return: JSON字符串
+    """
+    return dumps({**template, "data": {**template["data"], "answer": answer, "thinking": thinking, "search": search}})
+
+
+def encode_frame(frame: Any) -> str:
+    """
+    编码流式响应帧, 文本分片按模板直接编码
+    :param frame: 返回结构体(ChatResponse等)或字符串
+    :return: JSON字符串
+    """
+    if isinstance(frame, str):
+        return frame
+    if _is_delta(frame):
+        data = frame.data
+        return encode_delta(_delta_template(frame), answer=data.answer, thinking=data.thinking, search=data.search)
+    if isinstance(frame, BaseModel):
+        return frame.model_dump_json()
+    return dumps(frame)
+
+
+class FrameCoalescer:
+    """
+    流式文本分片合并
+    连续的同类文本分片(只有回答或只有思考过程)合并为一帧, 由调用方按时间或字数触发输出;
+    遇到其他帧(搜索结果、结束帧等)时先输出已合并的内容, 保证帧顺序不变
+    """
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+        self.template: Optional[Dict[str, Any]] = None
+        self.parts: List[str] = []
+        self.size = 0
+        self.search = None
+        self.started_at = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self.parts)
+
+    def add(self, frame: Any) -> Optional[str]:
+        """
+        合并文本分片
+        :param frame: 返回结构体(只有回答或只有思考过程)
+        :return: 合并类型变化时先输出的已合并帧
+        """
+        data = frame.data
+        text = data.answer or data.thinking
+        if not text:
+            return None
+        kind = "answer" if data.answer else "thinking"
+        flushed = None
+        if self.parts and kind != self.kind:
+            flushed = self.flush()
+        if not self.parts:
+            self.kind = kind
+            self.template = _delta_template(frame)
+            self.search = data.search
+            self.started_at = time.monotonic()
+        self.parts.append(text)
+        self.size += len(text)
+        return flushed
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started_at) * 1000
+
+    def flush(self) -> str:
+        """
+        输出已合并的文本分片
+        :return: JSON字符串
+        """
+        text = "".join(self.parts)
+        frame = encode_delta(self.template, answer=text if self.kind == "answer" else "",
+                             thinking=text if self.kind == "thinking" else "", search=self.search)
+        self.kind, self.template, self.parts, self.size, self.search = None, None, [], 0, None
+        return frame
+
+
+def _mergeable(frame: Any) -> bool:
+    """
+    可合并的文本分片: 不携带搜索结果, 且只有回答或只有思考过程
+    """
+    if isinstance(frame, str) or not _is_delta(frame) or frame.data.search:
+        return False
+    return not (frame.data.answer and frame.data.thinking)
+
+
+async def encode_stream(
+        source: AsyncIterator[Any],
+        coalesce_ms: int = STREAM_COALESCE_MS,
+        coalesce_chars: int = STREAM_COALESCE_CHARS,
+) -> AsyncIterator[str]:
+    """
+    编码流式响应, 开启合并时将coalesce_ms内或累计coalesce_chars字以内的文本分片合并为一帧
+    :param source: 返回结构体的异步迭代器
+    :param coalesce_ms: 合并间隔(毫秒, 0为不合并)
+    :param coalesce_chars: 合并字数, 达到后立即输出
+    :return: JSON字符串
+    """
+    if coalesce_ms <= 0:
+        async for frame in source:
+            yield encode_frame(frame)
+        return
+
+    iterator = source.__aiter__()
+    coalescer = FrameCoalescer()
+    next_task: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0.0, coalesce_ms - coalescer.elapsed_ms()) / 1000 if coalescer else None
+            done, _ = await asyncio.wait({next_task}, timeout=timeout)
+            if not done:
+                # 合并间隔已到, 上游未输出新分片
+                yield coalescer.flush()
+                continue
+            task, next_task = next_task, None
+            try:
+                frame = task.result()
+            except StopAsyncIteration:
+                break
+            if _mergeable(frame):
+                flushed = coalescer.add(frame)
+                if flushed:
+                    yield flushed
+                if coalescer and (coalescer.size >= coalesce_chars or coalescer.elapsed_ms() >= coalesce_ms):
+                    yield coalescer.flush()
+                continue
+            if coalescer:
+                yield coalescer.flush()
+            yield encode_frame(frame)
+        if coalescer:
+            yield coalescer.flush()
+    finally:
+        if next_task is not None:
+            next_task.cancel()
+            await asyncio.gather(next_task, return_exceptions=True)
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
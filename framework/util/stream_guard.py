@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+
+from loguru import logger
+from starlette.requests import Request
+
+from config.base_config import SSE_DISCONNECT_POLL_MS
+from framework.util.stage_graph import PrefetchStream
+
+_metrics: Dict[str, int] = {"active": 0, "completed": 0, "abandoned": 0, "failed": 0}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, delta: int = 1):
+    with _metrics_lock:
+        _metrics[name] += delta
+
+
+def get_stream_metrics() -> Dict[str, int]:
+    """
+    流式响应统计(当前进程)
+    :return: 进行中、正常完成、客户端断开放弃、异常结束的流数量
+    """
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+class DisconnectGuard:
+    """
+    SSE客户端断开检测
+    上游流由后台任务消费(PrefetchStream), 同时轮询客户端连接状态; 客户端断开时直接取消后台任务,
+    取消信号沿生成器链传递至聊天模型的_stream/_astream并关闭与模型服务的HTTP响应, 不依赖SSE响应是否仍在读取本生成器。
+    """
+
+    def __init__(
+            self,
+            request: Request,
+            request_id: str = None,
+            poll_ms: int = SSE_DISCONNECT_POLL_MS,
+    ):
+        """
+        构造函数
+        :param request: 请求对象
+        :param request_id: 请求唯一标识
+        :param poll_ms: 连接状态轮询间隔(毫秒)
+        """
+        self.request = request
+        self.request_id = request_id
+        self.poll_ms = poll_ms
+        self.disconnected = False
+        self._stream: Optional[PrefetchStream] = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_ms / 1000)
+            if await self.request.is_disconnected():
+                self.disconnected = True
+                logger.info("###DisconnectGuard INFO, 客户端已断开, 取消上游流式请求, request_id={}.", self.request_id)
+                if self._stream:
+                    self._stream.cancel()
+                return
+
+    async def stream(self, source: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        包装上游流, 客户端断开或本生成器被取消、关闭时取消上游
+        :param source: 上游异步迭代器
+        :return: 上游数据
+        """
+        self._stream = PrefetchStream(source).start()
+        watcher = asyncio.ensure_future(self._watch())
+        _count("active")
+        result = "abandoned"
+        try:
+            async for item in self._stream:
+                yield item
+            if not self.disconnected:
+                result = "completed"
+        except Exception:
+            result = "failed"
+            raise
+        finally:
+            watcher.cancel()
+            self._stream.cancel()
+            _count("active", -1)
+            _count(result)
+            if result == "abandoned":
+                logger.info("###DisconnectGuard INFO, 流式响应已放弃, request_id={}.", self.request_id)
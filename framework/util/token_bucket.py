@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流器(线程安全)
+    按固定速率补充令牌, 允许不超过容量的突发请求。
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float = None
+    ):
+        """
+        构造函数
+        :param rate: 每秒补充的令牌数, 小于等于0表示不限流
+        :param capacity: 桶容量, 默认与速率相同
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate or 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(
+            self,
+            tokens: float = 1
+    ) -> float:
+        """
+        尝试获取令牌
+        :param tokens: 需要的令牌数
+        :return: 0表示获取成功, 否则为需要等待的秒数
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(
+            self,
+            tokens: float = 1
+    ):
+        """
+        阻塞获取令牌
+        :param tokens: 需要的令牌数
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(
+            self,
+            tokens: float = 1
+    ):
+        """
+        异步获取令牌(等待期间不阻塞事件循环)
+        :param tokens: 需要的令牌数
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
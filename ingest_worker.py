@@ -0,0 +1,35 @@
+import argparse
+import multiprocessing
+
+from loguru import logger
+
+from config.base_config import INGEST_WORKER_PROCESSES, INGEST_WORKER_CONCURRENCY
+from config.loguru_config import init_log_config
+from service.ingest_queue import IngestWorkerPool
+
+
+def run_worker(concurrency: int):
+    """
+    单个消费进程: 启动指定数量的消费线程并阻塞运行
+    :param concurrency: 消费线程数
+    """
+    init_log_config()
+    logger.info("###IngestWorker INFO, 消费进程启动, concurrency={}.", concurrency)
+    IngestWorkerPool(concurrency=concurrency).run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库文件向量化消费进程")
+    parser.add_argument("--processes", type=int, default=INGEST_WORKER_PROCESSES, help="消费进程数")
+    parser.add_argument("--concurrency", type=int, default=INGEST_WORKER_CONCURRENCY, help="每个进程的消费线程数")
+    args = parser.parse_args()
+    processes = [multiprocessing.Process(target=run_worker, args=(args.concurrency,), name=f"ingest-worker-{i}")
+                 for i in range(max(1, args.processes))]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-import json
-from typing import List, Any
+import re
+from typing import Dict, List, Any, Tuple
 
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain.base_language import BaseLanguageModel
@@ -7,7 +7,6 @@ from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
 from langchain.chains.question_answering import load_qa_chain
 from langchain_community.tools import TavilySearchResults
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableSerializable
 from loguru import logger
 from langchain.chains.llm import LLMChain
@@ -15,11 +14,12 @@ from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, MessagesP
     SystemMessagePromptTemplate
 from langchain.memory import ConversationBufferMemory
 
-from config.base_config import TAVILY_API_KEY, DEFAULT_CHAT_BOT_ROLE
+from config.base_config import TAVILY_API_KEY, DEFAULT_CHAT_BOT_ROLE, LLM_ROUTE_HEDGE_MS, BOT_PROFILE_TEMPLATE_LIMIT
 from config.base_config_model_type import MODEL_TYPE_TEXT
 from framework.business_code import ERROR_10002
 from framework.business_except import BusinessException
 from models.llms.dashscope.dashscope import DashScopeAI
+from models.llms.llm_stream_chunk import LlmStreamChunk, stream_chunks
 from models.llms.llms_adapter import LLMsAdapter
 from content.prompt_template_chat import (
     MEMORY_HISTORY_KEY,
@@ -30,6 +30,9 @@ from content.prompt_template_chat import (
 from service.domain.ai_chat_bot import ChatBotModel
 from service.domain.ai_chat_history import ChatHistoryModel
 
+# 提示词占位符转换为模板变量时去除的字符
+_PLACEHOLDER_VARIABLE_PATTERN = re.compile("[^A-Za-z0-9_]")
+
 THINKING_PROMPT = """你是一名临床医学专业人士，请严格按以下要求回答医学问题：
 1. 回答风格：严谨、学术，语言简明，避免口语化，类似医学教科书或科研综述。
 2. 输出内容：仅针对用户输入中的医学范畴内容应答，非医学信息直接过滤。输出结构和逻辑清晰。
@@ -81,10 +84,7 @@ class ChainModel:
                 input_variables=CONVERSATION_CHAT_VARIABLES
             )
         else:
-            prompt = PromptTemplate(
-                template=chatBotModel.prompt,
-                input_variables=chatBotModel.prompt_variables.split(",")
-            )
+            prompt = cls.get_prompt_template(chatBotModel, chatBotModel.prompt, chatBotModel.prompt_variables)
 
         adapter = LLMsAdapter(model=chatBotModel.llms, model_name=chatBotModel.get_llm_model_name())
         llm = adapter.get_model_instance(history=ChainModel.init_memory(history=history)[1], question=question)
@@ -140,9 +140,9 @@ class ChainModel:
             images: List[str] = [],
             verbose: bool = True,
             **kwargs,
-    ) -> RunnableSerializable[dict, str]:
+    ) -> RunnableSerializable[dict, LlmStreamChunk]:
         """
-        获取默认的聊天链实例对象
+        获取默认的聊天链实例对象(流式输出LlmStreamChunk)
         :param question: 用户问题
         :param chatBotModel: 机器人实体对象
         :param history: 历史聊天记录
@@ -154,8 +154,9 @@ class ChainModel:
         """
         # 确定用哪个模型
         llms, llm_model_name = cls.get_llms_model(chatBotModel, model_type)
+        fallbacks, hedge_ms = cls.get_llms_fallbacks(chatBotModel, model_type)
 
-        adapter = LLMsAdapter(model=llms, model_name=llm_model_name)
+        adapter = LLMsAdapter(model=llms, model_name=llm_model_name, fallbacks=fallbacks, hedge_ms=hedge_ms)
         llm = adapter.get_model_instance(
             history=ChainModel.init_memory(history=history)[1],
             question=question,
@@ -165,30 +166,114 @@ class ChainModel:
             **kwargs
         )
         # 封装指令信息
-        prompt = PromptTemplate(
-            template=chatBotModel.prompt,
-            input_variables=chatBotModel.prompt_variables.split(",")
-        )
-        parser = StrOutputParser()
-        chain = prompt | llm | parser
+        prompt = cls.get_prompt_template(chatBotModel, chatBotModel.prompt, chatBotModel.prompt_variables)
+        chain = prompt | stream_chunks(llm)
         return chain
 
+    @classmethod
+    def get_prompt_template(cls, chatBotModel: ChatBotModel, template: str, input_variables: str) -> PromptTemplate:
+        """
+        获取编译后的提示词模板(同一机器人配置缓存内复用)
+        :param chatBotModel: 机器人实体对象
+        :param template: 提示词
+        :param input_variables: 提示词变量(逗号分隔)
+        :return: 提示词模板
+        """
+        template, values = cls._profile_template(chatBotModel, template)
+        key = ("prompt", template, input_variables)
+        prompt = getattr(chatBotModel, "compiled_templates", {}).get(key)
+        if prompt is None:
+            prompt = PromptTemplate(template=template, input_variables=input_variables.split(",") + list(values))
+            cls._put_compiled_template(chatBotModel, key, prompt)
+        return prompt.partial(**values) if values else prompt
+
+    @classmethod
+    def get_chat_prompt_template(
+            cls,
+            chatBotModel: ChatBotModel,
+            system_role: str,
+            prompt_content: str,
+            with_scratchpad: bool = False,
+    ) -> ChatPromptTemplate:
+        """
+        获取编译后的聊天提示词模板(同一机器人配置缓存内复用)
+        :param chatBotModel: 机器人实体对象
+        :param system_role: 角色定义
+        :param prompt_content: 提示词
+        :param with_scratchpad: 是否包含代理执行过程占位(agent_scratchpad)
+        :return: 聊天提示词模板
+        """
+        prompt_content, values = cls._profile_template(chatBotModel, prompt_content)
+        key = ("chat", system_role, prompt_content, with_scratchpad)
+        prompt = getattr(chatBotModel, "compiled_templates", {}).get(key)
+        if prompt is None:
+            messages = [
+                SystemMessagePromptTemplate.from_template(system_role),
+                HumanMessagePromptTemplate.from_template(prompt_content)
+            ]
+            if with_scratchpad:
+                messages.append(MessagesPlaceholder(variable_name="agent_scratchpad"))
+            prompt = ChatPromptTemplate(messages=messages)
+            cls._put_compiled_template(chatBotModel, key, prompt)
+        return prompt.partial(**values) if values else prompt
+
+    @classmethod
+    def _profile_template(cls, chatBotModel: ChatBotModel, template: str) -> Tuple[str, Dict[str, str]]:
+        """
+        还原占位符处理前的机器人提示词: 占位符替换为模板变量, 按请求替换的取值在缓存查找后以partial填充,
+        同一机器人配置只编译一份模板
+        :param chatBotModel: 机器人实体对象
+        :param template: 提示词
+        :return: (用于编译与缓存的提示词, 模板变量取值)
+        """
+        values = getattr(chatBotModel, "prompt_values", None)
+        source = getattr(chatBotModel, "prompt_source", None)
+        if not values or not source or template != chatBotModel.prompt:
+            return template, {}
+        variables = {}
+        for key, value in values.items():
+            variable = "placeholder_" + _PLACEHOLDER_VARIABLE_PATTERN.sub("_", key[1:-1])
+            source = source.replace(key, "{" + variable + "}")
+            variables[variable] = value
+        return source, variables
+
+    @classmethod
+    def _put_compiled_template(cls, chatBotModel: ChatBotModel, key: tuple, prompt: Any):
+        # 只有机器人配置缓存返回的副本携带compiled_templates; 模板按机器人原始提示词缓存, 数量超过上限时不再缓存
+        templates = getattr(chatBotModel, "compiled_templates", None)
+        if templates is not None and len(templates) < BOT_PROFILE_TEMPLATE_LIMIT:
+            templates[key] = prompt
+
     @classmethod
     def get_llms_model(cls, chatBotModel, model_type=MODEL_TYPE_TEXT):
-        llms_models = chatBotModel.llms_models
+        llms_models = chatBotModel.get_llms_models()
         llms = chatBotModel.llms if model_type == MODEL_TYPE_TEXT else None
         llm_model_name = chatBotModel.get_llm_model_name() if model_type == MODEL_TYPE_TEXT else None
-        if llms_models and model_type in llms_models:
-            model = json.loads(llms_models)[model_type]
+        if model_type in llms_models:
+            model = llms_models[model_type]
             llms = model["llms"] if model else None
             llm_model_name = model["modelName"] if model else None
         return llms, llm_model_name
 
+    @classmethod
+    def get_llms_fallbacks(cls, chatBotModel, model_type=MODEL_TYPE_TEXT):
+        """
+        获取机器人配置的备用模型与对冲等待时间
+        llms_models示例: {"text": {"llms": "DashScope", "modelName": "qwen-plus", "hedgeMs": 1500,
+                                   "fallbacks": [{"llms": "Deepseek", "modelName": "deepseek-chat"}]}}
+        :return: 备用模型[(大语言模型, 子模型名称)], 对冲等待时间(毫秒)
+        """
+        model = chatBotModel.get_llms_models().get(model_type)
+        if model:
+            fallbacks = [(item.get("llms"), item.get("modelName")) for item in model.get("fallbacks") or []]
+            return fallbacks, int(model.get("hedgeMs") or LLM_ROUTE_HEDGE_MS)
+        return [], LLM_ROUTE_HEDGE_MS
+
     @classmethod
     def check_llm_model_existing(cls, chatBotModel, model_type=MODEL_TYPE_TEXT):
-        llms_models = chatBotModel.llms_models
-        if llms_models and model_type in llms_models:
-            model = json.loads(llms_models)[model_type]
+        llms_models = chatBotModel.get_llms_models()
+        if model_type in llms_models:
+            model = llms_models[model_type]
             return model and model["llms"] and model["modelName"]
         return False
 
@@ -447,7 +532,8 @@ class ChainModel:
         """
         # 确定用哪个模型
         llms, llm_model_name = cls.get_llms_model(chatBotModel, model_type)
-        adapter = LLMsAdapter(model=llms, model_name=llm_model_name)
+        fallbacks, hedge_ms = cls.get_llms_fallbacks(chatBotModel, model_type)
+        adapter = LLMsAdapter(model=llms, model_name=llm_model_name, fallbacks=fallbacks, hedge_ms=hedge_ms)
         llm = adapter.get_chat_model_instance(
             history=ChainModel.init_memory(history=history)[1],
             model_type=model_type,
@@ -466,13 +552,7 @@ class ChainModel:
         system_role = DEFAULT_CHAT_BOT_ROLE
         if chatBotModel and chatBotModel.bot_role:
             system_role = chatBotModel.bot_role
-        prompt = ChatPromptTemplate(
-            messages=[
-                SystemMessagePromptTemplate.from_template(system_role),
-                HumanMessagePromptTemplate.from_template(prompt_content),
-                MessagesPlaceholder(variable_name="agent_scratchpad")
-            ]
-        )
+        prompt = cls.get_chat_prompt_template(chatBotModel, system_role, prompt_content, with_scratchpad=True)
         search = TavilySearchResults(max_results=2, tavily_api_key=TAVILY_API_KEY, name="Tavily")
         tools = [search]
         agent = create_tool_calling_agent(llm, tools, prompt)
@@ -504,7 +584,8 @@ class ChainModel:
         """
         # 确定用哪个模型
         llms, llm_model_name = cls.get_llms_model(chatBotModel, model_type)
-        adapter = LLMsAdapter(model=llms, model_name=llm_model_name)
+        fallbacks, hedge_ms = cls.get_llms_fallbacks(chatBotModel, model_type)
+        adapter = LLMsAdapter(model=llms, model_name=llm_model_name, fallbacks=fallbacks, hedge_ms=hedge_ms)
         llm = adapter.get_chat_model_instance(
             history=ChainModel.init_memory(history=history)[1],
             model_type=model_type,
@@ -523,12 +604,7 @@ class ChainModel:
         system_role = DEFAULT_CHAT_BOT_ROLE
         if chatBotModel and chatBotModel.bot_role:
             system_role = chatBotModel.bot_role
-        prompt = ChatPromptTemplate(
-            messages=[
-                SystemMessagePromptTemplate.from_template(system_role),
-                HumanMessagePromptTemplate.from_template(prompt_content)
-            ]
-        )
+        prompt = cls.get_chat_prompt_template(chatBotModel, system_role, prompt_content)
         chain = prompt | llm
         return chain
 
@@ -0,0 +1,91 @@
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Type, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+from config.base_config import LLM_ROUTE_HEDGE_MS
+from models.llms.llm_router import (
+    acall_with_fallback,
+    astream_hedged,
+    call_with_fallback,
+    stream_with_fallback,
+)
+
+
+class ChatRouterAI(BaseChatModel):
+    """
+    聊天模型路由
+        - 按熔断状态在主服务商与备用服务商之间切换, 首个分片前失败时切换下一个服务商
+        - 异步流式请求可开启对冲: 超过hedge_ms未收到首个分片时向下一个服务商发起相同请求, 采用先输出者
+    """
+    routes: List[Any] = None
+    hedge_ms: int = LLM_ROUTE_HEDGE_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "ChatRouter"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        """
+        常规推理
+        :return: 推理结果
+        """
+        return call_with_fallback(self.routes, lambda model: model._generate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        """
+        异步常规推理
+        :return: 推理结果
+        """
+        return await acall_with_fallback(self.routes, lambda model: model._agenerate(messages, stop=stop, **kwargs))
+
+    def _stream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """
+        流式推理
+        :return: 推理结果
+        """
+        for chunk in stream_with_fallback(self.routes, lambda model: model._stream(messages, stop=stop, **kwargs)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+            self,
+            messages: List[BaseMessage],
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """
+        异步流式推理(对冲请求的各服务商不回调, 只对采用的分片回调)
+        :return: 推理结果
+        """
+        async for chunk in astream_hedged(self.routes, lambda model: model._astream(messages, stop=stop, **kwargs),
+                                          hedge_ms=self.hedge_ms):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def bind_tools(
+            self,
+            tools: Sequence[Union[Dict[str, Any], Type, Callable, BaseTool]],
+            **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """
+        绑定工具(按主服务商的格式转换, 各服务商均兼容OpenAI工具格式)
+        :return: 绑定信息
+        """
+        binding = self.routes[0].model.bind_tools(tools, **kwargs)
+        return super().bind(**binding.kwargs)
@@ -4,7 +4,7 @@ from typing import Optional, Any, Mapping, List, Iterator, Type, AsyncIterator,
 
 from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
 from langchain_core.language_models import BaseChatModel, LanguageModelInput
-from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.language_models.chat_models import generate_from_stream, agenerate_from_stream
 from langchain_core.messages import BaseMessage, BaseMessageChunk, AIMessageChunk, HumanMessage, AIMessage, \
     SystemMessage
 from langchain_core.outputs import ChatResult, ChatGenerationChunk
@@ -13,12 +13,12 @@ from langchain_core.runnables import Runnable
 from langchain_core.tools import BaseTool
 from langchain_core.utils.function_calling import convert_to_openai_tool
 from loguru import logger
-from openai import OpenAI, AsyncOpenAI
 
 from config.base_config_dashscope import BASHSCOPE_MODEL_NAME, BASHSCOPE_MAX_TOKENS, BASHSCOPE_TEMPERATURE, \
     BASHSCOPE_BASE_URL, BASHSCOPE_API_KEY, BASHSCOPE_MODEL_TYPE, BASHSCOPE_VL_URL
 from config.base_config_model_type import MODEL_TYPE_VL
 from models.chatai.convert_message import MessageChunkConverter
+from models.llms.llm_client_registry import get_openai_client, get_async_openai_client
 
 
 class ChatDashScopeAI(BaseChatModel):
@@ -85,7 +85,7 @@ class ChatDashScopeAI(BaseChatModel):
         extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
         logger.info("#############Request {} LLMs Generate INFO, request_id={}, url={}, params={}, message={}, extra_body={}.",
                     self._llm_type, self.request_id, self.base_url, self._default_params, messages, extra_body)
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        client = get_openai_client(base_url=self.base_url, api_key=self.api_key)
         response = client.chat.completions.create(messages=messages, stream=False, **self._default_params,
                                                   extra_body=extra_body, **kwargs)
         logger.info("#############Response {} LLMs Generate INFO, request_id={}, processTime={}, response={}.",
@@ -93,6 +93,30 @@ class ChatDashScopeAI(BaseChatModel):
         generation_info = None
         return MessageChunkConverter.create_chat_result(response, generation_info)
 
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        """
+        异步常规推理
+        :return: 推理结果
+        """
+        if self.streaming:
+            stream_iter = self._astream(
+                messages=messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            return await agenerate_from_stream(stream_iter)
+        start_time = time.time()
+        messages = self._get_message_list(input_=messages)
+        extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
+        logger.info("#############Request {} LLMs AGenerate INFO, request_id={}, url={}, params={}, message={}, extra_body={}.",
+                    self._llm_type, self.request_id, self.base_url, self._default_params, messages, extra_body)
+        client = get_async_openai_client(base_url=self.base_url, api_key=self.api_key)
+        response = await client.chat.completions.create(messages=messages, stream=False, **self._default_params,
+                                                        extra_body=extra_body, **kwargs)
+        logger.info("#############Response {} LLMs AGenerate INFO, request_id={}, processTime={}, response={}.",
+                    self._llm_type, self.request_id, time.time() - start_time, response)
+        generation_info = None
+        return MessageChunkConverter.create_chat_result(response, generation_info)
+
     def _stream(
             self,
             messages: List[BaseMessage],
@@ -114,7 +138,7 @@ class ChatDashScopeAI(BaseChatModel):
         else:
             extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
         stream_options = {"include_usage": True}
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        client = get_openai_client(base_url=self.base_url, api_key=self.api_key)
         logger.info("#############Response {} LLMs Stream INFO, request_id={}, messages={}, extra_body={}.",
                     self._llm_type, self.request_id, messages, extra_body)
         response = client.chat.completions.create(messages=messages, stream=True, **self._default_params,
@@ -159,10 +183,10 @@ class ChatDashScopeAI(BaseChatModel):
         异步流式推理
         :return: 推理结果
          """
-        logger.info("#############Request LLMs AStream INFO, request_id={}, url={}, params={}, message={}.",
+        logger.info("#############Request {} LLMs AStream INFO, request_id={}, url={}, params={}, message={}.",
                     self._llm_type, self.request_id, self.base_url, self._default_params, messages)
         start_time = time.time()
-        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        client = get_async_openai_client(base_url=self.base_url, api_key=self.api_key)
         messages = self._get_message_list(input_=messages)
         default_chunk_class: Type[BaseMessageChunk] = AIMessageChunk
         base_generation_info = {}
@@ -1,11 +1,10 @@
-import random
 import time
 import uuid
 from typing import Any, Mapping, List, Optional, Iterator, Type, AsyncIterator, Sequence, Union, Dict, Callable, Literal
 
 from langchain_core.callbacks import CallbackManagerForLLMRun, AsyncCallbackManagerForLLMRun
 from langchain_core.language_models import BaseChatModel, LanguageModelInput
-from langchain_core.language_models.chat_models import generate_from_stream
+from langchain_core.language_models.chat_models import generate_from_stream, agenerate_from_stream
 from langchain_core.messages import BaseMessage, AIMessageChunk, BaseMessageChunk, HumanMessage, AIMessage, \
     SystemMessage
 from langchain_core.outputs import ChatResult, ChatGenerationChunk
@@ -14,11 +13,11 @@ from langchain_core.runnables import Runnable
 from langchain_core.tools import BaseTool
 from langchain_core.utils.function_calling import convert_to_openai_tool
 from loguru import logger
-from openai import OpenAI, AsyncOpenAI
 
-from config.base_config_deepseek import DEEPSEEK_URL, DEEPSEEK_MODEL_NAME, DEEPSEEK_MAX_TOKENS, DEEPSEEK_TEMPERATURE, \
-    DEEPSEEK_API_KEY_POOL
+from config.base_config_deepseek import DEEPSEEK_URL, DEEPSEEK_MODEL_NAME, DEEPSEEK_MAX_TOKENS, DEEPSEEK_TEMPERATURE
 from models.chatai.convert_message import MessageChunkConverter
+from models.llms.deepseek.deepseek import get_deepseek_key_scheduler
+from models.llms.llm_client_registry import get_openai_client, get_async_openai_client
 
 
 class ChatDeepseekAI(BaseChatModel):
@@ -73,14 +72,44 @@ class ChatDeepseekAI(BaseChatModel):
             extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
         logger.info("#############Request {} LLMs Generate INFO, request_id={}, messages={}, extra_body={}.",
                     self._llm_type, self.request_id, messages, extra_body)
-        api_key = random.choices(DEEPSEEK_API_KEY_POOL[0], DEEPSEEK_API_KEY_POOL[1], k=1)[0]
-        client = OpenAI(api_key=api_key, base_url=self.url)
-        response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=False, **self._default_params, **kwargs)
+        with get_deepseek_key_scheduler().lease() as lease:
+            client = get_openai_client(base_url=self.url, api_key=lease.api_key)
+            response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=False, **self._default_params, **kwargs)
+            lease.record_usage(response.usage)
         logger.info("#############Response {} LLMs Generate INFO, request_id={}, processTime={}, response={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response)
         generation_info = None
         return MessageChunkConverter.create_chat_result(response, generation_info)
 
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        """
+        异步常规推理
+        :return: 推理结果
+        """
+        if self.streaming:
+            stream_iter = self._astream(
+                messages=messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            return await agenerate_from_stream(stream_iter)
+        start_time = time.time()
+        messages = self._get_message_list(input_=messages)
+        if self.kwargs.get("enable_thinking"):
+            extra_body = {"enable_thinking": True, "chat_template_kwargs": {"enable_thinking": True}}
+        else:
+            extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
+        logger.info("#############Request {} LLMs AGenerate INFO, request_id={}, messages={}, extra_body={}.",
+                    self._llm_type, self.request_id, messages, extra_body)
+        with get_deepseek_key_scheduler().lease() as lease:
+            client = get_async_openai_client(base_url=self.url, api_key=lease.api_key)
+            response = await client.chat.completions.create(messages=messages, extra_body=extra_body, stream=False,
+                                                            **self._default_params, **kwargs)
+            lease.record_usage(response.usage)
+        logger.info("#############Response {} LLMs AGenerate INFO, request_id={}, processTime={}, response={}.",
+                    self._llm_type, self.request_id, time.time() - start_time, response)
+        generation_info = None
+        return MessageChunkConverter.create_chat_result(response, generation_info)
+
     def _stream(
             self,
             messages: List[BaseMessage],
@@ -103,15 +132,16 @@ class ChatDeepseekAI(BaseChatModel):
             extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
         logger.info("#############Request {} LLMs Stream INFO, request_id={}, messages={}, extra_body={}.",
                     self._llm_type, self.request_id, messages, extra_body)
-        api_key = random.choices(DEEPSEEK_API_KEY_POOL[0], DEEPSEEK_API_KEY_POOL[1], k=1)[0]
-        client = OpenAI(api_key=api_key, base_url=self.url)
-        response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=True, **self._default_params, **kwargs)
+        lease = get_deepseek_key_scheduler().lease()
+        with lease.guard():
+            client = get_openai_client(base_url=self.url, api_key=lease.api_key)
+            response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=True, **self._default_params, **kwargs)
         logger.info("#############Response {} LLMs Stream INFO, request_id={}, processTime={}, response={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response)
         base_generation_info = {}
         with response:
             is_first_chunk = True
-            for chunk in response:
+            for chunk in lease.wrap_stream(response):
                 logger.info("#############Response {} LLMs Stream INFO, request_id={}, processTime={}, chunk={}.",
                             self._llm_type, self.request_id, time.time() - start_time, chunk)
                 if not isinstance(chunk, dict):
@@ -146,8 +176,6 @@ class ChatDeepseekAI(BaseChatModel):
         logger.info("#############Request {} LLMs AStream INFO, request_id={}, url={}, params={}, message={}.",
                     self._llm_type, self.request_id, self.url, self._default_params, messages)
         start_time = time.time()
-        api_key = random.choices(DEEPSEEK_API_KEY_POOL[0], DEEPSEEK_API_KEY_POOL[1], k=1)[0]
-        client = AsyncOpenAI(api_key=api_key, base_url=self.url)
         messages = self._get_message_list(input_=messages)
         default_chunk_class: Type[BaseMessageChunk] = AIMessageChunk
         base_generation_info = {}
@@ -156,13 +184,16 @@ class ChatDeepseekAI(BaseChatModel):
         else:
             extra_body = {"enable_thinking": False, "chat_template_kwargs": {"enable_thinking": False}}
         stream_options = {"include_usage": True}
-        response = await client.chat.completions.create(messages=messages, stream=True, **self._default_params,
-                                                        extra_body=extra_body, stream_options=stream_options, **kwargs)
+        lease = get_deepseek_key_scheduler().lease()
+        with lease.guard():
+            client = get_async_openai_client(base_url=self.url, api_key=lease.api_key)
+            response = await client.chat.completions.create(messages=messages, stream=True, **self._default_params,
+                                                            extra_body=extra_body, stream_options=stream_options, **kwargs)
         logger.info("#############Response {} LLMs AStream INFO, request_id={}, processTime={}, response={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response)
         async with response:
             is_first_chunk = True
-            async for chunk in response:
+            async for chunk in lease.wrap_astream(response):
                 if not isinstance(chunk, dict):
                     chunk = chunk.model_dump()
                 generation_chunk = MessageChunkConverter.convert_chunk_to_generation_chunk(
@@ -0,0 +1,204 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from loguru import logger
+
+from config.base_config import (
+    EMBEDDINGS_CACHE_MEMORY_SIZE,
+    EMBEDDINGS_CACHE_REDIS_ENABLED,
+    EMBEDDINGS_CACHE_REDIS_SECONDS)
+from framework.redis.redis_client import RedisClient
+
+# Redis缓存键前缀
+EMBEDDINGS_CACHE_REDIS_KEY = "embedding:{model}:{digest}"
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class EmbeddingsLRUCache:
+    """
+    进程内向量LRU缓存(线程安全)
+    """
+
+    def __init__(
+            self,
+            max_size: int
+    ):
+        """
+        构造函数
+        :param max_size: 最大缓存条数
+        """
+        self.max_size = max_size
+        self._data: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: List[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EmbeddingsCacheStats:
+    """
+    向量缓存命中统计(进程级)
+    """
+    _lock = threading.Lock()
+    memory_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def incr(cls, memory_hits: int = 0, redis_hits: int = 0, misses: int = 0):
+        with cls._lock:
+            cls.memory_hits += memory_hits
+            cls.redis_hits += redis_hits
+            cls.misses += misses
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, int]:
+        """
+        获取当前统计信息
+        :return: 统计字典
+        """
+        total = cls.memory_hits + cls.redis_hits + cls.misses
+        return {
+            "memory_hits": cls.memory_hits,
+            "redis_hits": cls.redis_hits,
+            "misses": cls.misses,
+            "hit_rate": round((cls.memory_hits + cls.redis_hits) / total, 4) if total else 0,
+            "memory_size": len(_memory_cache),
+        }
+
+
+_memory_cache = EmbeddingsLRUCache(max_size=EMBEDDINGS_CACHE_MEMORY_SIZE)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带缓存的Embeddings包装器
+    以"模型名称 + 规范化文本哈希"为键, 先查进程内LRU, 再查Redis(float32二进制),
+    均未命中的文本才会请求底层模型, 结果回写两级缓存。
+    """
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            model_name: str,
+            use_redis: bool = EMBEDDINGS_CACHE_REDIS_ENABLED,
+            redis_seconds: int = EMBEDDINGS_CACHE_REDIS_SECONDS,
+    ):
+        """
+        构造函数
+        :param embeddings: 底层Embeddings模型
+        :param model_name: 模型名称(参与缓存键计算)
+        :param use_redis: 是否启用Redis共享缓存
+        :param redis_seconds: Redis缓存过期时间，单位秒
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.use_redis = use_redis
+        self.redis_seconds = redis_seconds
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        文本规范化: Unicode NFC、去除首尾空白、合并连续空白
+        :param text: 原始文本
+        :return: 规范化文本
+        """
+        return _WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+    def cache_key(self, text: str) -> str:
+        digest = hashlib.sha256(self.normalize(text).encode("utf-8")).hexdigest()
+        return EMBEDDINGS_CACHE_REDIS_KEY.format(model=self.model_name, digest=digest)
+
+    def _redis_get(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not self.use_redis or not keys:
+            return [None] * len(keys)
+        try:
+            values = RedisClient().get_bytes_list(keys)
+            return [np.frombuffer(v, dtype="<f4").tolist() if v else None for v in values]
+        except Exception as err:
+            logger.warning("######CachedEmbeddings WARN, Redis读取失败, err={}", err)
+            return [None] * len(keys)
+
+    def _redis_set(self, mapping: Dict[str, List[float]]):
+        if not self.use_redis or not mapping:
+            return
+        try:
+            RedisClient().set_bytes_list_time(
+                mapping={k: np.asarray(v, dtype="<f4").tobytes() for k, v in mapping.items()},
+                time=self.redis_seconds
+            )
+        except Exception as err:
+            logger.warning("######CachedEmbeddings WARN, Redis写入失败, err={}", err)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        result: List[Optional[List[float]]] = [_memory_cache.get(key) for key in keys]
+        memory_hits = sum(1 for v in result if v is not None)
+
+        # 二级缓存: Redis, 同一批次内重复文本只查询一次
+        redis_keys = list(dict.fromkeys(key for key, v in zip(keys, result) if v is None))
+        redis_values = dict(zip(redis_keys, self._redis_get(redis_keys)))
+        redis_hits = 0
+        for i, key in enumerate(keys):
+            if result[i] is None and redis_values.get(key) is not None:
+                result[i] = redis_values[key]
+                _memory_cache.put(key, result[i])
+                redis_hits += 1
+
+        # 未命中: 请求底层模型(同一批次内重复文本只请求一次)
+        miss_index: Dict[str, List[int]] = OrderedDict()
+        for i, key in enumerate(keys):
+            if result[i] is None:
+                miss_index.setdefault(key, []).append(i)
+        if miss_index:
+            miss_texts = [texts[indexes[0]] for indexes in miss_index.values()]
+            miss_embeddings = self.embeddings.embed_documents(miss_texts)
+            if len(miss_embeddings) != len(miss_texts):
+                raise ValueError(f"Embeddings length mismatch: {len(miss_embeddings)} != {len(miss_texts)}")
+            fresh = {}
+            for (key, indexes), embedding in zip(miss_index.items(), miss_embeddings):
+                for i in indexes:
+                    result[i] = embedding
+                _memory_cache.put(key, embedding)
+                fresh[key] = embedding
+            self._redis_set(fresh)
+
+        misses = sum(len(indexes) for indexes in miss_index.values())
+        EmbeddingsCacheStats.incr(memory_hits=memory_hits, redis_hits=redis_hits, misses=misses)
+        logger.info("######CachedEmbeddings INFO, model={}, texts={}, memory_hits={}, redis_hits={}, misses={}.",
+                    self.model_name, len(texts), memory_hits, redis_hits, misses)
+        return result
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_embeddings_cache_stats() -> Dict[str, int]:
+    """
+    获取向量缓存命中统计
+    :return: 统计字典
+    """
+    return EmbeddingsCacheStats.snapshot()
@@ -1,24 +1,75 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Mapping, Optional
 import requests
+from requests.adapters import HTTPAdapter
 from loguru import logger
 from pydantic import BaseModel, Extra
 from langchain.embeddings.base import Embeddings
+
+from framework.util.token_bucket import TokenBucket
 from models.embeddings.dashscope.dashscope_embedding_config import (
     DASHSCOPE_EMBEDDINGS_URL,
     DASHSCOPE_EMBEDDINGS_MODEL,
     HTTP_REQUEST_CONN_TIMEOUT,
     HTTP_REQUEST_READ_TIMEOUT,
     DASHSCOPE_EMBEDDINGS_API_KEY,
+    DASHSCOPE_EMBEDDINGS_BATCH_SIZE,
+    DASHSCOPE_EMBEDDINGS_MAX_WORKERS,
+    DASHSCOPE_EMBEDDINGS_RATE_LIMIT,
+    DASHSCOPE_EMBEDDINGS_RETRY_COUNT,
+    DASHSCOPE_EMBEDDINGS_RETRY_BACKOFF,
+    DASHSCOPE_EMBEDDINGS_POOL_SIZE,
 )
 
+# 可重试的HTTP状态码
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+# 进程内共享限流器, 所有实例共用同一份请求配额
+_rate_limiter = TokenBucket(rate=DASHSCOPE_EMBEDDINGS_RATE_LIMIT)
+
+
+def get_http_session() -> requests.Session:
+    """
+    获取进程内共享的长连接Session
+    :return: Session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=DASHSCOPE_EMBEDDINGS_POOL_SIZE,
+                                      pool_maxsize=DASHSCOPE_EMBEDDINGS_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+class RetryableEmbeddingError(ValueError):
+    """
+    可重试的向量服务异常(限流、服务端错误、网络异常)
+    """
+
 
 class DashScopeApiEmbeddings(BaseModel, Embeddings):
     """
     通义千问 - 通用文本向量服务
+    文本按批次打包, 多线程并发请求, 令牌桶限流, 失败按指数退避重试,
+    返回结果与输入文本一一对应。
     """
     api_key: str = DASHSCOPE_EMBEDDINGS_API_KEY
     embeddings_api_url: str = DASHSCOPE_EMBEDDINGS_URL
     emb_model_name: Optional[str] = DASHSCOPE_EMBEDDINGS_MODEL
+    batch_size: int = DASHSCOPE_EMBEDDINGS_BATCH_SIZE
+    max_workers: int = DASHSCOPE_EMBEDDINGS_MAX_WORKERS
+    retry_count: int = DASHSCOPE_EMBEDDINGS_RETRY_COUNT
+    retry_backoff: float = DASHSCOPE_EMBEDDINGS_RETRY_BACKOFF
 
     class Config:
         extra = Extra.forbid
@@ -35,23 +86,44 @@ class DashScopeApiEmbeddings(BaseModel, Embeddings):
             self,
             input: List[str]
     ) -> List[List[float]]:
-        result_list = []
-        total = 0
-        for i in input:
+        if not input:
+            return []
+        batches = [input[i:i + self.batch_size] for i in range(0, len(input), self.batch_size)]
+        start = time.time()
+        if len(batches) == 1:
+            results = [self._embed_batch_with_retry(batches[0], 1)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch_with_retry, batches, range(1, len(batches) + 1)))
+        embeddings = [embedding for batch_result in results for embedding in batch_result]
+        logger.info("#############DashScope Embeddings INFO, texts={}, batches={}, cost={}s.",
+                    len(input), len(batches), round(time.time() - start, 3))
+        return embeddings
+
+    def _embed_batch_with_retry(
+            self,
+            contents: List[str],
+            batch_no: int,
+    ) -> List[List[float]]:
+        attempt = 0
+        while True:
+            attempt = attempt + 1
+            _rate_limiter.acquire()
             try:
-                total = total + 1
-                embeddings = self._embed_single(content=i, total=total)
-            except Exception as err:
-                print(err)
-                continue
-            result_list.append(embeddings)
-        return result_list
-
-    def _embed_single(
+                return self._embed_batch(contents=contents, batch_no=batch_no)
+            except RetryableEmbeddingError as err:
+                if attempt > self.retry_count:
+                    raise ValueError(f"Embedding batch {batch_no} failed after {attempt} attempts: {err}")
+                delay = self.retry_backoff * (2 ** (attempt - 1)) * (1 + random.random())
+                logger.warning("#############DashScope Embeddings WARN, batch={}, attempt={}, retry in {}s, err={}.",
+                               batch_no, attempt, round(delay, 2), err)
+                time.sleep(delay)
+
+    def _embed_batch(
             self,
-            content: str,
-            total: int,
-    ) -> List[float]:
+            contents: List[str],
+            batch_no: int,
+    ) -> List[List[float]]:
         headers = {
             "Content-Type": "application/json",
             "Authorization": "Bearer " + self.api_key,
@@ -59,7 +131,7 @@ class DashScopeApiEmbeddings(BaseModel, Embeddings):
 
         payload = {
             "input": {
-                "texts": [content]
+                "texts": contents
             },
             "model": self.emb_model_name,
             "parameters": {
@@ -67,16 +139,19 @@ class DashScopeApiEmbeddings(BaseModel, Embeddings):
             },
         }
         try:
-            response = requests.post(
+            response = get_http_session().post(
                 self.embeddings_api_url,
                 headers=headers,
                 json=payload,
                 timeout=(HTTP_REQUEST_CONN_TIMEOUT, HTTP_REQUEST_READ_TIMEOUT)
             )
-            logger.info("#############Request DashScope Embeddings INFO, url={}, headers={}, response={}, total={}.",
-                        self.embeddings_api_url, headers, response, total)
+            logger.info("#############Request DashScope Embeddings INFO, url={}, response={}, batch={}, size={}.",
+                        self.embeddings_api_url, response, batch_no, len(contents))
         except requests.exceptions.RequestException as e:
-            raise ValueError(f"Error raised by embedding inference endpoint: {e}")
+            raise RetryableEmbeddingError(f"Error raised by embedding inference endpoint: {e}")
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableEmbeddingError(f"Status {response.status_code}: {response.text}")
 
         try:
             parsed_response = response.json()
@@ -88,14 +163,20 @@ class DashScopeApiEmbeddings(BaseModel, Embeddings):
                 raise ValueError(f"Unexpected response type: {output_response}")
 
             embeddings_response = output_response["embeddings"]
-            if not isinstance(embeddings_response, list):
+            if not isinstance(embeddings_response, list) or len(embeddings_response) != len(contents):
                 raise ValueError(f"Unexpected response type: {embeddings_response}")
 
-            return embeddings_response[0]["embedding"]
+            # 按text_index回填, 保证与输入顺序一致
+            result = [None] * len(contents)
+            for index, item in enumerate(embeddings_response):
+                result[item.get("text_index", index)] = item["embedding"]
+            return result
         except requests.exceptions.JSONDecodeError as e:
             raise ValueError(
                 f"Error raised by inference API: {e}.\nResponse: {response.text}"
             )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Unexpected response: {e}.\nResponse: {response.text}")
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embeddings = self._embed(texts)
@@ -7,3 +7,15 @@ DASHSCOPE_EMBEDDINGS_API_KEY = DASHSCOPE_API_KEY
 
 HTTP_REQUEST_CONN_TIMEOUT = 3
 HTTP_REQUEST_READ_TIMEOUT = 5
+
+# 单次请求最多携带的文本条数(text-embedding-v1/v2上限为25, v3为10)
+DASHSCOPE_EMBEDDINGS_BATCH_SIZE = 10 if VECTOR_EMBEDDINGS_MODEL_TYPE == "text-embedding-v3" else 25
+# 并发请求线程数
+DASHSCOPE_EMBEDDINGS_MAX_WORKERS = 4
+# 每秒最大请求数(令牌桶限流)
+DASHSCOPE_EMBEDDINGS_RATE_LIMIT = 10
+# 单批次失败重试次数及退避基数(秒)
+DASHSCOPE_EMBEDDINGS_RETRY_COUNT = 3
+DASHSCOPE_EMBEDDINGS_RETRY_BACKOFF = 0.5
+# HTTP连接池大小
+DASHSCOPE_EMBEDDINGS_POOL_SIZE = 16
@@ -5,6 +5,7 @@ from langchain_community.embeddings.openai import OpenAIEmbeddings
 from loguru import logger
 
 from framework.business_except import BusinessException
+from models.embeddings.cached_embeddings import CachedEmbeddings
 from models.embeddings.dashscope.dashscope_embedding_api import DashScopeApiEmbeddings
 
 
@@ -19,12 +20,30 @@ class EmbeddingsModelAdapter:
     def get_model_instance(
             self,
             model: str = default_model,
-            model_type: str = default_model_type
+            model_type: str = default_model_type,
+            use_cache: bool = EMBEDDINGS_CACHE_ENABLED
     ):
         """
         获取Embeddings稀疏值模型实例
         :param model: 模型
         :param model_type: 数据集类型
+        :param use_cache: 是否启用向量缓存
+        :return: 模型实例
+        """
+        instance = self._get_raw_model_instance(model=model, model_type=model_type)
+        if instance is not None and use_cache:
+            return CachedEmbeddings(embeddings=instance, model_name=f"{model}:{model_type}")
+        return instance
+
+    def _get_raw_model_instance(
+            self,
+            model: str,
+            model_type: str
+    ):
+        """
+        获取未包装缓存的Embeddings模型实例
+        :param model: 模型
+        :param model_type: 数据集类型
         :return: 模型实例
         """
         try:
@@ -1,5 +1,4 @@
 from typing import Any, List, Mapping, Optional, Dict
-import requests
 import json
 from loguru import logger
 from langchain.callbacks.manager import CallbackManagerForLLMRun
@@ -11,8 +10,14 @@ from custom.amway.amway_config import (
     BAIDUBCE_TOP_P,
     BAIDUBCE_PENALTY_SCORE, BAIDUBCE_SECURE_ANSWER,
 )
-from framework.business_code import ERROR_10901, ERROR_10902
+from framework.business_code import ERROR_10902
 from framework.business_except import BusinessException
+from models.llms.llm_client_registry import (
+    BAIDUBCE_TOKEN_ERROR_CODES,
+    get_baidubce_access_token,
+    invalidate_baidubce_access_token,
+    get_http_session,
+)
 
 
 class BaidubceAI(LLM):
@@ -36,33 +41,18 @@ class BaidubceAI(LLM):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> str:
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        payload = ""
-        logger.info("###BaidubceAI get_access_token request INFO, url={}, body={}.", self.access_token_url, payload)
-        response = requests.post(url=self.access_token_url, data=payload, headers=headers)
-        logger.info("###BaidubceAI get_access_token request INFO, response={}.", response.text)
-        if "error" in response.text:
-            logger.error("###BaidubceAI get_access_token request ERROR, code={}, message={}.", ERROR_10901, response.text)
-            raise BusinessException(ERROR_10901.code, ERROR_10901.message)
-        data = eval(response.text)
-        access_token = str(data["access_token"])
-        chat_url = self.chat_url.replace("{access_token}", access_token)
-        headers = {
-            'Content-Type': 'application/json',
-        }
         body = {
             "messages": self._get_messages(prompt=prompt, **kwargs),
             "temperature": self.temperature,
             "top_p": self.top_p,
             "penalty_score": self.penalty_score,
         }
-        logger.info("###BaidubceAI chat request INFO, url={}, ques={}, body={}.", chat_url, prompt, body)
-        response = requests.post(url=chat_url, data=json.dumps(body), headers=headers)
-        response_json = response.json()
-        logger.info("###BaidubceAI chat request INFO, response={}.", response_json)
+        response_json = self._post_chat(prompt=prompt, body=body)
+        # AccessToken失效(缓存期内被吊销或提前过期)时刷新后重试一次
+        if response_json.get("error_code") in BAIDUBCE_TOKEN_ERROR_CODES:
+            logger.warning("###BaidubceAI chat request WARN, access_token失效, 刷新后重试, response={}.", response_json)
+            invalidate_baidubce_access_token(self.access_token_url)
+            response_json = self._post_chat(prompt=prompt, body=body)
         # 千帆业务异常
         if "error_code" in response_json:
             logger.error("###BaidubceAI chat request ERROR, code={}, message={}.", ERROR_10902, response_json)
@@ -74,6 +64,22 @@ class BaidubceAI(LLM):
             return BAIDUBCE_SECURE_ANSWER
         return response_json["result"]
 
+    def _post_chat(
+            self,
+            prompt: str,
+            body: Dict,
+    ) -> Dict:
+        access_token = get_baidubce_access_token(access_token_url=self.access_token_url)
+        chat_url = self.chat_url.replace("{access_token}", access_token)
+        headers = {
+            'Content-Type': 'application/json',
+        }
+        logger.info("###BaidubceAI chat request INFO, url={}, ques={}, body={}.", self.chat_url, prompt, body)
+        response = get_http_session().post(url=chat_url, data=json.dumps(body), headers=headers)
+        response_json = response.json()
+        logger.info("###BaidubceAI chat request INFO, response={}.", response_json)
+        return response_json
+
     def _get_messages(
             self,
             prompt: str,
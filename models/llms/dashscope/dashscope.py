@@ -4,16 +4,16 @@ import uuid
 from random import randint
 from typing import Any, List, Optional, Iterator, Mapping
 
-import requests
 from langchain.callbacks.manager import CallbackManagerForLLMRun
 from langchain.llms.base import LLM
 from langchain_core.outputs import GenerationChunk
 from loguru import logger
-from openai import OpenAI
 
 from config.base_config import DEFAULT_CHAT_BOT_ROLE
 from config.base_config_dashscope import *
 from config.base_config_model_type import MODEL_TYPE_VL
+from models.llms.llm_client_registry import get_openai_client, get_http_session
+from models.llms.llm_stream_chunk import generation_data
 
 
 class DashScopeAI(LLM):
@@ -76,7 +76,7 @@ class DashScopeAI(LLM):
         常规推理
         :return: 推理结果
         """
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        client = get_openai_client(base_url=self.base_url, api_key=self.api_key)
         messages = self._get_message_list(prompt=prompt)
         logger.info("#############Request {} LLMs Call INFO, request_id={}, url={}, params={}, message={}.",
                     self._llm_type, self.request_id, self.base_url, self._default_params, messages)
@@ -133,7 +133,7 @@ class DashScopeAI(LLM):
         logger.info("#############Request {} LLMs Stream INFO, request_id={}, url={}, headers={}, json={}.",
                     self._llm_type, self.request_id, url, headers, request_json)
         start_time = time.time()
-        response = requests.post(url=url, headers=headers, json=request_json, stream=True)
+        response = get_http_session().post(url=url, headers=headers, json=request_json, stream=True)
         response_usage = None
         response_content = ""
         reasoning_content = ""
@@ -157,7 +157,7 @@ class DashScopeAI(LLM):
                 }
             data = None
             if response_usage is not None:
-                data = {"thinking": "", "content": "", "usage": response_usage}
+                data = generation_data(usage=response_usage)
             message = choices[0].get("message")
             if message is not None:
                 # 思考过程
@@ -170,9 +170,11 @@ class DashScopeAI(LLM):
                 else:
                     content = message.get("content", "")
                 response_content += content
-                data = {"thinking": reasoning, "content": content, "usage": response_usage}
+                data = generation_data(content=content, thinking=reasoning, usage=response_usage)
+            if data is None:
+                continue
             yield GenerationChunk(
-                text=json.dumps(data, ensure_ascii=False, indent=4),
+                text=data["content"],
                 generation_info=data
             )
             logger.info("#############Request {} LLMs Stream INFO, request_id={}, processTime={}, content=[{}], "
@@ -1,5 +1,3 @@
-import json
-import random
 import time
 import uuid
 from typing import Any, List, Optional, Iterator, Mapping
@@ -7,10 +5,20 @@ from langchain.callbacks.manager import CallbackManagerForLLMRun
 from langchain.llms.base import LLM
 from langchain_core.outputs import GenerationChunk
 from loguru import logger
-from openai import OpenAI
 
 from config.base_config import DEFAULT_CHAT_BOT_ROLE
 from config.base_config_deepseek import *
+from models.llms.llm_client_registry import get_openai_client
+from models.llms.llm_key_scheduler import KeyScheduler, get_key_scheduler
+from models.llms.llm_stream_chunk import generation_data
+
+
+def get_deepseek_key_scheduler() -> KeyScheduler:
+    """
+    DeepSeek密钥调度器(按DEEPSEEK_API_KEY_POOL的密钥与权重)
+    :return: 调度器
+    """
+    return get_key_scheduler(provider="deepseek", api_keys=DEEPSEEK_API_KEY_POOL[0], weights=DEEPSEEK_API_KEY_POOL[1])
 
 
 class DeepseekAI(LLM):
@@ -55,8 +63,6 @@ class DeepseekAI(LLM):
         常规推理
         :return: 推理结果
         """
-        api_key = random.choices(DEEPSEEK_API_KEY_POOL[0], DEEPSEEK_API_KEY_POOL[1], k=1)[0]
-        client = OpenAI(api_key=api_key, base_url=self.url)
         messages = [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt},
@@ -68,7 +74,10 @@ class DeepseekAI(LLM):
         logger.info("#############Request {} LLMs Call INFO, request_id={}, url={}, params={}, message={}, extra_body={}.",
                     self._llm_type, self.request_id, self.url, self._default_params, messages, extra_body)
         start_time = time.time()
-        response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=False, **self._default_params)
+        with get_deepseek_key_scheduler().lease() as lease:
+            client = get_openai_client(base_url=self.url, api_key=lease.api_key)
+            response = client.chat.completions.create(messages=messages, extra_body=extra_body, stream=False, **self._default_params)
+            lease.record_usage(response.usage)
         logger.info("#############Request {} LLMs Call INFO, request_id={}, processTime={}, response={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response)
         return response.choices[0].message.content
@@ -84,8 +93,6 @@ class DeepseekAI(LLM):
         流式推理
         :return: 推理结果
         """
-        api_key = random.choices(DEEPSEEK_API_KEY_POOL[0], DEEPSEEK_API_KEY_POOL[1], k=1)[0]
-        client = OpenAI(api_key=api_key, base_url=self.url)
         messages = [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt},
@@ -97,15 +104,18 @@ class DeepseekAI(LLM):
         logger.info("#############Request {} LLMs Stream INFO, request_id={}, url={}, params={}, message={}, extra_body={}.",
                     self._llm_type, self.request_id, self.url, self._default_params, messages, extra_body)
         start_time = time.time()
-        stream = client.chat.completions.create(
-            messages=messages,
-            extra_body = extra_body,
-            stream=True,
-            **self._default_params,
-        )
+        lease = get_deepseek_key_scheduler().lease()
+        with lease.guard():
+            client = get_openai_client(base_url=self.url, api_key=lease.api_key)
+            stream = client.chat.completions.create(
+                messages=messages,
+                extra_body = extra_body,
+                stream=True,
+                **self._default_params,
+            )
         response_usage = None
         response_content = ""
-        for chunk in stream:
+        for chunk in lease.wrap_stream(stream):
             if not chunk:
                 continue
             response_usage = {
@@ -114,10 +124,9 @@ class DeepseekAI(LLM):
                 "output_tokens": getattr(chunk.usage, 'completion_tokens', 0),
             } if chunk.choices[0].finish_reason == 'stop' else None
             response_content = response_content + chunk.choices[0].delta.content
-            data = {"thinking": "", "content": chunk.choices[0].delta.content, "usage": response_usage}
             yield GenerationChunk(
-                text=json.dumps(data),
-                generation_info=data
+                text=chunk.choices[0].delta.content or "",
+                generation_info=generation_data(content=chunk.choices[0].delta.content, usage=response_usage)
             )
         logger.info("#############Request {} LLMs Stream INFO, request_id={}, processTime={}, content=[{}], usage={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response_content, response_usage)
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from loguru import logger
+from openai import AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+
+from config.base_config import (
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_CONNECT_TIMEOUT,
+    LLM_HTTP_READ_TIMEOUT,
+    LLM_HTTP2_ENABLED,
+    BAIDUBCE_TOKEN_REFRESH_MARGIN)
+from framework.business_code import ERROR_10901
+from framework.business_except import BusinessException
+
+try:
+    import h2  # noqa: F401, 可选, httpx启用HTTP/2所需
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+"""
+大模型客户端注册表: (base_url, api_key) -> 进程内共享的OpenAI客户端
+客户端底层为调优后的httpx连接池(长连接复用, 可选HTTP/2), 避免每次调用重新建立TCP/TLS连接;
+异步客户端的连接池绑定事件循环, 按事件循环分别缓存
+"""
+_clients: Dict[Tuple[Optional[str], str], OpenAI] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Optional[str], str], AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# 千帆AccessToken缓存: access_token_url -> (access_token, 过期时间戳)
+_baidubce_tokens: Dict[str, Tuple[str, float]] = {}
+_baidubce_token_lock = threading.Lock()
+# 千帆AccessToken无效或过期的错误码
+BAIDUBCE_TOKEN_ERROR_CODES = (110, 111)
+
+
+def _http2_enabled() -> bool:
+    if LLM_HTTP2_ENABLED and not HTTP2_AVAILABLE:
+        logger.warning("###LlmClientRegistry WARN, 未安装h2, HTTP/2退化为HTTP/1.1.")
+        return False
+    return bool(LLM_HTTP2_ENABLED)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_HTTP_READ_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT)
+
+
+def get_openai_client(
+        base_url: Optional[str],
+        api_key: str,
+) -> OpenAI:
+    """
+    获取进程内共享的同步客户端
+    :param base_url: 服务地址(为空时使用OpenAI默认地址)
+    :param api_key: API密钥
+    :return: 客户端
+    """
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                http_client = httpx.Client(limits=_limits(), timeout=_timeout(), http2=_http2_enabled())
+                client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+                _clients[key] = client
+                logger.info("###LlmClientRegistry INFO, 创建同步客户端, base_url={}.", base_url)
+    return client
+
+
+def get_async_openai_client(
+        base_url: Optional[str],
+        api_key: str,
+) -> AsyncOpenAI:
+    """
+    获取当前事件循环内共享的异步客户端
+    :param base_url: 服务地址(为空时使用OpenAI默认地址)
+    :param api_key: API密钥
+    :return: 客户端
+    """
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key)
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout(), http2=_http2_enabled())
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            clients[key] = client
+            logger.info("###LlmClientRegistry INFO, 创建异步客户端, base_url={}.", base_url)
+    return client
+
+
+def get_http_session() -> requests.Session:
+    """
+    获取进程内共享的长连接Session(DashScope原生流式接口、千帆接口)
+    :return: Session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=LLM_HTTP_MAX_KEEPALIVE, pool_maxsize=LLM_HTTP_MAX_CONNECTIONS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_baidubce_access_token(
+        access_token_url: str,
+        request_id: str = None,
+        force_refresh: bool = False,
+) -> str:
+    """
+    获取千帆AccessToken(缓存至过期前BAIDUBCE_TOKEN_REFRESH_MARGIN秒)
+    :param access_token_url: token请求地址
+    :param request_id: 请求唯一标识
+    :param force_refresh: 是否强制刷新(接口返回token无效或过期时)
+    :return: AccessToken
+    """
+    cached = _baidubce_tokens.get(access_token_url)
+    if not force_refresh and cached and cached[1] > time.time():
+        return cached[0]
+    with _baidubce_token_lock:
+        cached = _baidubce_tokens.get(access_token_url)
+        if not force_refresh and cached and cached[1] > time.time():
+            return cached[0]
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        logger.info("###LlmClientRegistry get_baidubce_access_token INFO, request_id={}, url={}.", request_id,
+                    access_token_url)
+        response = get_http_session().post(url=access_token_url, data="", headers=headers,
+                                           timeout=(LLM_HTTP_CONNECT_TIMEOUT, LLM_HTTP_READ_TIMEOUT))
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if "error" in data or "access_token" not in data:
+            logger.error("###LlmClientRegistry get_baidubce_access_token ERROR, request_id={}, code={}, message={}.",
+                         request_id, ERROR_10901, response.text)
+            raise BusinessException(ERROR_10901.code, ERROR_10901.message)
+        access_token = str(data["access_token"])
+        expires_in = int(data.get("expires_in") or 0)
+        _baidubce_tokens[access_token_url] = (access_token,
+                                              time.time() + max(0, expires_in - BAIDUBCE_TOKEN_REFRESH_MARGIN))
+        logger.info("###LlmClientRegistry get_baidubce_access_token INFO, request_id={}, expires_in={}.", request_id,
+                    expires_in)
+        return access_token
+
+
+def invalidate_baidubce_access_token(access_token_url: str):
+    """
+    清除千帆AccessToken缓存
+    :param access_token_url: token请求地址
+    """
+    with _baidubce_token_lock:
+        _baidubce_tokens.pop(access_token_url, None)
+
+
+def _pool_stats(http_client) -> Dict:
+    """
+    统计httpx客户端连接池占用(读取httpcore连接池状态, 版本不兼容时仅返回配置)
+    """
+    stats = {
+        "max_connections": LLM_HTTP_MAX_CONNECTIONS,
+        "max_keepalive": LLM_HTTP_MAX_KEEPALIVE,
+        "closed": http_client.is_closed,
+    }
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return stats
+    idle = sum(1 for conn in connections if conn.is_idle())
+    http2 = sum(1 for conn in connections if getattr(conn, "_connection", None).__class__.__name__ == "HTTP2Connection")
+    stats.update({
+        "connections": len(connections),
+        "active": len(connections) - idle,
+        "idle": idle,
+        "http2": http2,
+        "requests": len(getattr(pool, "_requests", [])),
+    })
+    return stats
+
+
+def _mask(api_key: str) -> str:
+    return f"{api_key[:6]}***{api_key[-4:]}" if api_key and len(api_key) > 10 else "***"
+
+
+def get_pool_metrics() -> Dict:
+    """
+    大模型客户端连接池指标
+    :return: 各客户端连接数、活跃/空闲连接数、排队中的请求数
+    """
+    with _clients_lock:
+        sync_clients = list(_clients.items())
+        async_clients = [(key, client) for clients in list(_async_clients.values()) for key, client in clients.items()]
+    metrics = {
+        "http2_enabled": _http2_enabled(),
+        "sync": [dict(base_url=base_url, api_key=_mask(api_key), **_pool_stats(client._client))
+                 for (base_url, api_key), client in sync_clients],
+        "async": [dict(base_url=base_url, api_key=_mask(api_key), **_pool_stats(client._client))
+                  for (base_url, api_key), client in async_clients],
+        "baidubce_tokens": {url.split("?")[0]: max(0, int(expire_at - time.time()))
+                            for url, (_, expire_at) in list(_baidubce_tokens.items())},
+    }
+    return metrics
+
+
+async def close_clients():
+    """
+    关闭全部客户端连接池(应用停止时调用)
+    """
+    with _clients_lock:
+        sync_clients = list(_clients.values())
+        _clients.clear()
+        # 其他事件循环的连接池无法在当前循环中关闭, 随事件循环回收
+        async_clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+        _async_clients.clear()
+    for client in sync_clients:
+        client.close()
+    for client in async_clients:
+        try:
+            await client.close()
+        except Exception as err:
+            logger.warning("###LlmClientRegistry WARN, 关闭异步客户端失败, err={}.", err)
@@ -0,0 +1,417 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from loguru import logger
+
+from config.base_config import (
+    LLM_KEY_COOLDOWN_SECONDS,
+    LLM_KEY_COOLDOWN_MAX_SECONDS,
+    LLM_KEY_FAILURE_THRESHOLD,
+    LLM_KEY_TPM_LIMIT,
+    LLM_KEY_SYNC_ENABLED,
+    LLM_KEY_SYNC_INTERVAL_MS)
+from framework.redis.redis_client import RedisClient
+from framework.redis.redis_lock import default_owner
+
+# 延迟/错误率指数滑动平均系数
+EWMA_ALPHA = 0.2
+# 尚无延迟样本时的默认延迟(秒)
+DEFAULT_LATENCY = 1.0
+# 进程快照超过该时间未刷新视为进程已退出(毫秒)
+SNAPSHOT_STALE_MS = 10000
+# 集群状态哈希表过期时间(秒)
+STATE_EXPIRE_SECONDS = 86400
+
+
+class KeyState:
+    """
+    单个API密钥的运行状态(本进程)
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            weight: float,
+    ):
+        self.api_key = api_key
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        self.weight = max(float(weight), 0.01)
+        self.in_flight = 0
+        self.latency = DEFAULT_LATENCY
+        self.error_rate = 0.0
+        self.failures = 0
+        self.throttles = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.tokens_minute = 0
+        self.tokens = 0
+        self.total_tokens = 0
+        # 其他进程的占用(集群同步)
+        self.remote_in_flight = 0
+        self.remote_tokens = 0
+        self.remote_cooldown_until = 0.0
+
+    def add_tokens(self, tokens: int):
+        minute = int(time.time() // 60)
+        if minute != self.tokens_minute:
+            self.tokens_minute, self.tokens = minute, 0
+        self.tokens += tokens
+        self.total_tokens += tokens
+
+    def minute_tokens(self) -> int:
+        local = self.tokens if self.tokens_minute == int(time.time() // 60) else 0
+        return local + self.remote_tokens
+
+
+class KeyLease:
+    """
+    API密钥租约: 请求期间占用密钥, 结束时上报结果
+    常规请求: with scheduler.lease() as lease, 以lease.api_key发起请求并lease.record_usage(response.usage);
+    流式请求: 在lease.guard()内发起请求, 以lease.wrap_stream/wrap_astream迭代响应, 迭代结束时释放;
+    抛出的异常按类型记为限流或失败, 调用方取消(GeneratorExit、CancelledError)只释放不计入健康状态
+    """
+
+    def __init__(
+            self,
+            scheduler: "KeyScheduler",
+            state: KeyState,
+    ):
+        self.scheduler = scheduler
+        self.state = state
+        self.api_key = state.api_key
+        self.start_time = time.time()
+        self.first_token_time: Optional[float] = None
+        self.tokens = 0
+        self.released = False
+
+    def first_token(self):
+        if self.first_token_time is None:
+            self.first_token_time = time.time()
+
+    def record_usage(self, usage):
+        """
+        记录用量
+        :param usage: 响应中的usage(对象或字典)
+        """
+        if usage is None:
+            return
+        total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+        self.tokens = int(total or 0)
+
+    @contextmanager
+    def guard(self):
+        """
+        发起流式请求期间异常时释放租约
+        """
+        try:
+            yield self
+        except BaseException as err:
+            self.release(err=err)
+            raise
+
+    def wrap_stream(self, stream) -> Iterator:
+        """
+        迭代流式响应, 记录首个分片延迟与用量, 迭代结束时释放租约
+        :param stream: 流式响应
+        :return: 响应分片
+        """
+        try:
+            for chunk in stream:
+                self._on_chunk(chunk)
+                yield chunk
+        except BaseException as err:
+            self.release(err=err)
+            raise
+        self.release()
+
+    async def wrap_astream(self, stream) -> AsyncIterator:
+        """
+        异步迭代流式响应, 记录首个分片延迟与用量, 迭代结束时释放租约
+        :param stream: 流式响应
+        :return: 响应分片
+        """
+        try:
+            async for chunk in stream:
+                self._on_chunk(chunk)
+                yield chunk
+        except BaseException as err:
+            self.release(err=err)
+            raise
+        self.release()
+
+    def _on_chunk(self, chunk):
+        self.first_token()
+        usage = chunk.get("usage") if isinstance(chunk, dict) else getattr(chunk, "usage", None)
+        if usage:
+            self.record_usage(usage)
+
+    def release(self, err: BaseException = None):
+        if self.released:
+            return
+        self.released = True
+        latency = (self.first_token_time or time.time()) - self.start_time
+        self.scheduler.release(self, err=err, latency=latency)
+
+    def __enter__(self) -> "KeyLease":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release(err=exc_val)
+        return False
+
+
+class KeyScheduler:
+    """
+    API密钥调度器
+    在健康的密钥中选择负载最低者(并发数、近期延迟、错误率加权), 限流(429)的密钥按指数退避冷却, 连续失败(5xx、超时)的密钥同样冷却;
+    开启集群同步时, 后台线程定期将本进程的并发数、分钟用量及新的冷却状态写入Redis并读取其他进程的占用与冷却状态, 按全局负载选择密钥;
+    选择与释放密钥只读写内存状态, 不在请求路径(包括异步请求的事件循环)上访问Redis
+    """
+
+    def __init__(
+            self,
+            provider: str,
+            api_keys: Sequence[str],
+            weights: Sequence[float] = None,
+    ):
+        """
+        构造函数
+        :param provider: 服务商标识
+        :param api_keys: 密钥列表
+        :param weights: 密钥权重(额度比例)
+        """
+        weights = list(weights) if weights else [1.0] * len(api_keys)
+        self.provider = provider
+        self.states: List[KeyState] = [KeyState(api_key, weight) for api_key, weight in zip(api_keys, weights)]
+        self.owner = default_owner()
+        self.redis_key = f"llm:keys:{provider}"
+        self._lock = threading.Lock()
+        # 待同步的冷却状态: 密钥ID -> 冷却截止时间(毫秒)
+        self._pending_cooldowns: Dict[str, int] = {}
+        self._wakeup = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+
+    def _score(self, state: KeyState) -> float:
+        load = state.in_flight + state.remote_in_flight + 1
+        return load * max(state.latency, 0.05) * (1 + 4 * state.error_rate) / state.weight
+
+    def _cooling(self, state: KeyState, now: float) -> bool:
+        return max(state.cooldown_until, state.remote_cooldown_until) > now
+
+    def _saturated(self, state: KeyState) -> bool:
+        return LLM_KEY_TPM_LIMIT > 0 and state.minute_tokens() >= LLM_KEY_TPM_LIMIT * state.weight
+
+    def lease(self) -> KeyLease:
+        """
+        选择密钥并占用
+        :return: 密钥租约
+        """
+        self._start_syncer()
+        now = time.time()
+        with self._lock:
+            candidates = [s for s in self.states if not self._cooling(s, now) and not self._saturated(s)] or \
+                         [s for s in self.states if not self._cooling(s, now)]
+            if candidates:
+                state = min(candidates, key=self._score)
+            else:
+                # 全部冷却中时选择最早恢复的密钥, 不阻塞请求
+                state = min(self.states, key=lambda s: max(s.cooldown_until, s.remote_cooldown_until))
+                logger.warning("###KeyScheduler WARN, 全部密钥冷却中, provider={}, key_id={}.", self.provider,
+                               state.key_id)
+            state.in_flight += 1
+            state.requests += 1
+        return KeyLease(self, state)
+
+    def release(
+            self,
+            lease: KeyLease,
+            err: BaseException = None,
+            latency: float = 0.0,
+    ):
+        """
+        释放密钥并记录请求结果
+        :param lease: 密钥租约
+        :param err: 异常(成功时为空)
+        :param latency: 请求延迟(流式请求为首个分片延迟)
+        """
+        state = lease.state
+        status = error_status_code(err)
+        cooldown = 0.0
+        with self._lock:
+            state.in_flight = max(0, state.in_flight - 1)
+            if lease.tokens:
+                state.add_tokens(lease.tokens)
+            if err is None:
+                state.latency += EWMA_ALPHA * (latency - state.latency)
+                state.error_rate *= 1 - EWMA_ALPHA
+                state.failures = 0
+                state.throttles = 0
+            elif isinstance(err, (GeneratorExit, asyncio.CancelledError)):
+                # 调用方主动取消(客户端断开等), 不计入密钥健康状态
+                pass
+            elif status == 429:
+                state.throttled += 1
+                state.throttles += 1
+                state.error_rate += EWMA_ALPHA * (1 - state.error_rate)
+                cooldown = _retry_after(err) or min(LLM_KEY_COOLDOWN_SECONDS * 2 ** (state.throttles - 1),
+                                                    LLM_KEY_COOLDOWN_MAX_SECONDS)
+            elif status is None or status >= 500:
+                state.errors += 1
+                state.failures += 1
+                state.error_rate += EWMA_ALPHA * (1 - state.error_rate)
+                if state.failures >= LLM_KEY_FAILURE_THRESHOLD:
+                    cooldown = min(LLM_KEY_COOLDOWN_SECONDS * 2 ** (state.failures - LLM_KEY_FAILURE_THRESHOLD),
+                                   LLM_KEY_COOLDOWN_MAX_SECONDS)
+            if cooldown:
+                state.cooldown_until = max(state.cooldown_until, time.time() + cooldown)
+                if LLM_KEY_SYNC_ENABLED:
+                    self._pending_cooldowns[state.key_id] = int(state.cooldown_until * 1000)
+        if cooldown:
+            logger.warning("###KeyScheduler WARN, 密钥进入冷却, provider={}, key_id={}, status={}, cooldown={}s, err={}.",
+                           self.provider, state.key_id, status, cooldown, err)
+            # 唤醒后台线程尽快发布冷却状态
+            self._wakeup.set()
+
+    def _start_syncer(self):
+        """
+        首次调度时启动集群同步后台线程
+        """
+        if not LLM_KEY_SYNC_ENABLED or self._syncer is not None:
+            return
+        with self._lock:
+            if self._syncer is not None:
+                return
+            self._syncer = threading.Thread(target=self._sync_loop, name=f"key-sync-{self.provider}", daemon=True)
+        self._syncer.start()
+
+    def _sync_loop(self):
+        while True:
+            self._sync()
+            self._wakeup.wait(LLM_KEY_SYNC_INTERVAL_MS / 1000)
+            self._wakeup.clear()
+
+    def _sync(self):
+        """
+        与其他进程同步密钥占用与冷却状态(仅在后台线程执行, 失败时退化为本进程调度)
+        """
+        with self._lock:
+            cooldowns_pending, self._pending_cooldowns = self._pending_cooldowns, {}
+        try:
+            now_ms = int(time.time() * 1000)
+            minute = int(time.time() // 60)
+            with self._lock:
+                snapshot = {s.key_id: [s.in_flight, s.tokens if s.tokens_minute == minute else 0] for s in self.states}
+            redis_client = RedisClient()
+            for key_id, cooldown_until in cooldowns_pending.items():
+                redis_client.set_hash_by_key(self.redis_key, f"cooldown:{key_id}", cooldown_until)
+            redis_client.set_hash_by_key(self.redis_key, f"owner:{self.owner}",
+                                         json.dumps({"ts": now_ms, "minute": minute, "keys": snapshot}))
+            redis_client.expire(self.redis_key, STATE_EXPIRE_SECONDS)
+            fields = redis_client.get_hash(self.redis_key) or {}
+            remote_in_flight: Dict[str, int] = {}
+            remote_tokens: Dict[str, int] = {}
+            cooldowns: Dict[str, float] = {}
+            for field, value in fields.items():
+                if field.startswith("cooldown:"):
+                    cooldowns[field[len("cooldown:"):]] = int(value) / 1000
+                elif field.startswith("owner:") and field != f"owner:{self.owner}":
+                    data = json.loads(value)
+                    if now_ms - int(data.get("ts", 0)) > SNAPSHOT_STALE_MS:
+                        continue
+                    for key_id, (in_flight, tokens) in data.get("keys", {}).items():
+                        remote_in_flight[key_id] = remote_in_flight.get(key_id, 0) + int(in_flight)
+                        if data.get("minute") == minute:
+                            remote_tokens[key_id] = remote_tokens.get(key_id, 0) + int(tokens)
+            with self._lock:
+                for s in self.states:
+                    s.remote_in_flight = remote_in_flight.get(s.key_id, 0)
+                    s.remote_tokens = remote_tokens.get(s.key_id, 0)
+                    s.remote_cooldown_until = cooldowns.get(s.key_id, 0.0)
+        except Exception as err:
+            logger.warning("###KeyScheduler WARN, 同步集群密钥状态失败, provider={}, err={}.", self.provider, err)
+            # 未发布的冷却状态留到下次同步
+            with self._lock:
+                for key_id, cooldown_until in cooldowns_pending.items():
+                    self._pending_cooldowns[key_id] = max(cooldown_until, self._pending_cooldowns.get(key_id, 0))
+
+    def metrics(self) -> List[Dict]:
+        """
+        密钥调度指标
+        :return: 各密钥并发数、延迟、错误率、冷却剩余时间与用量
+        """
+        now = time.time()
+        with self._lock:
+            return [{
+                "key_id": s.key_id,
+                "weight": s.weight,
+                "in_flight": s.in_flight,
+                "remote_in_flight": s.remote_in_flight,
+                "latency": round(s.latency, 3),
+                "error_rate": round(s.error_rate, 3),
+                "cooldown": round(max(0.0, max(s.cooldown_until, s.remote_cooldown_until) - now), 1),
+                "requests": s.requests,
+                "throttled": s.throttled,
+                "errors": s.errors,
+                "minute_tokens": s.minute_tokens(),
+                "total_tokens": s.total_tokens,
+            } for s in self.states]
+
+
+def error_status_code(err: BaseException) -> Optional[int]:
+    if err is None:
+        return None
+    status = getattr(err, "status_code", None)
+    if status is None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+    return int(status) if status is not None else None
+
+
+def _retry_after(err: BaseException) -> Optional[float]:
+    headers = getattr(getattr(err, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except ValueError:
+        return None
+
+
+_schedulers: Dict[str, KeyScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_key_scheduler(
+        provider: str,
+        api_keys: Sequence[str],
+        weights: Sequence[float] = None,
+) -> KeyScheduler:
+    """
+    获取进程内共享的密钥调度器
+    :param provider: 服务商标识
+    :param api_keys: 密钥列表
+    :param weights: 密钥权重
+    :return: 调度器
+    """
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(provider)
+            if scheduler is None:
+                scheduler = KeyScheduler(provider=provider, api_keys=api_keys, weights=weights)
+                _schedulers[provider] = scheduler
+    return scheduler
+
+
+def get_key_metrics() -> Dict[str, List[Dict]]:
+    """
+    全部服务商的密钥调度指标
+    :return: 服务商 -> 各密钥指标
+    """
+    with _schedulers_lock:
+        schedulers = list(_schedulers.items())
+    return {provider: scheduler.metrics() for provider, scheduler in schedulers}
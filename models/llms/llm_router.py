@@ -0,0 +1,458 @@
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import LLM, BaseLLM
+from langchain_core.outputs import GenerationChunk
+from loguru import logger
+
+from config.base_config import LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_OPEN_SECONDS, LLM_ROUTE_HEDGE_MS
+from models.llms.llm_key_scheduler import error_status_code
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    服务商熔断器
+    连续失败达到阈值后熔断, 熔断期间不再向该服务商发起请求; 到期后进入半开状态放行一次探测请求, 成功则恢复, 失败则重新熔断;
+    探测请求未得出结果(客户端断开、请求被取消、请求本身错误)时释放探测, 超过open_seconds仍未释放的探测视为失效
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+            open_seconds: float = LLM_BREAKER_OPEN_SECONDS,
+    ):
+        """
+        构造函数
+        :param name: 服务商标识
+        :param failure_threshold: 熔断失败次数
+        :param open_seconds: 熔断持续时间(秒)
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_at = 0.0
+        self.total_failures = 0
+        self.total_opens = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        是否放行请求(半开状态下只放行一次探测请求)
+        :return: 是否放行
+        """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.time() - self.opened_at >= self.open_seconds:
+                self.state = BREAKER_HALF_OPEN
+                self.probing = False
+            if self.state == BREAKER_HALF_OPEN and (not self.probing or
+                                                   time.time() - self.probe_at >= self.open_seconds):
+                self.probing = True
+                self.probe_at = time.time()
+                return True
+            return False
+
+    def release(self):
+        """
+        释放探测请求(请求未得出成功或失败的结果, 不改变熔断状态)
+        """
+        with self._lock:
+            self.probing = False
+
+    def success(self):
+        with self._lock:
+            if self.state != BREAKER_CLOSED:
+                logger.info("###CircuitBreaker INFO, 服务商恢复, name={}.", self.name)
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def failure(self, err: BaseException = None):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.probing = False
+            if self.state == BREAKER_HALF_OPEN or (self.state == BREAKER_CLOSED and
+                                                   self.failures >= self.failure_threshold):
+                self.state = BREAKER_OPEN
+                self.opened_at = time.time()
+                self.total_opens += 1
+                logger.warning("###CircuitBreaker WARN, 服务商熔断, name={}, failures={}, open_seconds={}, err={}.",
+                               self.name, self.failures, self.open_seconds, err)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "open_remaining": round(max(0.0, self.opened_at + self.open_seconds - time.time()), 1)
+                if self.state == BREAKER_OPEN else 0,
+                "total_failures": self.total_failures,
+                "total_opens": self.total_opens,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    获取进程内共享的服务商熔断器
+    :param name: 服务商标识
+    :return: 熔断器
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name=name)
+                _breakers[name] = breaker
+    return breaker
+
+
+def get_breaker_metrics() -> Dict[str, Dict]:
+    """
+    全部服务商熔断状态
+    :return: 服务商 -> 熔断状态
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {name: breaker.metrics() for name, breaker in breakers}
+
+
+class LlmRoute:
+    """
+    路由目标: 服务商与对应的模型实例
+    """
+
+    def __init__(
+            self,
+            provider: str,
+            model: Any,
+    ):
+        self.provider = provider
+        self.model = model
+        self.breaker = get_circuit_breaker(provider)
+
+    def __repr__(self) -> str:
+        return f"LlmRoute({self.provider})"
+
+
+def is_caller_error(err: BaseException) -> bool:
+    """
+    是否为请求本身的错误(参数错误、内容审核等4xx, 不含超时与限流), 此类错误不计入熔断也不切换服务商
+    """
+    status = error_status_code(err)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class RouteSelector:
+    """
+    按顺序选择熔断器放行的路由; 全部熔断时仍选择首个路由, 不直接拒绝请求
+    """
+
+    def __init__(
+            self,
+            routes: List[LlmRoute],
+    ):
+        self.routes = routes
+        self.index = 0
+        self.started = 0
+        self.errors: List[BaseException] = []
+
+    def next(self) -> Optional[LlmRoute]:
+        while self.index < len(self.routes):
+            route = self.routes[self.index]
+            self.index += 1
+            if route.breaker.allow():
+                self.started += 1
+                return route
+            logger.info("###LlmRouter INFO, 服务商熔断中, 跳过, provider={}.", route.provider)
+        if self.started == 0 and self.routes:
+            self.started += 1
+            return self.routes[0]
+        return None
+
+    def failed(self, route: LlmRoute, err: BaseException):
+        """
+        记录路由失败, 请求本身的错误直接抛出
+        """
+        if is_caller_error(err):
+            route.breaker.release()
+            raise err
+        route.breaker.failure(err)
+        self.errors.append(err)
+        logger.warning("###LlmRouter WARN, 服务商请求失败, 切换下一个服务商, provider={}, err={}.", route.provider, err)
+
+    def raise_last(self):
+        if self.errors:
+            raise self.errors[-1]
+        raise RuntimeError("no available llm route")
+
+
+def call_with_fallback(
+        routes: List[LlmRoute],
+        call: Callable[[Any], Any],
+) -> Any:
+    """
+    按顺序调用路由, 失败时切换下一个
+    :param routes: 路由列表
+    :param call: 调用函数(模型实例) -> 结果
+    :return: 结果
+    """
+    selector = RouteSelector(routes)
+    while (route := selector.next()) is not None:
+        try:
+            result = call(route.model)
+        except Exception as err:
+            selector.failed(route, err)
+            continue
+        except BaseException:
+            route.breaker.release()
+            raise
+        route.breaker.success()
+        return result
+    selector.raise_last()
+
+
+async def acall_with_fallback(
+        routes: List[LlmRoute],
+        call: Callable[[Any], Awaitable[Any]],
+) -> Any:
+    """
+    按顺序异步调用路由, 失败时切换下一个
+    :param routes: 路由列表
+    :param call: 调用函数(模型实例) -> 结果
+    :return: 结果
+    """
+    selector = RouteSelector(routes)
+    while (route := selector.next()) is not None:
+        try:
+            result = await call(route.model)
+        except Exception as err:
+            selector.failed(route, err)
+            continue
+        except BaseException:
+            route.breaker.release()
+            raise
+        route.breaker.success()
+        return result
+    selector.raise_last()
+
+
+def stream_with_fallback(
+        routes: List[LlmRoute],
+        stream: Callable[[Any], Iterator],
+) -> Iterator:
+    """
+    按顺序流式调用路由, 首个分片前失败时切换下一个, 开始输出后的异常直接抛出
+    :param routes: 路由列表
+    :param stream: 流式调用函数(模型实例) -> 分片迭代器
+    :return: 分片
+    """
+    selector = RouteSelector(routes)
+    while (route := selector.next()) is not None:
+        iterator = iter(stream(route.model))
+        try:
+            first = next(iterator)
+        except StopIteration:
+            route.breaker.success()
+            return
+        except Exception as err:
+            selector.failed(route, err)
+            continue
+        try:
+            yield first
+            yield from iterator
+        except Exception as err:
+            _stream_failed(route, err)
+            raise
+        except BaseException:
+            # 客户端断开等, 结果未知
+            route.breaker.release()
+            raise
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        route.breaker.success()
+        return
+    selector.raise_last()
+
+
+async def astream_hedged(
+        routes: List[LlmRoute],
+        stream: Callable[[Any], AsyncIterator],
+        hedge_ms: int = LLM_ROUTE_HEDGE_MS,
+) -> AsyncIterator:
+    """
+    流式调用路由(对冲请求)
+    首个分片前失败时切换下一个; 开启对冲时, 超过hedge_ms未收到首个分片则同时向下一个服务商发起相同请求,
+    采用先输出首个分片者并取消其他请求(被取消的请求不计入熔断失败)
+    :param routes: 路由列表
+    :param stream: 流式调用函数(模型实例) -> 异步分片迭代器
+    :param hedge_ms: 对冲等待时间(毫秒, 0为不对冲)
+    :return: 分片
+    """
+    selector = RouteSelector(routes)
+    # 首个分片任务 -> (路由, 异步迭代器)
+    pending: Dict[asyncio.Future, tuple] = {}
+
+    def start() -> bool:
+        route = selector.next()
+        if route is None:
+            return False
+        iterator = stream(route.model).__aiter__()
+        pending[asyncio.ensure_future(iterator.__anext__())] = (route, iterator)
+        return True
+
+    winner, first, finished = None, None, False
+    try:
+        start()
+        while winner is None:
+            if not pending and not start():
+                selector.raise_last()
+            can_hedge = hedge_ms > 0 and selector.index < len(routes)
+            done, _ = await asyncio.wait(list(pending), timeout=hedge_ms / 1000 if can_hedge else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if start():
+                    logger.info("###LlmRouter INFO, {}ms内未收到首个分片, 发起对冲请求, routes={}.", hedge_ms,
+                                [route for route, _ in pending.values()])
+                continue
+            for task in done:
+                route, iterator = pending.pop(task)
+                try:
+                    first = task.result()
+                except StopAsyncIteration:
+                    winner, finished = (route, iterator), True
+                    break
+                except Exception as err:
+                    selector.failed(route, err)
+                    continue
+                winner = (route, iterator)
+                break
+    finally:
+        await _cancel_pending(pending)
+
+    route, iterator = winner
+    if finished:
+        route.breaker.success()
+        return
+    try:
+        yield first
+        async for chunk in iterator:
+            yield chunk
+    except Exception as err:
+        _stream_failed(route, err)
+        raise
+    except BaseException:
+        # 客户端断开、请求被取消等, 结果未知
+        route.breaker.release()
+        raise
+    finally:
+        await iterator.aclose()
+    route.breaker.success()
+
+
+def _stream_failed(route: LlmRoute, err: BaseException):
+    """
+    记录开始输出后的流式请求失败, 请求本身的错误只释放探测
+    """
+    if is_caller_error(err):
+        route.breaker.release()
+    else:
+        route.breaker.failure(err)
+
+
+async def _cancel_pending(pending: Dict[asyncio.Future, tuple]):
+    """
+    取消未胜出的请求并关闭迭代器, 释放其探测(慢于对冲等待时间不代表服务商故障, 不计入熔断失败)
+    """
+    if not pending:
+        return
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task, (route, iterator) in pending.items():
+        route.breaker.release()
+        logger.info("###LlmRouter INFO, 对冲请求已取消, provider={}.", route.provider)
+        try:
+            await iterator.aclose()
+        except Exception as err:
+            logger.warning("###LlmRouter WARN, 关闭请求失败, provider={}, err={}.", route.provider, err)
+    pending.clear()
+
+
+class RouterAI(LLM):
+    """
+    大语言模型路由: 按熔断状态在主服务商与备用服务商之间切换
+    """
+    routes: List[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "Router"
+
+    def _call(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> str:
+        """
+        常规推理
+        :return: 推理结果
+        """
+        return call_with_fallback(self.routes, lambda model: model._call(prompt, stop=stop, **kwargs))
+
+    def _stream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        流式推理
+        :return: 推理结果
+        """
+        for chunk in stream_with_fallback(self.routes, lambda model: _stream_route(model, prompt, stop, **kwargs)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _stream_route(
+        model: BaseLLM,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+) -> Iterator[GenerationChunk]:
+    """
+    流式调用单个服务商, 未实现流式推理的模型(如文心一言、智谱)改为常规推理并一次性输出,
+    避免未实现异常被计入熔断失败
+    :param model: 模型实例
+    :param prompt: 提示词
+    :param stop: 停止词
+    :return: 分片
+    """
+    if type(model)._stream == BaseLLM._stream:
+        yield GenerationChunk(text=model._call(prompt, stop=stop, **kwargs))
+        return
+    yield from model._stream(prompt, stop=stop, **kwargs)
@@ -0,0 +1,168 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain.llms.base import BaseLLM
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.load import dumpd
+from langchain_core.outputs import GenerationChunk, LLMResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableConfig, RunnableGenerator
+from langchain_core.runnables.config import ensure_config
+
+USAGE_KEYS = ("total_tokens", "input_tokens", "output_tokens")
+
+
+class LlmStreamChunk:
+    """
+    大模型流式分片(模型封装与问答服务之间的内部协议)
+    模型封装在GenerationChunk.generation_info中放入{"thinking", "content", "usage"}, text只放回复内容,
+    问答服务直接读取本对象, 不再逐个分片序列化/反序列化JSON
+    """
+    __slots__ = ("content", "thinking", "usage")
+
+    def __init__(
+            self,
+            content: str = "",
+            thinking: str = "",
+            usage: Optional[Dict[str, int]] = None,
+    ):
+        """
+        构造函数
+        :param content: 回复内容
+        :param thinking: 思考过程
+        :param usage: token用量(仅结束分片携带)
+        """
+        self.content = content or ""
+        self.thinking = thinking or ""
+        self.usage = usage
+
+    @property
+    def is_done(self) -> bool:
+        """
+        是否为结束分片(携带完整的token用量)
+        """
+        return bool(self.usage) and all(key in self.usage for key in USAGE_KEYS)
+
+    @classmethod
+    def from_generation(cls, chunk: GenerationChunk) -> "LlmStreamChunk":
+        """
+        由模型流式分片转换
+        :param chunk: 模型流式分片
+        :return: 内部分片
+        """
+        info = chunk.generation_info
+        if info and ("content" in info or "thinking" in info):
+            return cls(content=info.get("content"), thinking=info.get("thinking"), usage=info.get("usage"))
+        # 未按协议输出generation_info的模型, text即回复内容
+        return cls(content=chunk.text)
+
+    def __repr__(self) -> str:
+        return f"LlmStreamChunk(content={self.content!r}, thinking={self.thinking!r}, usage={self.usage})"
+
+
+def generation_data(content: str = "", thinking: str = "", usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    模型封装输出的分片数据(GenerationChunk.generation_info)
+    :param content: 回复内容
+    :param thinking: 思考过程
+    :param usage: token用量
+    :return: 分片数据
+    """
+    return {"thinking": thinking or "", "content": content or "", "usage": usage}
+
+
+def _done_chunk() -> LlmStreamChunk:
+    # 不输出token用量的模型, 流结束时补发结束分片(触发问答记录保存)
+    return LlmStreamChunk(usage={key: 0 for key in USAGE_KEYS})
+
+
+def _start_run(llm: BaseLLM, prompt: str, config: Optional[RunnableConfig], stop: Optional[List[str]]):
+    config = ensure_config(config)
+    callback_manager = CallbackManager.configure(
+        config.get("callbacks"), llm.callbacks, llm.verbose, config.get("tags"), llm.tags,
+        config.get("metadata"), llm.metadata,
+    )
+    (run_manager,) = callback_manager.on_llm_start(
+        dumpd(llm), [prompt], invocation_params={**llm.dict(), "stop": stop}, options={"stop": stop},
+        name=config.get("run_name"), batch_size=1,
+    )
+    return run_manager
+
+
+async def _astart_run(llm: BaseLLM, prompt: str, config: Optional[RunnableConfig], stop: Optional[List[str]]):
+    config = ensure_config(config)
+    callback_manager = AsyncCallbackManager.configure(
+        config.get("callbacks"), llm.callbacks, llm.verbose, config.get("tags"), llm.tags,
+        config.get("metadata"), llm.metadata,
+    )
+    (run_manager,) = await callback_manager.on_llm_start(
+        dumpd(llm), [prompt], invocation_params={**llm.dict(), "stop": stop}, options={"stop": stop},
+        name=config.get("run_name"), batch_size=1,
+    )
+    return run_manager
+
+
+def _llm_result(texts: List[str]) -> LLMResult:
+    # 分片的generation_info各模型格式不一, 合并时只拼接文本
+    return LLMResult(generations=[[GenerationChunk(text="".join(texts))]] if texts else [])
+
+
+def _to_prompt(prompt_value: Any) -> str:
+    return prompt_value.to_string() if isinstance(prompt_value, PromptValue) else str(prompt_value)
+
+
+def stream_chunks(llm: BaseLLM, stop: Optional[List[str]] = None) -> RunnableGenerator:
+    """
+    将大语言模型包装为输出LlmStreamChunk的流式节点(替代 llm | StrOutputParser())
+    与BaseLLM.stream流程一致(回调、stop参数、未实现流式的模型回退为invoke), 但保留分片的generation_info;
+    模型未输出token用量时在流结束后补发结束分片
+    :param llm: 大语言模型实例
+    :param stop: 停止词
+    :return: 流式节点, 输入为提示词, 输出为LlmStreamChunk
+    """
+
+    def transform(inputs: Iterator[PromptValue], config: RunnableConfig) -> Iterator[LlmStreamChunk]:
+        for prompt_value in inputs:
+            prompt = _to_prompt(prompt_value)
+            if type(llm)._stream == BaseLLM._stream:
+                # 未实现流式的模型(只实现_call), 整体输出
+                yield LlmStreamChunk(content=llm.invoke(prompt, config=config, stop=stop))
+                yield _done_chunk()
+                continue
+            run_manager = _start_run(llm, prompt, config, stop)
+            texts, done = [], False
+            try:
+                for chunk in llm._stream(prompt, stop=stop, run_manager=run_manager):
+                    texts.append(chunk.text)
+                    item = LlmStreamChunk.from_generation(chunk)
+                    done = done or item.is_done
+                    yield item
+            except BaseException as err:
+                run_manager.on_llm_error(err, response=_llm_result(texts))
+                raise
+            run_manager.on_llm_end(_llm_result(texts))
+            if not done:
+                yield _done_chunk()
+
+    async def atransform(inputs: AsyncIterator[PromptValue], config: RunnableConfig) -> AsyncIterator[LlmStreamChunk]:
+        async for prompt_value in inputs:
+            prompt = _to_prompt(prompt_value)
+            if type(llm)._astream == BaseLLM._astream and type(llm)._stream == BaseLLM._stream:
+                yield LlmStreamChunk(content=await llm.ainvoke(prompt, config=config, stop=stop))
+                yield _done_chunk()
+                continue
+            run_manager = await _astart_run(llm, prompt, config, stop)
+            texts, done = [], False
+            try:
+                async for chunk in llm._astream(prompt, stop=stop, run_manager=run_manager):
+                    texts.append(chunk.text)
+                    item = LlmStreamChunk.from_generation(chunk)
+                    done = done or item.is_done
+                    yield item
+            except BaseException as err:
+                await run_manager.on_llm_error(err, response=_llm_result(texts))
+                raise
+            await run_manager.on_llm_end(_llm_result(texts))
+            if not done:
+                yield _done_chunk()
+
+    return RunnableGenerator(transform, atransform, name=f"{llm._llm_type}Chunks")
@@ -1,4 +1,4 @@
-from typing import List, Any
+from typing import List, Any, Tuple
 
 from langchain.base_language import BaseLanguageModel
 
@@ -9,12 +9,14 @@ from config.base_config_dashscope import BASHSCOPE_MODEL_NAME, BASHSCOPE_BASE_UR
 from config.base_config_deepseek import DEEPSEEK_MODEL_NAME
 from config.base_config_model_type import MODEL_TYPE_TEXT
 from config.prod.prod_config_dashscope import PROD_BASHSCOPE_VL_URL
+from models.chatai.chat_router import ChatRouterAI
 from models.chatai.dashscope.chat_dashscop import ChatDashScopeAI
 from models.chatai.deepseek.chat_deepseek import ChatDeepseekAI
 from models.llms.baidubce.baidubce import BaidubceAI
 from models.llms.chatglm4.chatglm4 import ChatGlm4AI
 from models.llms.dashscope.dashscope import DashScopeAI
 from models.llms.deepseek.deepseek import DeepseekAI
+from models.llms.llm_router import LlmRoute, RouterAI
 from models.llms.openai.chatopenai import ChatOpenAI
 from service.domain.ai_chat_bot import ChatBotModel
 
@@ -28,14 +30,20 @@ class LLMsAdapter:
             self,
             model: str = CURRENT_LLM,
             model_name: str = None,
+            fallbacks: List[Tuple[str, str]] = None,
+            hedge_ms: int = LLM_ROUTE_HEDGE_MS,
     ):
         """
         构造函数
         :param model: 大语言模型
         :param model_name: 子模型名称
+        :param fallbacks: 备用模型(按顺序), [(大语言模型, 子模型名称)]
+        :param hedge_ms: 对冲等待时间(毫秒, 0为不对冲)
         """
         self.model = model if model else CURRENT_LLM
         self.model_name = model_name
+        self.fallbacks = [(m, n) for m, n in (fallbacks or []) if m and (m, n) != (self.model, model_name)]
+        self.hedge_ms = hedge_ms
 
     def get_model_instance(
             self,
@@ -50,6 +58,14 @@ class LLMsAdapter:
         获取指定的大语言模型实例
         :return: 模型实例
         """
+        if self.fallbacks:
+            routes = [
+                LlmRoute(provider=model, model=LLMsAdapter(model=model, model_name=model_name).get_model_instance(
+                    question=question, history=history, chatBotModel=chatBotModel, images=images,
+                    model_type=model_type, **kwargs))
+                for model, model_name in [(self.model, self.model_name)] + self.fallbacks
+            ]
+            return RouterAI(routes=[route for route in routes if route.model is not None])
         system_role = DEFAULT_CHAT_BOT_ROLE
         if chatBotModel and chatBotModel.bot_role:
             system_role = chatBotModel.bot_role
@@ -95,6 +111,13 @@ class LLMsAdapter:
         获取指定的聊天大语言模型实例
         :return: 模型实例
         """
+        if self.fallbacks:
+            routes = [
+                LlmRoute(provider=model, model=LLMsAdapter(model=model, model_name=model_name).get_chat_model_instance(
+                    history=history, images=images, model_type=model_type, **kwargs))
+                for model, model_name in [(self.model, self.model_name)] + self.fallbacks
+            ]
+            return ChatRouterAI(routes=[route for route in routes if route.model is not None], hedge_ms=self.hedge_ms)
         if self.model == "DashScope":
             # 当model_type为VL时不考虑enable_thinking
             if model_type == MODEL_TYPE_TEXT:
@@ -1,4 +1,3 @@
-import json
 import time
 import uuid
 from typing import Any, List, Optional, Iterator, Mapping
@@ -6,10 +5,11 @@ from langchain.callbacks.manager import CallbackManagerForLLMRun
 from langchain.llms.base import LLM
 from langchain_core.outputs import GenerationChunk
 from loguru import logger
-from openai import OpenAI
 
 from config.base_config import DEFAULT_CHAT_BOT_ROLE
 from config.base_config_openai import *
+from models.llms.llm_client_registry import get_openai_client
+from models.llms.llm_stream_chunk import generation_data
 
 
 class ChatOpenAI(LLM):
@@ -44,7 +44,7 @@ class ChatOpenAI(LLM):
         常规推理
         :return: 推理结果
         """
-        client = OpenAI(api_key=self.api_key)
+        client = get_openai_client(base_url=None, api_key=self.api_key)
         messages = [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt},
@@ -68,7 +68,7 @@ class ChatOpenAI(LLM):
         流式推理
         :return: 推理结果
         """
-        client = OpenAI(api_key=self.api_key)
+        client = get_openai_client(base_url=None, api_key=self.api_key)
         messages = [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt},
@@ -99,13 +99,8 @@ class ChatOpenAI(LLM):
 
             yield GenerationChunk(
                 text=choices0_content,
-                generation_info=response_usage,
+                generation_info=generation_data(content=choices0_content, usage=response_usage),
             )
-            if response_usage:
-                yield GenerationChunk(
-                    text=json.dumps(response_usage),
-                    generation_info=response_usage
-                )
         logger.info("#############Request {} LLMs Stream INFO, request_id={}, processTime={}, content=[{}], usage={}.",
                     self._llm_type, self.request_id, time.time() - start_time, response_content, response_usage)
 
@@ -142,19 +142,60 @@ class BaseVectorClient(ABC):
         """
         pass
 
+    @abstractmethod
+    def sync_file_data(
+            self,
+            split_docs: List[Document],
+            embedding: Embeddings,
+            namespace: str,
+            file_id: str,
+    ) -> Dict[str, Any]:
+        """
+        按分片内容摘要增量同步知识文件的向量数据
+        仅对新增分片计算向量并写入, 删除已不存在的分片, 未变化的分片保留原有向量
+        :param split_docs: 新版本分割文件集(元数据包含content_hash)
+        :param embedding: 稀疏值类型
+        :param namespace: 命名空间标识
+        :param file_id: 知识文件标识
+        :return: 同步结果{ids: 按文档顺序的向量标识, inserted, deleted, updated, kept}
+        """
+        pass
+
+    @abstractmethod
+    def copy_file_data(
+            self,
+            namespace: str,
+            source_file_id: str,
+            file_id: str,
+            metadata_patch: Dict[str, Any] = None,
+    ) -> list[str]:
+        """
+        复用已向量化文件的分片数据(不重新计算向量)
+        :param namespace: 目标命名空间标识
+        :param source_file_id: 源知识文件标识
+        :param file_id: 目标知识文件标识
+        :param metadata_patch: 覆盖的元数据字段
+        :return: 向量标识, 源文件无分片时为空
+        """
+        pass
+
     @abstractmethod
     def search_data(
             self,
             ques: str,
             embedding: Embeddings,
             namespace_list: list[str],
-            search_top_k: int) -> List[Tuple[Document, float, str]]:
+            search_top_k: int,
+            ef_search: int = None,
+            probes: int = None) -> List[Tuple[Document, float, str]]:
         """
         搜索向量数据
         :param ques: 问题
         :param embedding: 稀疏值类型
         :param namespace_list: 命名空间标识
         :param search_top_k: top数
+        :param ef_search: HNSW索引检索候选列表大小(为空取默认配置)
+        :param probes: IVFFlat索引检索聚类数(为空取默认配置)
         :return: Chunk文档集合
         """
         pass
@@ -180,3 +221,39 @@ class BaseVectorClient(ABC):
         以tag识别为开启或禁用
         """
         pass
+
+    @abstractmethod
+    def init_database(self):
+        """
+        初始化向量库(连接池、表结构), 应用启动时调用一次
+        """
+        pass
+
+    @abstractmethod
+    def close_database(self):
+        """
+        释放向量库连接池, 应用关闭时调用
+        """
+        pass
+
+    @abstractmethod
+    def create_index(
+            self,
+            index_type: str = None,
+            rebuild: bool = False
+    ) -> bool:
+        """
+        创建(或重建)向量索引
+        :param index_type: 索引类型
+        :param rebuild: 是否重建
+        :return: 是否执行
+        """
+        pass
+
+    @abstractmethod
+    def get_index_health(self) -> Dict[str, Any]:
+        """
+        查询向量索引健康状况
+        :return: 健康信息
+        """
+        pass
@@ -1,21 +1,30 @@
 from __future__ import annotations
 
 from datetime import datetime
+from io import StringIO
 
 from loguru import logger
 import enum
+import json
 import logging
+import threading
+import time
 import uuid
 import sqlalchemy
 from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.dialects.postgresql import JSON, UUID
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, declarative_base, relationship
 from langchain.docstore.document import Document
 from langchain.embeddings.base import Embeddings
 from langchain.utils import get_from_dict_or_env
 from langchain.vectorstores.base import VectorStore
-from config.base_config import PGVECTOR_DIMENSIONS
+from config.base_config import PGVECTOR_DIMENSIONS, PGVECTOR_BULK_INSERT_MODE, PGVECTOR_BULK_INSERT_BATCH_SIZE, \
+    PGVECTOR_EXACT_FALLBACK, PGVECTOR_ROW_COUNT_CACHE_SECONDS
+from framework.util.hash_util import text_sha256
+from models.vectordatabase.custom.pgvector_engine import PGEngineRegistry
+from models.vectordatabase.custom.pgvector_index import PGVectorIndexManager, default_search_params
 from service.namespacefile.namespace_file_metadata import MetadataModel
 
 Base = declarative_base()  # type: Any
@@ -23,6 +32,28 @@ Base = declarative_base()  # type: Any
 
 ADA_TOKEN_COUNT = int(PGVECTOR_DIMENSIONS)
 _LANGCHAIN_DEFAULT_COLLECTION_NAME = "langchain"
+# 批量写入模式
+BULK_INSERT_MODE_COPY = "copy"
+BULK_INSERT_MODE_EXECUTEMANY = "executemany"
+BULK_INSERT_MODE_ORM = "orm"
+# COPY写入的列顺序
+_COPY_COLUMNS = ("uuid", "collection_id", "embedding", "document", "cmetadata", "custom_id",
+                 "file_id", "create_date", "update_date", "status", "number")
+# 分片内容摘要在元数据中的键(增量向量化比对使用)
+CONTENT_HASH_KEY = "content_hash"
+# 可检索分片数缓存: (集合标识, 过滤条件) -> (过期时间, 分片数)
+_row_count_cache: Dict[tuple, Tuple[float, int]] = {}
+_row_count_lock = threading.Lock()
+
+
+def _copy_escape(value: Any) -> str:
+    """
+    COPY文本格式转义
+    """
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
 
 
 class BaseModel(Base):
@@ -128,6 +159,17 @@ class EmbeddingStore(BaseModel):
             return (session.query(cls).filter(cls.custom_id.in_(custom_id_list)).
                 update({cls.status: status_tag}))
 
+    @classmethod
+    def get_chunk_list_by_file_id(cls, session: Session, file_id: str) -> List[Tuple[str, dict, str]]:
+        # 获取文件全部分片的(custom_id, cmetadata, number), 不加载向量与正文
+        return session.query(cls.custom_id, cls.cmetadata, cls.number).filter(cls.file_id == file_id).all()
+
+    @classmethod
+    def get_document_by_custom_id(cls, session: Session, custom_id_list: list[str]) -> Dict[str, str]:
+        # 获取指定分片的正文
+        results = session.query(cls.custom_id, cls.document).filter(cls.custom_id.in_(custom_id_list)).all()
+        return {custom_id: document for custom_id, document in results}
+
     @classmethod
     def get_number_by_file_id(cls, session: Session, file_id: str) -> int:
         # 获取相关fild_id文件的分片序号
@@ -359,16 +401,16 @@ class PGVector(VectorStore):
     ) -> None:
         """
         Initialize the store.
+        The engine, schema and collection ids are shared process-wide
+        through `PGEngineRegistry`, so creating a store is cheap.
         """
         self._conn = self.connect()
         # self.create_vector_extension()
         self.create_tables_if_not_exists()
         self.create_collection()
 
-    def connect(self) -> sqlalchemy.engine.Connection:
-        engine = sqlalchemy.create_engine(self.connection_string)
-        conn = engine.connect()
-        return conn
+    def connect(self) -> Engine:
+        return PGEngineRegistry.get_engine(self.connection_string)
 
     def create_vector_extension(self) -> None:
         try:
@@ -380,23 +422,26 @@ class PGVector(VectorStore):
             self.logger.exception(e)
 
     def create_tables_if_not_exists(self) -> None:
-        with self._conn.begin():
-            Base.metadata.create_all(self._conn)
+        PGEngineRegistry.ensure_schema(self.connection_string, Base.metadata)
 
     def drop_tables(self) -> None:
-        with self._conn.begin():
-            Base.metadata.drop_all(self._conn)
+        with self._conn.begin() as conn:
+            Base.metadata.drop_all(conn)
 
     def create_collection(self) -> None:
         if self.pre_delete_collection:
             self.delete_collection()
+        if PGEngineRegistry.get_collection_id(self.connection_string, self.collection_name):
+            return
         with Session(self._conn) as session:
-            CollectionStore.get_or_create(
+            collection, _ = CollectionStore.get_or_create(
                 session, self.collection_name, cmetadata=self.collection_metadata
             )
+            PGEngineRegistry.set_collection_id(self.connection_string, self.collection_name, collection.uuid)
 
     def delete_collection(self) -> None:
         self.logger.debug("Trying to delete collection")
+        PGEngineRegistry.evict_collection(self.connection_string, self.collection_name)
         with Session(self._conn) as session:
             collection = self.get_collection(session)
             if not collection:
@@ -404,15 +449,35 @@ class PGVector(VectorStore):
                 return
             session.delete(collection)
             session.commit()
+        # 删除期间其他请求可能重新缓存了旧的collection_id
+        PGEngineRegistry.evict_collection(self.connection_string, self.collection_name)
+
+    def create_indexes(self, index_type: Optional[str] = None, rebuild: bool = False) -> bool:
+        """
+        创建(或重建)向量索引及btree索引
+        """
+        manager = PGVectorIndexManager(self._conn)
+        if index_type:
+            return manager.create_indexes(index_type=index_type, rebuild=rebuild)
+        return manager.create_indexes(rebuild=rebuild)
+
+    def get_index_health(self) -> Dict[str, Any]:
+        """
+        查询索引健康状况
+        """
+        return PGVectorIndexManager(self._conn).get_index_health()
 
     def get_collection(self, session: Session) -> Optional["CollectionStore"]:
         return CollectionStore.get_by_name(session, self.collection_name)
 
     def get_collection_list(self, session: Session) -> List[CollectionStore.uuid]:
-        collection_ids = []
-        collectionStore = CollectionStore.get_by_name_list(session, self.collection_name_list)
-        for collection in collectionStore:
-            collection_ids.append(collection.uuid)
+        collection_ids, miss_names = PGEngineRegistry.get_collection_ids(
+            self.connection_string, self.collection_name_list
+        )
+        if miss_names:
+            for collection in CollectionStore.get_by_name_list(session, miss_names):
+                PGEngineRegistry.set_collection_id(self.connection_string, collection.name, collection.uuid)
+                collection_ids.append(collection.uuid)
         return collection_ids
 
     @classmethod
@@ -605,14 +670,15 @@ class PGVector(VectorStore):
         ids: List[str],
         **kwargs: Any,
     ) -> None:
+        # 知识库文件标识
+        file_id = kwargs.get("file_id") or None
+        bulk_mode = kwargs.get("bulk_mode") or PGVECTOR_BULK_INSERT_MODE
+        if bulk_mode != BULK_INSERT_MODE_ORM:
+            self.bulk_add_embeddings(texts=texts, embeddings=embeddings, metadatas=metadatas, ids=ids,
+                                     file_id=file_id, bulk_mode=bulk_mode)
+            return
         # 设置每个文件的分片序号
         number = 1
-        # 知识库文件标识
-        file_id = None
-        for k, v in kwargs.items():
-            if k == "file_id":
-                file_id = v if v else None
-                break
         logger.info("######PGvector INFO, get session before... mark={}", ids[0])
         with Session(self._conn) as session:
             logger.info("######PGvector INFO, get session after... mark={}", ids[0])
@@ -640,6 +706,260 @@ class PGVector(VectorStore):
             session.commit()
             logger.info("######PGvector INFO, commit step 2... mark={}.", ids[0])
 
+    def get_collection_id(self) -> uuid.UUID:
+        """
+        获取当前知识库的collection_id(优先读取缓存)
+        """
+        collection_id = PGEngineRegistry.get_collection_id(self.connection_string, self.collection_name)
+        if collection_id:
+            return collection_id
+        with Session(self._conn) as session:
+            collection = self.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            PGEngineRegistry.set_collection_id(self.connection_string, self.collection_name, collection.uuid)
+            return collection.uuid
+
+    def bulk_add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[dict],
+        ids: List[str],
+        file_id: Optional[str] = None,
+        bulk_mode: str = PGVECTOR_BULK_INSERT_MODE,
+        batch_size: int = PGVECTOR_BULK_INSERT_BATCH_SIZE,
+    ) -> int:
+        """
+        绕过ORM批量写入分片, 按批次使用COPY或executemany, 整个文件在同一事务内提交
+        :return: 写入条数
+        """
+        if not texts:
+            return 0
+        collection_id = self.get_collection_id()
+        start = time.time()
+        with self._conn.begin() as conn:
+            total = self._write_rows(conn=conn, collection_id=collection_id, texts=texts, embeddings=embeddings,
+                                     metadatas=metadatas, ids=ids, file_id=file_id, bulk_mode=bulk_mode,
+                                     batch_size=batch_size)
+        cost = time.time() - start
+        logger.info("######PGvector INFO, bulk insert finished, rows={}, cost={}s, rows/s={}, mark={}.",
+                    total, round(cost, 3), round(total / cost, 1) if cost > 0 else total, ids[0])
+        return total
+
+    def _write_rows(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        collection_id: uuid.UUID,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[dict],
+        ids: List[str],
+        file_id: Optional[str] = None,
+        numbers: Optional[List[int]] = None,
+        bulk_mode: str = PGVECTOR_BULK_INSERT_MODE,
+        batch_size: int = PGVECTOR_BULK_INSERT_BATCH_SIZE,
+    ) -> int:
+        """
+        在调用方事务内分批写入分片
+        :param numbers: 分片序号(为空时按写入顺序从1开始编号)
+        :return: 写入条数
+        """
+        table = EmbeddingStore.__table__
+        total = 0
+        # COPY依赖psycopg2的copy_expert, 其他驱动退化为executemany
+        use_copy = bulk_mode == BULK_INSERT_MODE_COPY and conn.dialect.driver == "psycopg2"
+        for offset in range(0, len(texts), batch_size):
+            now = datetime.now()
+            rows = [
+                {
+                    "uuid": uuid.uuid4(),
+                    "collection_id": collection_id,
+                    "embedding": embeddings[i],
+                    "document": texts[i],
+                    "cmetadata": metadatas[i],
+                    "custom_id": ids[i],
+                    "file_id": file_id,
+                    "create_date": now,
+                    "update_date": now,
+                    "status": '1',
+                    "number": str(numbers[i] if numbers else i + 1),
+                }
+                for i in range(offset, min(offset + batch_size, len(texts)))
+            ]
+            if use_copy:
+                self._copy_rows(conn, rows)
+            else:
+                conn.execute(table.insert(), rows)
+            total += len(rows)
+            logger.info("######PGvector INFO, bulk insert batch done, mode={}, rows={}/{}, mark={}.",
+                        "copy" if use_copy else "executemany", total, len(texts), ids[0])
+        return total
+
+    def get_file_chunk_hashes(
+        self,
+        file_id: str,
+    ) -> List[Tuple[str, str, Optional[dict], Optional[str]]]:
+        """
+        获取文件已有分片的内容摘要
+        历史分片元数据中没有content_hash时, 按正文补算(与写入时口径一致)
+        :param file_id: 知识文件标识
+        :return: [(custom_id, content_hash, cmetadata, number)]
+        """
+        with Session(self._conn) as session:
+            chunks = EmbeddingStore.get_chunk_list_by_file_id(session=session, file_id=file_id)
+            missing = [custom_id for custom_id, cmetadata, _ in chunks
+                       if not (cmetadata or {}).get(CONTENT_HASH_KEY)]
+            documents = EmbeddingStore.get_document_by_custom_id(session=session, custom_id_list=missing) \
+                if missing else {}
+        return [
+            (custom_id, (cmetadata or {}).get(CONTENT_HASH_KEY) or text_sha256(documents.get(custom_id)),
+             cmetadata, number)
+            for custom_id, cmetadata, number in chunks
+        ]
+
+    def sync_file_embeddings(
+        self,
+        file_id: str,
+        texts: List[str],
+        metadatas: List[dict],
+        bulk_mode: str = PGVECTOR_BULK_INSERT_MODE,
+    ) -> Dict[str, Any]:
+        """
+        按分片内容摘要增量同步文件分片
+        内容未变化的分片复用原有向量(仅在序号或元数据变化时更新), 只对新增分片计算向量,
+        删除新版本中已不存在的分片; 删除、更新、写入在同一事务内提交, 失败时保留原有分片。
+        :param file_id: 知识文件标识
+        :param texts: 新版本分片正文(按文档顺序)
+        :param metadatas: 新版本分片元数据(需包含content_hash)
+        :param bulk_mode: 批量写入模式
+        :return: {ids: 新版本分片标识(按文档顺序), inserted, deleted, updated, kept}
+        """
+        start = time.time()
+        # 同一内容可能在文件内重复出现, 以队列逐个匹配
+        existing: Dict[str, List[Tuple[str, Optional[dict], Optional[str]]]] = {}
+        for custom_id, content_hash, cmetadata, number in self.get_file_chunk_hashes(file_id=file_id):
+            existing.setdefault(content_hash, []).append((custom_id, cmetadata, number))
+
+        ids, new_index, updates = [], [], []
+        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+            content_hash = metadata.get(CONTENT_HASH_KEY) or text_sha256(text)
+            metadata[CONTENT_HASH_KEY] = content_hash
+            matched = existing.get(content_hash)
+            if matched:
+                custom_id, cmetadata, number = matched.pop(0)
+                if cmetadata != metadata or str(number) != str(i + 1):
+                    updates.append({"_custom_id": custom_id, "_cmetadata": metadata, "_number": str(i + 1)})
+            else:
+                custom_id = str(uuid.uuid4()).replace("-", "")
+                new_index.append(i)
+            ids.append(custom_id)
+        removed = [custom_id for matched in existing.values() for custom_id, _, _ in matched]
+
+        # 向量计算耗时较长, 放在事务之外
+        new_texts = [texts[i] for i in new_index]
+        embeddings = self.embedding_function.embed_documents(new_texts) if new_texts else []
+        collection_id = self.get_collection_id() if new_texts else None
+        table = EmbeddingStore.__table__
+        with self._conn.begin() as conn:
+            if removed:
+                conn.execute(table.delete().where(table.c.custom_id.in_(removed)))
+            if updates:
+                conn.execute(
+                    table.update()
+                    .where(table.c.custom_id == sqlalchemy.bindparam("_custom_id"))
+                    .values(cmetadata=sqlalchemy.bindparam("_cmetadata"), number=sqlalchemy.bindparam("_number"),
+                            update_date=datetime.now()),
+                    updates
+                )
+            if new_texts:
+                self._write_rows(conn=conn, collection_id=collection_id, texts=new_texts, embeddings=embeddings,
+                                 metadatas=[metadatas[i] for i in new_index], ids=[ids[i] for i in new_index],
+                                 file_id=file_id, numbers=[i + 1 for i in new_index], bulk_mode=bulk_mode)
+        result = {
+            "ids": ids,
+            "inserted": len(new_index),
+            "deleted": len(removed),
+            "updated": len(updates),
+            "kept": len(ids) - len(new_index),
+        }
+        logger.info("######PGvector INFO, sync file embeddings finished, file_id={}, inserted={}, deleted={}, "
+                    "updated={}, kept={}, cost={}s.", file_id, result["inserted"], result["deleted"],
+                    result["updated"], result["kept"], round(time.time() - start, 3))
+        return result
+
+    def copy_file_embeddings(
+        self,
+        source_file_id: str,
+        file_id: str,
+        metadata_patch: Optional[dict] = None,
+    ) -> List[str]:
+        """
+        复用已向量化文件的分片: 以一条INSERT ... SELECT在库内复制到当前知识库, 不重新计算向量
+        目标文件已有分片先删除, 删除与复制在同一事务内提交;
+        分片标识由目标文件与源分片标识派生, 重复执行结果一致。
+        :param source_file_id: 源知识文件标识
+        :param file_id: 目标知识文件标识
+        :param metadata_patch: 覆盖的元数据字段(如文件显示名称)
+        :return: 按分片序号排列的向量标识, 源文件无分片时为空
+        """
+        start = time.time()
+        table_name = EmbeddingStore.__tablename__
+        statement = sqlalchemy.text(
+            f"INSERT INTO {table_name} "
+            f"(uuid, collection_id, embedding, document, cmetadata, custom_id, file_id, create_date, update_date, "
+            f"status, number) "
+            f"SELECT md5('uuid:' || :file_id || ':' || e.custom_id)::uuid, :collection_id, e.embedding, e.document, "
+            f"(coalesce(e.cmetadata::jsonb, '{{}}'::jsonb) || cast(:metadata_patch as jsonb))::json, "
+            f"md5(:file_id || ':' || e.custom_id), :file_id, now(), now(), e.status, e.number "
+            f"FROM {table_name} e WHERE e.file_id = :source_file_id "
+            f"RETURNING custom_id, number"
+        )
+        collection_id = self.get_collection_id()
+        table = EmbeddingStore.__table__
+        with self._conn.begin() as conn:
+            conn.execute(table.delete().where(table.c.file_id == file_id))
+            rows = conn.execute(statement, {
+                "file_id": str(file_id),
+                "source_file_id": str(source_file_id),
+                "collection_id": str(collection_id),
+                "metadata_patch": json.dumps(metadata_patch or {}, ensure_ascii=False),
+            }).fetchall()
+        ids = [custom_id for custom_id, number in sorted(rows, key=lambda row: int(row[1] or 0))]
+        logger.info("######PGvector INFO, copy file embeddings finished, source_file_id={}, file_id={}, rows={}, "
+                    "cost={}s.", source_file_id, file_id, len(ids), round(time.time() - start, 3))
+        return ids
+
+    @staticmethod
+    def _copy_rows(
+        conn: sqlalchemy.engine.Connection,
+        rows: List[dict],
+    ) -> None:
+        """
+        使用COPY FROM STDIN(文本格式)写入一个批次
+        """
+        buffer = StringIO()
+        for row in rows:
+            values = []
+            for column in _COPY_COLUMNS:
+                value = row[column]
+                if column == "embedding":
+                    value = "[" + ",".join(str(float(v)) for v in value) + "]"
+                elif column == "cmetadata":
+                    value = json.dumps(value, ensure_ascii=False) if value is not None else None
+                values.append(_copy_escape(value))
+            buffer.write("\t".join(values))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {EmbeddingStore.__tablename__} ({', '.join(_COPY_COLUMNS)}) FROM STDIN",
+                buffer
+            )
+        finally:
+            cursor.close()
+
     def add_texts(
         self,
         texts: Iterable[str],
@@ -711,6 +1031,8 @@ class PGVector(VectorStore):
         query: str,
         k: int = 4,
         filter: Optional[dict] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> List[Tuple[Document, float, str]]:
         """Return docs most similar to query.
 
@@ -718,13 +1040,15 @@ class PGVector(VectorStore):
             query: Text to look up documents similar to.
             k: Number of Documents to return. Defaults to 4.
             filter (Optional[Dict[str, str]]): Filter by metadata. Defaults to None.
+            ef_search: HNSW `hnsw.ef_search` for this query. Defaults to config.
+            probes: IVFFlat `ivfflat.probes` for this query. Defaults to config.
 
         Returns:
             List of Documents most similar to the query and score for each
         """
         embedding = self.embedding_function.embed_query(query)
         docs = self.similarity_search_with_score_by_vector(
-            embedding=embedding, k=k, filter=filter
+            embedding=embedding, k=k, filter=filter, ef_search=ef_search, probes=probes
         )
         return docs
 
@@ -733,8 +1057,13 @@ class PGVector(VectorStore):
         embedding: List[float],
         k: int = 4,
         filter: Optional[dict] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> List[Tuple[Document, float, str]]:
+        if ef_search is None and probes is None:
+            ef_search, probes = default_search_params()
         with Session(self._conn) as session:
+            PGVectorIndexManager.apply_search_params(session, ef_search=ef_search, probes=probes)
             collection_ids = self.get_collection_list(session)
             if not collection_ids:
                 raise ValueError("collection_ids not found")
@@ -761,7 +1090,7 @@ class PGVector(VectorStore):
 
                 filter_by = sqlalchemy.and_(filter_by, *filter_clauses)
 
-            results: List[QueryResult] = (
+            query = (
                 session.query(
                     EmbeddingStore,
                     self.distance_strategy(embedding).label("distance"),  # type: ignore
@@ -774,8 +1103,14 @@ class PGVector(VectorStore):
                     EmbeddingStore.collection_id == CollectionStore.uuid,
                 )
                 .limit(k)
-                .all()
             )
+            results: List[QueryResult] = query.all()
+            if PGVECTOR_EXACT_FALLBACK and len(results) < k and \
+                    len(results) < self._get_row_count(session, collection_ids, filter, filter_by):
+                # 向量索引先取ef_search个候选再按集合与状态过滤, 小集合可能召回不足, 回退精确检索;
+                # 可检索分片本身不足k条时召回数量已是全部, 不回退
+                PGVectorIndexManager.disable_vector_index(session)
+                results = query.all()
 
         docs = [
             (
@@ -790,6 +1125,36 @@ class PGVector(VectorStore):
         ]
         return docs
 
+    @staticmethod
+    def _get_row_count(
+        session: Session,
+        collection_ids: List[Any],
+        filter: Optional[dict],
+        filter_by: Any,
+    ) -> int:
+        """
+        查询集合中符合过滤条件的可检索分片数(按集合与过滤条件缓存PGVECTOR_ROW_COUNT_CACHE_SECONDS秒)
+        :param session: 数据库会话
+        :param collection_ids: 集合标识
+        :param filter: 元数据过滤条件
+        :param filter_by: 查询条件
+        :return: 分片数
+        """
+        key = (tuple(sorted(str(collection_id) for collection_id in collection_ids)),
+               json.dumps(filter, sort_keys=True, default=str))
+        now = time.time()
+        with _row_count_lock:
+            cached = _row_count_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        count = session.query(sqlalchemy.func.count(EmbeddingStore.uuid)) \
+            .filter(filter_by) \
+            .filter(EmbeddingStore.status == '1') \
+            .scalar() or 0
+        with _row_count_lock:
+            _row_count_cache[key] = (now + PGVECTOR_ROW_COUNT_CACHE_SECONDS, count)
+        return count
+
     def similarity_search_by_vector(
         self,
         embedding: List[float],
@@ -0,0 +1,171 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import sqlalchemy
+from loguru import logger
+from sqlalchemy.engine import Engine
+
+from config.base_config import (
+    PGVECTOR_POOL_SIZE,
+    PGVECTOR_POOL_MAX_OVERFLOW,
+    PGVECTOR_POOL_TIMEOUT,
+    PGVECTOR_POOL_RECYCLE,
+    PGVECTOR_POOL_PRE_PING,
+    PGVECTOR_COLLECTION_CACHE_SECONDS)
+
+
+class PGEngineRegistry:
+    """
+    向量库引擎注册表(进程级)
+    按连接串缓存带连接池的Engine, 表结构初始化在进程内只执行一次,
+    同时缓存知识库名称与collection_id的映射, 使PGVector实例成为轻量句柄;
+    映射在本进程删除知识库时移除, 并按PGVECTOR_COLLECTION_CACHE_SECONDS过期, 以感知其他进程的删除与重建。
+    """
+    _lock = threading.RLock()
+    _engines: Dict[str, Engine] = {}
+    _schema_ready: Dict[str, bool] = {}
+    # (连接串, 知识库名称) -> (collection_id, 过期时间)
+    _collections: Dict[Tuple[str, str], Tuple[uuid.UUID, float]] = {}
+
+    @classmethod
+    def _cached_collection_id(
+            cls,
+            connection_string: str,
+            name: str
+    ) -> Optional[uuid.UUID]:
+        entry = cls._collections.get((connection_string, name))
+        if entry is None:
+            return None
+        collection_id, expires_at = entry
+        if expires_at <= time.monotonic():
+            cls._collections.pop((connection_string, name), None)
+            return None
+        return collection_id
+
+    @classmethod
+    def get_engine(
+            cls,
+            connection_string: str
+    ) -> Engine:
+        """
+        获取连接串对应的共享Engine, 不存在时创建
+        :param connection_string: 连接串
+        :return: Engine
+        """
+        engine = cls._engines.get(connection_string)
+        if engine is not None:
+            return engine
+        with cls._lock:
+            engine = cls._engines.get(connection_string)
+            if engine is None:
+                engine = sqlalchemy.create_engine(
+                    connection_string,
+                    pool_size=PGVECTOR_POOL_SIZE,
+                    max_overflow=PGVECTOR_POOL_MAX_OVERFLOW,
+                    pool_timeout=PGVECTOR_POOL_TIMEOUT,
+                    pool_recycle=PGVECTOR_POOL_RECYCLE,
+                    pool_pre_ping=PGVECTOR_POOL_PRE_PING,
+                )
+                cls._engines[connection_string] = engine
+                logger.info("######PGEngineRegistry INFO, 创建连接池: pool_size={}, max_overflow={}, recycle={}.",
+                            PGVECTOR_POOL_SIZE, PGVECTOR_POOL_MAX_OVERFLOW, PGVECTOR_POOL_RECYCLE)
+            return engine
+
+    @classmethod
+    def ensure_schema(
+            cls,
+            connection_string: str,
+            metadata: sqlalchemy.MetaData
+    ) -> None:
+        """
+        初始化表结构, 每个连接串在进程内仅执行一次
+        :param connection_string: 连接串
+        :param metadata: 表结构元数据
+        """
+        if cls._schema_ready.get(connection_string):
+            return
+        with cls._lock:
+            if cls._schema_ready.get(connection_string):
+                return
+            engine = cls.get_engine(connection_string)
+            with engine.begin() as conn:
+                metadata.create_all(conn)
+            cls._schema_ready[connection_string] = True
+
+    @classmethod
+    def get_collection_id(
+            cls,
+            connection_string: str,
+            name: str
+    ) -> Optional[uuid.UUID]:
+        """
+        获取缓存的collection_id
+        :param connection_string: 连接串
+        :param name: 知识库名称
+        :return: collection_id
+        """
+        return cls._cached_collection_id(connection_string, name)
+
+    @classmethod
+    def get_collection_ids(
+            cls,
+            connection_string: str,
+            name_list: List[str]
+    ) -> Tuple[List[uuid.UUID], List[str]]:
+        """
+        批量获取缓存的collection_id
+        :param connection_string: 连接串
+        :param name_list: 知识库名称列表
+        :return: (已缓存的collection_id列表, 未命中的知识库名称列表)
+        """
+        hit_ids, miss_names = [], []
+        for name in name_list or []:
+            collection_id = cls._cached_collection_id(connection_string, name)
+            if collection_id is None:
+                miss_names.append(name)
+            else:
+                hit_ids.append(collection_id)
+        return hit_ids, miss_names
+
+    @classmethod
+    def set_collection_id(
+            cls,
+            connection_string: str,
+            name: str,
+            collection_id: uuid.UUID
+    ) -> None:
+        """
+        缓存collection_id
+        :param connection_string: 连接串
+        :param name: 知识库名称
+        :param collection_id: collection_id
+        """
+        cls._collections[(connection_string, name)] = (collection_id,
+                                                       time.monotonic() + PGVECTOR_COLLECTION_CACHE_SECONDS)
+
+    @classmethod
+    def evict_collection(
+            cls,
+            connection_string: str,
+            name: str
+    ) -> None:
+        """
+        移除缓存的collection_id(知识库删除时调用)
+        :param connection_string: 连接串
+        :param name: 知识库名称
+        """
+        cls._collections.pop((connection_string, name), None)
+
+    @classmethod
+    def dispose(cls) -> None:
+        """
+        释放所有连接池(进程退出时调用)
+        """
+        with cls._lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            cls._engines.clear()
+            cls._schema_ready.clear()
+            cls._collections.clear()
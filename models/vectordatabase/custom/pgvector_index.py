@@ -0,0 +1,231 @@
+import math
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import sqlalchemy
+from loguru import logger
+from sqlalchemy.engine import Engine
+
+from config.base_config import (
+    PGVECTOR_INDEX_TYPE,
+    PGVECTOR_HNSW_M,
+    PGVECTOR_HNSW_EF_CONSTRUCTION,
+    PGVECTOR_HNSW_EF_SEARCH,
+    PGVECTOR_IVFFLAT_LISTS,
+    PGVECTOR_IVFFLAT_PROBES,
+    PGVECTOR_ITERATIVE_SCAN)
+
+INDEX_TYPE_HNSW = "hnsw"
+INDEX_TYPE_IVFFLAT = "ivfflat"
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+# 向量索引名称
+VECTOR_INDEX_NAMES = {
+    INDEX_TYPE_HNSW: f"ix_{EMBEDDING_TABLE}_embedding_hnsw",
+    INDEX_TYPE_IVFFLAT: f"ix_{EMBEDDING_TABLE}_embedding_ivfflat",
+}
+# 普通btree索引: 名称 -> 列
+BTREE_INDEXES = {
+    f"ix_{EMBEDDING_TABLE}_collection_status": "(collection_id, status)",
+    f"ix_{EMBEDDING_TABLE}_file_id": "(file_id)",
+    f"ix_{EMBEDDING_TABLE}_custom_id": "(custom_id)",
+}
+# 重建时新索引的临时名称后缀(构建完成后替换旧索引)
+_REBUILD_SUFFIX = "_new"
+# 多进程同时启动时, 仅允许一个进程构建索引
+_INDEX_ADVISORY_LOCK_KEY = 73200005
+
+
+class PGVectorIndexManager:
+    """
+    langchain_pg_embedding索引管理
+    负责向量索引(HNSW/IVFFlat, vector_cosine_ops)与btree索引的创建、重建、健康检查,
+    以及检索时ef_search/probes参数的设置。
+    """
+
+    def __init__(
+            self,
+            engine: Engine
+    ):
+        """
+        构造函数
+        :param engine: 向量库Engine
+        """
+        self.engine = engine
+
+    @staticmethod
+    def auto_ivfflat_lists(row_count: int) -> int:
+        """
+        按pgvector建议计算ivfflat的lists: 百万行以内rows/1000, 以上sqrt(rows)
+        :param row_count: 数据行数
+        :return: lists
+        """
+        if row_count <= 1000000:
+            return max(10, row_count // 1000)
+        return int(math.sqrt(row_count))
+
+    def _row_count(self, conn) -> int:
+        result = conn.execute(sqlalchemy.text(
+            f"SELECT reltuples::bigint FROM pg_class WHERE relname = '{EMBEDDING_TABLE}'")).scalar()
+        return max(int(result or 0), 0)
+
+    def _vector_index_sql(
+            self,
+            conn,
+            index_type: str,
+            m: int,
+            ef_construction: int,
+            lists: int,
+            index_name: str = None,
+    ) -> str:
+        index_name = index_name or VECTOR_INDEX_NAMES[index_type]
+        if index_type == INDEX_TYPE_HNSW:
+            return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} " \
+                   f"USING hnsw (embedding vector_cosine_ops) WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+        lists = int(lists) or self.auto_ivfflat_lists(self._row_count(conn))
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} " \
+               f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+
+    def create_indexes(
+            self,
+            index_type: str = PGVECTOR_INDEX_TYPE,
+            rebuild: bool = False,
+            m: int = PGVECTOR_HNSW_M,
+            ef_construction: int = PGVECTOR_HNSW_EF_CONSTRUCTION,
+            lists: int = PGVECTOR_IVFFLAT_LISTS,
+    ) -> bool:
+        """
+        创建(或重建)索引, 使用CONCURRENTLY不阻塞读写
+        重建时先以临时名称构建新索引, 完成后删除旧索引并改名, 构建期间检索仍使用旧索引
+        :param index_type: 向量索引类型 hnsw/ivfflat
+        :param rebuild: 是否重建向量索引(切换索引类型或调整参数时使用)
+        :param m: HNSW每层最大连接数
+        :param ef_construction: HNSW构建时候选列表大小
+        :param lists: IVFFlat聚类数, 0表示按数据量自动计算
+        :return: 是否执行(其他进程正在构建时返回False)
+        """
+        if index_type not in VECTOR_INDEX_NAMES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            locked = conn.execute(sqlalchemy.text(
+                f"SELECT pg_try_advisory_lock({_INDEX_ADVISORY_LOCK_KEY})")).scalar()
+            if not locked:
+                logger.info("######PGVectorIndexManager INFO, 其他进程正在构建索引, 跳过.")
+                return False
+            try:
+                for index_name, columns in BTREE_INDEXES.items():
+                    conn.execute(sqlalchemy.text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {EMBEDDING_TABLE} {columns}"))
+                # 清理上次中断遗留的无效索引
+                self._drop_invalid_indexes(conn)
+                start = time.time()
+                if rebuild:
+                    self._rebuild_vector_index(conn, index_type, m, ef_construction, lists)
+                else:
+                    conn.execute(sqlalchemy.text(self._vector_index_sql(conn, index_type, m, ef_construction, lists)))
+                logger.info("######PGVectorIndexManager INFO, 索引就绪, type={}, rebuild={}, cost={}s.",
+                            index_type, rebuild, round(time.time() - start, 3))
+                return True
+            finally:
+                conn.execute(sqlalchemy.text(f"SELECT pg_advisory_unlock({_INDEX_ADVISORY_LOCK_KEY})"))
+
+    def _rebuild_vector_index(
+            self,
+            conn,
+            index_type: str,
+            m: int,
+            ef_construction: int,
+            lists: int,
+    ):
+        index_name = VECTOR_INDEX_NAMES[index_type]
+        tmp_name = f"{index_name}{_REBUILD_SUFFIX}"
+        conn.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name}"))
+        conn.execute(sqlalchemy.text(
+            self._vector_index_sql(conn, index_type, m, ef_construction, lists, index_name=tmp_name)))
+        # 新索引就绪后删除旧索引(含其他类型的向量索引)并改名
+        for name in VECTOR_INDEX_NAMES.values():
+            conn.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(sqlalchemy.text(f"ALTER INDEX {tmp_name} RENAME TO {index_name}"))
+
+    def _drop_invalid_indexes(self, conn):
+        invalid = conn.execute(sqlalchemy.text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            f"WHERE t.relname = '{EMBEDDING_TABLE}' AND NOT i.indisvalid")).scalars().all()
+        for name in invalid:
+            logger.warning("######PGVectorIndexManager WARN, 删除无效索引: {}", name)
+            conn.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    def get_index_health(self) -> Dict[str, Any]:
+        """
+        查询索引健康状况: 是否存在、是否有效、大小、扫描次数, 以及表行数
+        :return: 健康信息
+        """
+        with self.engine.connect() as conn:
+            rows = conn.execute(sqlalchemy.text(
+                "SELECT c.relname AS name, am.amname AS method, i.indisvalid AS valid, i.indisready AS ready, "
+                "pg_relation_size(c.oid) AS size_bytes, COALESCE(s.idx_scan, 0) AS scans, "
+                "pg_get_indexdef(c.oid) AS definition "
+                "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_class t ON t.oid = i.indrelid JOIN pg_am am ON am.oid = c.relam "
+                "LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid "
+                f"WHERE t.relname = '{EMBEDDING_TABLE}' ORDER BY c.relname")).mappings().all()
+            row_count = self._row_count(conn)
+            seq_scans = conn.execute(sqlalchemy.text(
+                f"SELECT seq_scan FROM pg_stat_user_tables WHERE relname = '{EMBEDDING_TABLE}'")).scalar()
+        indexes = [dict(row) for row in rows]
+        existing = {index["name"]: index for index in indexes}
+        expected = list(BTREE_INDEXES.keys()) + [VECTOR_INDEX_NAMES[PGVECTOR_INDEX_TYPE]]
+        missing = [name for name in expected if name not in existing]
+        invalid = [index["name"] for index in indexes if not index["valid"]]
+        return {
+            "table": EMBEDDING_TABLE,
+            "row_count": row_count,
+            "seq_scan": int(seq_scans or 0),
+            "index_type": PGVECTOR_INDEX_TYPE,
+            "healthy": not missing and not invalid,
+            "missing": missing,
+            "invalid": invalid,
+            "indexes": indexes,
+        }
+
+    @staticmethod
+    def apply_search_params(
+            session,
+            ef_search: Optional[int] = None,
+            probes: Optional[int] = None,
+            iterative_scan: str = PGVECTOR_ITERATIVE_SCAN,
+    ):
+        """
+        在当前事务内设置检索参数(SET LOCAL, 事务结束自动失效)
+        :param session: 数据库会话
+        :param ef_search: HNSW检索候选列表大小
+        :param probes: IVFFlat检索的聚类数
+        :param iterative_scan: 迭代扫描模式(pgvector>=0.8, strict_order/relaxed_order, 为空不设置),
+            过滤条件在向量扫描之后执行, 开启后结果不足时继续扫描索引
+        """
+        if ef_search:
+            session.execute(sqlalchemy.text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if probes:
+            session.execute(sqlalchemy.text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+        if iterative_scan in ("strict_order", "relaxed_order"):
+            session.execute(sqlalchemy.text(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}"))
+            session.execute(sqlalchemy.text(f"SET LOCAL ivfflat.iterative_scan = {iterative_scan}"))
+
+    @staticmethod
+    def disable_vector_index(session):
+        """
+        在当前事务内禁用索引扫描, 按集合条件过滤后精确计算距离(向量索引召回不足时使用)
+        :param session: 数据库会话
+        """
+        session.execute(sqlalchemy.text("SET LOCAL enable_indexscan = off"))
+
+
+def default_search_params() -> Tuple[Optional[int], Optional[int]]:
+    """
+    按当前索引类型返回默认检索参数
+    :return: (ef_search, probes)
+    """
+    if PGVECTOR_INDEX_TYPE == INDEX_TYPE_HNSW:
+        return PGVECTOR_HNSW_EF_SEARCH, None
+    return None, PGVECTOR_IVFFLAT_PROBES
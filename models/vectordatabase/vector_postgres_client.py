@@ -1,9 +1,14 @@
+import threading
 import uuid
 from typing import List, Tuple, Dict, Any
 
+from loguru import logger
+
 from langchain.embeddings.base import Embeddings
 from langchain.schema import Document
-from models.vectordatabase.custom.custom_pgvector import PGVector, DistanceStrategy, EmbeddingStore
+from models.vectordatabase.custom.custom_pgvector import PGVector, DistanceStrategy, EmbeddingStore, Base
+from models.vectordatabase.custom.pgvector_engine import PGEngineRegistry
+from models.vectordatabase.custom.pgvector_index import PGVectorIndexManager
 
 from config.base_config import *
 from models.embeddings.es_model_adapter import EmbeddingsModelAdapter
@@ -145,15 +150,53 @@ class VectorPostgresClient(BaseVectorClient):
             pre_delete_collection=False,
             ids=ids,
             file_id=file_id,
+            bulk_mode=PGVECTOR_BULK_INSERT_MODE,
         )
         return ids
 
+    def sync_file_data(
+            self,
+            split_docs: List[Document],
+            embedding: Embeddings,
+            namespace: str,
+            file_id: str,
+    ) -> Dict[str, Any]:
+        return PGVector.from_existing_index(
+            embedding=embedding,
+            collection_name=namespace,
+            connection_string=self.__get_db_conn(),
+            distance_strategy=DistanceStrategy.COSINE,
+            pre_delete_collection=False,
+        ).sync_file_embeddings(
+            file_id=file_id,
+            texts=[_doc.page_content for _doc in split_docs],
+            metadatas=[_doc.metadata for _doc in split_docs],
+            bulk_mode=PGVECTOR_BULK_INSERT_MODE,
+        )
+
+    def copy_file_data(
+            self,
+            namespace: str,
+            source_file_id: str,
+            file_id: str,
+            metadata_patch: Dict[str, Any] = None,
+    ) -> list[str]:
+        return PGVector.from_existing_index(
+            embedding=EmbeddingsModelAdapter().get_model_instance(),
+            collection_name=namespace,
+            connection_string=self.__get_db_conn(),
+            distance_strategy=DistanceStrategy.COSINE,
+            pre_delete_collection=False,
+        ).copy_file_embeddings(source_file_id=source_file_id, file_id=file_id, metadata_patch=metadata_patch)
+
     def search_data(
             self,
             ques: str,
             embedding: Embeddings,
             namespace_list: list[str],
-            search_top_k: int
+            search_top_k: int,
+            ef_search: int = None,
+            probes: int = None
     ) -> List[Tuple[Document, float, str]]:
         store = PGVector.from_existing_collection_list(
             embedding=embedding,
@@ -162,7 +205,7 @@ class VectorPostgresClient(BaseVectorClient):
             distance_strategy=DistanceStrategy.COSINE,
             pre_delete_collection=False
         )
-        return store.similarity_search_with_score(query=ques, k=search_top_k)
+        return store.similarity_search_with_score(query=ques, k=search_top_k, ef_search=ef_search, probes=probes)
 
     def update_data(
             self,
@@ -198,3 +241,27 @@ class VectorPostgresClient(BaseVectorClient):
 
     def get_vector_database_type(self) -> str:
         return 'Postgres'
+
+    def init_database(self):
+        PGEngineRegistry.ensure_schema(self.__get_db_conn(), Base.metadata)
+        if PGVECTOR_INDEX_AUTO_CREATE:
+            # 索引构建可能耗时较长, 放到后台线程执行, 不阻塞应用启动
+            threading.Thread(target=self.create_index, name="pgvector-index", daemon=True).start()
+
+    def close_database(self):
+        PGEngineRegistry.dispose()
+
+    def create_index(
+            self,
+            index_type: str = None,
+            rebuild: bool = False
+    ) -> bool:
+        try:
+            return PGVectorIndexManager(PGEngineRegistry.get_engine(self.__get_db_conn())).create_indexes(
+                index_type=index_type or PGVECTOR_INDEX_TYPE, rebuild=rebuild)
+        except Exception as err:
+            logger.error("######[VectorPostgresClient] create_index error, index_type={}, err={}", index_type, err)
+            raise err
+
+    def get_index_health(self) -> Dict[str, Any]:
+        return PGVectorIndexManager(PGEngineRegistry.get_engine(self.__get_db_conn())).get_index_health()
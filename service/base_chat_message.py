@@ -2,6 +2,7 @@ import re
 import uuid
 import json
 from datetime import datetime
+from functools import lru_cache
 from langchain.schema import Document
 from loguru import logger
 from typing import List, Tuple, Any
@@ -17,7 +18,22 @@ from service.domain.ai_namespace import NamespaceModel
 from service.domain.ai_namespace_file import AiNamespaceFileDomain
 from service.chat_response import ChatResponse, ChatResponseVO
 from service.schedule.disclaimer_data_schedule import sort_disclaimer_data
-from service.schedule.prohibited_data_schedule import get_prohibited_data
+from service.prohibited_filter import get_prohibited_filter
+
+# 提示词占位符: {business.xxx} 或 {system.xxx}
+_PLACEHOLDER_PATTERN = re.compile("{(?:business?|system)[.][A-Za-z0-9_]+}")
+# 超链接
+_URL_PATTERN = re.compile("(?:https?|ftp|file)://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]")
+
+
+@lru_cache(maxsize=1024)
+def parse_prompt_placeholders(prompt: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    解析提示词中的占位符(按提示词内容缓存)
+    :param prompt: 提示词
+    :return: (占位符名称, 占位符原文)列表
+    """
+    return tuple((str(p).split(".")[1].split("}")[0], p) for p in _PLACEHOLDER_PATTERN.findall(prompt))
 
 
 class BaseChatMessage:
@@ -44,16 +60,20 @@ class BaseChatMessage:
             **kwargs
     ):
         prompt = str(chatBotModel.prompt)
-        pattern = "{(?:business?|system)[.][A-Za-z0-9_]+}"
-        prompt_placeholder = re.findall(pattern, prompt)
+        prompt_placeholder = parse_prompt_placeholders(prompt)
         if not prompt_placeholder:
             return
-        prompt_placeholder_list = [str(p).split(".")[1].split("}")[0] for p in prompt_placeholder]
-        prompt_placeholder_key_map = {str(p).split(".")[1].split("}")[0]: p for p in prompt_placeholder}
+        prompt_placeholder_list = [name for name, _ in prompt_placeholder]
+        prompt_placeholder_key_map = {name: p for name, p in prompt_placeholder}
         prompt_placeholder_map = {}
+        # 原始提示词与占位符取值, 编译后的提示词模板按原始提示词缓存, 取值在缓存查找后填充(见ChainModel.get_prompt_template)
+        prompt_values = {}
         for ppl in prompt_placeholder_list:
             if ppl not in kwargs:
                 if is_want_delete:
+                    for key in ("{business." + ppl + "}", "{system." + ppl + "}"):
+                        if key in prompt:
+                            prompt_values[key] = ""
                     prompt = prompt.replace("{business." + ppl + "}", "").replace("{system." + ppl + "}", "")
                 else:
                     logger.error(
@@ -66,6 +86,9 @@ class BaseChatMessage:
             key = prompt_placeholder_key_map[k]
             val = '' if not v else v
             prompt = prompt.replace(key, val)
+            prompt_values[key] = str(val)
+        chatBotModel.prompt_source = str(chatBotModel.prompt)
+        chatBotModel.prompt_values = prompt_values
         chatBotModel.prompt = prompt
 
     @classmethod
@@ -300,21 +323,10 @@ class BaseChatMessage:
         """
         if not answer:
             return answer
-        prohibited_List = get_prohibited_data()
-        for prohibited in prohibited_List.values():
-            try:
-                prohibited = eval(prohibited)
-                if prohibited["ruleType"] == '1':
-                    # 敏感词直接替换
-                    answer = answer.replace(prohibited['prohibited'], prohibited['replacement'])
-                elif prohibited["ruleType"] == '0':
-                    # 敏感词正则替换
-                    answer = re.sub(prohibited['regularExpression'], prohibited['replacement'], answer)
-            except Exception as e:
-                logger.warning("###Purge###: e={} prohibited={}.", e, prohibited)
+        # 敏感词过滤(规则编译后缓存, 规则版本变化时重新加载)
+        answer = get_prohibited_filter().purge(answer)
         # 智能策略 - 超链接格式处理
-        url_pattern = "(?:https?|ftp|file)://[-A-Za-z0-9+&@#/%?=~_|!:,.;]+[-A-Za-z0-9+&@#/%=~_|]"
-        url_collection = re.findall(url_pattern, answer)
+        url_collection = _URL_PATTERN.findall(answer)
         for url in url_collection:
             answer = answer.replace(url, " " + url + " ")
         return answer
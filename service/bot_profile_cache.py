@@ -0,0 +1,248 @@
+import copy
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.base_config import BOT_PROFILE_CACHE_SECONDS, BOT_PROFILE_CHANNEL
+from framework.redis.redis_client import RedisClient
+from service.domain.ai_bot_namespace_relation import AiBotNamespaceRelationDomain
+from service.domain.ai_chat_bot import AiChatBotDomain, ChatBotModel
+from service.domain.ai_namespace import AiNamespaceDomain
+
+# 失效通知订阅断开后的重连间隔(秒)
+LISTENER_RETRY_SECONDS = 5
+
+
+def _parse_version(version) -> Optional[int]:
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        return None
+
+
+class BotProfile:
+    """
+    机器人配置档案(按 bot_id + version 缓存)
+        - 机器人配置: 模型路由(llms_models/llms_base)已解析, 编译后的提示词模板缓存在compiled_templates中
+        - 领域问答机器人关联的知识库标识与知识库名称
+    """
+
+    def __init__(
+            self,
+            chatBotModel: ChatBotModel,
+            ttl_seconds: int,
+    ):
+        """
+        构造函数
+        :param chatBotModel: 机器人实体对象
+        :param ttl_seconds: 有效期(秒)
+        """
+        self.model = chatBotModel
+        # 模型路由配置预解析(解析结果按内容缓存, 见parse_config_json)
+        self.llms_models = chatBotModel.get_llms_models()
+        # 编译后的提示词模板, 通过配置副本的compiled_templates共享(见ChainModel.get_prompt_template)
+        self.templates = {}
+        self.bot_id = chatBotModel.bot_id
+        self.version = chatBotModel.version
+        self.nas_ids: Optional[tuple] = None
+        self.namespace_list: Optional[List[str]] = None
+        self.expires_at = time.monotonic() + ttl_seconds
+
+    def is_expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class BotProfileCache:
+    """
+    机器人配置缓存(进程内)
+    每次请求只做一次字典查找, 返回配置副本(提示词占位符处理会修改副本的prompt, 并记录原始提示词用于模板缓存);
+    到期后重新查询, 管理端修改配置后向BOT_PROFILE_CHANNEL发布通知, 各进程订阅后立即失效
+    """
+
+    def __init__(
+            self,
+            ttl_seconds: int = BOT_PROFILE_CACHE_SECONDS,
+            channel: str = BOT_PROFILE_CHANNEL,
+    ):
+        """
+        构造函数
+        :param ttl_seconds: 有效期(秒, 0为不缓存)
+        :param channel: 失效通知频道
+        """
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self._profiles: Dict[str, BotProfile] = {}
+        self._lock = threading.Lock()
+        # 每次失效递增, 查询期间发生失效时不写入缓存, 避免写入旧配置
+        self._generation = 0
+        self._listener: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _get_profile(self, bot_id: str) -> Optional[BotProfile]:
+        profile = self._profiles.get(bot_id)
+        if profile is None or profile.is_expired():
+            return None
+        return profile
+
+    @staticmethod
+    def _copy(profile: BotProfile) -> ChatBotModel:
+        chatBotModel = copy.copy(profile.model)
+        chatBotModel.compiled_templates = profile.templates
+        return chatBotModel
+
+    def peek_bot(self, bot_id: str) -> Optional[ChatBotModel]:
+        """
+        从缓存获取机器人配置(不查询数据库)
+        :param bot_id: 机器人标识
+        :return: 机器人配置副本, 未缓存时返回None
+        """
+        profile = self._get_profile(bot_id)
+        return self._copy(profile) if profile else None
+
+    def get_bot(self, bot_id: str, request_id: str = None) -> Optional[ChatBotModel]:
+        """
+        获取机器人配置, 未缓存时查询数据库
+        :param bot_id: 机器人标识
+        :param request_id: 请求唯一标识
+        :return: 机器人配置副本
+        """
+        chatBotModel = self.peek_bot(bot_id)
+        if chatBotModel:
+            return chatBotModel
+        generation = self._generation
+        chatBotModel = AiChatBotDomain(request_id).find_one(bot_id=bot_id)
+        if not chatBotModel or not self.enabled:
+            return chatBotModel
+        profile = BotProfile(chatBotModel, self.ttl_seconds)
+        with self._lock:
+            if generation == self._generation:
+                self._profiles[bot_id] = profile
+        return self._copy(profile)
+
+    def get_namespaces(
+            self,
+            chatBotModel: ChatBotModel,
+            request_id: str = None,
+    ) -> Tuple[Optional[tuple], Optional[List[str]]]:
+        """
+        获取领域问答机器人关联的知识库
+        :param chatBotModel: 机器人配置
+        :param request_id: 请求唯一标识
+        :return: 知识库标识列表, 知识库名称列表(未查询到时为None)
+        """
+        profile = self._get_profile(chatBotModel.bot_id)
+        if profile and profile.version == chatBotModel.version and profile.namespace_list is not None:
+            return profile.nas_ids, profile.namespace_list
+        generation = self._generation
+        nas_ids = AiBotNamespaceRelationDomain(request_id=request_id).find_nas_id_by_bot_id(chatBotModel.bot_id)
+        if not nas_ids:
+            return nas_ids, None
+        namespaceModelList = AiNamespaceDomain(request_id=request_id).find_namespace_by_list_id(nas_ids)
+        if not namespaceModelList:
+            return nas_ids, None
+        namespace_list = [str(namespaceModel.namespace) for namespaceModel in namespaceModelList]
+        if profile and profile.version == chatBotModel.version:
+            with self._lock:
+                if generation == self._generation:
+                    profile.nas_ids, profile.namespace_list = nas_ids, namespace_list
+        return nas_ids, namespace_list
+
+    def invalidate(self, bot_id: str = None, version=None):
+        """
+        失效机器人配置
+        :param bot_id: 机器人标识(为空时全部失效)
+        :param version: 新版本号(缓存版本不低于该版本时忽略, 用于丢弃乱序到达的旧通知)
+        """
+        with self._lock:
+            self._generation += 1
+            if not bot_id or bot_id == "*":
+                self._profiles.clear()
+                logger.info("###BotProfileCache INFO, 机器人配置缓存全部失效.")
+                return
+            profile = self._profiles.get(bot_id)
+            if profile is None:
+                return
+            cached, latest = _parse_version(profile.version), _parse_version(version)
+            if cached is not None and latest is not None and cached >= latest:
+                return
+            self._profiles.pop(bot_id, None)
+        logger.info("###BotProfileCache INFO, 机器人配置缓存失效, bot_id={}, version={}.", bot_id, version)
+
+    def _on_message(self, data: str):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            message = {"bot_id": data}
+        if not isinstance(message, dict):
+            message = {"bot_id": str(message)}
+        self.invalidate(bot_id=message.get("bot_id"), version=message.get("version"))
+
+    def start_listener(self):
+        """
+        启动失效通知订阅线程
+        """
+        if not self.enabled or self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, name="bot-profile-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        reconnect = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = RedisClient().subscribe(self.channel)
+                if reconnect:
+                    # 断开期间可能错过通知
+                    self.invalidate()
+                logger.info("###BotProfileCache INFO, 已订阅机器人配置失效通知, channel={}.", self.channel)
+                for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self._on_message(message.get("data"))
+            except Exception as err:
+                logger.warning("###BotProfileCache WARN, 机器人配置失效通知订阅中断, {}秒后重连, err={}.",
+                               LISTENER_RETRY_SECONDS, err)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            reconnect = True
+            time.sleep(LISTENER_RETRY_SECONDS)
+
+
+_cache: Optional[BotProfileCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_bot_profile_cache() -> BotProfileCache:
+    """
+    获取进程内共享的机器人配置缓存(首次获取时启动失效通知订阅)
+    :return: 机器人配置缓存
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = BotProfileCache()
+                cache.start_listener()
+                _cache = cache
+    return _cache
+
+
+def publish_bot_profile_changed(bot_id: str, version=None) -> int:
+    """
+    通知各进程机器人配置已修改(管理端递增version后调用)
+    :param bot_id: 机器人标识(*为全部)
+    :param version: 新版本号
+    :return: 收到通知的进程数
+    """
+    get_bot_profile_cache().invalidate(bot_id=bot_id, version=version)
+    return RedisClient().publish(BOT_PROFILE_CHANNEL, json.dumps({"bot_id": bot_id, "version": version}))
@@ -1,19 +1,18 @@
-import json
 import uuid
 from datetime import datetime
 from loguru import logger
 
+from config.base_config import CHAT_SAVE_PARTIAL_ANSWER
 from custom.bespin.bespin_sample_service import SampleService
 from framework.business_code import ERROR_10007, ERROR_10000, ERROR_10001
 from framework.business_except import BusinessException
 from models.chains.chain_model import ChainModel
+from models.llms.llm_stream_chunk import LlmStreamChunk
 from service.base_chat_message import BaseChatMessage
-from service.domain.ai_bot_namespace_relation import AiBotNamespaceRelationDomain
-from service.domain.ai_chat_bot import AiChatBotDomain
+from service.bot_profile_cache import get_bot_profile_cache
 from service.domain.ai_chat_history import AiChatHistoryDomain
-from service.domain.ai_namespace import AiNamespaceDomain
 from service.local_repo_service import LocalRepositoryDomain
-from service.chat_response import ChatResponse, ChatResponseVO
+from service.chat_response import ChatResponse
 from typing import Iterator, List, Dict
 
 from service.search_service import SearchService
@@ -56,7 +55,7 @@ class ChatPrivateDomain(BaseChatMessage):
         """
         question_time = datetime.now()
         # 查询机器人信息
-        chatBotModel = AiChatBotDomain(request_id=self.request_id).find_one(bot_id=bot_id)
+        chatBotModel = get_bot_profile_cache().get_bot(bot_id, request_id=self.request_id)
         if not chatBotModel:
             logger.error("ChatPrivateDomain_ask ERROR, [{}]未查询到机器人[{}]信息, request_id={}.", ERROR_10000, bot_id,
                          self.request_id)
@@ -65,16 +64,14 @@ class ChatPrivateDomain(BaseChatMessage):
             logger.error("ChatPrivateDomain_ask ERROR, [{}]当前机器人[{}]的使用类型不合法, request_id={}.", ERROR_10007,
                          bot_id, self.request_id)
             raise BusinessException(ERROR_10007.code, ERROR_10007.message)
-        # 查询知识库信息
-        botNamespace_tuple = AiBotNamespaceRelationDomain(request_id=self.request_id).find_nas_id_by_bot_id(
-            chatBotModel.bot_id)
+        # 查询知识库信息(一个机器人关联多个知识库)
+        botNamespace_tuple, namespace_list = get_bot_profile_cache().get_namespaces(chatBotModel,
+                                                                                    request_id=self.request_id)
         if not botNamespace_tuple:
             logger.error("ChatPrivateDomain_ask ERROR, ask_stream [{}]未查询到所属知识库[{}]信息, request_id={}.",
                          ERROR_10001, chatBotModel.bot_id, self.request_id)
             raise BusinessException(ERROR_10001.code, ERROR_10001.message)
-        # 一个机器人关联多个知识库逻辑
-        Namespace_list = AiNamespaceDomain(request_id=self.request_id).find_namespace_by_list_id(botNamespace_tuple)
-        namespace_list = [str(namespaceModel.namespace) for namespaceModel in Namespace_list]
+        namespace_list = namespace_list or []
 
         # 查询历史聊天记录
         history = self.query_chat_history(
@@ -149,7 +146,7 @@ class ChatPrivateDomain(BaseChatMessage):
         """
         question_time = datetime.now()
         # 查询机器人信息
-        chatBotModel = AiChatBotDomain(request_id=self.request_id).find_one(bot_id=bot_id)
+        chatBotModel = get_bot_profile_cache().get_bot(bot_id, request_id=self.request_id)
         if not chatBotModel:
             logger.error("ChatPrivateDomain_ask ERROR, ask_stream [{}]未查询到机器人[{}]信息, request_id={}.",
                          ERROR_10000, bot_id, self.request_id)
@@ -158,20 +155,17 @@ class ChatPrivateDomain(BaseChatMessage):
             logger.error("ChatPrivateDomain_ask ERROR, ask_stream [{}]当前机器人[{}]的使用类型不合法, request_id={}.",
                          ERROR_10007, bot_id, self.request_id)
             raise BusinessException(ERROR_10007.code, ERROR_10007.message)
-        # 查询知识库信息
-        botNamespace_tuple = AiBotNamespaceRelationDomain(request_id=self.request_id).find_nas_id_by_bot_id(
-            chatBotModel.bot_id)
+        # 查询知识库信息(一个机器人关联多个知识库)
+        botNamespace_tuple, namespace_list = get_bot_profile_cache().get_namespaces(chatBotModel,
+                                                                                    request_id=self.request_id)
         if not botNamespace_tuple:
             logger.error("ChatPrivateDomain_ask ERROR, ask_stream [{}]未查询到所属知识库ID[{}]信息, request_id={}.",
                          ERROR_10001, chatBotModel.bot_id, self.request_id)
             raise BusinessException(ERROR_10001.code, ERROR_10001.message)
-        # 一个机器人关联多个知识库逻辑
-        namespaceModelList = AiNamespaceDomain(request_id=self.request_id).find_namespace_by_list_id(botNamespace_tuple)
-        if not namespaceModelList:
+        if not namespace_list:
             logger.error("ChatPrivateDomain_ask ERROR, ask_stream [{}]未查询到相关知识库[{}]信息, request_id={}.",
-                         ERROR_10001, namespaceModelList, self.request_id)
+                         ERROR_10001, botNamespace_tuple, self.request_id)
             raise BusinessException(ERROR_10001.code, ERROR_10001.message)
-        namespace_list = [str(namespaceModel.namespace) for namespaceModel in namespaceModelList]
 
         # 查询历史聊天记录
         history = self.query_chat_history(
@@ -217,32 +211,60 @@ class ChatPrivateDomain(BaseChatMessage):
         answer = ""
         thinking = ""
         is_first = True
-        for chunk in chain.stream({"question": sub_ques, "context": input_context, "search_context": search_context,
-                                   "chat_history": " "}):
-            search_: List[Dict] = []
-            if is_first:
-                search_ = list(search)
-                is_first = False
-            chunk = json.loads(chunk) if chunk else chunk
-            flag, usage = self.is_dict_with_usage(chunk)
-            answer = answer if flag else answer + chunk.get("content")
-            answer_ = "[DONE]" if flag else chunk.get("content")
-            thinking_ = chunk.get("thinking")
-            thinking += thinking_
-            if answer_ == "[DONE]":
-                # 图表标签
-                answer = answer + self.get_label_content(metadata=metadata)
-                # 在answer里面增加溯源文件与免责信息
-                """
-                answer = self.get_answer_has_trace_content(
-                    answer,
-                    chatBotModel=chatBotModel,
-                    namespaceModel=namespaceModel,
-                    ques_docs=ques_docs,
-                    input_documents=input_documents
-                )
-                """
-                chat_response = self.purge_with_history(
+        saved = False
+        try:
+            for chunk in chain.stream({"question": sub_ques, "context": input_context, "search_context": search_context,
+                                       "chat_history": " "}):
+                search_: List[Dict] = []
+                if is_first:
+                    search_ = list(search)
+                    is_first = False
+                chunk: LlmStreamChunk = chunk
+                flag, usage = chunk.is_done, chunk.usage
+                answer = answer if flag else answer + chunk.content
+                answer_ = "[DONE]" if flag else chunk.content
+                thinking_ = chunk.thinking
+                thinking += thinking_
+                if answer_ == "[DONE]":
+                    # 图表标签
+                    answer = answer + self.get_label_content(metadata=metadata)
+                    # 在answer里面增加溯源文件与免责信息
+                    """
+                    answer = self.get_answer_has_trace_content(
+                        answer,
+                        chatBotModel=chatBotModel,
+                        namespaceModel=namespaceModel,
+                        ques_docs=ques_docs,
+                        input_documents=input_documents
+                    )
+                    """
+                    chat_response = self.purge_with_history(
+                        ques=ques,
+                        answer=answer,
+                        metadata=metadata,
+                        bot_id=bot_id,
+                        user_id=user_id,
+                        question_time=question_time,
+                        chatHistoryDomain=AiChatHistoryDomain(request_id=self.request_id),
+                        group_uuid=group_uuid,
+                        llms=chatBotModel.llms,
+                        llms_model_name=chatBotModel.get_llm_model_name(),
+                        **usage,
+                        **kwargs
+                    )
+                    saved = True
+                    chat_response.data.answer = answer_
+                    chat_response.data.thinking = thinking_
+                    chat_response.data.search = search_
+                    yield chat_response
+                else:
+                    yield ChatResponse.delta(answer=answer_, thinking=thinking_, search=search_)
+        except GeneratorExit:
+            # 客户端中途断开
+            logger.info("ChatPrivateDomain INFO, ask_stream request_id={}, 客户端已断开, 已生成回答=[{}].",
+                        self.request_id, answer)
+            if CHAT_SAVE_PARTIAL_ANSWER and answer and not saved:
+                self.purge_with_history(
                     ques=ques,
                     answer=answer,
                     metadata=metadata,
@@ -253,21 +275,9 @@ class ChatPrivateDomain(BaseChatMessage):
                     group_uuid=group_uuid,
                     llms=chatBotModel.llms,
                     llms_model_name=chatBotModel.get_llm_model_name(),
-                    **usage,
                     **kwargs
                 )
-                chat_response.data.answer = answer_
-                chat_response.data.thinking = thinking_
-                chat_response.data.search = search_
-                yield chat_response
-            else:
-                yield ChatResponse(
-                    data=ChatResponseVO(
-                        answer=answer_,
-                        thinking=thinking_,
-                        search=search_,
-                    )
-                )
+            raise
         logger.info(
             "ChatPublicDomain INFO, ask_stream request_id={}, 问题=[{}], 回答结果=[{}],思考过程=[{}],搜索结果=[{}].",
             self.request_id, ques, answer, thinking, search)
@@ -1,22 +1,26 @@
-import json
+import asyncio
 import uuid
 from datetime import datetime
-from typing import Iterator, List, Dict, AsyncIterator
+from typing import Any, Callable, Iterator, List, Dict, AsyncIterator
 
 from langchain_core.messages import AIMessageChunk, AIMessage
 from loguru import logger
 
 from config.base_config import HTTP_HOST, QUES_OPTIMIZER_MODEL, QUES_OPTIMIZER_MODEL_NAME, FILES_SUMMARY_MODEL, \
     FILES_SUMMARY_MODEL_NAME, INTENTION_RECOGNITION_MODEL, INTENTION_RECOGNITION_MODEL_NAME, THINKING_MODEL_NAME, \
-    THINKING_MODEL
+    THINKING_MODEL, CHAT_SPECULATIVE_GENERATION, CHAT_SAVE_PARTIAL_ANSWER
 from config.base_config_model_type import MODEL_TYPE_VL, MODEL_TYPE_TEXT
 from custom.bespin.bespin_sample_service import SampleService
 from framework.business_code import ERROR_10007, ERROR_10000
 from framework.business_except import BusinessException
+from framework.mysql.mysql_pool import run_in_db_executor, get_db_executor
+from framework.util.async_util import run_blocking
+from framework.util.stage_graph import StageGraph, PrefetchStream
 from models.chains.chain_model import ChainModel
+from models.llms.llm_stream_chunk import LlmStreamChunk
 from service.base_chat_message import BaseChatMessage
+from service.bot_profile_cache import get_bot_profile_cache
 from service.chat_response import ChatResponse, ChatResponseVO
-from service.domain.ai_chat_bot import AiChatBotDomain
 from service.domain.ai_chat_history import AiChatHistoryDomain
 from service.intention_recognition import MedicalDiagnosisChecker
 from service.map_reduce_summarizer import MapReduceSummarizer
@@ -90,7 +94,7 @@ class ChatPublicDomain(BaseChatMessage):
         """
         question_time = datetime.now()
         # 根据标识查询机器人配置信息
-        chatBotModel = AiChatBotDomain(self.request_id).find_one(bot_id=bot_id)
+        chatBotModel = get_bot_profile_cache().get_bot(bot_id, request_id=self.request_id)
         logger.info("ChatPublicDomain INFO, request_id={}, 当前机器人信息：{}.", self.request_id, chatBotModel)
         if not chatBotModel:
             logger.error("ChatPublicDomain ERROR, [{}]未查询到机器人[{}]信息, request_id={}.", ERROR_10000, bot_id,
@@ -152,7 +156,7 @@ class ChatPublicDomain(BaseChatMessage):
         """
         question_time = datetime.now()
         # 根据标识查询机器人配置信息
-        chatBotModel = AiChatBotDomain(self.request_id).find_one(bot_id=bot_id)
+        chatBotModel = get_bot_profile_cache().get_bot(bot_id, request_id=self.request_id)
         logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前机器人信息：{}.", self.request_id,
                     chatBotModel)
         if not chatBotModel:
@@ -254,11 +258,11 @@ class ChatPublicDomain(BaseChatMessage):
             if is_first:
                 search_ = list(search)
                 is_first = False
-            chunk = json.loads(chunk) if chunk else chunk
-            flag, usage = self.is_dict_with_usage(chunk)
-            answer = answer if flag else answer + chunk.get("content")
-            answer_ = "[DONE]" if flag else chunk.get("content")
-            thinking_ = chunk.get("thinking")
+            chunk: LlmStreamChunk = chunk
+            flag, usage = chunk.is_done, chunk.usage
+            answer = answer if flag else answer + chunk.content
+            answer_ = "[DONE]" if flag else chunk.content
+            thinking_ = chunk.thinking
             thinking += thinking_
             if answer_ == "[DONE]":
                 chat_response = self.purge_with_history(
@@ -281,13 +285,7 @@ class ChatPublicDomain(BaseChatMessage):
                 chat_response.data.search = search_
                 yield chat_response
             else:
-                yield ChatResponse(
-                    data=ChatResponseVO(
-                        answer=answer_,
-                        thinking=thinking_,
-                        search=search_
-                    )
-                )
+                yield ChatResponse.delta(answer=answer_, thinking=thinking_, search=search_)
         logger.info(
             "ChatPublicDomain INFO, ask_stream request_id={}, 问题=[{}], 回答结果=[{}],思考过程=[{}],搜索结果=[{}].",
             self.request_id, ques, answer, thinking, search)
@@ -303,6 +301,8 @@ class ChatPublicDomain(BaseChatMessage):
     ) -> AsyncIterator[ChatResponse]:
         """
         公共知识问答-聊天模型
+        各前置阶段按依赖关系并发执行(见build_chat_stage_graph), 主模型在意图识别完成前投机发起,
+        首字延迟由各阶段耗时之和降为最长依赖链耗时。
         :param enable_ques_optimizer: 是否开启问题优化
         :param ques: 问题
         :param bot_id: 机器人标识
@@ -311,130 +311,192 @@ class ChatPublicDomain(BaseChatMessage):
         :return: AI回答内容
         """
         question_time = datetime.now()
-        # 根据标识查询机器人配置信息
-        chatBotModel = AiChatBotDomain(self.request_id).find_one(bot_id=bot_id)
-        logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前机器人信息：{}.", self.request_id,
-                    chatBotModel)
-        if not chatBotModel:
-            logger.error("ChatPublicDomain ERROR, ask_stream [{}]未查询到机器人[{}]信息, request_id={}.", ERROR_10000,
-                         bot_id, self.request_id)
-            raise BusinessException(ERROR_10000.code, ERROR_10000.message)
-        if not chatBotModel.is_public_bot():
-            logger.error("ChatPublicDomain ERROR, ask_stream [{}]当前机器人[{}]的使用类型不合法, request_id={}.",
-                         ERROR_10007, bot_id, self.request_id)
-            raise BusinessException(ERROR_10007.code, ERROR_10007.message)
-
-        llms, llm_model_name = ChainModel.get_llms_model(chatBotModel, MODEL_TYPE_TEXT)
-
-        # 查询历史聊天记录
-        history = self.query_chat_history(
-            request_id=self.request_id,
-            user_id=user_id,
-            bot_id=bot_id,
-            memory_limit_size=chatBotModel.memory_limit_size,
-            group_uuid=group_uuid
-        )
-        logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前历史聊天记录：{}.", self.request_id, history)
-
-        # 将所有question通过换行符拼接
-        combined_questions = '\n'.join([item.question for item in history])
-
-        # 图片识别前置，识别的内容参与意图识别
-        # 聊天附件处理
-        files, images, preprocessedFiles = await self.handle_files(kwargs)
-
-        # VL模型处理图片
-        vl_answer = await self.invoke_images(chatBotModel, images, kwargs, IMAGES_SUMMARY_FIXED_QUES)
-
-        # 意图识别
-        intention_ques = vl_answer + combined_questions + ques
-        checker = MedicalDiagnosisChecker(model=INTENTION_RECOGNITION_MODEL, model_name=INTENTION_RECOGNITION_MODEL_NAME)
-        intention_response = checker.get_response(intention_ques)
-        if intention_response:
-            answers = [intention_response, "[DONE]"]
-            for ans in answers:
-                if ans != "[DONE]":
-                    chat_response = self.purge_with_history(
-                        ques=ques,
-                        answer=ans,
-                        bot_id=bot_id,
-                        user_id=user_id,
-                        question_time=question_time,
-                        chatHistoryDomain=AiChatHistoryDomain(self.request_id),
-                        group_uuid=group_uuid,
-                        llms=chatBotModel.llms,
-                        llms_model_name=llm_model_name,
-                        voice=kwargs.get("voice"),
-                    )
-                    chat_response.data.answer = ans
-                    yield chat_response
+        # 附件摘要进度, 等待准备阶段期间以进度帧输出
+        progress: asyncio.Queue = asyncio.Queue()
+        graph = self.build_chat_stage_graph(ques=ques, bot_id=bot_id, user_id=user_id, group_uuid=group_uuid,
+                                            kwargs=kwargs, on_progress=progress.put_nowait).start()
+        stream = None
+        prepare_task = None
+        answer = ""
+        saved = False
+        try:
+            chatBotModel = await graph.get("bot")
+            history = await graph.get("history")
+            files, images, preprocessedFiles = await graph.get("attachments")
+            vl_answer = await graph.get("vl")
+            llms, llm_model_name = ChainModel.get_llms_model(chatBotModel, MODEL_TYPE_TEXT)
+
+            async def prepare_context():
+                history_files_summary_ = await graph.get("files_summary")
+                plugin_ques_, sub_ques_ = await graph.get("plugin")
+
+                # # 问题优化
+                # opt_ques = sub_ques
+                # if enable_ques_optimizer:
+                #     optimizer = MedicalQuestionOptimizer(model=QUES_OPTIMIZER_MODEL, model_name=QUES_OPTIMIZER_MODEL_NAME)
+                #     opt_ques = optimizer.optimize_question(sub_ques)
+                #     logger.info("ChatPublicDomain INFO, ask_stream request_id={}, sub_ques={}, opt_ques={}.", self.request_id, sub_ques, opt_ques)
+
+                files_context_ = await graph.get("files") + vl_answer
+                # 合并历史会话附件内容与当前的附件内容
+                final_files_context_ = "<历史附件信息>" + history_files_summary_ + "</历史附件信息><当前问题附件信息>" + files_context_ + "</当前问题附件信息>"
+                return plugin_ques_, sub_ques_, files_context_, final_files_context_
+
+            # 附件摘要等准备阶段与意图识别同时等待, 意图识别先完成且为非医学问题时直接拒绝, 不再等待准备阶段
+            prepare_task = asyncio.ensure_future(prepare_context())
+            if not graph.done("intent"):
+                await asyncio.wait({prepare_task, graph.task("intent")}, return_when=asyncio.FIRST_COMPLETED)
+            intent_task_done = graph.done("intent")
+            intention_response = await graph.get("intent") if intent_task_done else None
+            if intention_response:
+                prepare_task.cancel()
+                await asyncio.gather(prepare_task, return_exceptions=True)
+            else:
+                async for event in wait_with_progress(prepare_task, progress):
+                    yield ChatResponse.progress(event)
+                plugin_ques, sub_ques, files_context, final_files_context = await prepare_task
+
+                # 发起主模型请求; 意图识别未完成时投机执行, 结果先缓存不输出
+                if kwargs.get("enable_search"):
+                    # 代理模型
+                    agent = ChainModel.get_chat_agent_instance_stream(chatBotModel=chatBotModel, history=history, **kwargs)
+                    source = agent.astream_events({"question": sub_ques,
+                                                   "files_context": final_files_context,
+                                                   "chat_history": ""}, version="v2")
                 else:
-                    # 返回结束符
-                    yield ChatResponse(
-                        data=ChatResponseVO(
+                    chain = ChainModel.get_chat_instance_stream(chatBotModel=chatBotModel, history=history, **kwargs)
+                    source = chain.astream({"question": sub_ques, "files_context": final_files_context, "chat_history": ""})
+                if CHAT_SPECULATIVE_GENERATION and not intent_task_done:
+                    stream = PrefetchStream(source).start()
+                    source = stream
+                intention_response = await graph.get("intent")
+
+            if intention_response:
+                if stream:
+                    stream.cancel()
+                    logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 非医学问题, 已取消投机生成.",
+                                self.request_id)
+                graph.log_timings(intention=True)
+                answers = [intention_response, "[DONE]"]
+                for ans in answers:
+                    if ans != "[DONE]":
+                        chat_response = await run_in_db_executor(
+                            self.purge_with_history,
+                            ques=ques,
                             answer=ans,
+                            bot_id=bot_id,
+                            user_id=user_id,
+                            question_time=question_time,
+                            chatHistoryDomain=AiChatHistoryDomain(self.request_id),
+                            group_uuid=group_uuid,
+                            llms=chatBotModel.llms,
+                            llms_model_name=llm_model_name,
+                            voice=kwargs.get("voice"),
                         )
-                    )
-            return
-
-        # 查询历史聊天附件summary记录
-        history_files_summary = self.query_chat_history_files_summary(
-            request_id=self.request_id,
-            history=history,
-        )
-        logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前历史聊天关联的附件摘要信息：{}.", self.request_id, history_files_summary)
-
-        # 样例插件
-        ques, sub_ques = SampleService(request_id=self.request_id).plugin(
-            ques=ques,
-            chatBotModel=chatBotModel,
-            history=ChainModel.init_memory(history=history)[1]
-        )
-
-        # # 问题优化
-        # opt_ques = sub_ques
-        # if enable_ques_optimizer:
-        #     optimizer = MedicalQuestionOptimizer(model=QUES_OPTIMIZER_MODEL, model_name=QUES_OPTIMIZER_MODEL_NAME)
-        #     opt_ques = optimizer.optimize_question(sub_ques)
-        #     logger.info("ChatPublicDomain INFO, ask_stream request_id={}, sub_ques={}, opt_ques={}.", self.request_id, sub_ques, opt_ques)
-
-        # 文本模型处理文件
-        files_answer = await self.invoke_files(preprocessedFiles, FILE_SUMMARY_FIXED_QUES)
-        files_context = files_answer + vl_answer
-
-        # 合并历史会话附件内容与当前的附件内容
-        final_files_context = "<历史附件信息>" + history_files_summary + "</历史附件信息><当前问题附件信息>" + files_context + "</当前问题附件信息>"
-
-        # 处理模型类型
-        answer = ""
-        thinking = ""
-        search = ""
-        usage = {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0}
-        logger.info("ChatPublicDomain INFO, ask_stream request_id={}, chain.prompt={}.", self.request_id, "?")
-        # 开启联网搜索模式
-        if kwargs.get("enable_search"):
-            # 代理模型
-            agent = ChainModel.get_chat_agent_instance_stream(chatBotModel=chatBotModel, history=history, **kwargs)
-            async for event in agent.astream_events({"question": sub_ques,
-                                                     "files_context": final_files_context,
-                                                     "chat_history": ""}, version="v2"):
-                kind = event["event"]
-                answer_ = ""
-                thinking_ = ""
+                        chat_response.data.answer = ans
+                        yield chat_response
+                    else:
+                        # 返回结束符
+                        yield ChatResponse(
+                            data=ChatResponseVO(
+                                answer=ans,
+                            )
+                        )
+                return
+            graph.log_timings(speculative=stream is not None)
+            ques = plugin_ques
+
+            # 处理模型类型
+            answer = ""
+            thinking = ""
+            search = ""
+            usage = {"total_tokens": 0, "input_tokens": 0, "output_tokens": 0}
+            logger.info("ChatPublicDomain INFO, ask_stream request_id={}, chain.prompt={}.", self.request_id, "?")
+            # 开启联网搜索模式
+            if kwargs.get("enable_search"):
+                async for event in source:
+                    kind = event["event"]
+                    answer_ = ""
+                    thinking_ = ""
+                    has_think = False
+                    # LLM 开始生成文本（逐字输出）
+                    if kind == "on_chat_model_stream":
+                        chunk = event["data"]["chunk"]
+                        is_thinking = chunk.response_metadata.get("is_thinking", False)
+                        is_answer = chunk.response_metadata.get("is_answer", False)
+                        BaseChatMessage.is_dict_with_usage_metadata(chunk.usage_metadata, usage)
+                        content = chunk.content
+                        if content == "<think>":
+                            has_think = True
+                            continue
+                        if content == "</think>":
+                            has_think = False
+                            continue
+                        if content:
+                            if is_answer and not has_think:
+                                answer += content
+                                answer_ = content
+                            if is_thinking or has_think:
+                                thinking += content
+                                thinking_ = content
+                            yield ChatResponse.delta(answer=answer_, thinking=thinking_, search=[])
+                        finish_reason = chunk.response_metadata.get("finish_reason", "") == "stop"
+                        if finish_reason:
+                            answer_ = "[DONE]"
+                            chat_response = await run_in_db_executor(
+                                BaseChatMessage.purge_with_history,
+                                ques=sub_ques,
+                                answer=answer,
+                                bot_id=bot_id,
+                                user_id=user_id,
+                                question_time=question_time,
+                                chatHistoryDomain=AiChatHistoryDomain(self.request_id),
+                                group_uuid=group_uuid,
+                                llms=chatBotModel.llms,
+                                llms_model_name=chatBotModel.get_llm_model_name(),
+                                thinking=thinking,
+                                search=search,
+                                files=files,
+                                files_context=files_context,
+                                voice=kwargs.get("voice"),
+                                **usage,
+                            )
+                            saved = True
+                            chat_response.data.answer = answer_
+                            chat_response.data.thinking = thinking_
+                            chat_response.data.search = []
+                            yield chat_response
+                    # 代理决定调用工具（显示加载状态）
+                    elif kind == "on_tool_start":
+                        tool_name = event["name"]
+                        logger.info("[正在调用工具: {}]...", tool_name)
+                    # 工具返回结果后继续流式输出
+                    elif kind == "on_tool_end":
+                        search_ = event["data"]["output"]
+                        search = search_
+                        yield ChatResponse(
+                            data=ChatResponseVO(
+                                answer=answer_,
+                                thinking=thinking_,
+                                search=search_
+                            )
+                        )
+            else:
                 has_think = False
-                # LLM 开始生成文本（逐字输出）
-                if kind == "on_chat_model_stream":
-                    chunk = event["data"]["chunk"]
+                async for chunk in source:
+                    chunk: AIMessageChunk = chunk
                     is_thinking = chunk.response_metadata.get("is_thinking", False)
                     is_answer = chunk.response_metadata.get("is_answer", False)
-                    BaseChatMessage.is_dict_with_usage_metadata(chunk.usage_metadata, usage)
-                    content = chunk.content
-                    if content == "<think>":
+                    if chunk.content == "<think>":
                         has_think = True
                         continue
-                    if content == "</think>":
+                    if chunk.content == "</think>":
                         has_think = False
                         continue
+                    answer_ = ""
+                    thinking_ = ""
+                    BaseChatMessage.is_dict_with_usage_metadata(chunk.usage_metadata, usage)
+                    content = chunk.content
                     if content:
                         if is_answer and not has_think:
                             answer += content
@@ -442,17 +504,12 @@ class ChatPublicDomain(BaseChatMessage):
                         if is_thinking or has_think:
                             thinking += content
                             thinking_ = content
-                        yield ChatResponse(
-                            data=ChatResponseVO(
-                                answer=answer_,
-                                thinking=thinking_,
-                                search=[]
-                            )
-                        )
+                        yield ChatResponse.delta(answer=answer_, thinking=thinking_, search=[])
                     finish_reason = chunk.response_metadata.get("finish_reason", "") == "stop"
                     if finish_reason:
                         answer_ = "[DONE]"
-                        chat_response = BaseChatMessage.purge_with_history(
+                        chat_response = await run_in_db_executor(
+                            BaseChatMessage.purge_with_history,
                             ques=sub_ques,
                             answer=answer,
                             bot_id=bot_id,
@@ -469,83 +526,147 @@ class ChatPublicDomain(BaseChatMessage):
                             voice=kwargs.get("voice"),
                             **usage,
                         )
+                        saved = True
                         chat_response.data.answer = answer_
                         chat_response.data.thinking = thinking_
                         chat_response.data.search = []
                         yield chat_response
-                # 代理决定调用工具（显示加载状态）
-                elif kind == "on_tool_start":
-                    tool_name = event["name"]
-                    logger.info("[正在调用工具: {}]...", tool_name)
-                # 工具返回结果后继续流式输出
-                elif kind == "on_tool_end":
-                    search_ = event["data"]["output"]
-                    search = search_
-                    yield ChatResponse(
-                        data=ChatResponseVO(
-                            answer=answer_,
-                            thinking=thinking_,
-                            search=search_
-                        )
-                    )
-        else:
-            chain = ChainModel.get_chat_instance_stream(chatBotModel=chatBotModel, history=history, **kwargs)
-            has_think = False
-            for chunk in chain.stream({"question": sub_ques, "files_context": final_files_context, "chat_history": ""}):
-                chunk: AIMessageChunk = chunk
-                is_thinking = chunk.response_metadata.get("is_thinking", False)
-                is_answer = chunk.response_metadata.get("is_answer", False)
-                if chunk.content == "<think>":
-                    has_think = True
-                    continue
-                if chunk.content == "</think>":
-                    has_think = False
-                    continue
-                answer_ = ""
-                thinking_ = ""
-                BaseChatMessage.is_dict_with_usage_metadata(chunk.usage_metadata, usage)
-                content = chunk.content
-                if content:
-                    if is_answer and not has_think:
-                        answer += content
-                        answer_ = content
-                    if is_thinking or has_think:
-                        thinking += content
-                        thinking_ = content
-                    yield ChatResponse(
-                        data=ChatResponseVO(
-                            answer=answer_,
-                            thinking=thinking_,
-                            search=[]
-                        )
-                    )
-                finish_reason = chunk.response_metadata.get("finish_reason", "") == "stop"
-                if finish_reason:
-                    answer_ = "[DONE]"
-                    chat_response = BaseChatMessage.purge_with_history(
-                        ques=sub_ques,
-                        answer=answer,
-                        bot_id=bot_id,
-                        user_id=user_id,
-                        question_time=question_time,
-                        chatHistoryDomain=AiChatHistoryDomain(self.request_id),
-                        group_uuid=group_uuid,
-                        llms=chatBotModel.llms,
-                        llms_model_name=chatBotModel.get_llm_model_name(),
-                        thinking=thinking,
-                        search=search,
-                        files=files,
-                        files_context=files_context,
-                        voice=kwargs.get("voice"),
-                        **usage,
-                    )
-                    chat_response.data.answer = answer_
-                    chat_response.data.thinking = thinking_
-                    chat_response.data.search = []
-                    yield chat_response
-        logger.info(
-            "ChatPublicDomain INFO, ask_stream request_id={}, 问题=[{}], 回答结果=[{}],思考过程=[{}],搜索结果=[{}].",
-            self.request_id, ques, answer, thinking, search)
+            logger.info(
+                "ChatPublicDomain INFO, ask_stream request_id={}, 问题=[{}], 回答结果=[{}],思考过程=[{}],搜索结果=[{}].",
+                self.request_id, ques, answer, thinking, search)
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端中途断开
+            logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 客户端已断开, 已生成回答=[{}].",
+                        self.request_id, answer)
+            if CHAT_SAVE_PARTIAL_ANSWER and answer and not saved:
+                # 当前任务已取消, 提交到数据库线程池后台保存
+                get_db_executor().submit(
+                    BaseChatMessage.purge_with_history,
+                    ques=sub_ques,
+                    answer=answer,
+                    bot_id=bot_id,
+                    user_id=user_id,
+                    question_time=question_time,
+                    chatHistoryDomain=AiChatHistoryDomain(self.request_id),
+                    group_uuid=group_uuid,
+                    llms=chatBotModel.llms,
+                    llms_model_name=chatBotModel.get_llm_model_name(),
+                    thinking=thinking,
+                    search=search,
+                    files=files,
+                    files_context=files_context,
+                    voice=kwargs.get("voice"),
+                    **usage,
+                )
+            raise
+        finally:
+            if stream:
+                stream.cancel()
+            if prepare_task and not prepare_task.done():
+                prepare_task.cancel()
+            graph.cancel()
+
+    def build_chat_stage_graph(
+            self,
+            ques: str,
+            bot_id: str,
+            user_id: str,
+            group_uuid: str,
+            kwargs: dict,
+            on_progress: Callable[[Dict], Any] = None,
+    ) -> StageGraph:
+        """
+        构建聊天前置处理的依赖图
+            bot(机器人) ─┬─ history(历史记录) ─┬─ files_summary(历史附件摘要)
+                         │                     ├─ plugin(样例插件)
+            attachments ─┼─ vl(图片识别) ──────┴─ intent(意图识别)
+                         └─ files(文件摘要)
+        :param ques: 问题
+        :param bot_id: 机器人标识
+        :param user_id: 用户标识
+        :param group_uuid: 会话分组标识
+        :param kwargs: 扩展参数
+        :param on_progress: 附件摘要进度回调
+        :return: 依赖图执行器
+        """
+        async def _bot():
+            # 根据标识查询机器人配置信息(未缓存时数据库操作放到专用线程池, 不阻塞事件循环)
+            cache = get_bot_profile_cache()
+            chatBotModel = cache.peek_bot(bot_id) or await run_in_db_executor(cache.get_bot, bot_id,
+                                                                              request_id=self.request_id)
+            logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前机器人信息：{}.", self.request_id,
+                        chatBotModel)
+            if not chatBotModel:
+                logger.error("ChatPublicDomain ERROR, ask_stream [{}]未查询到机器人[{}]信息, request_id={}.",
+                             ERROR_10000, bot_id, self.request_id)
+                raise BusinessException(ERROR_10000.code, ERROR_10000.message)
+            if not chatBotModel.is_public_bot():
+                logger.error("ChatPublicDomain ERROR, ask_stream [{}]当前机器人[{}]的使用类型不合法, request_id={}.",
+                             ERROR_10007, bot_id, self.request_id)
+                raise BusinessException(ERROR_10007.code, ERROR_10007.message)
+            return chatBotModel
+
+        async def _history(bot):
+            history = await run_in_db_executor(
+                self.query_chat_history,
+                request_id=self.request_id,
+                user_id=user_id,
+                bot_id=bot_id,
+                memory_limit_size=bot.memory_limit_size,
+                group_uuid=group_uuid
+            )
+            logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前历史聊天记录：{}.", self.request_id,
+                        history)
+            return history
+
+        async def _attachments():
+            # 聊天附件处理
+            return await self.handle_files(kwargs)
+
+        async def _vl(bot, attachments):
+            # VL模型处理图片, 识别的内容参与意图识别
+            return await self.invoke_images(bot, attachments[1], kwargs, IMAGES_SUMMARY_FIXED_QUES)
+
+        async def _files(attachments):
+            # 文本模型处理文件
+            return await self.invoke_files(attachments[2], FILE_SUMMARY_FIXED_QUES, on_progress=on_progress)
+
+        async def _intent(history, vl):
+            # 意图识别: 图片内容 + 历史问题(换行拼接) + 当前问题
+            combined_questions = '\n'.join([item.question for item in history])
+            checker = MedicalDiagnosisChecker(model=INTENTION_RECOGNITION_MODEL,
+                                              model_name=INTENTION_RECOGNITION_MODEL_NAME)
+            return await checker.aget_response(vl + combined_questions + ques)
+
+        async def _files_summary(history):
+            # 查询历史聊天附件summary记录
+            history_files_summary = await run_in_db_executor(
+                self.query_chat_history_files_summary,
+                request_id=self.request_id,
+                history=history,
+            )
+            logger.info("ChatPublicDomain INFO, ask_stream request_id={}, 当前历史聊天关联的附件摘要信息：{}.",
+                        self.request_id, history_files_summary)
+            return history_files_summary
+
+        async def _plugin(bot, history):
+            # 样例插件(同步实现, 兜底放到线程池执行)
+            return await run_blocking(
+                SampleService(request_id=self.request_id).plugin,
+                ques=ques,
+                chatBotModel=bot,
+                history=ChainModel.init_memory(history=history)[1]
+            )
+
+        return (StageGraph(name="ask_chat_stream", request_id=self.request_id)
+                .add("bot", _bot)
+                .add("attachments", _attachments)
+                .add("history", _history, deps=["bot"])
+                .add("vl", _vl, deps=["bot", "attachments"])
+                .add("files", _files, deps=["attachments"])
+                .add("intent", _intent, deps=["history", "vl"])
+                .add("files_summary", _files_summary, deps=["history"])
+                .add("plugin", _plugin, deps=["bot", "history"]))
 
     async def handle_files(self,  kwargs):
         """
@@ -585,25 +706,54 @@ class ChatPublicDomain(BaseChatMessage):
             chain = ChainModel.get_chat_instance_stream_common(prompt=ques, model=llms, model_name= llm_model_name, model_type=MODEL_TYPE_VL,
                                                         images=images, **kwargs)
             logger.info("invoke_images images={}", images)
-            response = chain.invoke(input={})
+            response = await chain.ainvoke(input={})
             logger.info("invoke_images result={}", response)
             response: AIMessage = response
             return "<图片内容>" + response.content + "</图片内容>" if response and response.content else ""
         return ""
 
-    async def invoke_files(self, files, ques):
+    async def invoke_files(self, files, ques, on_progress: Callable[[Dict], Any] = None):
         """
         处理聊天文件信息，将相关的聊天文件，逐个分块进行总结，得到最后的summary结果
         :param files:
         :param ques:
+        :param on_progress: 进度回调
         :return:
         """
+
+        def _progress(event):
+            logger.info("invoke_files request_id={}, progress={}", self.request_id, event)
+            if on_progress:
+                on_progress(event)
+
         filesContents = ""
         if files and len(files) > 0:
             summarizer = MapReduceSummarizer(model=FILES_SUMMARY_MODEL, model_name=FILES_SUMMARY_MODEL_NAME)
-            contents = summarizer.get_content(files=files, question=ques)
+            contents = await summarizer.aget_content(
+                files=files,
+                question=ques,
+                on_progress=_progress
+            )
             logger.info("summarizer.get_content result={}", contents)
             if contents and len(contents) > 0:
                 for content in contents:
                     filesContents += "<" + content["fileName"] + ">" + content["content"] + "</" + content["fileName"] + ">"
         return "<文件内容>" + filesContents + "</文件内容>" if filesContents else ""
+
+
+async def wait_with_progress(task: asyncio.Future, progress: asyncio.Queue) -> AsyncIterator[Dict]:
+    """
+    等待任务完成, 期间逐条输出进度事件(任务完成后未输出的进度不再输出)
+    :param task: 任务
+    :param progress: 进度事件队列
+    :return: 进度事件
+    """
+    while not task.done():
+        getter = asyncio.ensure_future(progress.get())
+        try:
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if not getter.cancelled():
+            yield getter.result()
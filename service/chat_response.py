@@ -144,6 +144,11 @@ class ChatResponseVO(BaseModel):
         title="label_list",
         description="表格标签列表"
     )
+    progress: dict | None = Field(
+        default=None,
+        title="progress",
+        description="附件摘要进度{fileName, phase(cache/map/reduce/refine/done), done, total}",
+    )
 
 
 class ChatResponse(QueryResponse):
@@ -156,6 +161,26 @@ class ChatResponse(QueryResponse):
         description="业务数据",
     )
 
+    @classmethod
+    def delta(cls, answer: str = "", thinking: str = "", search: List[dict] = None) -> "ChatResponse":
+        """
+        流式文本分片(跳过字段校验, 只用于服务内部逐字输出的分片)
+        :param answer: 回答内容
+        :param thinking: 思考过程
+        :param search: 搜索结果
+        :return: 聊天问答返回结构体
+        """
+        return cls.model_construct(data=ChatResponseVO.model_construct(answer=answer, thinking=thinking, search=search))
+
+    @classmethod
+    def progress(cls, event: dict) -> "ChatResponse":
+        """
+        附件摘要进度帧(回答内容为空)
+        :param event: 进度事件
+        :return: 聊天问答返回结构体
+        """
+        return cls(data=ChatResponseVO(progress=event))
+
     class Config:
         json_schema_extra = {
             "example": {
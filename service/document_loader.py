@@ -0,0 +1,180 @@
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain.docstore.document import Document
+from langchain_community.document_loaders import UnstructuredFileLoader, UnstructuredHTMLLoader
+from loguru import logger
+from pypdf import PdfReader
+
+from config.base_config import (
+    DOCUMENT_PDF_BACKEND,
+    DOCUMENT_HTML_BACKEND,
+    DOCUMENT_PDF_PARALLEL_PAGES,
+    DOCUMENT_PDF_BATCH_PAGES,
+    DOCUMENT_LOADER_PROCESSES)
+
+try:
+    import fitz  # PyMuPDF, 可选的PDF解析后端
+except ImportError:
+    fitz = None
+
+PDF_BACKEND_PYPDF = "pypdf"
+PDF_BACKEND_PYMUPDF = "pymupdf"
+HTML_BACKEND_UNSTRUCTURED = "unstructured"
+HTML_BACKEND_LXML = "lxml"
+
+"""
+文档加载器注册表: 扩展名(.pdf)或MIME类型(application/pdf) -> 加载函数(file_path) -> 按页惰性产出的文档
+未注册的类型以unstructured按文件路径直接加载
+"""
+DOCUMENT_LOADERS: Dict[str, Callable[[str], Iterator[Document]]] = {}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def register_document_loader(*keys: str):
+    """
+    注册文档加载函数
+    :param keys: 扩展名或MIME类型
+    :return: 装饰器
+    """
+    def decorator(loader: Callable[[str], Iterator[Document]]) -> Callable[[str], Iterator[Document]]:
+        for key in keys:
+            DOCUMENT_LOADERS[key.lower()] = loader
+        return loader
+    return decorator
+
+
+def get_document_executor() -> ProcessPoolExecutor:
+    """
+    获取文档解析专用进程池(spawn方式启动, 避免复制父进程中的线程与锁)
+    :return: 进程池
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=DOCUMENT_LOADER_PROCESSES,
+                                                mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def iter_documents(
+        file_path: str,
+        mime_type: str = None,
+) -> Iterator[Document]:
+    """
+    按文件路径加载文档(优先按扩展名, 其次按MIME类型选择加载器)
+    :param file_path: 文件路径
+    :param mime_type: MIME类型(为空时按文件名推断)
+    :return: 按页惰性产出的文档
+    """
+    suffix = os.path.splitext(file_path)[1].lower()
+    mime_type = (mime_type or mimetypes.guess_type(file_path)[0] or "").lower()
+    loader = DOCUMENT_LOADERS.get(suffix) or DOCUMENT_LOADERS.get(mime_type) or load_unstructured
+    logger.info("###DocumentLoader INFO, 加载文档, path={}, suffix={}, mime_type={}, loader={}.", file_path, suffix,
+                mime_type, loader.__name__)
+    return loader(file_path)
+
+
+def load_unstructured(file_path: str) -> Iterator[Document]:
+    yield from UnstructuredFileLoader(file_path=file_path).lazy_load()
+
+
+def _pdf_backend() -> str:
+    if DOCUMENT_PDF_BACKEND == PDF_BACKEND_PYMUPDF and fitz is None:
+        logger.warning("###DocumentLoader WARN, 未安装PyMuPDF, PDF解析退化为pypdf.")
+        return PDF_BACKEND_PYPDF
+    return DOCUMENT_PDF_BACKEND
+
+
+def _pdf_page_count(file_path: str, backend: str) -> int:
+    if backend == PDF_BACKEND_PYMUPDF:
+        with fitz.open(file_path) as pdf:
+            return pdf.page_count
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(
+        file_path: str,
+        start: int,
+        end: int,
+        backend: str = PDF_BACKEND_PYPDF,
+) -> List[str]:
+    """
+    提取PDF指定页段的文本(模块级函数, 可在子进程中执行)
+    :param file_path: 文件路径
+    :param start: 起始页(含, 从0开始)
+    :param end: 结束页(不含)
+    :param backend: 解析后端
+    :return: 各页文本
+    """
+    if backend == PDF_BACKEND_PYMUPDF:
+        with fitz.open(file_path) as pdf:
+            return [pdf[i].get_text() for i in range(start, end)]
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def _iter_pdf_pages(file_path: str, backend: str) -> Iterator[str]:
+    if backend == PDF_BACKEND_PYMUPDF:
+        with fitz.open(file_path) as pdf:
+            for page in pdf:
+                yield page.get_text()
+        return
+    for page in PdfReader(file_path).pages:
+        yield page.extract_text()
+
+
+@register_document_loader(".pdf", "application/pdf")
+def load_pdf(file_path: str) -> Iterator[Document]:
+    """
+    PDF按页加载(元数据与PyPDFLoader一致: source、page)
+    页数达到阈值时按页段提交进程池并行解析, 按页序产出, 前面的页段解析完成即可开始切割
+    :param file_path: 文件路径
+    :return: 按页惰性产出的文档
+    """
+    backend = _pdf_backend()
+    page_count = _pdf_page_count(file_path, backend)
+    if page_count < DOCUMENT_PDF_PARALLEL_PAGES or DOCUMENT_LOADER_PROCESSES <= 1:
+        for page, text in enumerate(_iter_pdf_pages(file_path, backend)):
+            yield Document(page_content=text, metadata={"source": file_path, "page": page})
+        return
+
+    batch_pages = max(1, DOCUMENT_PDF_BATCH_PAGES)
+    logger.info("###DocumentLoader INFO, PDF并行解析, path={}, pages={}, batch_pages={}, backend={}.", file_path,
+                page_count, batch_pages, backend)
+    executor = get_document_executor()
+    futures = [
+        (start, executor.submit(extract_pdf_pages, file_path, start, min(start + batch_pages, page_count), backend))
+        for start in range(0, page_count, batch_pages)
+    ]
+    try:
+        for start, future in futures:
+            for offset, text in enumerate(future.result()):
+                yield Document(page_content=text, metadata={"source": file_path, "page": start + offset})
+    finally:
+        # 调用方提前结束迭代或解析失败时, 取消尚未开始的页段
+        for _, future in futures:
+            future.cancel()
+
+
+@register_document_loader(".html", ".htm", "text/html")
+def load_html(file_path: str) -> Iterator[Document]:
+    """
+    HTML加载, lxml后端直接提取正文, 默认沿用unstructured
+    :param file_path: 文件路径
+    :return: 文档
+    """
+    if DOCUMENT_HTML_BACKEND != HTML_BACKEND_LXML:
+        yield from UnstructuredHTMLLoader(file_path=file_path).lazy_load()
+        return
+    from service.spider_crawler import decode_html, extract_html
+    with open(file_path, "rb") as f:
+        title, text = extract_html(decode_html(f.read()))
+    yield Document(page_content=text, metadata={"source": file_path, "title": title})
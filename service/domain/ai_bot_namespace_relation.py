@@ -1,10 +1,8 @@
 import uuid
 from typing import List
 
-import pymysql
 from loguru import logger
-
-from config.base_config import MYSQL_HOST, MYSQL_PORT, MYSQL_CHARSET, MYSQL_DATABASE, MYSQL_USER, MYSQL_PASSWD
+from framework.mysql.mysql_pool import get_db_conn
 
 
 class BotNamespaceRelationModel:
@@ -43,21 +41,6 @@ class BotNamespaceRelationModel:
                "}"
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiBotNamespaceRelationDomain:
     """
     机器人关联知识库模块
@@ -88,8 +71,8 @@ class AiBotNamespaceRelationDomain:
             with conn.cursor() as cursor:
                 sql = f"select id, deleted, creator, create_time, updator, update_time, version, " \
                       f"bot_id, nas_id " \
-                      f"from {self.table_name} where bot_id = '{bot_id}' and deleted = 0"
-                cursor.execute(sql)
+                      f"from {self.table_name} where bot_id = %s and deleted = 0"
+                cursor.execute(sql, (bot_id,))
                 datas = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, datas)
                 data_list = []
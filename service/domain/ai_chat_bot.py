@@ -1,10 +1,21 @@
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from typing import List
 from loguru import logger
 from config.base_config import *
-import pymysql
 import json
+from framework.mysql.mysql_pool import get_db_conn, text_params
+
+
+@lru_cache(maxsize=256)
+def parse_config_json(text: str):
+    """
+    解析机器人的JSON配置(按内容缓存, 返回结果只读)
+    :param text: JSON配置
+    :return: 解析结果
+    """
+    return json.loads(text)
 
 
 class ChatBotModel:
@@ -141,9 +152,16 @@ class ChatBotModel:
         """
         获取子模型名称
         """
-        llms_base = json.loads(self.llms_base)
+        llms_base = parse_config_json(self.llms_base)
         return llms_base["modelName"] if llms_base else None
 
+    def get_llms_models(self) -> dict:
+        """
+        获取按模型类型配置的模型信息(llms_models解析结果, 只读)
+        :return: 模型类型 -> 模型配置
+        """
+        return parse_config_json(self.llms_models) if self.llms_models else {}
+
     def is_open_second_prompt(self):
         """
         是否开启召回分片信息
@@ -160,22 +178,6 @@ def chatbot_has_traceability(self):
     return self.traceability == 1
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    logger.info(f"MYSQL_CHARSET={MYSQL_CHARSET},MYSQL_HOST={MYSQL_HOST}")
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiChatBotDomain:
     """
     机器人模块
@@ -214,12 +216,15 @@ class AiChatBotDomain:
                       f"origin_domain, fragmented_relationship, slave_carrying_question, " \
                       f"llms, llms_base, suffix_prompt_variables, prompt_ability, bot_role , llms_models " \
                       f"from {self.table_name} where deleted = 0"
+                params = []
                 if id:
-                    sql = sql + f" and id = '{id}'"
+                    sql = sql + " and id = %s"
+                    params.append(id)
                 if bot_id:
-                    sql = sql + f" and bot_id = '{bot_id}'"
+                    sql = sql + " and bot_id = %s"
+                    params.append(bot_id)
 
-                cursor.execute(sql)
+                cursor.execute(sql, params)
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data_list)
 
@@ -251,8 +256,8 @@ class AiChatBotDomain:
                       f"id, deleted, creator, create_time, updator, update_time, version,traceability, " \
                       f"origin_domain, fragmented_relationship, slave_carrying_question, "\
                       f"llms, llms_base, suffix_prompt_variables, prompt_ability, bot_role , llms_models " \
-                      f"from {self.table_name} where bot_id = '{bot_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where bot_id = %s"
+                cursor.execute(sql, (bot_id,))
                 data = cursor.fetchone()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data)
                 if data:
@@ -330,14 +335,14 @@ class AiChatBotDomain:
                       f"slave_bot_mark, " \
                       f"fixed_ques, " \
                       f"use_type) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s'," \
-                      f"'%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      ('0', 'system', current_time, 'system', current_time, '0',
-                       bot_id, prompt, prompt_variables, prefix_prompt, prefix_prompt_variables, suffix_prompt,
-                       namespace_id, name, memory_limit_size, welcome_tip, vector_top_k,
-                       chains_chunk_type, bot_type, slave_bot_mark, fixed_ques, use_type)
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s," \
+                      f"%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params('0', 'system', current_time, 'system', current_time, '0',
+                                     bot_id, prompt, prompt_variables, prefix_prompt, prefix_prompt_variables,
+                                     suffix_prompt, namespace_id, name, memory_limit_size, welcome_tip, vector_top_k,
+                                     chains_chunk_type, bot_type, slave_bot_mark, fixed_ques, use_type)
 
-                cursor.execute(sql.encode('utf-8'))
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
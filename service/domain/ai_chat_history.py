@@ -1,16 +1,9 @@
 from datetime import datetime, timezone, timedelta
 import uuid
 from typing import List
-import pymysql
 from loguru import logger
-from config.base_config import (
-    MYSQL_HOST,
-    MYSQL_DATABASE,
-    MYSQL_CHARSET,
-    MYSQL_PORT,
-    MYSQL_PASSWD,
-    MYSQL_USER)
 from framework.util.aes_256 import AESCipher
+from framework.mysql.mysql_pool import get_db_conn as pool_get_db_conn, POOL_BEIJING_TIME, text_params
 
 
 class ChatHistoryModel:
@@ -75,21 +68,10 @@ class ChatHistoryModel:
 
 def get_db_conn():
     """
-    获取数据库连接对象
+    获取数据库连接对象(连接池, 会话时区为北京时间UTC+8)
     :return: conn数据库连接对象
     """
-    conn = pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-    # 设置连接时区为北京时间（UTC+8）
-    with conn.cursor() as cursor:
-        cursor.execute("SET time_zone = '+8:00'")
-    return conn
+    return pool_get_db_conn(pool_name=POOL_BEIJING_TIME, init_sql=("SET time_zone = '+8:00'",))
 
 
 class AiChatHistoryDomain:
@@ -125,8 +107,8 @@ class AiChatHistoryDomain:
                 sql = f"select question, answer, user_id, bot_id, create_time, update_time, " \
                       f"deleted, creator, updator, answer_like, group_uuid, answer_type, comment, " \
                       f"use_send, use_mark, thinking, `search`, files,id from {self.table_name} " \
-                      f"where deleted = 0 and bot_id = '{bot_id}' and user_id = '{user_id}'"
-                cursor.execute(sql)
+                      f"where deleted = 0 and bot_id = %s and user_id = %s"
+                cursor.execute(sql, (bot_id, user_id))
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -165,13 +147,17 @@ class AiChatHistoryDomain:
                 sql = f"select question, answer, user_id, bot_id, create_time, update_time, " \
                       f"deleted, creator, updator, answer_like, group_uuid, answer_type, comment, " \
                       f"use_send, use_mark, thinking, `search`, files, id from {self.table_name} " \
-                      f"where deleted = 0 and (answer_like is null or answer_like = 'LIKE') and user_id = '{user_id}' "
+                      f"where deleted = 0 and (answer_like is null or answer_like = 'LIKE') and user_id = %s "
+                params = [user_id]
                 if bot_id:
-                    sql = sql + f" and bot_id = '{bot_id}' "
+                    sql = sql + " and bot_id = %s "
+                    params.append(bot_id)
                 if group_uuid:
-                    sql = sql + f" and group_uuid = '{group_uuid}' "
-                sql = sql + f" order by create_time desc limit {limit_size};"
-                cursor.execute(sql)
+                    sql = sql + " and group_uuid = %s "
+                    params.append(group_uuid)
+                sql = sql + " order by create_time desc limit %s;"
+                params.append(int(limit_size))
+                cursor.execute(sql, params)
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -267,9 +253,6 @@ class AiChatHistoryDomain:
                 
                 logger.info("Request_id={}, 存储的question_time: {}, answer_time: {}", self.request_id, question_time, answer_time)
 
-                answer = answer.replace("'", "\\'")
-                question = question.replace("'", "\\'")
-
                 sql = f"insert into {self.table_name} " \
                       f"(deleted, " \
                       f"creator, " \
@@ -295,12 +278,12 @@ class AiChatHistoryDomain:
                       f"`search`, " \
                       f"voice, " \
                       f"files) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      (deleted, 'system', question_time, 'system', answer_time, '0', user_id, bot_id, AESCipher().aes_encoding(question),
-                       AESCipher().aes_encoding(answer), group_uuid, answer_type, comment, use_send, use_mark, llms, llms_model_name, total_tokens,
-                       input_tokens, output_tokens, thinking, search, voice, files)
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params(deleted, 'system', question_time, 'system', answer_time, '0', user_id, bot_id, AESCipher().aes_encoding(question),
+                                     AESCipher().aes_encoding(answer), group_uuid, answer_type, comment, use_send, use_mark, llms, llms_model_name, total_tokens,
+                                     input_tokens, output_tokens, thinking, search, voice, files)
 
-                cursor.execute(sql.encode('utf-8'))
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
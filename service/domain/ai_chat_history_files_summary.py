@@ -1,15 +1,8 @@
 from datetime import datetime
 import uuid
 from typing import List
-import pymysql
 from loguru import logger
-from config.base_config import (
-    MYSQL_HOST,
-    MYSQL_DATABASE,
-    MYSQL_CHARSET,
-    MYSQL_PORT,
-    MYSQL_PASSWD,
-    MYSQL_USER)
+from framework.mysql.mysql_pool import get_db_conn, text_params
 
 
 class ChatHistoryFilesSummaryModel:
@@ -47,21 +40,6 @@ class ChatHistoryFilesSummaryModel:
                "}"
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiChatHistoryFilesSummaryDomain:
     """
     历史聊天附件summary记录模块
@@ -94,12 +72,13 @@ class AiChatHistoryFilesSummaryDomain:
         try:
             # 过滤掉None和空字符串
             valid_items = [str(item) for item in history_ids if item is not None and str(item).strip()]
-            sub_sql_in = "('" + "', '".join(valid_items) + "')"
+            if not valid_items:
+                return []
             with conn.cursor() as cursor:
                 sql = f"select history_id, summary, create_time, update_time, " \
                       f"deleted, creator, updator from {self.table_name} " \
-                      f"where deleted = 0 and history_id in {sub_sql_in}"
-                cursor.execute(sql)
+                      f"where deleted = 0 and history_id in %s"
+                cursor.execute(sql, (tuple(valid_items),))
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -138,8 +117,6 @@ class AiChatHistoryFilesSummaryDomain:
                 question_time = question_time or current_time
                 answer_time = answer_time or current_time
 
-                summary = summary.replace("'", "\\'")
-
                 sql = f"insert into {self.table_name} " \
                       f"(deleted, " \
                       f"creator, " \
@@ -149,10 +126,10 @@ class AiChatHistoryFilesSummaryDomain:
                       f"version, " \
                       f"history_id, " \
                       f"summary) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      (deleted, 'system', question_time, 'system', answer_time, '0', history_id, summary)
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params(deleted, 'system', question_time, 'system', answer_time, '0', history_id, summary)
 
-                cursor.execute(sql.encode('utf-8'))
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -1,9 +1,8 @@
 import uuid
 from datetime import datetime
 from typing import List
-import pymysql
 from loguru import logger
-from config.base_config import MYSQL_HOST, MYSQL_DATABASE, MYSQL_PORT, MYSQL_CHARSET, MYSQL_USER, MYSQL_PASSWD
+from framework.mysql.mysql_pool import get_db_conn
 
 
 class ChatImagesModel:
@@ -57,21 +56,6 @@ class ChatImagesModel:
 
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiChatImagesDomain:
     table_name: str = "ai_chat_images"
 
@@ -90,8 +74,8 @@ class AiChatImagesDomain:
             with conn.cursor() as cursor:
                 sql = f"select id, deleted, creator, create_time, updator, update_time, version, " \
                       f"user_id, source, target, answer_like, num, uuid, style, model, dir, status " \
-                      f"from {self.table_name} where id = '{images_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where id = %s"
+                cursor.execute(sql, (images_id,))
                 data = cursor.fetchone()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data)
                 if data:
@@ -115,14 +99,15 @@ class AiChatImagesDomain:
             with conn.cursor() as cursor:
                 current_time = datetime.now()
                 sql = f"update {self.table_name} set " \
-                      f"deleted = '{deleted}', " \
+                      f"deleted = %s, " \
                       f"updator = 'system', " \
-                      f"update_time = '{current_time}', " \
-                      f"status = '{images_status}', " \
-                      f"uuid = '{images_uuid}', " \
-                      f"target = '{','.join(targets)}' " \
-                      f"where id={images_id}; "
-                cursor.execute(sql.encode('utf-8'))
+                      f"update_time = %s, " \
+                      f"status = %s, " \
+                      f"uuid = %s, " \
+                      f"target = %s " \
+                      f"where id = %s; "
+                cursor.execute(sql, (deleted, current_time, str(images_status), str(images_uuid), ','.join(targets),
+                                     images_id))
                 conn.commit()
                 logger.info("Request_id={}, [{}]修改成功!", self.request_id, self.table_name)
         except Exception as e:
@@ -3,7 +3,7 @@ from typing import List
 
 from loguru import logger
 from config.base_config import *
-import pymysql
+from framework.mysql.mysql_pool import get_db_conn
 
 
 class DisclaimerModel:
@@ -73,21 +73,6 @@ class DisclaimerModel:
         return self.has_trace_flag == '1'
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiDisclaimerDomain:
     """
     查询免责声明表
@@ -1,9 +1,8 @@
 import uuid
 from typing import List
 from loguru import logger
-import pymysql
-from config.base_config import MYSQL_HOST, MYSQL_PORT, MYSQL_DATABASE, MYSQL_CHARSET, MYSQL_USER, MYSQL_PASSWD
 from service.domain.ai_bot_namespace_relation import BotNamespaceRelationModel
+from framework.mysql.mysql_pool import get_db_conn
 
 
 class NamespaceModel:
@@ -82,21 +81,6 @@ class NamespaceModel:
 
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiNamespaceDomain:
     """
     知识库模块
@@ -127,8 +111,8 @@ class AiNamespaceDomain:
             with conn.cursor() as cursor:
                 sql = f"select namespace, name, remark, chunk_size, chunk_overlap, type, user_id, " \
                       f"id, deleted, creator, create_time, updator, update_time, version " \
-                      f"from {self.table_name} where id = '{namespace_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where id = %s"
+                cursor.execute(sql, (namespace_id,))
                 data = cursor.fetchone()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data)
                 if data:
@@ -162,17 +146,13 @@ class AiNamespaceDomain:
                 sql = f"select namespace, name, remark, chunk_size, chunk_overlap, type, user_id, " \
                       f"id, deleted, creator, create_time, updator, update_time, version " \
                       f"from {self.table_name} where deleted = 0"
-                if id:
-                    sql = sql + f" and id = '{id}'"
-                if user_id:
-                    sql = sql + f" and user_id = '{user_id}'"
-                if type:
-                    sql = sql + f" and type = '{type}'"
-                if name:
-                    sql = sql + f" and name = '{name}'"
-                if namespace:
-                    sql = sql + f" and namespace = '{namespace}'"
-                cursor.execute(sql)
+                params = []
+                for column, value in (("id", id), ("user_id", user_id), ("type", type), ("name", name),
+                                      ("namespace", namespace)):
+                    if value:
+                        sql = sql + f" and {column} = %s"
+                        params.append(value)
+                cursor.execute(sql, params)
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data_list)
                 result_list = []
@@ -198,12 +178,8 @@ class AiNamespaceDomain:
             with conn.cursor() as cursor:
                 sql = f"select namespace, name, remark, chunk_size, chunk_overlap, type, user_id, " \
                       f"id, deleted, creator, create_time, updator, update_time, version " \
-                      f"from {self.table_name} where "
-                if len(botNamespace_tuple) == 1:
-                    sql = sql + f" id = '{botNamespace_tuple[0]}'"
-                else:
-                    sql = sql + f" id in {botNamespace_tuple}"
-                cursor.execute(sql)
+                      f"from {self.table_name} where id in %s"
+                cursor.execute(sql, (tuple(botNamespace_tuple),))
                 datas = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, datas)
                 namespace_list = []
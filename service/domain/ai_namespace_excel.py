@@ -5,7 +5,7 @@ from typing import List
 
 from loguru import logger
 from config.base_config import *
-import pymysql
+from framework.mysql.mysql_pool import get_db_conn, text_params
 
 
 class NamespaceExcelModel:
@@ -62,21 +62,6 @@ class NamespaceExcelModel:
                "}"
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiNamespaceExcelDomain:
     """
     知识库关联Excel信息表
@@ -121,7 +106,6 @@ class AiNamespaceExcelDomain:
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                path = path.replace("\\", "\\\\")
                 current_time = datetime.now()
                 sql = f"insert into {self.table_name} " \
                       f"(deleted, " \
@@ -139,10 +123,10 @@ class AiNamespaceExcelDomain:
                       f"size, " \
                       f"remark, " \
                       f"channel) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      ('0', 'system', current_time, 'system', current_time, '0',
-                       excel_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel)
-                cursor.execute(sql.encode('utf-8'))
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params('0', 'system', current_time, 'system', current_time, '0',
+                                     excel_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel)
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -168,8 +152,8 @@ class AiNamespaceExcelDomain:
             with conn.cursor() as cursor:
                 sql = f"select id, deleted, creator, create_time, updator, update_time, version, " \
                       f"excel_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel " \
-                      f"from {self.table_name} where namespace_id = '{namespace_id}' and namespace_file_id = '{namespace_file_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where namespace_id = %s and namespace_file_id = %s"
+                cursor.execute(sql, (namespace_id, namespace_file_id))
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list, len(data_list))
 
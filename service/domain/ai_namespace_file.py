@@ -1,10 +1,9 @@
 import uuid
 from typing import List
 from datetime import datetime
-import pymysql
 from loguru import logger
-from config.base_config import MYSQL_HOST, MYSQL_PORT, MYSQL_DATABASE, MYSQL_CHARSET, MYSQL_USER, MYSQL_PASSWD, \
-    SCHEDULES_FILE_RETRY_COUNT, SCHEDULES_FILE_LIMIT_COUNT
+from config.base_config import SCHEDULES_FILE_RETRY_COUNT, SCHEDULES_FILE_LIMIT_COUNT
+from framework.mysql.mysql_pool import get_db_conn, text_params
 
 
 class NamespaceFileModel:
@@ -75,21 +74,6 @@ class NamespaceFileModel:
         return self.vector_status in ('None', 'Wait', 'Fail')
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiNamespaceFileDomain:
     """
     知识库文件模块
@@ -116,6 +100,7 @@ class AiNamespaceFileDomain:
             size: str,
             vector_ids: list[str],
             remark: str = None,
+            vector_status: str = "Done",
     ) -> int:
         """
         创建知识库文件信息
@@ -127,13 +112,13 @@ class AiNamespaceFileDomain:
         :param size: 文件大小
         :param remark: 备注信息
         :param vector_ids: 向量标识
+        :param vector_status: 向量化状态(异步向量化时为Wait)
         :return: 自增长序号
         """
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                path = path.replace("\\", "\\\\")
-                vector_ids_str = ','.join(vector_ids)
+                vector_ids_str = ','.join(vector_ids or [])
                 current_time = datetime.now()
                 sql = f"insert into {self.table_name} " \
                       f"(deleted, " \
@@ -153,11 +138,11 @@ class AiNamespaceFileDomain:
                       f"vector_status, " \
                       f"vector_count, " \
                       f"channel) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      ('0', 'system', current_time, 'system', current_time, '0',
-                       namespace_id, name, display_name, path, type, size, remark, vector_ids_str, "Done", 0, 'python')
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params('0', 'system', current_time, 'system', current_time, '0',
+                                     namespace_id, name, display_name, path, type, size, remark, vector_ids_str, vector_status, 0, 'python')
 
-                cursor.execute(sql.encode('utf-8'))
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -220,10 +205,10 @@ class AiNamespaceFileDomain:
                       f"display_name, " \
                       f"trace_name, " \
                       f"use_status) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      (file_id, '0', '0', creator, current_time, 'system', current_time, '0',
-                       namespace_id, name, path, type, size, remark, 'Person', "Wait", 0, display_name, trace_name, '1')
-                cursor.execute(sql)
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params(file_id, '0', '0', creator, current_time, 'system', current_time, '0',
+                                     namespace_id, name, path, type, size, remark, 'Person', "Wait", 0, display_name, trace_name, '1')
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -258,14 +243,16 @@ class AiNamespaceFileDomain:
                     vector_ids_str = ','.join(vector_ids)
                 current_time = datetime.now()
                 sql = f"update {self.table_name} set " \
-                      f"deleted = '{deleted}', " \
+                      f"deleted = %s, " \
                       f"updator = 'system', " \
-                      f"update_time = '{current_time}', " \
-                      f"vector_ids = '{vector_ids_str}', " \
-                      f"vector_status = '{vector_status}', " \
-                      f"vector_count = {vector_count} " \
-                      f"where id={file_id}; "
-                cursor.execute(sql.encode('utf-8'))
+                      f"update_time = %s, " \
+                      f"vector_ids = %s, " \
+                      f"vector_status = %s, " \
+                      f"vector_count = %s " \
+                      f"where id = %s; "
+                # vector_ids为空时与原有数据保持一致, 保存为'None'
+                cursor.execute(sql, (deleted, current_time, str(vector_ids_str), vector_status, int(vector_count),
+                                     file_id))
                 conn.commit()
                 logger.info("Request_id={}, [{}]修改成功!", self.request_id, self.table_name)
         except Exception as e:
@@ -300,19 +287,26 @@ class AiNamespaceFileDomain:
                       f"vector_status, vector_count, channel, deleted, creator, create_time, updator, update_time, version, " \
                       f"display_name, trace_name, md5 " \
                       f"from {self.table_name} where deleted = 0 "
+                params = []
                 if file_id:
-                    sql = sql + f" and id = '{file_id}'"
+                    sql = sql + " and id = %s"
+                    params.append(file_id)
                 if namespace_id:
-                    sql = sql + f" and namespace_id = '{namespace_id}'"
+                    sql = sql + " and namespace_id = %s"
+                    params.append(namespace_id)
                 if name:
-                    sql = sql + f" and name like '%{name}'%"
+                    sql = sql + " and name like %s"
+                    params.append(f"%{name}%")
                 if path:
-                    sql = sql + f" and path = '{path}'"
+                    sql = sql + " and path = %s"
+                    params.append(path)
                 if vector_ids:
-                    sql = sql + f" and vector_ids like '%{vector_ids}'%"
+                    sql = sql + " and vector_ids like %s"
+                    params.append(f"%{vector_ids}%")
                 if vector_status:
-                    sql = sql + f" and vector_status = '{vector_status}'"
-                cursor.execute(sql)
+                    sql = sql + " and vector_status = %s"
+                    params.append(vector_status)
+                cursor.execute(sql, params)
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -338,24 +332,35 @@ class AiNamespaceFileDomain:
         return file_list[0] if len(file_list) > 0 else None
 
     def find_by_status_none(
-            self
+            self,
+            shard_index: int = 0,
+            shard_count: int = 1,
     ) -> List[NamespaceFileModel]:
         """
         查询未向量化的文件列表
+        :param shard_index: 分片序号(按主键取模)
+        :param shard_count: 分片总数
         :return: 文件列表
         """
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
+                params = [SCHEDULES_FILE_RETRY_COUNT]
+                shard_sql = ""
+                if shard_count > 1:
+                    shard_sql = "and id %% %s = %s "
+                    params.extend([int(shard_count), int(shard_index)])
+                params.append(SCHEDULES_FILE_LIMIT_COUNT)
                 sql = f"select id, namespace_id, name, path, type, size, remark, vector_ids, " \
                       f"vector_status, vector_count, channel, deleted, creator, create_time, updator, update_time, version, " \
                       f"display_name, trace_name, md5 " \
                       f"from {self.table_name} where vector_status not in ('Wait', 'Done', 'Vectoring') " \
-                      f"and vector_count < {SCHEDULES_FILE_RETRY_COUNT} " \
+                      f"and vector_count < %s " \
                       f"and deleted = 0 " \
+                      f"{shard_sql}" \
                       f"order by create_time desc " \
-                      f"limit {SCHEDULES_FILE_LIMIT_COUNT};"
-                cursor.execute(sql)
+                      f"limit %s;"
+                cursor.execute(sql, params)
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -389,8 +394,8 @@ class AiNamespaceFileDomain:
                       f"vector_status, vector_count, channel, deleted, creator, create_time, updator, update_time, version, " \
                       f"display_name, trace_name, md5 " \
                       f"from {self.table_name} " \
-                      f"where name = '{file_name}' and namespace_id = '{namespace_id}' ; "
-                cursor.execute(sql)
+                      f"where name = %s and namespace_id = %s ; "
+                cursor.execute(sql, (file_name, namespace_id))
                 data = cursor.fetchone()
                 logger.info("Request_id={}, [{}]查询结果：{}.", self.request_id, self.table_name, data)
                 if data:
@@ -408,12 +413,70 @@ class AiNamespaceFileDomain:
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                sql = f"UPDATE {self.table_name} SET vector_ids = CONCAT(vector_ids, ',{custom_id}')" \
-                      f"WHERE id = {file_id};"
-                cursor.execute(sql)
+                sql = f"UPDATE {self.table_name} SET vector_ids = CONCAT(vector_ids, %s) " \
+                      f"WHERE id = %s;"
+                cursor.execute(sql, (f",{custom_id}", file_id))
             conn.commit()
             logger.info("Request_id={}, [{}]更新结果：{}.", self.request_id, self.table_name, custom_id)
         except Exception as e:
             logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
         finally:
             conn.close()
+
+    def find_done_by_md5(
+            self,
+            md5: str,
+            exclude_file_id: int = None,
+            limit: int = 10,
+    ) -> List[NamespaceFileModel]:
+        """
+        查询内容摘要相同且已向量化成功的文件(最近更新优先)
+        :param md5: 文件内容MD5
+        :param exclude_file_id: 排除的文件标识(当前文件)
+        :param limit: 最大条数
+        :return: 文件列表
+        """
+        conn = get_db_conn()
+        try:
+            with conn.cursor() as cursor:
+                sql = f"select id, namespace_id, name, path, type, size, remark, vector_ids, " \
+                      f"vector_status, vector_count, channel, deleted, creator, create_time, updator, update_time, version, " \
+                      f"display_name, trace_name, md5 " \
+                      f"from {self.table_name} where deleted = 0 and vector_status = 'Done' and md5 = %s " \
+                      f"and id <> %s " \
+                      f"order by update_time desc " \
+                      f"limit %s;"
+                cursor.execute(sql, (md5, exclude_file_id or 0, int(limit)))
+                data_list = cursor.fetchall()
+                logger.info("Request_id={}, [{}]同内容文件查询结果, md5={}, 数据长度：{}.", self.request_id,
+                            self.table_name, md5, len(data_list))
+                return [NamespaceFileModel(data) for data in data_list]
+        except Exception as e:
+            logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
+            return []
+        finally:
+            conn.close()
+
+    def update_md5(
+            self,
+            file_id: int,
+            md5: str,
+    ):
+        """
+        修改知识库文件内容摘要
+        :param file_id: 文件主键标识
+        :param md5: 文件内容MD5
+        :return: None
+        """
+        conn = get_db_conn()
+        try:
+            with conn.cursor() as cursor:
+                sql = f"update {self.table_name} set md5 = %s, update_time = %s where id = %s;"
+                cursor.execute(sql, (md5, datetime.now(), file_id))
+            conn.commit()
+            logger.info("Request_id={}, [{}]内容摘要修改成功, file_id={}, md5={}.", self.request_id, self.table_name,
+                        file_id, md5)
+        except Exception as e:
+            logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
+        finally:
+            conn.close()
@@ -1,12 +1,36 @@
 import uuid
-from typing import List
+import os
+from importlib.util import find_spec
+from typing import List, Iterable, Iterator, Callable, Dict
 from datetime import datetime
-import pymysql
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from loguru import logger
 from config.base_config import *
 from service.domain.ai_namespace_file import NamespaceFileModel
+from framework.mysql.mysql_pool import get_db_conn, text_params
+
+# 是否安装PyMuPDF(决定扫描版PDF页面的OCR取图方式)
+PDF_RENDERER = "fitz" if find_spec("fitz") is not None else "pypdf"
+
+"""
+分片策略注册表: 策略编码 -> 处理函数(domain, docs, chunkStrategyModel, stream)
+按需分派, 只执行命中的策略
+"""
+CHUNK_STRATEGY_HANDLERS: Dict[str, Callable] = {}
+
+
+def register_chunk_strategy(*chunk_strategies: str):
+    """
+    注册分片策略处理函数
+    :param chunk_strategies: 策略编码
+    :return: 装饰器
+    """
+    def decorator(handler: Callable) -> Callable:
+        for chunk_strategy in chunk_strategies:
+            CHUNK_STRATEGY_HANDLERS[chunk_strategy] = handler
+        return handler
+    return decorator
 
 
 class ChunkStrategyModel:
@@ -60,21 +84,6 @@ class ChunkStrategyModel:
                "'window_size': '"+str(self.window_size)+"'}"
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiChunkStrategyDomain:
     """
     知识库文件模块
@@ -114,7 +123,6 @@ class AiChunkStrategyDomain:
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                path = path.replace("\\", "\\\\")
                 vector_ids_str = ','.join(vector_ids)
                 current_time = datetime.now()
                 sql = f"insert into {self.table_name} " \
@@ -135,11 +143,11 @@ class AiChunkStrategyDomain:
                       f"vector_status, " \
                       f"vector_count, " \
                       f"channel) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      ('0', 'system', current_time, 'system', current_time, '0',
-                       namespace_id, name, display_name, path, type, size, remark, vector_ids_str, "Done", 0, 'python')
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params('0', 'system', current_time, 'system', current_time, '0',
+                                     namespace_id, name, display_name, path, type, size, remark, vector_ids_str, "Done", 0, 'python')
 
-                cursor.execute(sql.encode('utf-8'))
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -174,14 +182,16 @@ class AiChunkStrategyDomain:
                     vector_ids_str = ','.join(vector_ids)
                 current_time = datetime.now()
                 sql = f"update {self.table_name} set " \
-                      f"deleted = '{deleted}', " \
+                      f"deleted = %s, " \
                       f"updator = 'system', " \
-                      f"update_time = '{current_time}', " \
-                      f"vector_ids = '{vector_ids_str}', " \
-                      f"vector_status = '{vector_status}', " \
-                      f"vector_count = {vector_count} " \
-                      f"where id={file_id}; "
-                cursor.execute(sql.encode('utf-8'))
+                      f"update_time = %s, " \
+                      f"vector_ids = %s, " \
+                      f"vector_status = %s, " \
+                      f"vector_count = %s " \
+                      f"where id = %s; "
+                # vector_ids为空时与原有数据保持一致, 保存为'None'
+                cursor.execute(sql, (deleted, current_time, str(vector_ids_str), vector_status, int(vector_count),
+                                     file_id))
                 conn.commit()
                 logger.info("Request_id={}, [{}]修改成功!", self.request_id, self.table_name)
         except Exception as e:
@@ -205,8 +215,8 @@ class AiChunkStrategyDomain:
                 sql = f"select id, deleted, creator, create_time, updator, update_time, version, file_id, " \
                       f"chunk_strategy, chunk_size, chunk_overlap, chunk_delimiter, chunk_delimiter_custom, "\
                       f"sentence_type, window_size " \
-                      f"from {self.table_name} where deleted = 0 and file_id = '{file_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where deleted = 0 and file_id = %s"
+                cursor.execute(sql, (file_id,))
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -245,11 +255,11 @@ class AiChunkStrategyDomain:
                       f"vector_status, vector_count, channel, deleted, creator, create_time, updator, update_time, version, " \
                       f"display_name, trace_name, md5 " \
                       f"from {self.table_name} where vector_status not in ('Wait', 'Done', 'Vectoring') " \
-                      f"and vector_count < {SCHEDULES_FILE_RETRY_COUNT} " \
+                      f"and vector_count < %s " \
                       f"and deleted = 0 " \
                       f"order by create_time desc " \
-                      f"limit {SCHEDULES_FILE_LIMIT_COUNT};"
-                cursor.execute(sql)
+                      f"limit %s;"
+                cursor.execute(sql, (SCHEDULES_FILE_RETRY_COUNT, SCHEDULES_FILE_LIMIT_COUNT))
                 data_list = cursor.fetchall()
                 logger.info("Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list,
                             len(data_list))
@@ -266,28 +276,39 @@ class AiChunkStrategyDomain:
     def case_chunk_strategy(
             self,
             chunk_strategy: str,
-            docs: list[Document],
-            chunkStrategyModel: ChunkStrategyModel
+            docs: Iterable[Document],
+            chunkStrategyModel: ChunkStrategyModel,
+            stream: bool = False,
     ):
-        switch_dict = {
-            CHUNK_STRATEGY_SMART: self.spilt_chunk_by_customize(docs, chunkStrategyModel),
-            CHUNK_STRATEGY_TEXT_LENGTH: self.spilt_chunk_by_customize(docs, chunkStrategyModel),
-            CHUNK_STRATEGY_TEXT_SENTENCE: self.spilt_chunk_by_customize(docs, chunkStrategyModel,
-                                                                        separators=SEPARATORS_SENTENCE),
-        }
-        return switch_dict.get(chunk_strategy)
+        """
+        按策略编码分派分片处理(仅执行命中的策略)
+        :param chunk_strategy: 策略编码
+        :param docs: 文档
+        :param chunkStrategyModel: 分片策略
+        :param stream: 是否逐页流式输出分片
+        :return: 分片列表(stream为True时为迭代器), 未注册的策略返回None
+        """
+        handler = CHUNK_STRATEGY_HANDLERS.get(chunk_strategy)
+        if not handler:
+            logger.warning("####未注册的分片策略：{}, request_id={}.", chunk_strategy, self.request_id)
+            return None
+        return handler(self, docs, chunkStrategyModel, stream)
 
     def switch_case_by_chunk_strategy(
             self,
             namespaceFileModel: NamespaceFileModel,
-            docs: list[Document]
+            docs: Iterable[Document],
+            stream: bool = False,
     ):
         """
         对文件分片策略进行分类处理
         不同的分片策略使用不同的方法
+        :param namespaceFileModel: 知识库文件
+        :param docs: 文档
+        :param stream: 是否逐页流式输出分片
         """
         if not namespaceFileModel or namespaceFileModel.type.lower() == 'html':
-            split_docs = self.spilt_chunk_by_customize(docs)
+            split_docs = self.iter_chunk_by_customize(docs) if stream else self.spilt_chunk_by_customize(docs)
         else:
             chunkStrategyModel = self.find_by_id(namespaceFileModel.id)
             chunk_strategy = chunkStrategyModel.chunk_strategy
@@ -297,19 +318,49 @@ class AiChunkStrategyDomain:
             split_docs = self.case_chunk_strategy(
                 chunk_strategy=chunk_strategy,
                 docs=docs,
-                chunkStrategyModel=chunkStrategyModel
+                chunkStrategyModel=chunkStrategyModel,
+                stream=stream,
             )
         return split_docs
 
-    def spilt_chunk_by_customize(
+    def get_strategy_signature(
             self,
-            docs:  list[Document],
+            namespaceFileModel: NamespaceFileModel,
+    ) -> str | None:
+        """
+        文件分片结果的决定参数(与switch_case_by_chunk_strategy的分派口径一致)
+        内容相同且签名相同的文件分片结果相同, 可直接复用已有向量
+        :param namespaceFileModel: 知识库文件
+        :return: 参数签名, 未配置分片策略时为空
+        """
+        ocr = _ocr_signature(force=namespaceFileModel.display_name == '保险单')
+        # 文件加载器按扩展名选择
+        suffix = os.path.splitext(namespaceFileModel.name or "")[1].lower()
+        if namespaceFileModel.type.lower() == 'html':
+            return f"customize|{suffix}|{ocr}"
+        chunkStrategyModel = self.find_by_id(namespaceFileModel.id)
+        if not chunkStrategyModel:
+            return None
+        return "|".join(str(value) for value in (
+            chunkStrategyModel.chunk_strategy,
+            chunkStrategyModel.chunk_size,
+            chunkStrategyModel.chunk_overlap,
+            chunkStrategyModel.chunk_delimiter,
+            chunkStrategyModel.chunk_delimiter_custom,
+            chunkStrategyModel.sentence_type,
+            chunkStrategyModel.window_size,
+            suffix,
+            ocr,
+        ))
+
+    @staticmethod
+    def _get_split_params(
             chunkStrategyModel: ChunkStrategyModel = None,
             separators: list[str] = None
     ):
         """
-        智能切割分片策略
-        自定义切割文本-字符长度分片
+        解析分片参数
+        :return: (分片长度, 重叠长度, 分隔符)
         """
         # 定义切割符
         if chunkStrategyModel:
@@ -325,18 +376,97 @@ class AiChunkStrategyDomain:
         else:
             split_chunk_size = SPLIT_CHUNK_SIZE
             split_chunk_overlap = SPLIT_CHUNK_OVERLAP
+        return split_chunk_size, split_chunk_overlap, separators
+
+    def spilt_chunk_by_customize(
+            self,
+            docs: Iterable[Document],
+            chunkStrategyModel: ChunkStrategyModel = None,
+            separators: list[str] = None
+    ) -> List[Document]:
+        """
+        智能切割分片策略
+        自定义切割文本-字符长度分片
+        """
+        split_docs = list(self.iter_chunk_by_customize(docs, chunkStrategyModel, separators))
+        logger.info("####切割后的文件数量有：{}, request_id={}.", len(split_docs), self.request_id)
+        return split_docs
+
+    def iter_chunk_by_customize(
+            self,
+            docs: Iterable[Document],
+            chunkStrategyModel: ChunkStrategyModel = None,
+            separators: list[str] = None
+    ) -> Iterator[Document]:
+        """
+        流式切割分片: 逐页切割并输出分片, 分片器只构建一次, 不整体持有切割后的副本
+        分片长度配置为-1(按全文长度计算)时需先读取全部文档
+        """
+        split_chunk_size, split_chunk_overlap, separators = self._get_split_params(chunkStrategyModel, separators)
         if split_chunk_size == -1:
+            docs = list(docs)
             total_length = 0
             for _doc in docs:
                 total_length = total_length + len(_doc.page_content)
             split_chunk_size = total_length/split_chunk_overlap
-        split_docs = RecursiveCharacterTextSplitter(
+        logger.info("####Chunk长度策略：{}, request_id={}.", split_chunk_size, self.request_id)
+        logger.info("####Chunk重叠策略：{}, request_id={}.", split_chunk_overlap, self.request_id)
+        splitter = RecursiveCharacterTextSplitter(
             chunk_size=split_chunk_size,
             chunk_overlap=split_chunk_overlap,
             separators=separators,
             is_separator_regex=True
-        ).split_documents(docs)
-        logger.info("####Chunk长度策略：{}, request_id={}.", split_chunk_size, self.request_id)
-        logger.info("####Chunk重叠策略：{}, request_id={}.", split_chunk_overlap, self.request_id)
-        logger.info("####切割后的文件数量有：{}, request_id={}.", len(split_docs), self.request_id)
-        return split_docs
+        )
+        for _doc in docs:
+            yield from splitter.split_documents([_doc])
+
+
+@register_chunk_strategy(CHUNK_STRATEGY_SMART, CHUNK_STRATEGY_TEXT_LENGTH)
+def split_by_text_length(
+        domain: AiChunkStrategyDomain,
+        docs: Iterable[Document],
+        chunkStrategyModel: ChunkStrategyModel,
+        stream: bool = False,
+):
+    """
+    智能分片/按长度分片
+    """
+    if stream:
+        return domain.iter_chunk_by_customize(docs, chunkStrategyModel)
+    return domain.spilt_chunk_by_customize(docs, chunkStrategyModel)
+
+
+@register_chunk_strategy(CHUNK_STRATEGY_TEXT_SENTENCE)
+def split_by_text_sentence(
+        domain: AiChunkStrategyDomain,
+        docs: Iterable[Document],
+        chunkStrategyModel: ChunkStrategyModel,
+        stream: bool = False,
+):
+    """
+    按句子分片
+    """
+    if stream:
+        return domain.iter_chunk_by_customize(docs, chunkStrategyModel, separators=SEPARATORS_SENTENCE)
+    return domain.spilt_chunk_by_customize(docs, chunkStrategyModel, separators=SEPARATORS_SENTENCE)
+
+
+def _ocr_signature(force: bool) -> str:
+    """
+    OCR参数签名: 开启OCR或保险单文件(以图片识别文本替换正文)的分片结果取决于OCR参数, 不与未经OCR的分片共用
+    :param force: 是否强制识别(保险单)
+    :return: 参数签名
+    """
+    if not (OCR_ENABLED or force):
+        return "ocr=False"
+    return "ocr=" + ",".join(str(value) for value in (
+        force,
+        OCR_ENABLED,
+        OCR_LANG,
+        OCR_TESSERACT_CONFIG,
+        OCR_MIN_TEXT_CHARS,
+        OCR_MIN_IMAGE_COVERAGE,
+        OCR_MIN_IMAGE_PIXELS,
+        OCR_PDF_DPI,
+        PDF_RENDERER,
+    ))
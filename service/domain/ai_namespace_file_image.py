@@ -5,7 +5,7 @@ from typing import List
 
 from loguru import logger
 from config.base_config import *
-import pymysql
+from framework.mysql.mysql_pool import get_db_conn, text_params
 
 
 class NamespaceFileImageModel:
@@ -56,21 +56,6 @@ class NamespaceFileImageModel:
                "}"
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiNamespaceFileImageDomain:
     """
     知识库关联Excel信息表
@@ -115,7 +100,6 @@ class AiNamespaceFileImageDomain:
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                path = path.replace("\\", "\\\\")
                 current_time = datetime.now()
                 sql = f"insert into {self.table_name} " \
                       f"(deleted, " \
@@ -133,10 +117,10 @@ class AiNamespaceFileImageDomain:
                       f"size, " \
                       f"remark, " \
                       f"channel) " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      ('0', 'system', current_time, 'system', current_time, '0',
-                       file_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel)
-                cursor.execute(sql.encode('utf-8'))
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params('0', 'system', current_time, 'system', current_time, '0',
+                                     file_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel)
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -160,8 +144,8 @@ class AiNamespaceFileImageDomain:
             with conn.cursor() as cursor:
                 sql = f"select id, deleted, creator, create_time, updator, update_time, version, " \
                       f"excel_id, namespace_id, namespace_file_id, name, path, type, size, remark, channel " \
-                      f"from {self.table_name} where file_id = '{file_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where file_id = %s"
+                cursor.execute(sql, (file_id,))
                 data_list = cursor.fetchall()
                 logger.info("###file info### Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id, self.table_name, data_list, len(data_list))
 
@@ -183,8 +167,8 @@ class AiNamespaceFileImageDomain:
             with conn.cursor() as cursor:
                 sql = f"select id, deleted, status, creator, create_time, updator, update_time, version, " \
                       f"file_id, image_id, name, path, type " \
-                      f"from {self.table_name} where image_id = '{image_id}'"
-                cursor.execute(sql)
+                      f"from {self.table_name} where image_id = %s"
+                cursor.execute(sql, (image_id,))
                 data = cursor.fetchone()
                 logger.info("###image info### Request_id={}, [{}]查询结果：{}, 数据长度：{}.", self.request_id,
                             self.table_name, data, len(data))
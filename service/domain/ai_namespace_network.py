@@ -1,11 +1,11 @@
 import uuid
 from datetime import datetime
-from typing import List
+from typing import Iterator, List
 
-import pymysql
 from loguru import logger
-from config.base_config import MYSQL_HOST, MYSQL_PORT, MYSQL_DATABASE, MYSQL_CHARSET, MYSQL_USER, MYSQL_PASSWD, \
-    SCHEDULES_FILE_RETRY_COUNT, SCHEDULES_FILE_LIMIT_COUNT, SPLIT_CHUNK_SIZE, SPLIT_CHUNK_OVERLAP, PAGE_SIZE
+from config.base_config import SCHEDULES_FILE_RETRY_COUNT, SCHEDULES_FILE_LIMIT_COUNT, SPLIT_CHUNK_SIZE, \
+    SPLIT_CHUNK_OVERLAP, PAGE_SIZE
+from framework.mysql.mysql_pool import get_db_conn, get_pool, text_params
 
 
 class NameSpaceNetworkModel:
@@ -39,6 +39,9 @@ class NameSpaceNetworkModel:
         self.retry_count = data[16]
         self.result_code = data[17]
         self.result_msg = data[18]
+        # 条件请求缓存校验信息(ETag / Last-Modified)
+        self.etag = data[19] if len(data) > 19 else None
+        self.last_modified = data[20] if len(data) > 20 else None
 
     def __str__(self):
         """
@@ -64,7 +67,22 @@ class NameSpaceNetworkModel:
                "'status': '" + str(self.status) + "', " \
                "'retry_count': '" + str(self.retry_count) + "', " \
                "'result_code': '" + str(self.result_code) + "', " \
-               "'result_msg': '" + str(self.result_msg)+"'}"
+               "'result_msg': '" + str(self.result_msg)+"', " \
+               "'etag': '" + str(self.etag) + "', " \
+               "'last_modified': '" + str(self.last_modified)+"'}"
+
+    def get_next_time(
+            self,
+            current_timestamp: int,
+    ) -> int:
+        """
+        计算下次爬取时间(毫秒时间戳), 已落后多个周期时从当前时间顺延, 避免每轮重复爬取
+        :param current_timestamp: 当前时间戳(毫秒)
+        :return: 下次爬取时间
+        """
+        update_rate = int(self.update_rate)
+        next_time = int(self.next_time or 0) + update_rate
+        return next_time if next_time > current_timestamp else current_timestamp + update_rate
 
     def default_serializer(self) -> dict:
         if isinstance(self, NameSpaceNetworkModel):
@@ -87,26 +105,13 @@ class NameSpaceNetworkModel:
                 'status': self.status,
                 'retry_count': str(self.retry_count),
                 'result_code': str(self.result_code),
-                'result_msg': str(self.result_msg)
+                'result_msg': str(self.result_msg),
+                'etag': self.etag,
+                'last_modified': self.last_modified
             }
         raise TypeError("Not serializable")
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiNamespaceNetworkDomain:
     """
     知识库爬虫信息模块
@@ -192,11 +197,11 @@ class AiNamespaceNetworkDomain:
                       f"retry_count, " \
                       f"result_code, " \
                       f"result_msg, " \
-                      f"values ('%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s','%s');" % \
-                      (id, deleted, creator, create_time, updator, update_time, version, namespace_id,
-                       file_id, website, title, update_rate, last_time, next_time, type, status,
-                       retry_count, result_code, result_msg)
-                cursor.execute(sql.encode('utf-8'))
+                      f"values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);"
+                params = text_params(id, deleted, creator, create_time, updator, update_time, version, namespace_id,
+                                     file_id, website, title, update_rate, last_time, next_time, type, status,
+                                     retry_count, result_code, result_msg)
+                cursor.execute(sql, params)
                 conn.commit()
                 logger.info("Request_id={}, [{}]保存成功!", self.request_id, self.table_name)
                 return cursor.lastrowid
@@ -215,54 +220,98 @@ class AiNamespaceNetworkDomain:
         :param url_id: 网站标识
         :return: 爬虫网站列表
         """
-        conn = get_db_conn()
         try:
-            with conn.cursor() as cursor:
-                sql = f"select id, deleted, creator, create_time, updator, update_time, version, namespace_id, " \
-                      f"file_id, website, title, update_rate, last_time, next_time, type, status, " \
-                      f"retry_count, result_code, result_msg " \
-                      f"from {self.table_name} where deleted = 0 and id = {url_id}"
-                cursor.execute(sql)
-                data = cursor.fetchone()
-                data = NameSpaceNetworkModel(data)
-                return data
+            sql = f"select id, deleted, creator, create_time, updator, update_time, version, namespace_id, " \
+                  f"file_id, website, title, update_rate, last_time, next_time, type, status, " \
+                  f"retry_count, result_code, result_msg, etag, last_modified " \
+                  f"from {self.table_name} where deleted = 0 and id = %s"
+            data = get_pool().query_one(sql, (url_id,))
+            return NameSpaceNetworkModel(data)
         except Exception as e:
             logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
-        finally:
-            conn.close()
 
     def find_all_update_network(
             self
     ) -> list[NameSpaceNetworkModel]:
         """
-        查询知爬虫网站列表信息
+        查询知爬虫网站列表信息(按主键游标分页读取全部记录)
+        :return: 爬虫网站列表
+        """
+        result_list = []
+        last_id = 0
+        while True:
+            page = self.find_network_page(last_id=last_id, limit=PAGE_SIZE)
+            result_list.extend(page)
+            if len(page) < PAGE_SIZE:
+                return result_list
+            last_id = page[-1].id
+
+    def find_network_page(
+            self,
+            last_id: int = 0,
+            limit: int = PAGE_SIZE,
+            current_timestamp: int = None,
+            shard_index: int = 0,
+            shard_count: int = 1,
+    ) -> list[NameSpaceNetworkModel]:
+        """
+        按主键游标(keyset)分页查询爬虫网站, 翻页成本与页码无关
+        :param last_id: 上一页最后一条记录的主键
+        :param limit: 每页条数
+        :param current_timestamp: 当前时间戳(毫秒), 不为空时只查询已到期的网站
+        :param shard_index: 分片序号(按主键取模)
+        :param shard_count: 分片总数
         :return: 爬虫网站列表
         """
         conn = get_db_conn()
         try:
             with conn.cursor() as cursor:
-                cursor.execute(f"SELECT COUNT(*) from {self.table_name} WHERE deleted = 0 and type = 1")
-                total_rows = cursor.fetchone()[0]
-                total_pages = (total_rows // PAGE_SIZE) + (1 if total_rows % PAGE_SIZE > 0 else 0)
-                for current_page in range(total_pages):
-                    offset = current_page * PAGE_SIZE
-                    sql = f"select id, deleted, creator, create_time, updator, update_time, version, namespace_id, " \
-                          f"file_id, website, title, update_rate, last_time, next_time, type, status, " \
-                          f"retry_count, result_code, result_msg " \
-                          f"from {self.table_name} where deleted = 0 and type = 1 ORDER BY create_time " \
-                          f"LIMIT {PAGE_SIZE} OFFSET {offset}"
-                    cursor.execute(sql)
-                    datas = cursor.fetchall()
-                    result_list = []
-                    for data in datas:
-                        data = NameSpaceNetworkModel(data)
-                        result_list.append(data)
-                    return result_list
+                sql = f"select id, deleted, creator, create_time, updator, update_time, version, namespace_id, " \
+                      f"file_id, website, title, update_rate, last_time, next_time, type, status, " \
+                      f"retry_count, result_code, result_msg, etag, last_modified " \
+                      f"from {self.table_name} where deleted = 0 and type = 1 and id > %s "
+                params = [last_id]
+                if current_timestamp is not None:
+                    sql = sql + "and next_time <= %s "
+                    params.append(current_timestamp)
+                if shard_count > 1:
+                    sql = sql + "and id %% %s = %s "
+                    params.extend([shard_count, shard_index])
+                sql = sql + "order by id limit %s"
+                params.append(limit)
+                cursor.execute(sql, params)
+                return [NameSpaceNetworkModel(data) for data in cursor.fetchall()]
         except Exception as e:
             logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
+            return []
         finally:
             conn.close()
 
+    def iter_due_network(
+            self,
+            current_timestamp: int,
+            limit: int = PAGE_SIZE,
+            shard_index: int = 0,
+            shard_count: int = 1,
+    ) -> Iterator[list[NameSpaceNetworkModel]]:
+        """
+        逐页迭代全部已到期的爬虫网站
+        :param current_timestamp: 当前时间戳(毫秒)
+        :param limit: 每页条数
+        :param shard_index: 分片序号
+        :param shard_count: 分片总数
+        :return: 爬虫网站分页迭代器
+        """
+        last_id = 0
+        while True:
+            page = self.find_network_page(last_id=last_id, limit=limit, current_timestamp=current_timestamp,
+                                          shard_index=shard_index, shard_count=shard_count)
+            if page:
+                yield page
+            if len(page) < limit:
+                return
+            last_id = page[-1].id
+
     def set_network_file_id(
             self,
             file_id: str,
@@ -271,18 +320,11 @@ class AiNamespaceNetworkDomain:
         """
         保存关联网站文件信息
         """
-        conn = get_db_conn()
         try:
-            with conn.cursor() as cursor:
-                sql = f"update {self.table_name} set " \
-                      f"file_id = {file_id}" \
-                      f"where id={network_model.id}; "
-                cursor.execute(sql)
-            conn.commit()
+            sql = f"update {self.table_name} set file_id = %s where id = %s"
+            get_pool().execute(sql, (file_id, network_model.id))
         except Exception as e:
             logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
-        finally:
-            conn.close()
 
     def update_next_time(
             self,
@@ -291,14 +333,48 @@ class AiNamespaceNetworkDomain:
         """
         更新下次爬虫时间
         """
-        conn = get_db_conn()
         try:
             next_time = network_model.next_time + network_model.update_rate
+            sql = f"update {self.table_name} set next_time = %s where id = %s"
+            get_pool().execute(sql, (next_time, network_model.id))
+        except Exception as e:
+            logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
+
+    def update_crawl_result(
+            self,
+            network_model: NameSpaceNetworkModel,
+            current_timestamp: int,
+            result_code: int,
+            result_msg: str = None,
+            etag: str = None,
+            last_modified: str = None,
+    ):
+        """
+        保存爬取结果: 条件请求校验信息、执行状态及下次爬取时间
+        :param network_model: 爬虫网站信息
+        :param current_timestamp: 本次爬取时间戳(毫秒)
+        :param result_code: 执行状态码(HTTP状态码, 异常为-1)
+        :param result_msg: 执行状态描述
+        :param etag: 响应ETag(为空时保留原值)
+        :param last_modified: 响应Last-Modified(为空时保留原值)
+        """
+        conn = get_db_conn()
+        try:
             with conn.cursor() as cursor:
                 sql = f"update {self.table_name} set " \
-                      f"next_time = {next_time}" \
-                      f"where id={network_model.id}; "
-                cursor.execute(sql)
+                      f"etag = coalesce(%s, etag), " \
+                      f"last_modified = coalesce(%s, last_modified), " \
+                      f"last_time = %s, " \
+                      f"next_time = %s, " \
+                      f"result_code = %s, " \
+                      f"result_msg = %s, " \
+                      f"retry_count = if(%s, 0, retry_count + 1), " \
+                      f"update_time = %s " \
+                      f"where id = %s;"
+                cursor.execute(sql, (etag, last_modified, current_timestamp,
+                                     network_model.get_next_time(current_timestamp), result_code,
+                                     (result_msg or "")[:255], 0 < result_code < 400, datetime.now(),
+                                     network_model.id))
             conn.commit()
         except Exception as e:
             logger.error("Request_id={}, [{}]数据库操作异常, Message={}", self.request_id, self.table_name, e)
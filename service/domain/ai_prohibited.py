@@ -4,7 +4,7 @@ from typing import List
 
 from loguru import logger
 from config.base_config import *
-import pymysql
+from framework.mysql.mysql_pool import get_db_conn
 
 
 class ProhibitedModel:
@@ -76,21 +76,6 @@ class ProhibitedModel:
         raise TypeError("Not serializable")
 
 
-def get_db_conn():
-    """
-    获取数据库连接对象
-    :return: conn数据库连接对象
-    """
-    return pymysql.connect(
-        host=MYSQL_HOST,
-        port=int(MYSQL_PORT),
-        database=MYSQL_DATABASE,
-        charset=MYSQL_CHARSET,
-        user=MYSQL_USER,
-        passwd=MYSQL_PASSWD
-    )
-
-
 class AiProhibitedDomain:
     """
     查询敏感禁用词信息表
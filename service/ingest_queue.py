@@ -0,0 +1,392 @@
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from config.base_config import (
+    INGEST_MAX_ATTEMPTS,
+    INGEST_CLAIM_IDLE_MS,
+    INGEST_BLOCK_MS,
+    INGEST_JOB_SECONDS,
+    INGEST_STREAM_MAXLEN,
+    INGEST_WORKER_CONCURRENCY)
+from framework.redis.redis_client import RedisClient
+from framework.redis.redis_lock import RedisLock, default_owner
+from framework.util.hash_util import file_md5
+from service.domain.ai_namespace_file import AiNamespaceFileDomain
+from service.schedule.namespace_file_schedule import handle
+
+INGEST_STREAM_KEY = "ingest:stream"
+INGEST_DEAD_STREAM_KEY = "ingest:dead"
+INGEST_GROUP = "ingest-workers"
+# 任务状态
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_DONE = "done"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_SUPERSEDED = "superseded"
+
+
+def _now() -> str:
+    return f"{datetime.now():%Y-%m-%d %H:%M:%S}"
+
+
+class IngestQueue:
+    """
+    文件向量化任务队列(Redis Stream + 消费组)
+    任务标识为"文件标识:内容摘要", 同一文件内容重复提交只保留一个任务(幂等);
+    消息至少投递一次, 消费端以任务状态与文件向量化状态去重。
+    """
+
+    def __init__(
+            self,
+            request_id: str = str(uuid.uuid4()),
+            stream: str = INGEST_STREAM_KEY,
+            group: str = INGEST_GROUP,
+    ):
+        """
+        构造函数
+        :param request_id: 请求唯一标识
+        :param stream: 消息流键
+        :param group: 消费组
+        """
+        self.request_id = request_id
+        self.stream = stream
+        self.group = group
+
+    @staticmethod
+    def job_key(job_id: str) -> str:
+        return f"ingest:job:{job_id}"
+
+    @staticmethod
+    def file_key(file_id: str) -> str:
+        return f"ingest:file:{file_id}"
+
+    def ensure_group(self):
+        RedisClient().stream_create_group(self.stream, self.group)
+
+    def enqueue(
+            self,
+            file_id: str,
+            namespace_id: str,
+            content_hash: str,
+            file_path: str = "",
+    ) -> Dict[str, Any]:
+        """
+        提交文件向量化任务
+        :param file_id: 知识文件标识
+        :param namespace_id: 知识库标识
+        :param content_hash: 文件内容摘要
+        :param file_path: 文件保存路径(处理前按该路径校验文件内容摘要)
+        :return: 任务信息
+        """
+        redis_client = RedisClient()
+        job_id = f"{file_id}:{content_hash}"
+        key = self.job_key(job_id)
+        if not redis_client.set_hash_nx(key, "status", JOB_STATUS_QUEUED):
+            job = self.get_job(job_id)
+            if job.get("status") != JOB_STATUS_FAILED:
+                logger.info("###IngestQueue INFO, 任务已存在, 忽略重复提交, job_id={}, status={}, request_id={}.",
+                            job_id, job.get("status"), self.request_id)
+                return job
+        return self._publish(job_id=job_id, file_id=file_id, namespace_id=namespace_id,
+                             content_hash=content_hash, file_path=file_path, attempts=0)
+
+    def _publish(
+            self,
+            job_id: str,
+            file_id: str,
+            namespace_id: str,
+            content_hash: str,
+            file_path: str,
+            attempts: int,
+            error: str = None,
+    ) -> Dict[str, Any]:
+        redis_client = RedisClient()
+        job = {
+            "job_id": job_id,
+            "file_id": file_id,
+            "namespace_id": namespace_id,
+            "content_hash": content_hash,
+            "file_path": file_path,
+            "status": JOB_STATUS_QUEUED,
+            "attempts": attempts,
+            "queued_time": _now(),
+            "error": error,
+        }
+        self.ensure_group()
+        job["message_id"] = redis_client.stream_add(self.stream, {
+            "job_id": job_id, "file_id": file_id, "namespace_id": namespace_id, "content_hash": content_hash,
+            "file_path": file_path, "attempts": attempts,
+        }, maxlen=INGEST_STREAM_MAXLEN)
+        redis_client.set_hash_time(self.job_key(job_id), job, INGEST_JOB_SECONDS)
+        redis_client.set_str_time(self.file_key(file_id), job_id, INGEST_JOB_SECONDS)
+        logger.info("###IngestQueue INFO, 提交向量化任务, job={}, request_id={}.", job, self.request_id)
+        return job
+
+    def get_job(
+            self,
+            job_id: str = None,
+            file_id: str = None,
+    ) -> Dict[str, Any]:
+        """
+        查询任务信息(按任务标识或文件最近一次任务)
+        :param job_id: 任务标识
+        :param file_id: 知识文件标识
+        :return: 任务信息
+        """
+        redis_client = RedisClient()
+        job_id = job_id or (redis_client.get_str(self.file_key(file_id)) if file_id else None)
+        if not job_id:
+            return {}
+        return redis_client.get_hash(self.job_key(job_id)) or {}
+
+    def is_active(
+            self,
+            file_id: str,
+    ) -> bool:
+        """
+        文件最近一次任务是否排队中(含失败后重新入队待重试)或处理中
+        :param file_id: 知识文件标识
+        :return: 是否存在未结束的任务
+        """
+        return self.get_job(file_id=file_id).get("status") in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+
+    def update_job(
+            self,
+            job_id: str,
+            **fields: Any,
+    ):
+        RedisClient().set_hash_time(self.job_key(job_id), fields, INGEST_JOB_SECONDS)
+
+    def retry_or_fail(
+            self,
+            fields: Dict[str, str],
+            error: str,
+    ):
+        """
+        失败任务: 未超过最大尝试次数时重新入队, 否则标记失败并转入死信流
+        :param fields: 消息内容
+        :param error: 失败原因
+        """
+        attempts = int(fields.get("attempts") or 0) + 1
+        if attempts < INGEST_MAX_ATTEMPTS:
+            self._publish(job_id=fields["job_id"], file_id=fields["file_id"], namespace_id=fields["namespace_id"],
+                          content_hash=fields["content_hash"], file_path=fields.get("file_path") or "",
+                          attempts=attempts, error=error)
+            return
+        self.fail(fields, error, attempts=attempts)
+
+    def fail(
+            self,
+            fields: Dict[str, str],
+            error: str,
+            attempts: int = None,
+    ):
+        """
+        标记任务失败并转入死信流(不再重试)
+        :param fields: 消息内容
+        :param error: 失败原因
+        :param attempts: 尝试次数
+        """
+        attempts = attempts if attempts is not None else int(fields.get("attempts") or 0) + 1
+        self.update_job(fields["job_id"], status=JOB_STATUS_FAILED, attempts=attempts, error=error,
+                        finished_time=_now())
+        RedisClient().stream_add(INGEST_DEAD_STREAM_KEY, dict(fields, attempts=attempts, error=error),
+                                 maxlen=INGEST_STREAM_MAXLEN)
+        logger.error("###IngestQueue ERROR, 向量化任务失败, 已转入死信流, job_id={}, attempts={}, error={}.",
+                     fields["job_id"], attempts, error)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        队列状况
+        :return: 消息流长度、未确认消息数、死信数
+        """
+        redis_client = RedisClient()
+        self.ensure_group()
+        return {
+            "stream_length": redis_client.stream_len(self.stream),
+            "pending": len(redis_client.stream_pending(self.stream, self.group, count=1000)),
+            "dead": redis_client.stream_len(INGEST_DEAD_STREAM_KEY),
+        }
+
+
+class IngestWorker:
+    """
+    文件向量化消费者
+    以消费组读取任务, 处理成功或已转为重试/失败后确认消息; 进程异常退出时未确认的消息在空闲超时后由其他消费者接管。
+    """
+
+    def __init__(
+            self,
+            consumer: str,
+            queue: IngestQueue = None,
+            claim_idle_ms: int = INGEST_CLAIM_IDLE_MS,
+            block_ms: int = INGEST_BLOCK_MS,
+    ):
+        """
+        构造函数
+        :param consumer: 消费者名称(消费组内唯一)
+        :param queue: 任务队列
+        :param claim_idle_ms: 接管未确认消息的空闲时间(毫秒)
+        :param block_ms: 阻塞读取时间(毫秒)
+        """
+        self.consumer = consumer
+        self.queue = queue or IngestQueue(request_id=consumer)
+        self.claim_idle_ms = claim_idle_ms
+        self.block_ms = block_ms
+        self._last_claim = 0.0
+
+    def run(self, stop_event: threading.Event):
+        """
+        消费循环, 直到stop_event被设置
+        :param stop_event: 停止信号
+        """
+        logger.info("###IngestWorker INFO, 消费者启动, consumer={}.", self.consumer)
+        redis_client = RedisClient()
+        while not stop_event.is_set():
+            try:
+                self.queue.ensure_group()
+                messages = self._claim_stale()
+                if not messages:
+                    messages = redis_client.stream_read_group(self.queue.stream, self.queue.group, self.consumer,
+                                                              count=1, block_ms=self.block_ms)
+                for message_id, fields in messages:
+                    self.process(message_id, fields)
+            except Exception as err:
+                logger.error("###IngestWorker ERROR, 消费异常, consumer={}, err={}.", self.consumer, err)
+                stop_event.wait(1)
+        logger.info("###IngestWorker INFO, 消费者退出, consumer={}.", self.consumer)
+
+    def _claim_stale(self) -> List[tuple]:
+        # 每个空闲周期检查一次超时未确认的消息
+        if time.time() - self._last_claim < self.claim_idle_ms / 1000 / 2:
+            return []
+        self._last_claim = time.time()
+        redis_client = RedisClient()
+        stale = [message_id for message_id, _, idle_ms, _ in
+                 redis_client.stream_pending(self.queue.stream, self.queue.group, count=100)
+                 if idle_ms >= self.claim_idle_ms]
+        claimed = redis_client.stream_claim(self.queue.stream, self.queue.group, self.consumer, self.claim_idle_ms,
+                                            stale)
+        if claimed:
+            logger.info("###IngestWorker INFO, 接管超时未确认消息, consumer={}, ids={}.", self.consumer,
+                        [message_id for message_id, _ in claimed])
+        return claimed
+
+    def process(
+            self,
+            message_id: str,
+            fields: Dict[str, str],
+    ):
+        """
+        处理单个任务
+        :param message_id: 消息ID
+        :param fields: 消息内容
+        """
+        job_id = fields.get("job_id")
+        lock = RedisLock(name=f"ingest:{job_id}", ttl_seconds=60, owner=self.consumer)
+        if not lock.acquire():
+            # 同一任务正在被其他消费者处理, 由其确认结果
+            logger.info("###IngestWorker INFO, 任务处理中, 跳过, job_id={}, consumer={}.", job_id, self.consumer)
+            return
+        try:
+            lock.start_renewal()
+            self._process(job_id, fields)
+        except Exception as err:
+            traceback.print_exc()
+            self.queue.retry_or_fail(fields, repr(err))
+        finally:
+            RedisClient().stream_ack(self.queue.stream, self.queue.group, message_id)
+            lock.release()
+
+    def _process(
+            self,
+            job_id: str,
+            fields: Dict[str, str],
+    ):
+        job = self.queue.get_job(job_id)
+        if job.get("status") in (JOB_STATUS_DONE, JOB_STATUS_SUPERSEDED):
+            return
+        request_id = str(uuid.uuid4())
+        namespaceFileDomain = AiNamespaceFileDomain(request_id=request_id)
+        namespaceFileModel = namespaceFileDomain.find_by_id(file_id=fields["file_id"])
+        if not namespaceFileModel:
+            self.queue.update_job(job_id, status=JOB_STATUS_FAILED, error="file not found", finished_time=_now())
+            return
+        if namespaceFileModel.md5 and namespaceFileModel.md5 != fields["content_hash"]:
+            # 文件内容已更新, 以新任务为准
+            self.queue.update_job(job_id, status=JOB_STATUS_SUPERSEDED, finished_time=_now())
+            return
+        if namespaceFileModel.vector_status == 'Done':
+            self.queue.update_job(job_id, status=JOB_STATUS_DONE, finished_time=_now())
+            return
+        # 校验磁盘文件内容与任务一致, 避免向量化其他上传的内容
+        file_path = fields.get("file_path") or namespaceFileModel.path + namespaceFileModel.name
+        md5 = file_md5(file_path)
+        if md5 != fields["content_hash"]:
+            logger.error("###IngestWorker ERROR, 文件内容与任务不一致, job_id={}, path={}, md5={}.", job_id, file_path,
+                         md5)
+            self.queue.fail(fields, f"content hash mismatch: {md5}")
+            return
+        if namespaceFileModel.vector_status == 'Vectoring':
+            # 已持有任务锁, 向量化中状态为上一个消费者异常退出的残留, 重置后重新处理
+            namespaceFileDomain.update(file_id=namespaceFileModel.id, vector_ids=[], vector_status='Wait',
+                                       vector_count=int(namespaceFileModel.vector_count))
+            namespaceFileModel.vector_status = 'Wait'
+
+        start = time.time()
+        self.queue.update_job(job_id, status=JOB_STATUS_RUNNING, worker=self.consumer, started_time=_now(),
+                              attempts=int(fields.get("attempts") or 0) + 1)
+        if handle(namespaceFileModel=namespaceFileModel, namespaceFileDomain=namespaceFileDomain,
+                  request_id=request_id):
+            self.queue.update_job(job_id, status=JOB_STATUS_DONE, finished_time=_now(),
+                                  cost=round(time.time() - start, 3), error="")
+            logger.info("###IngestWorker INFO, 向量化任务完成, job_id={}, cost={}s, consumer={}.", job_id,
+                        round(time.time() - start, 3), self.consumer)
+            return
+        self.queue.retry_or_fail(fields, "vectorize failed")
+
+
+class IngestWorkerPool:
+    """
+    文件向量化消费线程池(每个线程一个消费者)
+    """
+
+    def __init__(
+            self,
+            concurrency: int = INGEST_WORKER_CONCURRENCY,
+            name: str = None,
+    ):
+        """
+        构造函数
+        :param concurrency: 消费线程数
+        :param name: 消费者名称前缀(默认主机名:进程号)
+        """
+        self.concurrency = max(0, concurrency)
+        self.name = name or default_owner()
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> "IngestWorkerPool":
+        for i in range(self.concurrency):
+            worker = IngestWorker(consumer=f"{self.name}-{i}")
+            thread = threading.Thread(target=worker.run, args=(self.stop_event,), name=f"ingest-worker-{i}",
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+    def run_forever(self):
+        self.start()
+        for thread in self.threads:
+            thread.join()
@@ -1,5 +1,6 @@
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
+from loguru import logger
 
 from config.base_config_dashscope import BASHSCOPE_MODEL_NAME
 from models.llms.llms_adapter import LLMsAdapter
@@ -58,21 +59,34 @@ class LLMIntentClassifier:
         """
         try:
             model_response = self.chain.invoke(user_input)
-            model_response = model_response.strip()
-            # 验证回复格式
-            if model_response == "medical_diagnosis":
-                return "medical_diagnosis"
-            elif model_response == "other":
-                return "other"
-
-            # 如果回复格式不符合预期，记录并返回默认值
-            print(f"警告: 模型返回意外格式: {model_response}")
+            return self._parse_response(model_response)
+        except Exception as e:
+            logger.warning("###LLMIntentClassifier WARN, 大模型调用错误, user_input={}, err={}.", user_input, e)
             return "other"
 
+    async def aclassify(self, user_input: str) -> str:
+        """
+        根据大模型判断用户意图(异步)
+        :param user_input: 用户输入文本
+        :return: 匹配的意图类别
+        """
+        try:
+            model_response = await self.chain.ainvoke(user_input)
+            return self._parse_response(model_response)
         except Exception as e:
-            print(f"大模型调用错误: {e}")
+            logger.warning("###LLMIntentClassifier WARN, 大模型调用错误, user_input={}, err={}.", user_input, e)
             return "other"
 
+    @staticmethod
+    def _parse_response(model_response: str) -> str:
+        model_response = model_response.strip()
+        # 验证回复格式
+        if model_response in ("medical_diagnosis", "other"):
+            return model_response
+        # 如果回复格式不符合预期，记录并返回默认值
+        logger.warning("###LLMIntentClassifier WARN, 模型返回意外格式, response={}.", model_response)
+        return "other"
+
 class MedicalDiagnosisChecker:
     """医疗诊断检查器，用于判断用户问题是否与医疗诊断相关"""
 
@@ -108,6 +122,16 @@ class MedicalDiagnosisChecker:
             return None  # 医疗相关问题将由其他模块处理
         return self.FIXED_RESPONSE
 
+    async def aget_response(self, user_input: str) -> str:
+        """
+        根据用户输入获取相应回复(异步)
+        :param user_input: 用户输入文本
+        :return: 如果是医疗相关问题返回None，否则返回固定回答
+        """
+        if await self.intent_classifier.aclassify(user_input) == "medical_diagnosis":
+            return None
+        return self.FIXED_RESPONSE
+
 # 使用示例
 if __name__ == "__main__":
     checker = MedicalDiagnosisChecker(model="DashScope", model_name=BASHSCOPE_MODEL_NAME)
@@ -1,23 +1,21 @@
 import re
-import cv2
 import uuid
-import pytesseract
 import threading
-from typing import List, Tuple, Dict
+from typing import Iterator, List, Tuple, Dict
 from loguru import logger
-from langchain_community.document_loaders.directory import DirectoryLoader
-from langchain_community.document_loaders.pdf import PyPDFLoader
-from langchain_community.document_loaders import UnstructuredHTMLLoader
 from langchain.docstore.document import Document
 from config.base_config import *
 from service.domain.ai_namespace import NamespaceModel
-from service.domain.ai_namespace_file_image import AiNamespaceFileImageDomain
 from framework.business_code import ERROR_10208
 from framework.business_except import BusinessException
+from framework.util.hash_util import text_sha256
 from models.embeddings.es_model_adapter import EmbeddingsModelAdapter
+from models.vectordatabase.custom.custom_pgvector import CONTENT_HASH_KEY
 from models.vectordatabase.v_client import get_instance_client
-from service.domain.ai_namespace_file import NamespaceFileModel
+from service.domain.ai_namespace_file import NamespaceFileModel, AiNamespaceFileDomain
 from service.domain.ai_namespace_file_chunk_strategy import AiChunkStrategyDomain
+from service.document_loader import iter_documents
+from service.ocr_service import OcrPipeline
 
 
 class LocalRepositoryDomain:
@@ -50,23 +48,99 @@ class LocalRepositoryDomain:
         :param namespaceFileModel: 所属知识库文件
         :return: ids
         """
+        split_docs_new = self.split(glob=glob, namespaceFileModel=namespaceFileModel)
+        # 保存元数据
+        embeddingsModelAdapter = EmbeddingsModelAdapter()
+        embedding = embeddingsModelAdapter.get_model_instance()
+        file_id = str(namespaceFileModel.id) if namespaceFileModel else None
+        vector_client = get_instance_client()
+        ids = vector_client.insert_data_list(split_docs=split_docs_new, embedding=embedding,
+                                             namespace=namespaceModel.namespace, file_id=file_id)
+        logger.info("####切割后的文件ids有：{}.", ids)
+        return ids
+
+    def push_incremental(
+            self,
+            namespaceModel: NamespaceModel,
+            namespaceFileModel: NamespaceFileModel,
+    ) -> list[str]:
+        """
+        以分片内容摘要增量推送知识库文件
+        只对新增分片计算向量, 删除新版本中已不存在的分片, 内容未变化的分片保留原有向量
+        :param namespaceModel: 所属知识库
+        :param namespaceFileModel: 所属知识库文件
+        :return: 按文档顺序的全部向量标识
+        """
+        split_docs_new = self.split(glob=namespaceFileModel.name, namespaceFileModel=namespaceFileModel)
+        result = get_instance_client().sync_file_data(
+            split_docs=split_docs_new,
+            embedding=EmbeddingsModelAdapter().get_model_instance(),
+            namespace=namespaceModel.namespace,
+            file_id=str(namespaceFileModel.id)
+        )
+        logger.info("####增量向量化完成, file_id={}, 新增={}, 删除={}, 更新={}, 复用={}, request_id={}.",
+                    namespaceFileModel.id, result["inserted"], result["deleted"], result["updated"],
+                    result["kept"], self.request_id)
+        return result["ids"]
+
+    def push_reuse(
+            self,
+            namespaceModel: NamespaceModel,
+            namespaceFileModel: NamespaceFileModel,
+    ) -> list[str] | None:
+        """
+        复用内容相同文件的向量
+        按文件内容MD5查找已向量化成功的文件, 分片参数签名一致时在向量库内直接复制分片, 跳过解析、切割与向量计算
+        :param namespaceModel: 所属知识库
+        :param namespaceFileModel: 所属知识库文件
+        :return: 向量标识, 无可复用文件时为空
+        """
+        if not namespaceFileModel.md5:
+            return None
+        chunkStrategyDomain = AiChunkStrategyDomain(request_id=self.request_id)
+        signature = chunkStrategyDomain.get_strategy_signature(namespaceFileModel)
+        if not signature:
+            return None
+        for sourceFileModel in AiNamespaceFileDomain(request_id=self.request_id).find_done_by_md5(
+                md5=namespaceFileModel.md5, exclude_file_id=namespaceFileModel.id):
+            if chunkStrategyDomain.get_strategy_signature(sourceFileModel) != signature:
+                continue
+            ids = get_instance_client().copy_file_data(
+                namespace=namespaceModel.namespace,
+                source_file_id=str(sourceFileModel.id),
+                file_id=str(namespaceFileModel.id),
+                metadata_patch={"name": namespaceFileModel.display_name or namespaceFileModel.name},
+            )
+            if ids:
+                logger.info("####复用同内容文件向量, file_id={}, source_file_id={}, 分片数={}, request_id={}.",
+                            namespaceFileModel.id, sourceFileModel.id, len(ids), self.request_id)
+                return ids
+        return None
+
+    def split(
+            self,
+            glob: str,
+            namespaceFileModel: NamespaceFileModel = None,
+    ) -> List[Document]:
+        """
+        加载并按文件定义策略切割分片, 封装元数据
+        :param glob: 扫描名称
+        :param namespaceFileModel: 所属知识库文件
+        :return: 分片列表
+        """
         glob = glob if not namespaceFileModel else namespaceFileModel.name
         doc_content_path = CONTENT_PATH if not namespaceFileModel else namespaceFileModel.path
-        docs = self.loader(glob=glob, doc_content_path=doc_content_path)
-        logger.info("LocalRepositoryDomain loader INFO, SCENE-4  loading pdf after...")
-        logger.info(f"####解析的文档数量有：{len(docs)}")
-        logger.info(f"####第一个文档长度有：{len(docs[0].page_content)}")
-        # 保险单图片OCR识别文字业务接口
-        if namespaceFileModel.display_name == '保险单':
-            docs = self.ocr_picture_txt(
-                docs=docs
-            )
-        # 分片规格参数
-        namespace = namespaceModel.namespace
-        # 以文件定义策略切割分片
+        docs = self.loader(glob=glob, doc_content_path=doc_content_path,
+                           mime_type=namespaceFileModel.type if namespaceFileModel else None)
+        # 扫描页图片OCR识别(保险单以图片识别文本替换页面正文)
+        force_ocr = namespaceFileModel.display_name == '保险单'
+        if OCR_ENABLED or force_ocr:
+            docs = OcrPipeline(request_id=self.request_id).ocr_documents(docs=docs, force=force_ocr)
+        # 以文件定义策略切割分片(逐页加载、逐页切割, 解析完成前即可开始切割)
         split_docs = AiChunkStrategyDomain(request_id=self.request_id).switch_case_by_chunk_strategy(
             namespaceFileModel=namespaceFileModel,
-            docs=docs
+            docs=docs,
+            stream=True
         )
         split_docs_new = [
             Document(
@@ -78,46 +152,28 @@ class LocalRepositoryDomain:
             )
             for _doc in split_docs
         ]
-        # 保存元数据
-        embeddingsModelAdapter = EmbeddingsModelAdapter()
-        embedding = embeddingsModelAdapter.get_model_instance()
-        file_id = str(namespaceFileModel.id) if namespaceFileModel else None
-        vector_client = get_instance_client()
-        ids = vector_client.insert_data_list(split_docs=split_docs_new, embedding=embedding, namespace=namespace,
-                                             file_id=file_id)
-        logger.info("####切割后的文件ids有：{}.", ids)
-        return ids
+        logger.info("####切割后的文件数量有：{}, request_id={}.", len(split_docs_new), self.request_id)
+        return split_docs_new
 
     def loader(
             self,
             glob: str,
             doc_content_path: str,
-    ) -> List[Document]:
+            mime_type: str = None,
+    ) -> Iterator[Document]:
         """
-        文件加载
+        文件加载(按文件路径直接加载, 按扩展名或MIME类型选择加载器)
         :param glob: 文件名称
         :param doc_content_path: 目录地址
-        :return: 加载结果
+        :param mime_type: MIME类型
+        :return: 按页惰性产出的文档
         """
         # 基本参数校验
         if not glob or not doc_content_path:
             logger.error("LocalRepositoryDomain loader ERROR, param is not legal, glob={}, doc_content_path={}, "
                          "request_id={}.", glob, doc_content_path, self.request_id)
             raise BusinessException(ERROR_10208.code, ERROR_10208.message)
-
-        if ".pdf" in glob or ".PDF" in glob:
-            # loader = PyPDFLoader(file_path=(doc_content_path + glob))
-            logger.info("LocalRepositoryDomain loader INFO, SCENE-1  loading pdf before...")
-            loader = PyPDFLoader(file_path=(doc_content_path + glob)).load()
-            return loader
-        if ".html" in glob:
-            logger.info("LocalRepositoryDomain loader INFO, SCENE-3  loading html before...")
-            loader = UnstructuredHTMLLoader(file_path=(doc_content_path + glob)).load()
-            return loader
-        else:
-            logger.info("LocalRepositoryDomain loader INFO, SCENE-2  loading file before...")
-            loader = DirectoryLoader(path=doc_content_path, glob=str("**/" + glob), show_progress=True)
-            return loader.load()
+        return iter_documents(file_path=doc_content_path + glob, mime_type=mime_type)
 
     @classmethod
     def _get_metadata(
@@ -134,6 +190,8 @@ class LocalRepositoryDomain:
         image_pattern = r'IMAGE\d+'
         image_id_list = re.findall(image_pattern, page_content)
         metadata['images'] = image_id_list
+        # 分片内容摘要, 重新向量化时据此识别未变化的分片
+        metadata[CONTENT_HASH_KEY] = text_sha256(document.page_content)
         return metadata
 
     def search(
@@ -183,24 +241,6 @@ class LocalRepositoryDomain:
             self.request_id, float(VECTOR_SEARCH_SCORE), len(new_ques_docs), new_ques_docs, ques)
         return new_ques_docs
 
-    def ocr_picture_txt(
-            self,
-            docs: list[Document],
-    ):
-        image_pattern = r'IMAGE\d+'
-        image_id = re.findall(image_pattern, docs[0].page_content)
-        namespace_image_domain = AiNamespaceFileImageDomain(self.request_id).find_by_image_id(image_id=image_id[0])
-        image_path = namespace_image_domain.path + namespace_image_domain.image_id + namespace_image_domain.type
-        logger.info("###ocr_picture_path### image_path={} ", image_path)
-        img = cv2.imread(image_path)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, binary_img = cv2.threshold(gray, 130, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        custom_config = r'--oem 3 --psm 6'
-        new_text = pytesseract.image_to_string(gray, lang='chi_sim+en', config=custom_config)
-        logger.info("###ocr_picture_txt### new_txt={} ", new_text)
-        docs[0].page_content = new_text
-        return docs
-
 
 """
     def ocr_picture_txt(
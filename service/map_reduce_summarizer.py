@@ -1,6 +1,9 @@
+import asyncio
+import hashlib
 import json
+import threading
 import time
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional, Any
 from concurrent.futures import ThreadPoolExecutor
 
 from langchain.prompts import ChatPromptTemplate
@@ -10,7 +13,17 @@ from langchain_community.document_loaders import TextLoader
 from langchain_core.output_parsers import StrOutputParser
 from loguru import logger
 
+from config.base_config import (
+    FILES_SUMMARY_MODE,
+    FILES_SUMMARY_MAX_CONCURRENCY,
+    FILES_SUMMARY_RATE_LIMIT,
+    FILES_SUMMARY_REDUCE_TOKEN_BUDGET,
+    FILES_SUMMARY_CACHE_ENABLED,
+    FILES_SUMMARY_CACHE_SECONDS)
 from config.base_config_dashscope import BASHSCOPE_MODEL_NAME
+from framework.redis.redis_client import RedisClient
+from framework.util.async_util import run_blocking
+from framework.util.token_bucket import TokenBucket
 from models.llms.llms_adapter import LLMsAdapter
 
 """
@@ -18,63 +31,382 @@ from models.llms.llms_adapter import LLMsAdapter
 """
 CHUNK_SIZE = 1024 * 20
 
+"""
+summary模式: 分块并发摘要+树形归约 / 逐块串行累积
+"""
+SUMMARY_MODE_MAP_REDUCE = "map_reduce"
+SUMMARY_MODE_REFINE = "refine"
+
+"""
+summary结果缓存键
+"""
+FILES_SUMMARY_CACHE_KEY = "files_summary:{model}:{mode}:{question}:{file}"
+
+"""
+串行累积(refine)模式的提示模板
+"""
+MAP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "你是一个信息抽取专家。请根据已有内容和新文本内容抽取关键信息，总长度不超过{word_limit}字。用户需求：{question}"),
+    ("human", "已有内容：{existing_content}\n\n新文本内容：{text}"),
+])
+
+"""
+分块独立摘要(map)的提示模板
+"""
+CHUNK_MAP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "你是一个信息抽取专家。以下是一份文件的第{index}/{total}段，请抽取其中的关键信息，总长度不超过{word_limit}字。用户需求：{question}"),
+    ("human", "{text}"),
+])
+
+"""
+摘要合并(reduce)的提示模板
+"""
+REDUCE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "你是一个总结专家。以下是同一份文件按顺序排列的多段摘要，请合并为一份摘要：去除重复表述，保留全部关键信息与数据，"
+     "总长度不超过{word_limit}字。用户需求：{question}"),
+    ("human", "{texts}"),
+])
+
+# 进程级限流器, 所有summary请求共享
+_rate_limiter = TokenBucket(rate=FILES_SUMMARY_RATE_LIMIT)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算token数(中文约1字1token, 按字符数保守估计)
+    :param text: 文本
+    :return: token数
+    """
+    return len(text or "")
+
+
+def group_by_budget(texts: List[str], budget: int) -> List[List[str]]:
+    """
+    按token预算将有序文本分组, 每组至少2段(保证归约层数收敛)
+    :param texts: 有序文本
+    :param budget: 单组token预算
+    :return: 分组
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > budget and len(current) >= 2:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+def file_digest(file_path: str) -> str:
+    """
+    计算文件内容SHA-256
+    :param file_path: 文件路径
+    :return: 十六进制摘要
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
 
 class MapReduceSummarizer:
-    def __init__(self, model: str = "DashScope", model_name: str = BASHSCOPE_MODEL_NAME):
+    """
+    文件摘要
+        - map_reduce: 分块独立并发摘要(有界并发+限流), 再按token预算逐层合并, 耗时约为 单次调用 x 归约层数;
+        - refine: 逐块串行累积摘要(原有方式), 上下文连贯但耗时随分块数线性增长。
+    结果按(文件哈希, 问题, 模型, 模式)缓存到Redis。
+    """
+
+    def __init__(
+            self,
+            model: str = "DashScope",
+            model_name: str = BASHSCOPE_MODEL_NAME,
+            mode: str = FILES_SUMMARY_MODE,
+            max_concurrency: int = FILES_SUMMARY_MAX_CONCURRENCY,
+            reduce_token_budget: int = FILES_SUMMARY_REDUCE_TOKEN_BUDGET,
+            use_cache: bool = FILES_SUMMARY_CACHE_ENABLED,
+    ):
+        """
+        构造函数
+        :param model: 模型厂商
+        :param model_name: 模型名称
+        :param mode: summary模式 map_reduce/refine
+        :param max_concurrency: 分块摘要最大并发数
+        :param reduce_token_budget: 归约阶段单次输入的token预算
+        :param use_cache: 是否启用结果缓存
+        """
         # self.llm = LLMsAdapter(model=model, model_name=model_name).get_model_instance()
         self.llm = LLMsAdapter(model=model, model_name=model_name).get_chat_model_instance(history=[])
+        self.model_name = f"{model}:{model_name}"
+        self.mode = mode if mode in (SUMMARY_MODE_MAP_REDUCE, SUMMARY_MODE_REFINE) else SUMMARY_MODE_MAP_REDUCE
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.reduce_token_budget = reduce_token_budget
+        self.use_cache = use_cache
 
-    def process_single_file(self, file, word_limit, question):
+    @staticmethod
+    def load_and_split(file):
+        """
+        读取文件并分块
+        :return: (文档, 分块列表), 内容不超过分块大小时分块列表为None
+        """
+        document = TextLoader(file["filePath"], encoding="utf-8").load()[0]
+        if len(document.page_content) <= CHUNK_SIZE:
+            return document, None
+        text_splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=100)
+        return document, text_splitter.split_documents([document])
+
+    def cache_key(self, file_hash: str, question: str, word_limit: int) -> str:
+        question_digest = hashlib.sha256(f"{word_limit}:{question or ''}".encode("utf-8")).hexdigest()[:32]
+        return FILES_SUMMARY_CACHE_KEY.format(model=self.model_name, mode=self.mode, question=question_digest,
+                                              file=file_hash)
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if not self.use_cache:
+            return None
+        try:
+            return RedisClient().get_str(key)
+        except Exception as err:
+            logger.warning("###MapReduceSummarizer WARN, 缓存读取失败, err={}.", err)
+            return None
+
+    def _cache_set(self, key: str, content: str):
+        if not self.use_cache or not content:
+            return
+        try:
+            RedisClient().set_str_time(key, content, FILES_SUMMARY_CACHE_SECONDS)
+        except Exception as err:
+            logger.warning("###MapReduceSummarizer WARN, 缓存写入失败, err={}.", err)
+
+    @staticmethod
+    def _notify(on_progress: Optional[Callable[[Dict], Any]], **event):
+        if on_progress:
+            try:
+                on_progress(event)
+            except Exception as err:
+                logger.warning("###MapReduceSummarizer WARN, 进度回调异常, err={}.", err)
+
+    def process_single_file(self, file, word_limit, question, on_progress: Optional[Callable[[Dict], Any]] = None,
+                            executor: ThreadPoolExecutor = None):
         """
         处理单个文件的方法
+        :param executor: 分块摘要线程池(多个文件共享, 为空时按max_concurrency单独创建)
         """
-        # 设置映射阶段的提示模板
-        map_prompt = ChatPromptTemplate.from_messages([
-            ("system",
-             "你是一个信息抽取专家。请根据已有内容和新文本内容抽取关键信息，总长度不超过{word_limit}字。用户需求：{question}"),
-            ("human", "已有内容：{existing_content}\n\n新文本内容：{text}"),
-        ])
         # 初始化累积内容
         existing_content = ""
         try:
-            document = TextLoader(file["filePath"], encoding="utf-8").load()[0]
+            cache_key = self.cache_key(file_digest(file["filePath"]), question, word_limit) if self.use_cache else None
+            cached = self._cache_get(cache_key) if cache_key else None
+            if cached:
+                self._notify(on_progress, fileName=file["fileName"], phase="cache", done=1, total=1)
+                return {"fileName": file["fileName"], "content": cached}
 
-            if len(document.page_content) <= CHUNK_SIZE:
+            document, split_docs = self.load_and_split(file)
+            if split_docs is None:
                 return {"fileName": file["fileName"], "content": document.page_content}
 
-            # 文本分块器
-            text_splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=100)
-            split_docs = text_splitter.split_documents([document])
-
-            # 依次处理每个文档块
-            for doc in split_docs:
-                # 调用模型进行映射
-                inputs = {
-                    "existing_content": existing_content,
-                    "text": doc.page_content,
-                    "question": question,
-                    "word_limit": word_limit
-                }
-                # 生成新的累积内容
-                chain = map_prompt | self.llm | StrOutputParser()
-                new_content = chain.invoke(inputs)
-                existing_content = new_content
+            if self.mode == SUMMARY_MODE_REFINE:
+                existing_content = self._refine(split_docs, word_limit, question, file, on_progress)
+            else:
+                existing_content = self._map_reduce(split_docs, word_limit, question, file, on_progress, executor)
+            if cache_key:
+                self._cache_set(cache_key, existing_content)
         except Exception as err:
             logger.error("###API###MapReduceSummarizer get_content error, err={}.", err)
         return {"fileName": file["fileName"], "content": existing_content}
 
-    def get_content(self, word_limit=1024 * 5, files: List[Dict] = None, question: str = None, max_workers: int = 4):
+    def _refine(self, split_docs, word_limit, question, file, on_progress) -> str:
+        existing_content = ""
+        # 依次处理每个文档块
+        for index, doc in enumerate(split_docs):
+            # 调用模型进行映射
+            inputs = {
+                "existing_content": existing_content,
+                "text": doc.page_content,
+                "question": question,
+                "word_limit": word_limit
+            }
+            # 生成新的累积内容
+            chain = MAP_PROMPT | self.llm | StrOutputParser()
+            _rate_limiter.acquire()
+            new_content = chain.invoke(inputs)
+            existing_content = new_content
+            self._notify(on_progress, fileName=file["fileName"], phase="refine", done=index + 1, total=len(split_docs))
+        return existing_content
+
+    def _map_reduce(self, split_docs, word_limit, question, file, on_progress,
+                    executor: ThreadPoolExecutor = None) -> str:
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                return self._map_reduce(split_docs, word_limit, question, file, on_progress, executor)
+        map_chain = CHUNK_MAP_PROMPT | self.llm | StrOutputParser()
+        reduce_chain = REDUCE_PROMPT | self.llm | StrOutputParser()
+        total = len(split_docs)
+        done = [0]
+        lock = threading.Lock()
+
+        def _map(args):
+            index, doc = args
+            _rate_limiter.acquire()
+            result = map_chain.invoke({"index": index + 1, "total": total, "text": doc.page_content,
+                                       "question": question, "word_limit": word_limit})
+            with lock:
+                done[0] += 1
+                finished = done[0]
+            self._notify(on_progress, fileName=file["fileName"], phase="map", done=finished, total=total)
+            return result
+
+        def _reduce(texts):
+            _rate_limiter.acquire()
+            return reduce_chain.invoke({"texts": "\n\n".join(texts), "question": question, "word_limit": word_limit})
+
+        summaries = list(executor.map(_map, enumerate(split_docs)))
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = group_by_budget(summaries, self.reduce_token_budget)
+            summaries = list(executor.map(_reduce, groups))
+            self._notify(on_progress, fileName=file["fileName"], phase="reduce", level=level,
+                         remaining=len(summaries))
+        return summaries[0] if summaries else ""
+
+    def get_content(self, word_limit=1024 * 5, files: List[Dict] = None, question: str = None, max_workers: int = 4,
+                    on_progress: Optional[Callable[[Dict], Any]] = None):
         """
         并行处理所有文件，最后统一汇总结果输出
+        文件级并发受max_workers限制, 所有文件的分块摘要共享同一个线程池, 并发上限为max_concurrency
         """
         if not files:
             return []
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.process_single_file, file, word_limit, question) for file in files]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as chunk_executor, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.process_single_file, file, word_limit, question, on_progress,
+                                       chunk_executor)
+                       for file in files]
             results = [future.result() for future in futures]
         return results
 
+    async def aprocess_single_file(self, file, word_limit, question, semaphore: asyncio.Semaphore = None,
+                                   on_progress: Optional[Callable[[Dict], Any]] = None):
+        """
+        处理单个文件的方法(异步)
+        """
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        existing_content = ""
+        try:
+            # 文件读取、哈希与缓存读写为同步IO, 放到线程池执行
+            cache_key = None
+            if self.use_cache:
+                cache_key = self.cache_key(await run_blocking(file_digest, file["filePath"]), question, word_limit)
+                cached = await run_blocking(self._cache_get, cache_key)
+                if cached:
+                    self._notify(on_progress, fileName=file["fileName"], phase="cache", done=1, total=1)
+                    return {"fileName": file["fileName"], "content": cached}
+
+            document, split_docs = await run_blocking(self.load_and_split, file)
+            if split_docs is None:
+                return {"fileName": file["fileName"], "content": document.page_content}
+
+            if self.mode == SUMMARY_MODE_REFINE:
+                existing_content = await self._arefine(split_docs, word_limit, question, file, on_progress)
+            else:
+                existing_content = await self._amap_reduce(split_docs, word_limit, question, file, semaphore,
+                                                           on_progress)
+            if cache_key:
+                await run_blocking(self._cache_set, cache_key, existing_content)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error("###API###MapReduceSummarizer aget_content error, err={}.", err)
+        return {"fileName": file["fileName"], "content": existing_content}
+
+    async def _arefine(self, split_docs, word_limit, question, file, on_progress) -> str:
+        existing_content = ""
+        chain = MAP_PROMPT | self.llm | StrOutputParser()
+        for index, doc in enumerate(split_docs):
+            await _rate_limiter.aacquire()
+            existing_content = await chain.ainvoke({
+                "existing_content": existing_content,
+                "text": doc.page_content,
+                "question": question,
+                "word_limit": word_limit
+            })
+            self._notify(on_progress, fileName=file["fileName"], phase="refine", done=index + 1, total=len(split_docs))
+        return existing_content
+
+    async def _amap_reduce(self, split_docs, word_limit, question, file, semaphore, on_progress) -> str:
+        map_chain = CHUNK_MAP_PROMPT | self.llm | StrOutputParser()
+        reduce_chain = REDUCE_PROMPT | self.llm | StrOutputParser()
+        total = len(split_docs)
+        done = 0
+        start = time.time()
+
+        async def _map(index, doc):
+            nonlocal done
+            async with semaphore:
+                await _rate_limiter.aacquire()
+                result = await map_chain.ainvoke({"index": index + 1, "total": total, "text": doc.page_content,
+                                                  "question": question, "word_limit": word_limit})
+            done += 1
+            self._notify(on_progress, fileName=file["fileName"], phase="map", done=done, total=total)
+            return result
+
+        async def _reduce(texts):
+            async with semaphore:
+                await _rate_limiter.aacquire()
+                return await reduce_chain.ainvoke({"texts": "\n\n".join(texts), "question": question,
+                                                   "word_limit": word_limit})
+
+        summaries = list(await asyncio.gather(*[_map(i, doc) for i, doc in enumerate(split_docs)]))
+        level = 0
+        while len(summaries) > 1:
+            level += 1
+            groups = group_by_budget(summaries, self.reduce_token_budget)
+            summaries = list(await asyncio.gather(*[_reduce(group) for group in groups]))
+            self._notify(on_progress, fileName=file["fileName"], phase="reduce", level=level,
+                         remaining=len(summaries))
+        logger.info("###MapReduceSummarizer INFO, fileName={}, chunks={}, reduce_levels={}, cost={}s.",
+                    file["fileName"], total, level, round(time.time() - start, 3))
+        return summaries[0] if summaries else ""
+
+    async def aget_content(self, word_limit=1024 * 5, files: List[Dict] = None, question: str = None, max_workers: int = 4,
+                           on_progress: Optional[Callable[[Dict], Any]] = None):
+        """
+        并发处理所有文件(异步)，最后统一汇总结果输出
+        文件级并发受max_workers限制, 所有文件的分块摘要共享同一个并发上限(max_concurrency)
+        :param word_limit: 每次summary输出最大字数限制
+        :param files: 文件信息
+        :param question: 自定义问题
+        :param max_workers: 最大并发文件数
+        :param on_progress: 进度回调, 参数为{fileName, phase(cache/map/refine/done), done, total}
+                            或{fileName, phase(reduce), level(归约层数), remaining(剩余摘要数)}
+        :return: [{fileName, content}]
+        """
+        if not files:
+            return []
+        file_semaphore = asyncio.Semaphore(max_workers)
+        chunk_semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _process(file):
+            async with file_semaphore:
+                result = await self.aprocess_single_file(file, word_limit, question, chunk_semaphore, on_progress)
+            self._notify(on_progress, fileName=file["fileName"], phase="done", done=1, total=1)
+            return result
+
+        return list(await asyncio.gather(*[_process(file) for file in files]))
+
     def run(self, files: List[Dict] = None, question: str = None, word_limit: int = 1024 * 8, max_workers: int = 4):
         """
         遍历处理所有文件，逐个文件进行分快处理，按顺序将分块分别进行summary
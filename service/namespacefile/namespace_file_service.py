@@ -5,7 +5,7 @@ import urllib.request
 from bs4 import BeautifulSoup
 from datetime import datetime, date
 from loguru import logger
-from config.base_config import SPIDER_FILE_PATH
+from config.base_config import SPIDER_FILE_PATH, SPIDER_TIMEOUT_SECONDS, VECTOR_INCREMENTAL_ENABLED
 from framework.business_code import ERROR_10001, ERROR_10210, ERROR_10207
 from framework.business_except import BusinessException
 from models.embeddings.es_model_adapter import EmbeddingsModelAdapter
@@ -23,7 +23,7 @@ from service.namespacefile.namespace_file_response import (
     ChunkPageResponseVO,
     ChunkPageEmbeddingResponseVO
 )
-from service.schedule.namespace_file_schedule import handle
+from service.schedule.namespace_file_schedule import handle, handle_refresh
 
 
 class NamespaceFileService:
@@ -233,7 +233,7 @@ class NamespaceFileService:
             filename: str = None
     ):
         try:
-            response = urllib.request.urlopen(url=url)
+            response = urllib.request.urlopen(url=url, timeout=SPIDER_TIMEOUT_SECONDS)
             text_content = BeautifulSoup(response.read(), 'html.parser')
             if is_first_spider:
                 today_date = date.today()
@@ -323,6 +323,13 @@ class NamespaceFileService:
         try:
             namespaceFileDomain = AiNamespaceFileDomain(request_id=self.request_id)
             namespaceFileModel = namespaceFileDomain.find_by_id(file_id=network_model.file_id)
+            # 已向量化的文件按内容摘要增量刷新, 不再整体删除重建
+            if VECTOR_INCREMENTAL_ENABLED and namespaceFileModel.vector_status == 'Done':
+                return handle_refresh(
+                    namespaceFileModel=namespaceFileModel,
+                    namespaceFileDomain=namespaceFileDomain,
+                    request_id=self.request_id
+                )
             namespaceModel = AiNamespaceDomain(request_id=self.request_id).find_by_id(
                 namespace_id=network_model.namespace_id)
             get_instance_client().delete_file_data(namespace=namespaceModel.namespace,
@@ -334,7 +341,7 @@ class NamespaceFileService:
                 vector_count=0,
                 deleted=0
             )
-            handle(
+            return handle(
                 namespaceFileModel=namespaceFileModel,
                 namespaceFileDomain=namespaceFileDomain,
                 request_id=self.request_id
@@ -0,0 +1,303 @@
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pytesseract
+from langchain.docstore.document import Document
+from loguru import logger
+from pypdf import PdfReader
+
+from config.base_config import (
+    OCR_PROCESSES,
+    OCR_TIMEOUT_SECONDS,
+    OCR_MIN_TEXT_CHARS,
+    OCR_PAGE_WINDOW,
+    OCR_PDF_DPI,
+    OCR_MIN_IMAGE_COVERAGE,
+    OCR_MIN_IMAGE_PIXELS,
+    OCR_LANG,
+    OCR_TESSERACT_CONFIG,
+    OCR_CACHE_SECONDS)
+from framework.redis.redis_client import RedisClient
+from framework.util.hash_util import bytes_sha256
+from service.domain.ai_namespace_file_image import AiNamespaceFileImageDomain
+
+try:
+    import fitz  # PyMuPDF, 可选, 用于渲染扫描版PDF页面
+except ImportError:
+    fitz = None
+
+IMAGE_PATTERN = re.compile(r'IMAGE\d+')
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor() -> ProcessPoolExecutor:
+    """
+    获取OCR专用进程池(默认按CPU核数, spawn方式启动)
+    :return: 进程池
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=OCR_PROCESSES or os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def ocr_image_bytes(
+        data: bytes,
+        lang: str = OCR_LANG,
+        config: str = OCR_TESSERACT_CONFIG,
+        timeout: int = OCR_TIMEOUT_SECONDS,
+) -> str:
+    """
+    识别单张图片文字(模块级函数, 在子进程中执行)
+    灰度预处理后交由tesseract识别, 超时由pytesseract终止tesseract进程并抛出异常
+    :param data: 图片内容
+    :param lang: 识别语言
+    :param config: tesseract参数
+    :param timeout: 超时时间(秒)
+    :return: 识别文本
+    """
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return ""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return pytesseract.image_to_string(gray, lang=lang, config=config, timeout=timeout)
+
+
+class OcrPipeline:
+    """
+    文档OCR处理
+    按页窗口收集扫描页中的全部图片, 统一提交进程池并行识别; 识别结果按图片内容摘要缓存在Redis中, 相同图片只识别一次。
+    """
+
+    def __init__(
+            self,
+            request_id: str,
+    ):
+        """
+        构造函数
+        :param request_id: 请求唯一标识
+        """
+        self.request_id = request_id
+
+    @staticmethod
+    def _cache_key(content_hash: str) -> str:
+        return f"ocr:{OCR_LANG}:{content_hash}"
+
+    def _get_cached(self, hashes: Iterable[str]) -> Dict[str, str]:
+        result = {}
+        try:
+            redis_client = RedisClient()
+            for content_hash in hashes:
+                text = redis_client.get_str(self._cache_key(content_hash))
+                if text is not None:
+                    result[content_hash] = text
+        except Exception as err:
+            logger.warning("###OcrPipeline WARN, 读取OCR缓存失败, err={}, request_id={}.", err, self.request_id)
+        return result
+
+    def _set_cached(self, results: Dict[str, str]):
+        try:
+            redis_client = RedisClient()
+            for content_hash, text in results.items():
+                redis_client.set_str_time(self._cache_key(content_hash), text, OCR_CACHE_SECONDS)
+        except Exception as err:
+            logger.warning("###OcrPipeline WARN, 写入OCR缓存失败, err={}, request_id={}.", err, self.request_id)
+
+    def ocr_images(
+            self,
+            images: List[bytes],
+    ) -> List[str]:
+        """
+        批量识别图片文字(去重、读缓存后并行识别)
+        :param images: 图片内容
+        :return: 与输入顺序一致的识别文本, 识别失败或超时为空串
+        """
+        hashes = [bytes_sha256(data) for data in images]
+        results = self._get_cached(set(hashes))
+        pending = {}
+        for content_hash, data in zip(hashes, images):
+            if content_hash not in results and content_hash not in pending:
+                pending[content_hash] = data
+        executor = get_ocr_executor()
+        futures = {content_hash: executor.submit(ocr_image_bytes, data) for content_hash, data in pending.items()}
+        recognized = {}
+        for content_hash, future in futures.items():
+            try:
+                recognized[content_hash] = future.result()
+            except Exception as err:
+                # 超时或识别失败不写缓存, 下次仍可重试
+                logger.error("###OcrPipeline ERROR, 图片识别失败, hash={}, err={}, request_id={}.", content_hash, err,
+                             self.request_id)
+        self._set_cached(recognized)
+        results.update(recognized)
+        logger.info("###OcrPipeline INFO, 图片识别完成, 图片数={}, 缓存命中={}, 识别={}, 失败={}, request_id={}.",
+                    len(images), len(set(hashes)) - len(pending), len(recognized), len(pending) - len(recognized),
+                    self.request_id)
+        return [results.get(content_hash, "") for content_hash in hashes]
+
+    @staticmethod
+    def is_scanned(document: Document) -> bool:
+        """
+        是否为扫描页: 去除图片标识后的正文过少, 且页面含图片标识或来自PDF
+        :param document: 页面文档
+        :return: 识别结果
+        """
+        text = IMAGE_PATTERN.sub("", document.page_content or "")
+        if len(text.strip()) >= OCR_MIN_TEXT_CHARS:
+            return False
+        return bool(IMAGE_PATTERN.search(document.page_content or "")) or _is_pdf_page(document)
+
+    def ocr_documents(
+            self,
+            docs: Iterable[Document],
+            force: bool = False,
+    ) -> Iterator[Document]:
+        """
+        识别文档中扫描页的图片文字(按页窗口并行, 惰性产出)
+        普通扫描页在图片标识后追加识别文本(保留图片标识), 无图片标识的PDF页在正文后追加页面识别文本;
+        force为True时(保险单)以页面内全部图片的识别文本替换页面正文
+        :param docs: 页面文档
+        :param force: 是否对所有含图片标识的页面识别并替换正文
+        :return: 处理后的页面文档
+        """
+        pdf_cache: Dict[str, object] = {}
+        try:
+            window = []
+            for document in docs:
+                window.append(document)
+                if len(window) >= max(1, OCR_PAGE_WINDOW):
+                    yield from self._ocr_window(window, force, pdf_cache)
+                    window = []
+            if window:
+                yield from self._ocr_window(window, force, pdf_cache)
+        finally:
+            for pdf in pdf_cache.values():
+                if fitz is not None and isinstance(pdf, fitz.Document):
+                    pdf.close()
+
+    def _ocr_window(
+            self,
+            docs: List[Document],
+            force: bool,
+            pdf_cache: Dict[str, object],
+    ) -> List[Document]:
+        # (页序号, 图片标识(PDF页面渲染时为空), 图片内容)
+        jobs: List[Tuple[int, Optional[str], bytes]] = []
+        for i, document in enumerate(docs):
+            if not (force or self.is_scanned(document)):
+                continue
+            image_ids = IMAGE_PATTERN.findall(document.page_content or "")
+            for image_id in image_ids:
+                data = self._read_image(image_id)
+                if data:
+                    jobs.append((i, image_id, data))
+            if not image_ids and not force and _is_pdf_page(document):
+                for data in self._render_pdf_page(document, pdf_cache):
+                    jobs.append((i, None, data))
+        if not jobs:
+            return docs
+
+        texts = self.ocr_images([data for _, _, data in jobs])
+        page_texts: Dict[int, List[Tuple[Optional[str], str]]] = {}
+        for (i, image_id, _), text in zip(jobs, texts):
+            page_texts.setdefault(i, []).append((image_id, text.strip()))
+        for i, items in page_texts.items():
+            document = docs[i]
+            if force:
+                content = "\n".join(text for _, text in items if text)
+                document.page_content = content or document.page_content
+                continue
+            content = document.page_content or ""
+            for image_id, text in items:
+                if not text:
+                    continue
+                if image_id:
+                    content = content.replace(image_id, f"{image_id}\n{text}\n", 1)
+                else:
+                    content = f"{content.strip()}\n{text}" if content.strip() else text
+            document.page_content = content
+        return docs
+
+    def _read_image(self, image_id: str) -> Optional[bytes]:
+        imageModel = AiNamespaceFileImageDomain(self.request_id).find_by_image_id(image_id=image_id)
+        if not imageModel:
+            logger.warning("###OcrPipeline WARN, 未查询到图片信息, image_id={}, request_id={}.", image_id,
+                           self.request_id)
+            return None
+        image_path = imageModel.path + imageModel.image_id + imageModel.type
+        try:
+            with open(image_path, "rb") as f:
+                return f.read()
+        except OSError as err:
+            logger.warning("###OcrPipeline WARN, 读取图片失败, path={}, err={}, request_id={}.", image_path, err,
+                           self.request_id)
+            return None
+
+    def _render_pdf_page(
+            self,
+            document: Document,
+            pdf_cache: Dict[str, object],
+    ) -> List[bytes]:
+        """
+        获取PDF页面图片: 已安装PyMuPDF时按分辨率渲染整页(图片覆盖率低于OCR_MIN_IMAGE_COVERAGE的页面跳过),
+        否则提取页面内嵌图片(像素数低于OCR_MIN_IMAGE_PIXELS的图片跳过)
+        """
+        source, page = document.metadata["source"], int(document.metadata["page"])
+        try:
+            pdf = pdf_cache.get(source)
+            if pdf is None:
+                pdf = fitz.open(source) if fitz is not None else PdfReader(source)
+                pdf_cache[source] = pdf
+            if fitz is not None:
+                pdf_page = pdf[page]
+                if _image_coverage(pdf_page) < OCR_MIN_IMAGE_COVERAGE:
+                    return []
+                return [pdf_page.get_pixmap(dpi=OCR_PDF_DPI).tobytes("png")]
+            images, skipped = [], 0
+            for image in pdf.pages[page].images:
+                width, height = image.image.size
+                if width * height < OCR_MIN_IMAGE_PIXELS:
+                    skipped += 1
+                    continue
+                images.append(image.data)
+            if skipped:
+                logger.warning("###OcrPipeline WARN, 未安装PyMuPDF, 跳过PDF页面小图识别, source={}, page={}, 跳过={}, "
+                               "min_pixels={}, request_id={}.", source, page, skipped, OCR_MIN_IMAGE_PIXELS,
+                               self.request_id)
+            return images
+        except Exception as err:
+            logger.warning("###OcrPipeline WARN, 获取PDF页面图片失败, source={}, page={}, err={}, request_id={}.",
+                           source, page, err, self.request_id)
+            return []
+
+
+def _image_coverage(pdf_page) -> float:
+    """
+    PDF页面中图片覆盖的面积比例(图片区域裁剪到页面范围, 重叠部分重复计入, 最大为1)
+    """
+    page_rect = pdf_page.rect
+    page_area = page_rect.width * page_rect.height
+    if page_area <= 0:
+        return 0.0
+    areas = []
+    for info in pdf_page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page_rect
+        if not rect.is_empty:
+            areas.append(rect.width * rect.height)
+    return min(1.0, sum(areas) / page_area) if areas else 0.0
+
+
+def _is_pdf_page(document: Document) -> bool:
+    metadata = document.metadata or {}
+    return str(metadata.get("source", "")).lower().endswith(".pdf") and metadata.get("page") is not None
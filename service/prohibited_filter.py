@@ -0,0 +1,277 @@
+import ast
+import json
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.base_config import PROHIBITED_STREAM_LOOKBEHIND, PROHIBITED_VERSION_CHECK_SECONDS
+from framework.redis.redis_client import RedisClient
+from framework.util.aho_corasick import AhoCorasick
+from framework.util.async_util import run_blocking
+from service.chat_response import ChatResponse
+from service.schedule.prohibited_data_schedule import get_prohibited_data, prohibited_version_redis_key
+
+RULE_TYPE_REGEX = "0"
+RULE_TYPE_LITERAL = "1"
+
+
+def parse_prohibited_rule(value: str) -> Optional[Dict]:
+    """
+    解析Redis中保存的敏感词规则(JSON格式, 兼容旧版本保存的Python字面量格式)
+    :param value: 规则字符串
+    :return: 规则
+    """
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        rule = ast.literal_eval(value)
+        return rule if isinstance(rule, dict) else None
+    except (ValueError, SyntaxError) as err:
+        logger.warning("###ProhibitedFilter WARN, 敏感词规则格式错误, rule={}, err={}.", value, err)
+        return None
+
+
+class ProhibitedFilter:
+    """
+    编译后的敏感词过滤规则(不可变, 规则变化时整体替换)
+        - 字面规则(ruleType=1)构建为一个Aho-Corasick自动机, 一次扫描完成全部替换(最左最长匹配)
+        - 正则规则(ruleType=0)合并为一个预编译正则; 含捕获分组或替换串含反斜杠引用的规则无法合并, 单独预编译
+    依次执行字面替换、合并正则替换、单独正则替换
+    """
+
+    def __init__(
+            self,
+            rules: List[Dict],
+            version: str = None,
+    ):
+        """
+        构造函数
+        :param rules: 规则列表
+        :param version: 规则版本号
+        """
+        self.version = version
+        self.rule_count = 0
+        self._replacements: Dict[str, str] = {}
+        pattern_parts: List[str] = []
+        pattern_rules: List[Tuple[re.Pattern, str]] = []
+        self._pattern_replacements: List[str] = []
+        self._separate: List[Tuple[re.Pattern, str]] = []
+        for rule in rules:
+            rule_type, replacement = str(rule.get("ruleType")), rule.get("replacement") or ""
+            if rule_type == RULE_TYPE_LITERAL and rule.get("prohibited"):
+                self._replacements.setdefault(rule["prohibited"], replacement)
+            elif rule_type == RULE_TYPE_REGEX and rule.get("regularExpression"):
+                try:
+                    compiled = re.compile(rule["regularExpression"])
+                except re.error as err:
+                    logger.warning("###ProhibitedFilter WARN, 敏感词正则无效, rule={}, err={}.", rule, err)
+                    continue
+                if compiled.groups or compiled.flags & ~re.UNICODE or "\\" in replacement:
+                    self._separate.append((compiled, replacement))
+                else:
+                    pattern_parts.append(f"(?P<r{len(pattern_parts)}>{compiled.pattern})")
+                    pattern_rules.append((compiled, replacement))
+                    self._pattern_replacements.append(replacement)
+            else:
+                continue
+            self.rule_count += 1
+        self._automaton = AhoCorasick(self._replacements.keys())
+        self._pattern = None
+        if pattern_parts:
+            try:
+                self._pattern = re.compile("|".join(pattern_parts))
+            except re.error as err:
+                logger.warning("###ProhibitedFilter WARN, 敏感词正则合并失败, 改为逐条匹配, err={}.", err)
+                self._separate = pattern_rules + self._separate
+
+    @property
+    def has_regex(self) -> bool:
+        return self._pattern is not None or bool(self._separate)
+
+    @property
+    def max_literal_length(self) -> int:
+        return self._automaton.max_length
+
+    def _replace_pattern(self, match: re.Match) -> str:
+        return self._pattern_replacements[int(match.lastgroup[1:])]
+
+    def purge(self, text: str) -> str:
+        """
+        过滤敏感词
+        :param text: 文本
+        :return: 过滤后的文本
+        """
+        if not text or not self.rule_count:
+            return text
+        spans = self._automaton.find(text)
+        if spans:
+            parts, end = [], 0
+            for start, stop in spans:
+                parts.append(text[end:start])
+                parts.append(self._replacements[text[start:stop]])
+                end = stop
+            parts.append(text[end:])
+            text = "".join(parts)
+        if self._pattern is not None:
+            text = self._pattern.sub(self._replace_pattern, text)
+        for compiled, replacement in self._separate:
+            try:
+                text = compiled.sub(replacement, text)
+            except re.error as err:
+                logger.warning("###ProhibitedFilter WARN, 敏感词替换失败, pattern={}, err={}.", compiled.pattern, err)
+        return text
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        查找原文中全部规则的匹配位置(流式过滤判断匹配是否跨越输出位置)
+        :param text: 文本
+        :return: (开始下标, 结束下标)列表
+        """
+        spans = list(self._automaton.find(text))
+        if self._pattern is not None:
+            spans.extend(match.span() for match in self._pattern.finditer(text))
+        for compiled, _ in self._separate:
+            spans.extend(match.span() for match in compiled.finditer(text))
+        return spans
+
+    def stream(self, lookbehind: int = PROHIBITED_STREAM_LOOKBEHIND) -> "ProhibitedStreamFilter":
+        """
+        创建流式过滤器
+        :param lookbehind: 正则规则的跨分片回看字数
+        :return: 流式过滤器
+        """
+        return ProhibitedStreamFilter(self, lookbehind=lookbehind)
+
+
+class ProhibitedStreamFilter:
+    """
+    流式敏感词过滤
+    每次输入一个分片, 只输出已确定不会与后续分片组成敏感词的部分; 末尾保留最长敏感词长度-1个字(有正则规则时至少保留lookbehind个字),
+    跨越输出位置的匹配整体留到下次输出, 因此跨分片的敏感词也能被替换
+    """
+
+    def __init__(
+            self,
+            prohibited_filter: ProhibitedFilter,
+            lookbehind: int = PROHIBITED_STREAM_LOOKBEHIND,
+    ):
+        """
+        构造函数
+        :param prohibited_filter: 编译后的过滤规则
+        :param lookbehind: 正则规则的跨分片回看字数
+        """
+        self.filter = prohibited_filter
+        self.hold = max(prohibited_filter.max_literal_length - 1, lookbehind if prohibited_filter.has_regex else 0)
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        输入分片
+        :param chunk: 分片文本
+        :return: 可输出的已过滤文本
+        """
+        if not chunk:
+            return ""
+        if not self.filter.rule_count:
+            return chunk
+        self.buffer += chunk
+        cut = len(self.buffer) - self.hold
+        if cut <= 0:
+            return ""
+        spans = self.filter.spans(self.buffer)
+        moved = True
+        while moved:
+            moved = False
+            for start, stop in spans:
+                if start < cut < stop:
+                    cut, moved = start, True
+        if cut <= 0:
+            return ""
+        text, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return self.filter.purge(text)
+
+    def flush(self) -> str:
+        """
+        输出剩余文本(流结束时调用)
+        :return: 已过滤文本
+        """
+        text, self.buffer = self.buffer, ""
+        return self.filter.purge(text)
+
+
+_filter: Optional[ProhibitedFilter] = None
+_checked_at = 0.0
+_filter_lock = threading.Lock()
+
+
+def load_prohibited_filter(version: str = None) -> ProhibitedFilter:
+    """
+    从Redis加载规则并编译
+    :param version: 规则版本号
+    :return: 编译后的过滤规则
+    """
+    rules = []
+    for key, value in sorted((get_prohibited_data() or {}).items(), key=lambda item: str(item[0])):
+        rule = parse_prohibited_rule(value)
+        if rule:
+            rules.append(rule)
+    prohibited_filter = ProhibitedFilter(rules, version=version)
+    logger.info("###ProhibitedFilter INFO, 敏感词规则已加载, version={}, rules={}.", version, prohibited_filter.rule_count)
+    return prohibited_filter
+
+
+def get_prohibited_filter() -> ProhibitedFilter:
+    """
+    获取当前的过滤规则, 每PROHIBITED_VERSION_CHECK_SECONDS检查一次规则版本, 版本变化时重新加载并替换
+    :return: 编译后的过滤规则
+    """
+    global _filter, _checked_at
+    if _filter is not None and time.monotonic() - _checked_at < PROHIBITED_VERSION_CHECK_SECONDS:
+        return _filter
+    with _filter_lock:
+        if _filter is not None and time.monotonic() - _checked_at < PROHIBITED_VERSION_CHECK_SECONDS:
+            return _filter
+        _checked_at = time.monotonic()
+        try:
+            version = RedisClient().get_str(prohibited_version_redis_key)
+            if _filter is None or version != _filter.version:
+                _filter = load_prohibited_filter(version=version)
+        except Exception as err:
+            logger.warning("###ProhibitedFilter WARN, 敏感词规则加载失败, 继续使用当前规则, err={}.", err)
+            if _filter is None:
+                _filter = ProhibitedFilter([])
+    return _filter
+
+
+async def filter_answer_stream(source: AsyncIterator[ChatResponse]) -> AsyncIterator[ChatResponse]:
+    """
+    流式问答逐片过滤敏感词(只处理回答内容, 结束帧等其他帧输出前先输出保留的文本)
+    :param source: 流式问答结果
+    :return: 过滤后的流式问答结果
+    """
+    stream = (await run_blocking(get_prohibited_filter)).stream()
+    try:
+        async for chatResponse in source:
+            data = chatResponse.data
+            if data is None or data.history_id or data.answer == "[DONE]":
+                rest = stream.flush()
+                if rest:
+                    yield ChatResponse.delta(answer=rest)
+                yield chatResponse
+                continue
+            if data.answer:
+                data.answer = stream.feed(data.answer)
+                if not data.answer and not data.thinking and not data.search:
+                    continue
+            yield chatResponse
+        rest = stream.flush()
+        if rest:
+            yield ChatResponse.delta(answer=rest)
+    finally:
+        if hasattr(source, "aclose"):
+            await source.aclose()
@@ -3,6 +3,9 @@ import traceback
 import uuid
 from loguru import logger
 
+from config.base_config import VECTOR_INCREMENTAL_ENABLED, VECTOR_DEDUP_ENABLED
+from framework.scheduler.job_scheduler import JobContext
+from framework.util.hash_util import file_md5
 from service.domain.ai_namespace import AiNamespaceDomain
 from framework.business_code import ERROR_10001, ERROR_10213
 from framework.business_except import BusinessException
@@ -10,16 +13,46 @@ from service.domain.ai_namespace_file import NamespaceFileModel, AiNamespaceFile
 from service.local_repo_service import LocalRepositoryDomain
 
 
+def reload_namespace_file(context: JobContext = None):
+    """
+    定时任务-本地知识库文件向量化处理(分片执行时只处理本分片的文件)
+    向量化队列中仍有排队或重试任务的文件由队列消费者处理, 定时任务跳过
+    :param context: 定时任务上下文
+    """
+    # 向量化队列依赖本模块的handle, 在此处导入避免循环导入
+    from service.ingest_queue import IngestQueue
+    request_id = str(uuid.uuid4())
+    shard_index = context.shard_index if context else 0
+    shard_count = context.shard_count if context else 1
+    logger.info("###Reload_namespace_file###: request_id={}, shard={}/{}, time={}.", request_id, shard_index,
+                shard_count, datetime.datetime.now())
+    namespaceFileDomain = AiNamespaceFileDomain(request_id=request_id)
+    for namespaceFileModel in namespaceFileDomain.find_by_status_none(shard_index=shard_index,
+                                                                      shard_count=shard_count) or []:
+        if context:
+            context.check()
+        if IngestQueue(request_id=request_id).is_active(file_id=str(namespaceFileModel.id)):
+            logger.info("###Reload_namespace_file###文件向量化任务排队中, 跳过：文件名称[{}], request_id={}.",
+                        namespaceFileModel.name, request_id)
+            continue
+        handle(
+            namespaceFileModel=namespaceFileModel,
+            namespaceFileDomain=namespaceFileDomain,
+            request_id=request_id
+        )
+
+
 def handle(
         namespaceFileModel: NamespaceFileModel,
         namespaceFileDomain: AiNamespaceFileDomain,
         request_id: str = str(uuid.uuid4()),
-):
+) -> bool:
     """
     业务处理
     :param namespaceFileModel:  知识库文件实体对象
     :param namespaceFileDomain: 知识库文件服务
     :param request_id: 请求唯一标识
+    :return: 是否向量化成功
     """
     try:
         # 对于向量化成功文件更改分片策略
@@ -44,12 +77,25 @@ def handle(
             vector_status='Vectoring',
             vector_count=vector_count
         )
-        # 向本地知识库推送元数据
-        ids = LocalRepositoryDomain(request_id=request_id).push(
-            glob=namespaceFileModel.name,
-            namespaceModel=namespaceModel,
-            namespaceFileModel=namespaceFileModel,
-        )
+        # 内容相同且分片参数相同的文件已向量化时直接复制分片
+        ids = None
+        if VECTOR_DEDUP_ENABLED:
+            ids = LocalRepositoryDomain(request_id=request_id).push_reuse(
+                namespaceModel=namespaceModel,
+                namespaceFileModel=namespaceFileModel,
+            )
+        # 向本地知识库推送元数据(增量模式下与已有分片比对, 内容未变化的分片不重复计算向量)
+        if not ids and VECTOR_INCREMENTAL_ENABLED:
+            ids = LocalRepositoryDomain(request_id=request_id).push_incremental(
+                namespaceModel=namespaceModel,
+                namespaceFileModel=namespaceFileModel,
+            )
+        elif not ids:
+            ids = LocalRepositoryDomain(request_id=request_id).push(
+                glob=namespaceFileModel.name,
+                namespaceModel=namespaceModel,
+                namespaceFileModel=namespaceFileModel,
+            )
         # 成功场景: 同步更新至业务库-知识库表
         namespaceFileDomain.update(
             file_id=namespaceFileModel.id,
@@ -58,6 +104,7 @@ def handle(
             vector_count=vector_count
         )
         logger.info("###Reload_namespace_file###向量化文件成功：文件名称[{}], 向量标识[{}].", namespaceFileModel.name, ids)
+        return True
     except Exception as err:
         logger.error("###Reload_namespace_file###向量化文件失败：文件名称[{}], Message={}.", namespaceFileModel.name, err)
         traceback.print_exc()
@@ -69,3 +116,66 @@ def handle(
             vector_status='Fail',
             vector_count=vector_count
         )
+        return False
+
+
+def handle_refresh(
+        namespaceFileModel: NamespaceFileModel,
+        namespaceFileDomain: AiNamespaceFileDomain,
+        request_id: str = str(uuid.uuid4()),
+) -> bool:
+    """
+    已向量化文件内容刷新(网页定时抓取等场景)
+    文件MD5未变化时直接跳过; 否则按分片内容摘要增量同步, 失败时保留原有分片与向量化状态
+    :param namespaceFileModel:  知识库文件实体对象
+    :param namespaceFileDomain: 知识库文件服务
+    :param request_id: 请求唯一标识
+    :return: 是否重新向量化
+    """
+    md5 = file_md5(namespaceFileModel.path + namespaceFileModel.name)
+    if md5 == namespaceFileModel.md5:
+        logger.info("###Refresh_namespace_file###文件内容未变化, 跳过向量化：文件名称[{}], md5={}, request_id={}.",
+                    namespaceFileModel.name, md5, request_id)
+        return False
+
+    vector_ids = namespaceFileModel.vector_ids.split(',') \
+        if namespaceFileModel.vector_ids and namespaceFileModel.vector_ids != 'None' else []
+    vector_count = int(namespaceFileModel.vector_count)
+    try:
+        namespaceModel = AiNamespaceDomain(request_id=request_id).find_by_id(namespaceFileModel.namespace_id)
+        if not namespaceModel:
+            logger.error("###Refresh_namespace_file ERROR, [{}]未查询到所属知识库[{}]信息, request_id={}.", ERROR_10001,
+                         namespaceFileModel.namespace_id, request_id)
+            raise BusinessException(ERROR_10001.code, ERROR_10001.message)
+        # 更新向量状态，Vectoring(原有分片在同步提交前仍可检索)
+        namespaceFileDomain.update(
+            file_id=namespaceFileModel.id,
+            vector_ids=vector_ids,
+            vector_status='Vectoring',
+            vector_count=vector_count
+        )
+        ids = LocalRepositoryDomain(request_id=request_id).push_incremental(
+            namespaceModel=namespaceModel,
+            namespaceFileModel=namespaceFileModel,
+        )
+        namespaceFileDomain.update(
+            file_id=namespaceFileModel.id,
+            vector_ids=ids,
+            vector_status='Done',
+            vector_count=vector_count
+        )
+        namespaceFileDomain.update_md5(file_id=namespaceFileModel.id, md5=md5)
+        logger.info("###Refresh_namespace_file###增量向量化文件成功：文件名称[{}], md5={}, request_id={}.",
+                    namespaceFileModel.name, md5, request_id)
+        return True
+    except Exception as err:
+        logger.error("###Refresh_namespace_file###增量向量化文件失败：文件名称[{}], Message={}.", namespaceFileModel.name, err)
+        traceback.print_exc()
+        # 失败场景: 分片同步在单个事务内提交, 原有分片未被修改, 恢复原向量化状态, 待下次刷新重试
+        namespaceFileDomain.update(
+            file_id=namespaceFileModel.id,
+            vector_ids=vector_ids,
+            vector_status='Done',
+            vector_count=vector_count
+        )
+        return False
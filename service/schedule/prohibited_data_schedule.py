@@ -1,10 +1,13 @@
 import datetime
+import json
 import uuid
 from framework.redis.redis_client import RedisClient
 from loguru import logger
 from service.domain.ai_prohibited import AiProhibitedDomain,ProhibitedModel
 
 prohibited_redis_key = 'prohibited:ai_prohibited'
+# 规则版本号, 每次重新加载后更新, 各进程据此切换编译后的过滤规则(见service.prohibited_filter)
+prohibited_version_redis_key = 'prohibited:ai_prohibited:version'
 
 
 def init_prohibited_data():
@@ -30,14 +33,17 @@ def redis_set_prohibited_data(pkey: str):
     redis_client = RedisClient()
     request_id = str(uuid.uuid4())
     data_list = reload_prohibited_data(request_id=request_id)
-    if data_list:
-        for data in data_list:
-            try:
-                redis_client.set_hash_by_key(pkey, key=data.id,
-                                             v=str(data.default_serializer()))
-            except Exception as err:
-                logger.warning(err)
-                logger.info("####redis_set_prohibited_data fail，request_id={}, key={}.", request_id, pkey)
+    # 规则以JSON格式保存, 一次写入
+    mapping = {}
+    for data in data_list or []:
+        try:
+            mapping[data.id] = json.dumps(data.default_serializer(), ensure_ascii=False, default=str)
+        except Exception as err:
+            logger.warning(err)
+            logger.info("####redis_set_prohibited_data fail，request_id={}, key={}, id={}.", request_id, pkey, data.id)
+    if mapping:
+        redis_client.set_hash(pkey, mapping)
+    redis_client.set_str(prohibited_version_redis_key, uuid.uuid4().hex)
 
 
 def reload_prohibited_data(request_id: str) -> list[ProhibitedModel]:
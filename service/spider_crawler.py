@@ -0,0 +1,387 @@
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import UnicodeDammit
+from loguru import logger
+
+from config.base_config import (
+    SPIDER_MAX_CONCURRENCY,
+    SPIDER_PER_HOST_CONCURRENCY,
+    SPIDER_PER_HOST_INTERVAL_MS,
+    SPIDER_TIMEOUT_SECONDS,
+    SPIDER_MAX_BYTES,
+    SPIDER_PAGE_SIZE,
+    SPIDER_VECTOR_CONCURRENCY)
+from framework.mysql.mysql_pool import run_in_db_executor
+from framework.scheduler.job_scheduler import JobContext
+from framework.util.async_util import run_blocking
+from framework.util.hash_util import text_sha256
+from service.domain.ai_namespace_file import AiNamespaceFileDomain
+from service.domain.ai_namespace_network import AiNamespaceNetworkDomain, NameSpaceNetworkModel
+from service.namespacefile.namespace_file_service import NamespaceFileService
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+SPIDER_USER_AGENT = "Mozilla/5.0 (compatible; ChatOmniSpider/1.0)"
+# 正文提取时剔除的标签
+_IGNORED_TAGS = ("script", "style", "noscript", "template")
+
+
+def decode_html(
+        content: bytes,
+        charset: Optional[str] = None,
+) -> str:
+    """
+    解码网页内容(优先响应头字符集, 其次页面meta声明, 最后自动探测)
+    :param content: 响应内容
+    :param charset: 响应头字符集
+    :return: 网页文本
+    """
+    return UnicodeDammit(content, [charset] if charset else [], is_html=True).unicode_markup or ""
+
+
+def extract_html(
+        html: str,
+) -> Tuple[str, str]:
+    """
+    提取网页标题与正文(空白归一化), 优先使用lxml, 未安装时退化为BeautifulSoup
+    :param html: 网页文本
+    :return: (标题, 正文)
+    """
+    if not html.strip():
+        return "", ""
+    if lxml_html is not None:
+        parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+        document = lxml_html.document_fromstring(html.encode("utf-8"), parser=parser)
+        for element in document.xpath("|".join(f"//{tag}" for tag in _IGNORED_TAGS)):
+            element.drop_tree()
+        title = document.findtext(".//title") or ""
+        text = document.text_content()
+    else:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        for element in soup(_IGNORED_TAGS):
+            element.decompose()
+        title = soup.title.string if soup.title and soup.title.string else ""
+        text = soup.get_text(" ")
+    return " ".join(title.split()), " ".join(text.split())
+
+
+def write_file_atomic(
+        file_path: str,
+        content: str,
+):
+    """
+    先写临时文件再原子替换, 避免向量化读取到写了一半的文件
+    :param file_path: 文件路径
+    :param content: 文件内容
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_file(
+        file_path: str,
+) -> Optional[str]:
+    """
+    读取已保存的网页
+    :param file_path: 文件路径
+    :return: 网页文本, 文件不存在时为空
+    """
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def restore_file(
+        file_path: str,
+        content: Optional[str],
+):
+    """
+    恢复网页文件为更新前的内容(更新前不存在时删除)
+    :param file_path: 文件路径
+    :param content: 更新前的网页文本
+    """
+    if content is None:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+    write_file_atomic(file_path, content)
+
+
+class FetchResult:
+    """
+    网页抓取结果
+    """
+
+    def __init__(
+            self,
+            status_code: int,
+            text: str = None,
+            etag: str = None,
+            last_modified: str = None,
+    ):
+        """
+        构造函数
+        :param status_code: HTTP状态码
+        :param text: 网页文本
+        :param etag: 响应ETag
+        :param last_modified: 响应Last-Modified
+        """
+        self.status_code = status_code
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+class HostLimiter:
+    """
+    单站点限流: 限制同一站点的并发请求数, 并保证相邻请求的最小间隔
+    """
+
+    def __init__(
+            self,
+            concurrency: int = SPIDER_PER_HOST_CONCURRENCY,
+            interval_ms: int = SPIDER_PER_HOST_INTERVAL_MS,
+    ):
+        """
+        构造函数
+        :param concurrency: 单站点并发数
+        :param interval_ms: 同站点请求最小间隔(毫秒)
+        """
+        self.concurrency = max(1, concurrency)
+        self.interval = max(0, interval_ms) / 1000
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def acquire(self, host: str) -> AsyncIterator[None]:
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            if self.interval:
+                # 预占下一个请求时间片, 并发请求依次顺延
+                now = asyncio.get_running_loop().time()
+                slot = max(now, self._next_slot.get(host, 0.0))
+                self._next_slot[host] = slot + self.interval
+                if slot > now:
+                    await asyncio.sleep(slot - now)
+            yield
+
+
+class SpiderCrawler:
+    """
+    网页爬虫
+    异步并发抓取全部到期网站(连接池复用、全局及单站点并发限制), 使用ETag/Last-Modified条件请求,
+    304或正文未变化时只顺延下次爬取时间, 正文变化时才写入文件并触发增量向量化。
+    """
+
+    def __init__(
+            self,
+            request_id: str = str(uuid.uuid4()),
+            max_concurrency: int = SPIDER_MAX_CONCURRENCY,
+            per_host_concurrency: int = SPIDER_PER_HOST_CONCURRENCY,
+            per_host_interval_ms: int = SPIDER_PER_HOST_INTERVAL_MS,
+            timeout: int = SPIDER_TIMEOUT_SECONDS,
+            max_bytes: int = SPIDER_MAX_BYTES,
+            page_size: int = SPIDER_PAGE_SIZE,
+            vector_concurrency: int = SPIDER_VECTOR_CONCURRENCY,
+            context: JobContext = None,
+    ):
+        """
+        构造函数
+        :param request_id: 请求唯一标识
+        :param max_concurrency: 全局并发数
+        :param per_host_concurrency: 单站点并发数
+        :param per_host_interval_ms: 同站点请求最小间隔(毫秒)
+        :param timeout: 请求超时(秒)
+        :param max_bytes: 单页面最大字节数
+        :param page_size: 到期网站分页读取条数
+        :param vector_concurrency: 同时向量化的网页数
+        :param context: 定时任务上下文(分片信息及执行权校验), 为空时抓取全部到期网站
+        """
+        self.request_id = request_id
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.page_size = page_size
+        self.vector_concurrency = max(1, vector_concurrency)
+        self.context = context
+        self.host_limiter = HostLimiter(concurrency=per_host_concurrency, interval_ms=per_host_interval_ms)
+        self.network_domain = AiNamespaceNetworkDomain(request_id=request_id)
+        self.stats = {"total": 0, "not_modified": 0, "unchanged": 0, "updated": 0, "failed": 0}
+        self._vector_executor: Optional[ThreadPoolExecutor] = None
+
+    async def fetch(
+            self,
+            client: httpx.AsyncClient,
+            url: str,
+            etag: str = None,
+            last_modified: str = None,
+    ) -> FetchResult:
+        """
+        条件请求抓取网页
+        :param client: HTTP客户端
+        :param url: 网页地址
+        :param etag: 上次响应的ETag
+        :param last_modified: 上次响应的Last-Modified
+        :return: 抓取结果
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        async with self.host_limiter.acquire(urlsplit(url).netloc):
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 or response.status_code >= 400:
+                    return FetchResult(status_code=response.status_code)
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content.extend(chunk)
+                    if len(content) > self.max_bytes:
+                        raise ValueError(f"Response body exceeds {self.max_bytes} bytes")
+                return FetchResult(
+                    status_code=response.status_code,
+                    text=decode_html(bytes(content), response.charset_encoding),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+
+    async def crawl(
+            self,
+            client: httpx.AsyncClient,
+            network_model: NameSpaceNetworkModel,
+    ):
+        """
+        抓取单个网站并按需触发向量化
+        :param client: HTTP客户端
+        :param network_model: 爬虫网站信息
+        """
+        current_timestamp = int(time.time() * 1000)
+        self.stats["total"] += 1
+        try:
+            namespaceFileModel = await run_in_db_executor(
+                AiNamespaceFileDomain(request_id=self.request_id).find_by_id, network_model.file_id)
+            if not namespaceFileModel:
+                raise ValueError(f"Namespace file {network_model.file_id} not found")
+            result = await self.fetch(client=client, url=network_model.website, etag=network_model.etag,
+                                      last_modified=network_model.last_modified)
+            if result.not_modified or result.status_code >= 400:
+                self.stats["not_modified" if result.not_modified else "failed"] += 1
+                await run_in_db_executor(self.network_domain.update_crawl_result, network_model=network_model,
+                                         current_timestamp=current_timestamp, result_code=result.status_code)
+                return
+
+            file_path = namespaceFileModel.path + namespaceFileModel.name
+            text_digest = text_sha256(extract_html(result.text)[1])
+            previous = await run_blocking(read_file, file_path)
+            if previous is not None and text_digest == text_sha256(extract_html(previous)[1]):
+                # 网页标记变化但正文未变化(时间戳、广告等), 不重新向量化
+                self.stats["unchanged"] += 1
+                await run_in_db_executor(self.network_domain.update_crawl_result, network_model=network_model,
+                                         current_timestamp=current_timestamp, result_code=result.status_code,
+                                         result_msg="unchanged", etag=result.etag,
+                                         last_modified=result.last_modified)
+                return
+
+            # 向量化读取的是已保存的网页文件, 需先写入; 向量化失败时恢复旧文件,
+            # 下次爬取时正文摘要仍不一致, 重新向量化
+            await run_blocking(write_file_atomic, file_path, result.text)
+            try:
+                vectorized = await run_blocking(
+                    NamespaceFileService(request_id=self.request_id).update_spider_file_data,
+                    network_model=network_model,
+                    executor=self._vector_executor
+                )
+            except BaseException:
+                await run_blocking(restore_file, file_path, previous)
+                raise
+            if vectorized is False:
+                await run_blocking(restore_file, file_path, previous)
+            self.stats["updated" if vectorized is not False else "failed"] += 1
+            # 向量化失败时不保存校验信息, 下次爬取重新获取完整内容
+            await run_in_db_executor(self.network_domain.update_crawl_result, network_model=network_model,
+                                     current_timestamp=current_timestamp, result_code=result.status_code,
+                                     result_msg="updated" if vectorized is not False else "vectorize failed",
+                                     etag=result.etag if vectorized is not False else None,
+                                     last_modified=result.last_modified if vectorized is not False else None)
+        except Exception as err:
+            self.stats["failed"] += 1
+            logger.error("###SpiderCrawler ERROR, 网页爬取失败, id={}, website={}, Message={}, request_id={}.",
+                         network_model.id, network_model.website, repr(err), self.request_id)
+            await run_in_db_executor(self.network_domain.update_crawl_result, network_model=network_model,
+                                     current_timestamp=current_timestamp, result_code=-1, result_msg=repr(err))
+
+    async def _worker(
+            self,
+            client: httpx.AsyncClient,
+            queue: asyncio.Queue,
+    ):
+        while True:
+            network_model = await queue.get()
+            if network_model is None:
+                return
+            await self.crawl(client=client, network_model=network_model)
+
+    async def run(self) -> Dict[str, int]:
+        """
+        抓取全部到期网站(按主键游标分页流式读取, 队列满时暂停读取)
+        :return: 抓取统计
+        """
+        start = time.time()
+        current_timestamp = int(start * 1000)
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        self._vector_executor = ThreadPoolExecutor(max_workers=self.vector_concurrency,
+                                                   thread_name_prefix="spider-vector")
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True,
+                                         headers={"User-Agent": SPIDER_USER_AGENT}) as client:
+                queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+                workers = [asyncio.ensure_future(self._worker(client, queue)) for _ in range(self.max_concurrency)]
+                pages = self.network_domain.iter_due_network(
+                    current_timestamp=current_timestamp,
+                    limit=self.page_size,
+                    shard_index=self.context.shard_index if self.context else 0,
+                    shard_count=self.context.shard_count if self.context else 1,
+                )
+                while True:
+                    page = await run_in_db_executor(next, pages, None)
+                    if page is None:
+                        break
+                    # 失去执行权(锁过期被其他进程接管)后不再下发新网站
+                    if self.context and not self.context.is_valid():
+                        logger.error("###SpiderCrawler ERROR, 任务锁已失效, 停止爬取, request_id={}.", self.request_id)
+                        break
+                    for network_model in page:
+                        await queue.put(network_model)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+        finally:
+            self._vector_executor.shutdown(wait=True)
+        logger.info("###SpiderCrawler INFO, 网页爬取完成, shard={}, stats={}, cost={}s, request_id={}.",
+                    f"{self.context.shard_index}/{self.context.shard_count}" if self.context else None, self.stats,
+                    round(time.time() - start, 3), self.request_id)
+        return self.stats
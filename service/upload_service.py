@@ -0,0 +1,122 @@
+import hashlib
+import os
+import uuid
+
+from fastapi import UploadFile
+from loguru import logger
+
+from config.base_config import CONTENT_PATH, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE
+from framework.business_code import ERROR_10214, ERROR_10215
+from framework.business_except import BusinessException
+from framework.util.async_util import run_blocking
+
+
+class UploadResult:
+    """
+    上传文件保存结果
+    """
+
+    def __init__(
+            self,
+            file_name: str,
+            file_path: str,
+            file_dir: str,
+            size: int,
+            sha256: str,
+            md5: str,
+    ):
+        """
+        构造函数
+        :param file_name: 文件名称
+        :param file_path: 保存路径
+        :param file_dir: 保存目录(以/结尾, file_dir + file_name即保存路径)
+        :param size: 文件大小(字节)
+        :param sha256: 文件内容SHA-256
+        :param md5: 文件内容MD5(与知识库文件表md5字段口径一致)
+        """
+        self.file_name = file_name
+        self.file_path = file_path
+        self.file_dir = file_dir
+        self.size = size
+        self.sha256 = sha256
+        self.md5 = md5
+
+
+def _remove_quietly(file_path: str):
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as err:
+        logger.warning("###UploadService WARN, 删除临时文件失败, path={}, err={}.", file_path, err)
+
+
+async def save_upload_file(
+        user_file: UploadFile,
+        target_dir: str = CONTENT_PATH,
+        max_bytes: int = UPLOAD_MAX_BYTES,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        request_id: str = None,
+        content_addressed: bool = False,
+) -> UploadResult:
+    """
+    流式保存上传文件
+    按固定大小分块读取并写入临时文件, 同时计算内容摘要, 超过大小上限时立即中止;
+    写入完成后原子替换为目标文件, 读取方不会看到写了一半的文件, 内存占用与文件大小无关;
+    按内容保存时目标文件为"保存目录/内容MD5/文件名", 同名文件重复上传不会覆盖排队中任务的文件。
+    :param user_file: 上传文件
+    :param target_dir: 保存目录
+    :param max_bytes: 文件大小上限(字节)
+    :param chunk_size: 分块大小(字节)
+    :param request_id: 请求唯一标识
+    :param content_addressed: 是否按内容MD5分目录保存
+    :return: 保存结果
+    """
+    # 仅保留文件名部分, 避免路径穿越
+    file_name = os.path.basename((user_file.filename or "").replace("\\", "/"))
+    if not file_name:
+        logger.error("###UploadService ERROR, [{}]上传文件名非法, filename={}, request_id={}.", ERROR_10214,
+                     user_file.filename, request_id)
+        raise BusinessException(ERROR_10214.code, ERROR_10214.message)
+    # 已知文件大小时在读取前校验
+    if user_file.size is not None and user_file.size > max_bytes:
+        logger.error("###UploadService ERROR, [{}]上传文件大小超过限制, filename={}, size={}, max_bytes={}, "
+                     "request_id={}.", ERROR_10215, file_name, user_file.size, max_bytes, request_id)
+        raise BusinessException(ERROR_10215.code, ERROR_10215.message)
+
+    os.makedirs(target_dir, exist_ok=True)
+    tmp_path = f"{target_dir}{file_name}.{uuid.uuid4().hex}.tmp"
+    file_dir = target_dir
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = await user_file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    logger.error("###UploadService ERROR, [{}]上传文件大小超过限制, filename={}, max_bytes={}, "
+                                 "request_id={}.", ERROR_10215, file_name, max_bytes, request_id)
+                    raise BusinessException(ERROR_10215.code, ERROR_10215.message)
+                sha256.update(chunk)
+                md5.update(chunk)
+                await run_blocking(f.write, chunk)
+        if size == 0:
+            logger.error("###UploadService ERROR, [{}]上传文件为空, filename={}, request_id={}.", ERROR_10214,
+                         file_name, request_id)
+            raise BusinessException(ERROR_10214.code, ERROR_10214.message)
+        if content_addressed:
+            file_dir = f"{target_dir}{md5.hexdigest()}/"
+            await run_blocking(os.makedirs, file_dir, exist_ok=True)
+        file_path = f"{file_dir}{file_name}"
+        await run_blocking(os.replace, tmp_path, file_path)
+    finally:
+        _remove_quietly(tmp_path)
+        await user_file.close()
+    result = UploadResult(file_name=file_name, file_path=file_path, file_dir=file_dir, size=size, sha256=sha256.hexdigest(),
+                          md5=md5.hexdigest())
+    logger.info("###UploadService INFO, 上传文件保存成功, path={}, size={}, sha256={}, request_id={}.", file_path,
+                size, result.sha256, request_id)
+    return result